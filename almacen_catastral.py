@@ -0,0 +1,697 @@
+#!/usr/bin/env python3
+"""
+Almacén en disco del catálogo de propiedades (SQLite)
+
+Las propiedades se guardan en una tabla con una columna por campo, los
+cultivos en una tabla hija y las valoraciones calculadas y la consolidación
+en otras dos. Cada etapa lee solo las columnas que necesita en lugar de
+parsear los JSON completos:
+
+  1. python almacen_catastral.py migrar            # JSON de la extracción → almacén
+  2. python valorador_inmuebles.py --almacen       # columnas de las rústicas → valoraciones
+  3. python consolidar_valoraciones.py --almacen   # referencias y valores → consolidación
+  4. python almacen_catastral.py exportar          # JSON de los frontends
+
+Con el almacén, `exportar` es lo único que escribe los JSON de los frontends
+(datos_catastrales_mergeados.json y datos_catastrales_consolidados_completo.json).
+
+Los campos que no tienen columna propia se guardan en la columna `resto`
+(JSON), de modo que un registro se reconstruye exactamente igual que entró.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from diario_extraccion import escribir_json_atomico
+from formato_catastral import superficie_a_m2
+from json_incremental import iterar_array_json
+
+RUTA_ALMACEN = "data/catalogo_catastral.sqlite3"
+
+# Archivos que consumen los frontends (angular-catastro y frontend/)
+ARCHIVO_FRONTEND = os.path.join("angular-catastro", "src", "assets", "datos_catastrales_mergeados.json")
+ARCHIVO_CONSOLIDADO = os.path.join("data", "datos_catastrales_consolidados_completo.json")
+
+# Archivos JSON que se importan al migrar, en orden (los posteriores prevalecen)
+ARCHIVOS_PROPIEDADES = (
+    "datos_catastrales_consolidados.json",
+    "datos_catastrales_consolidados_completo.json",
+    "datos_catastrales_mergeados.json",
+)
+ARCHIVO_VALORACIONES = "valoraciones.json"
+
+# Campos añadidos por consolidar_valoraciones: no son datos de la propiedad
+_CAMPOS_CONSOLIDACION = ("valoracion_calculada", "valor_referencia_oficial", "comparacion")
+
+# (columna, tipo, ruta del campo en el registro JSON)
+COLUMNAS_PROPIEDADES = (
+    ("fecha_extraccion", "TEXT", ("fecha_extraccion",)),
+    ("url_consultada", "TEXT", ("url_consultada",)),
+    ("clase", "TEXT", ("datos_descriptivos", "clase")),
+    ("uso_principal", "TEXT", ("datos_descriptivos", "uso_principal")),
+    ("localizacion", "TEXT", ("datos_descriptivos", "localizacion", "texto_completo")),
+    ("poligono", "TEXT", ("datos_descriptivos", "localizacion", "poligono")),
+    ("parcela", "TEXT", ("datos_descriptivos", "localizacion", "parcela")),
+    ("partida", "TEXT", ("datos_descriptivos", "localizacion", "partida")),
+    ("municipio", "TEXT", ("datos_descriptivos", "localizacion", "municipio")),
+    ("provincia", "TEXT", ("datos_descriptivos", "localizacion", "provincia")),
+    ("superficie_grafica", "TEXT", ("parcela_catastral", "superficie_gráfica")),
+    ("valor_referencia", "REAL", ("valor_referencia",)),
+    ("valor_referencia_texto", "TEXT", ("valor_referencia_texto",)),
+    ("escritura", "TEXT", ("escritura",)),
+)
+
+COLUMNAS_CULTIVOS = (
+    ("subparcela", "TEXT", ("subparcela",)),
+    ("cultivo_aprovechamiento", "TEXT", ("cultivo_aprovechamiento",)),
+    ("intensidad_productiva", "TEXT", ("intensidad_productiva",)),
+    ("superficie", "TEXT", ("superficie_m2",)),
+)
+
+COLUMNAS_VALORACIONES = (
+    ("fecha_valoracion", "TEXT", ("fecha_valoracion",)),
+    ("clase_valoracion", "TEXT", ("clase",)),
+    ("uso_valoracion", "TEXT", ("uso_principal",)),
+    ("tipo_valoracion", "TEXT", ("tipo_valoracion",)),
+    ("region", "TEXT", ("region",)),
+    ("superficie_total_m2", "REAL", ("superficie_total_m2",)),
+    ("valor_estimado_euros", "REAL", ("valor_estimado_euros",)),
+)
+
+# Resultado de consolidar_valoraciones; el valor de referencia oficial se
+# guarda entero en `resto`
+COLUMNAS_CONSOLIDACION = (
+    ("valor_calculado", "REAL", ("comparacion", "valor_calculado")),
+    ("valor_oficial", "REAL", ("comparacion", "valor_oficial")),
+    ("diferencia_euros", "REAL", ("comparacion", "diferencia_euros")),
+    ("diferencia_porcentaje", "REAL", ("comparacion", "diferencia_porcentaje")),
+    ("mayor", "TEXT", ("comparacion", "mayor")),
+)
+
+# Columnas calculadas al guardar (no forman parte del registro original)
+#   superficie_m2: superficie gráfica de la parcela en m² ("1.197 m2" -> 1197.0)
+#   num_cultivos: número de cultivos (NULL si el registro no tiene la lista)
+#   superficie_m2 (cultivos): superficie del cultivo en m²
+
+_TIPOS = {"TEXT": str, "REAL": float}
+
+
+def _aplanar(registro: Dict, columnas) -> Tuple[List, Dict]:
+    """
+    Separa los campos con columna propia del resto del registro
+
+    Solo se pasan a su columna los valores del tipo de la columna; los demás
+    (incluidos los null) se quedan en el resto, para reconstruir el registro
+    sin cambios de tipo.
+
+    Returns:
+        (valores de las columnas, resto del registro)
+    """
+    resto = json.loads(json.dumps(registro))
+    valores = []
+    for _, tipo, ruta in columnas:
+        padres = [resto]
+        for clave in ruta[:-1]:
+            hijo = padres[-1].get(clave)
+            if not isinstance(hijo, dict):
+                break
+            padres.append(hijo)
+        else:
+            valor = padres[-1].get(ruta[-1])
+            if type(valor) is _TIPOS[tipo]:
+                valores.append(valor)
+                del padres[-1][ruta[-1]]
+                # Los diccionarios vaciados al extraer columnas no se guardan
+                for nivel in range(len(padres) - 1, 0, -1):
+                    if padres[nivel]:
+                        break
+                    del padres[nivel - 1][ruta[nivel - 1]]
+                continue
+        valores.append(None)
+    return valores, resto
+
+
+def _reconstruir(resto: Dict, columnas, valores: Sequence) -> Dict:
+    """Inversa de _aplanar"""
+    for (_, _, ruta), valor in zip(columnas, valores):
+        if valor is None:
+            continue
+        destino = resto
+        for clave in ruta[:-1]:
+            destino = destino.setdefault(clave, {})
+        destino[ruta[-1]] = valor
+    return resto
+
+
+def _reordenar(registro: Dict, orden: Sequence[str]) -> Dict:
+    """Devuelve el registro con las claves conocidas en el orden de los extractores"""
+    ordenado = {clave: registro.pop(clave) for clave in orden if clave in registro}
+    ordenado.update(registro)
+    return ordenado
+
+
+# Orden de las claves en los registros de parser_ovc_catastro.construir_datos
+_ORDEN_PROPIEDAD = (
+    "referencia_catastral", "fecha_extraccion", "url_consultada", "datos_descriptivos",
+    "parcela_catastral", "cultivos", "valor_referencia", "valor_referencia_texto", "escritura",
+)
+_ORDEN_DESCRIPTIVOS = ("referencia_catastral", "localizacion", "clase", "uso_principal")
+_ORDEN_LOCALIZACION = ("texto_completo", "poligono", "parcela", "partida", "municipio", "provincia")
+_ORDEN_PARCELA = ("superficie_gráfica",)
+_ORDEN_CULTIVO = ("subparcela", "cultivo_aprovechamiento", "intensidad_productiva", "superficie_m2")
+
+# Orden de las claves en las valoraciones de valorador_inmuebles (rústicas,
+# urbanas, con error y con fecha de devengo)
+_ORDEN_VALORACION = (
+    "referencia_catastral", "fecha_valoracion", "clase", "uso_principal", "tipo_valoracion", "metodo",
+    "superficie_total_m2", "superficie_total_ha", "valor_catastral", "coeficiente", "error", "region",
+    "provincia", "valor_estimado_euros", "valor_por_ha", "valor_por_m2", "detalles_cultivos",
+    "fuente_precios", "fuente_criterios", "advertencias", "fecha_devengo", "vigencia_tablas",
+)
+
+# Orden de las claves añadidas por consolidar_valoraciones.consolidar_registro
+_ORDEN_CONSOLIDACION = ("valor_referencia_oficial", "comparacion")
+_ORDEN_COMPARACION = tuple(nombre for nombre, _, _ in COLUMNAS_CONSOLIDACION)
+
+
+# Propiedades que propiedades_para_valorar construye solo con sus columnas:
+# rústicas para ValoradorInmuebles (LIKE solo ignora mayúsculas ASCII, así
+# que nunca acepta una clase que el valorador no tome por rústica), con
+# localización y con lista de cultivos
+_VALORABLE_POR_COLUMNAS = (
+    "(clase LIKE '%rústico%' OR clase LIKE '%rustico%') "
+    "AND num_cultivos IS NOT NULL AND (municipio IS NOT NULL OR provincia IS NOT NULL)"
+)
+
+
+class AlmacenCatastral:
+    """
+    Repositorio de propiedades, cultivos y valoraciones en SQLite
+    """
+
+    def __init__(self, ruta: str = RUTA_ALMACEN):
+        """
+        Args:
+            ruta: Archivo SQLite (":memory:" para un almacén temporal)
+        """
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        self.ruta = ruta
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("PRAGMA foreign_keys=ON")
+        self._crear_tablas()
+
+    def _crear_tablas(self):
+        def definicion(columnas):
+            return ",\n".join(f"    {nombre} {tipo}" for nombre, tipo, _ in columnas)
+
+        self.conexion.executescript(f"""
+CREATE TABLE IF NOT EXISTS propiedades (
+    referencia_catastral TEXT PRIMARY KEY,
+{definicion(COLUMNAS_PROPIEDADES)},
+    superficie_m2 REAL,
+    num_cultivos INTEGER,
+    resto TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cultivos (
+    referencia_catastral TEXT NOT NULL REFERENCES propiedades ON DELETE CASCADE,
+    orden INTEGER NOT NULL,
+{definicion(COLUMNAS_CULTIVOS)},
+    superficie_m2 REAL,
+    resto TEXT NOT NULL,
+    PRIMARY KEY (referencia_catastral, orden)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS valoraciones (
+    referencia_catastral TEXT PRIMARY KEY,
+{definicion(COLUMNAS_VALORACIONES)},
+    resto TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS consolidacion (
+    referencia_catastral TEXT PRIMARY KEY,
+{definicion(COLUMNAS_CONSOLIDACION)},
+    resto TEXT NOT NULL
+);
+""")
+        self._columnas = {
+            tabla: [fila[1] for fila in self.conexion.execute(f"PRAGMA table_info({tabla})")]
+            for tabla in ("propiedades", "cultivos", "valoraciones", "consolidacion")
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def guardar_propiedades(self, propiedades: Iterable[Dict]) -> int:
+        """
+        Inserta o actualiza propiedades (con sus cultivos)
+
+        Una propiedad que ya existe conserva su posición en el catálogo.
+
+        Args:
+            propiedades: Registros en el formato de los extractores
+
+        Returns:
+            Número de propiedades guardadas
+        """
+        nombres = [nombre for nombre, _, _ in COLUMNAS_PROPIEDADES] + ["superficie_m2", "num_cultivos", "resto"]
+        sql_propiedad = (
+            f"INSERT INTO propiedades (referencia_catastral, {', '.join(nombres)}) "
+            f"VALUES ({', '.join('?' * (len(nombres) + 1))}) "
+            f"ON CONFLICT(referencia_catastral) DO UPDATE SET "
+            + ", ".join(f"{nombre} = excluded.{nombre}" for nombre in nombres)
+        )
+        nombres_cultivo = [nombre for nombre, _, _ in COLUMNAS_CULTIVOS] + ["superficie_m2", "resto"]
+        sql_cultivo = (
+            f"INSERT INTO cultivos (referencia_catastral, orden, {', '.join(nombres_cultivo)}) "
+            f"VALUES ({', '.join('?' * (len(nombres_cultivo) + 2))})"
+        )
+
+        total = 0
+        with self.conexion:
+            for propiedad in propiedades:
+                propiedad = dict(propiedad)
+                referencia = propiedad.pop("referencia_catastral")
+                cultivos = propiedad.get("cultivos")
+                es_lista = isinstance(cultivos, list) and all(isinstance(c, dict) for c in cultivos)
+                if es_lista:
+                    del propiedad["cultivos"]
+
+                valores, resto = _aplanar(propiedad, COLUMNAS_PROPIEDADES)
+                parcela = propiedad.get("parcela_catastral")
+                superficie = superficie_a_m2(parcela.get("superficie_gráfica")) if isinstance(parcela, dict) else None
+                self.conexion.execute(sql_propiedad, [
+                    referencia, *valores, superficie, len(cultivos) if es_lista else None,
+                    json.dumps(resto, ensure_ascii=False),
+                ])
+
+                self.conexion.execute("DELETE FROM cultivos WHERE referencia_catastral = ?", (referencia,))
+                if es_lista:
+                    filas = []
+                    for orden, cultivo in enumerate(cultivos):
+                        valores_cultivo, resto_cultivo = _aplanar(cultivo, COLUMNAS_CULTIVOS)
+                        filas.append([
+                            referencia, orden, *valores_cultivo, superficie_a_m2(cultivo.get("superficie_m2")),
+                            json.dumps(resto_cultivo, ensure_ascii=False),
+                        ])
+                    self.conexion.executemany(sql_cultivo, filas)
+                total += 1
+        return total
+
+    def _guardar(self, tabla: str, columnas, registros: Iterable[Dict], sustituir: bool = False) -> int:
+        """Inserta o actualiza registros de una tabla con una fila por referencia"""
+        nombres = [nombre for nombre, _, _ in columnas] + ["resto"]
+        sql = (
+            f"INSERT OR REPLACE INTO {tabla} (referencia_catastral, {', '.join(nombres)}) "
+            f"VALUES ({', '.join('?' * (len(nombres) + 1))})"
+        )
+
+        total = 0
+        with self.conexion:
+            if sustituir:
+                self.conexion.execute(f"DELETE FROM {tabla}")
+            for registro in registros:
+                registro = dict(registro)
+                referencia = registro.pop("referencia_catastral")
+                valores, resto = _aplanar(registro, columnas)
+                self.conexion.execute(sql, [referencia, *valores, json.dumps(resto, ensure_ascii=False)])
+                total += 1
+        return total
+
+    def guardar_valoraciones(self, valoraciones: Iterable[Dict], sustituir: bool = False) -> int:
+        """
+        Inserta o actualiza valoraciones calculadas (una por referencia)
+
+        Args:
+            valoraciones: Valoraciones de ValoradorInmuebles
+            sustituir: Si True, borra antes las valoraciones guardadas (una
+                valoración completa del catálogo sustituye a la anterior)
+
+        Returns:
+            Número de valoraciones guardadas
+        """
+        return self._guardar("valoraciones", COLUMNAS_VALORACIONES, valoraciones, sustituir)
+
+    def guardar_consolidacion(self, registros: Iterable[Dict]) -> int:
+        """
+        Sustituye la consolidación guardada por la de consolidar_valoraciones
+
+        Args:
+            registros: Diccionarios con referencia_catastral, valor_referencia_oficial
+                y, si se pudieron comparar los valores, comparacion
+
+        Returns:
+            Número de registros guardados
+        """
+        return self._guardar("consolidacion", COLUMNAS_CONSOLIDACION, registros, sustituir=True)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def columnas(self, nombres: Sequence[str], tabla: str = "propiedades",
+                 referencias: Optional[Sequence[str]] = None) -> Iterator[Tuple]:
+        """
+        Lee solo las columnas indicadas, sin reconstruir los registros
+
+        Args:
+            nombres: Columnas a leer (p. ej. ["referencia_catastral", "valor_referencia"])
+            tabla: "propiedades", "cultivos" o "valoraciones"
+            referencias: Limita la lectura a estas referencias
+
+        Returns:
+            Iterador de tuplas con los valores, en el orden del catálogo
+        """
+        if tabla not in self._columnas:
+            raise ValueError(f"Tabla desconocida: {tabla}")
+        desconocidas = [nombre for nombre in nombres if nombre not in self._columnas[tabla]]
+        if desconocidas:
+            raise ValueError(f"Columnas desconocidas en {tabla}: {', '.join(desconocidas)}")
+
+        orden = "rowid" if tabla != "cultivos" else "referencia_catastral, orden"
+        sql = f"SELECT {', '.join(nombres)} FROM {tabla}"
+        if referencias is None:
+            return iter(self.conexion.execute(f"{sql} ORDER BY {orden}"))
+        return self._por_referencias(f"{sql} WHERE referencia_catastral = ? ORDER BY {orden}", referencias)
+
+    def _por_referencias(self, sql: str, referencias: Sequence[str]) -> Iterator[Tuple]:
+        for referencia in dict.fromkeys(referencias):
+            yield from self.conexion.execute(sql, (referencia,))
+
+    def propiedades(self, referencias: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """
+        Reconstruye las propiedades completas, con sus cultivos
+
+        Args:
+            referencias: Propiedades a leer (por defecto, todo el catálogo en su orden)
+
+        Returns:
+            Iterador de registros en el formato de los extractores
+        """
+        if referencias is None:
+            yield from self._propiedades_donde("1")
+            return
+
+        nombres = [nombre for nombre, _, _ in COLUMNAS_PROPIEDADES]
+        nombres_cultivo = [nombre for nombre, _, _ in COLUMNAS_CULTIVOS]
+        filas = self._por_referencias(
+            f"SELECT referencia_catastral, num_cultivos, resto, {', '.join(nombres)} "
+            f"FROM propiedades WHERE referencia_catastral = ?", referencias
+        )
+        filas_cultivos = self._por_referencias(
+            f"SELECT referencia_catastral, resto, {', '.join(nombres_cultivo)} "
+            f"FROM cultivos WHERE referencia_catastral = ? ORDER BY orden", referencias
+        )
+        yield from self._reconstruir_propiedades(filas, filas_cultivos)
+
+    def _propiedades_donde(self, condicion: str) -> Iterator[Dict]:
+        """Propiedades completas que cumplen una condición SQL, en el orden del catálogo"""
+        nombres = [nombre for nombre, _, _ in COLUMNAS_PROPIEDADES]
+        nombres_cultivo = [nombre for nombre, _, _ in COLUMNAS_CULTIVOS]
+        filas = self.conexion.execute(
+            f"SELECT referencia_catastral, num_cultivos, resto, {', '.join(nombres)} "
+            f"FROM propiedades WHERE {condicion} ORDER BY rowid"
+        )
+        # Los cultivos se leen en paralelo, en el mismo orden que las propiedades
+        filas_cultivos = self.conexion.cursor().execute(
+            f"SELECT c.referencia_catastral, c.resto, {', '.join('c.' + n for n in nombres_cultivo)} "
+            f"FROM cultivos c JOIN propiedades p USING (referencia_catastral) "
+            f"WHERE {condicion} ORDER BY p.rowid, c.orden"
+        )
+        return self._reconstruir_propiedades(filas, filas_cultivos)
+
+    @staticmethod
+    def _reconstruir_propiedades(filas, filas_cultivos) -> Iterator[Dict]:
+        """Une cada fila de propiedades con sus cultivos (ambas en el mismo orden)"""
+        cultivo = next(filas_cultivos, None)
+        for referencia, num_cultivos, resto, *valores in filas:
+            propiedad = _reconstruir(json.loads(resto), COLUMNAS_PROPIEDADES, valores)
+            propiedad["referencia_catastral"] = referencia
+
+            if num_cultivos is not None:
+                cultivos = []
+                while cultivo is not None and cultivo[0] == referencia:
+                    cultivos.append(_reordenar(
+                        _reconstruir(json.loads(cultivo[1]), COLUMNAS_CULTIVOS, cultivo[2:]), _ORDEN_CULTIVO
+                    ))
+                    cultivo = next(filas_cultivos, None)
+                propiedad["cultivos"] = cultivos
+
+            descriptivos = propiedad.get("datos_descriptivos")
+            if isinstance(descriptivos, dict):
+                if isinstance(descriptivos.get("localizacion"), dict):
+                    descriptivos["localizacion"] = _reordenar(descriptivos["localizacion"], _ORDEN_LOCALIZACION)
+                propiedad["datos_descriptivos"] = _reordenar(descriptivos, _ORDEN_DESCRIPTIVOS)
+            if isinstance(propiedad.get("parcela_catastral"), dict):
+                propiedad["parcela_catastral"] = _reordenar(propiedad["parcela_catastral"], _ORDEN_PARCELA)
+
+            yield _reordenar(propiedad, _ORDEN_PROPIEDAD)
+
+    def propiedades_para_valorar(self) -> Iterator[Dict]:
+        """
+        Registros del catálogo con los campos que usa ValoradorInmuebles
+
+        Las rústicas se construyen solo con sus columnas (clase, uso,
+        municipio, provincia, superficie y cultivos), sin leer `resto`. Las
+        demás, y las rústicas sin localización o sin lista de cultivos, se
+        reconstruyen completas: su valoración usa campos sin columna propia
+        (datos_catastrales, datos_inmueble, localizacion del formato antiguo).
+
+        Returns:
+            Iterador de registros en el orden del catálogo
+        """
+        filas = self.conexion.execute(
+            f"SELECT referencia_catastral, clase, uso_principal, municipio, provincia, superficie_grafica, "
+            f"{_VALORABLE_POR_COLUMNAS} FROM propiedades ORDER BY rowid"
+        )
+        # Cultivos de las rústicas y registros completos del resto, en paralelo y en el mismo orden
+        filas_cultivos = self.conexion.cursor().execute(
+            f"SELECT c.referencia_catastral, c.cultivo_aprovechamiento, c.superficie "
+            f"FROM cultivos c JOIN propiedades p USING (referencia_catastral) "
+            f"WHERE {_VALORABLE_POR_COLUMNAS} ORDER BY p.rowid, c.orden"
+        )
+        completas = self._propiedades_donde(f"NOT ({_VALORABLE_POR_COLUMNAS})")
+
+        cultivo = next(filas_cultivos, None)
+        for referencia, clase, uso_principal, municipio, provincia, superficie, por_columnas in filas:
+            if not por_columnas:
+                yield next(completas)
+                continue
+
+            cultivos = []
+            while cultivo is not None and cultivo[0] == referencia:
+                cultivos.append({
+                    clave: valor for clave, valor in
+                    (("cultivo_aprovechamiento", cultivo[1]), ("superficie_m2", cultivo[2])) if valor is not None
+                })
+                cultivo = next(filas_cultivos, None)
+
+            localizacion = {clave: valor for clave, valor in
+                            (("municipio", municipio), ("provincia", provincia)) if valor is not None}
+            datos_descriptivos = {clave: valor for clave, valor in
+                                  (("clase", clase), ("uso_principal", uso_principal)) if valor is not None}
+            yield {
+                "referencia_catastral": referencia,
+                "datos_descriptivos": dict(datos_descriptivos, localizacion=localizacion),
+                "parcela_catastral": {"superficie_gráfica": superficie} if superficie is not None else {},
+                "cultivos": cultivos,
+            }
+
+    def _leer(self, tabla: str, columnas, referencias: Optional[Sequence[str]]) -> Iterator[Dict]:
+        """Reconstruye los registros de una tabla con una fila por referencia"""
+        nombres = [nombre for nombre, _, _ in columnas]
+        sql = f"SELECT referencia_catastral, resto, {', '.join(nombres)} FROM {tabla}"
+        if referencias is None:
+            filas = self.conexion.execute(f"{sql} ORDER BY rowid")
+        else:
+            filas = self._por_referencias(f"{sql} WHERE referencia_catastral = ?", referencias)
+
+        for referencia, resto, *valores in filas:
+            registro = _reconstruir(json.loads(resto), columnas, valores)
+            registro["referencia_catastral"] = referencia
+            yield registro
+
+    def valoraciones(self, referencias: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Reconstruye las valoraciones guardadas, con las claves en el orden del valorador"""
+        for valoracion in self._leer("valoraciones", COLUMNAS_VALORACIONES, referencias):
+            yield _reordenar(valoracion, _ORDEN_VALORACION)
+
+    def consolidacion(self, referencias: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """Reconstruye el valor de referencia oficial y la comparación de cada propiedad consolidada"""
+        for registro in self._leer("consolidacion", COLUMNAS_CONSOLIDACION, referencias):
+            if isinstance(registro.get("comparacion"), dict):
+                registro["comparacion"] = _reordenar(registro["comparacion"], _ORDEN_COMPARACION)
+            yield _reordenar(registro, ("referencia_catastral",) + _ORDEN_CONSOLIDACION)
+
+    def ultima_valoracion(self) -> Optional[str]:
+        """Fecha (ISO) de la valoración más reciente guardada, o None si no hay valoraciones"""
+        return self.conexion.execute("SELECT MAX(fecha_valoracion) FROM valoraciones").fetchone()[0]
+
+    def contar(self, tabla: str = "propiedades") -> int:
+        if tabla not in self._columnas:
+            raise ValueError(f"Tabla desconocida: {tabla}")
+        return self.conexion.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+    def exportar_json(self, ruta: str = ARCHIVO_FRONTEND,
+                      referencias: Optional[Sequence[str]] = None) -> int:
+        """
+        Exporta las propiedades al JSON que consume el frontend
+
+        Returns:
+            Número de propiedades exportadas
+        """
+        total = 0
+
+        def contadas():
+            nonlocal total
+            for propiedad in self.propiedades(referencias):
+                total += 1
+                yield propiedad
+
+        escribir_json_atomico(ruta, contadas())
+        return total
+
+    def exportar_consolidado(self, ruta: str = ARCHIVO_CONSOLIDADO) -> int:
+        """
+        Exporta las propiedades consolidadas al JSON que consume frontend/
+
+        Cada propiedad lleva su valoración calculada, su valor de referencia
+        oficial y la comparación, en el formato de consolidar_valoraciones.
+
+        Returns:
+            Número de propiedades exportadas
+        """
+        valoraciones = {v["referencia_catastral"]: v for v in self.valoraciones()}
+        consolidacion = {c.pop("referencia_catastral"): c for c in self.consolidacion()}
+        total = 0
+
+        def consolidadas():
+            nonlocal total
+            for propiedad in self.propiedades():
+                referencia = propiedad["referencia_catastral"]
+                registro = consolidacion.get(referencia, {})
+                propiedad["valoracion_calculada"] = valoraciones.get(referencia)
+                propiedad["valor_referencia_oficial"] = registro.get("valor_referencia_oficial")
+                if "comparacion" in registro:
+                    propiedad["comparacion"] = registro["comparacion"]
+                total += 1
+                yield propiedad
+
+        escribir_json_atomico(ruta, consolidadas())
+        return total
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos"""
+        self.conexion.close()
+
+
+def _propiedades_de(ruta: str) -> Iterator[Dict]:
+    """Lee un JSON de propiedades en streaming, sin los campos de consolidar_valoraciones"""
+    for propiedad in iterar_array_json(ruta):
+        if not isinstance(propiedad, dict) or not propiedad.get("referencia_catastral"):
+            continue
+        oficial = propiedad.get("valor_referencia_oficial")
+        if isinstance(oficial, dict) and "valor_referencia" not in propiedad:
+            propiedad["valor_referencia"] = oficial.get("valor_referencia")
+            if "valor_referencia_texto" in oficial:
+                propiedad["valor_referencia_texto"] = oficial["valor_referencia_texto"]
+        for campo in _CAMPOS_CONSOLIDACION:
+            propiedad.pop(campo, None)
+        yield propiedad
+
+
+def migrar_json(almacen: AlmacenCatastral, directorio: str = "data",
+                archivos: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """
+    Importa al almacén los JSON existentes del directorio de datos
+
+    Args:
+        almacen: Almacén de destino
+        directorio: Directorio con los JSON
+        archivos: Rutas adicionales de propiedades (p. ej. el JSON del frontend),
+            que se importan después y prevalecen
+
+    Returns:
+        Registros importados por archivo
+    """
+    importados = {}
+
+    rutas = [os.path.join(directorio, nombre) for nombre in ARCHIVOS_PROPIEDADES]
+    rutas += list(archivos or [])
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            importados[ruta] = almacen.guardar_propiedades(_propiedades_de(ruta))
+
+    # Valoraciones: las del consolidado completo y, con prioridad, las de valoraciones.json
+    completo = os.path.join(directorio, "datos_catastrales_consolidados_completo.json")
+    if os.path.exists(completo):
+        importados[f"{completo} (valoraciones)"] = almacen.guardar_valoraciones(
+            propiedad["valoracion_calculada"] for propiedad in iterar_array_json(completo)
+            if isinstance(propiedad.get("valoracion_calculada"), dict)
+        )
+
+    ruta_valoraciones = os.path.join(directorio, ARCHIVO_VALORACIONES)
+    if os.path.exists(ruta_valoraciones):
+        with open(ruta_valoraciones, 'r', encoding='utf-8') as f:
+            valoraciones = json.load(f).get("valoraciones", [])
+        importados[ruta_valoraciones] = almacen.guardar_valoraciones(
+            v for v in valoraciones if v.get("referencia_catastral")
+        )
+
+    return importados
+
+
+def main():
+    """
+    Función principal
+
+    Uso: python almacen_catastral.py migrar [directorio] | exportar [archivo]
+    """
+    argumentos = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    orden = argumentos[0] if argumentos else "migrar"
+
+    print("=" * 60)
+    print("  ALMACÉN DEL CATÁLOGO CATASTRAL")
+    print("=" * 60)
+
+    with AlmacenCatastral() as almacen:
+        if orden == "migrar":
+            directorio = argumentos[1] if len(argumentos) > 1 else "data"
+            extra = [ARCHIVO_FRONTEND] if os.path.exists(ARCHIVO_FRONTEND) else []
+            importados = migrar_json(almacen, directorio, extra)
+            if not importados:
+                print(f"\n⚠️  No hay archivos JSON que migrar en {directorio}/")
+            for ruta, total in importados.items():
+                print(f"  ✓ {ruta}: {total}")
+            print(f"\n📦 {almacen.ruta}: {almacen.contar()} propiedades, "
+                  f"{almacen.contar('cultivos')} cultivos, {almacen.contar('valoraciones')} valoraciones")
+
+        elif orden == "exportar":
+            ruta = argumentos[1] if len(argumentos) > 1 else ARCHIVO_FRONTEND
+            total = almacen.exportar_json(ruta)
+            print(f"\n✓ {total} propiedades exportadas a {ruta}")
+            if almacen.contar("consolidacion"):
+                total = almacen.exportar_consolidado()
+                print(f"✓ {total} propiedades consolidadas exportadas a {ARCHIVO_CONSOLIDADO}")
+            else:
+                print("⚠️  Sin consolidación en el almacén: ejecuta python consolidar_valoraciones.py --almacen")
+
+        else:
+            print(f"❌ Orden desconocida: {orden}")
+            print(main.__doc__)
+
+
+if __name__ == "__main__":
+    main()
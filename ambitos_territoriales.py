@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Índice municipio -> ámbito territorial de la GVA
+
+Los ámbitos territoriales agrupan municipios con características
+agronómicas similares y determinan los módulos de valor rústico. El índice
+se genera una vez a partir de data/valores_gva_2025_oficial.json
+(ambitos_territoriales[*].municipios_incluidos y la sección municipios) y
+cada consulta es una búsqueda en un diccionario.
+
+Los nombres se normalizan (sin tildes, mayúsculas, artículos ni código
+postal), de modo que "03788 VALL DE GALLINERA", "la Vall de Gallinera" y
+"vall_de_gallinera" son la misma clave; los nombres con forma valenciana y
+castellana ("Alacant/Alicante") se indexan por ambas. Las referencias
+rústicas llevan además el código de municipio del Catastro (provincia y
+municipio, p. ej. 03106 en 03106A002000090000YL), que se indexa a partir
+del campo codigo_catastro de cada municipio.
+
+Añadir un ámbito o un municipio es un cambio en el JSON, no en el código.
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+# Relativa al módulo, no al directorio de trabajo de quien lo importa
+RUTA_VALORES_GVA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "valores_gva_2025_oficial.json")
+
+# Índices distintos (ruta, fecha de modificación) que se conservan en memoria
+MAX_INDICES_CARGADOS = 8
+
+# Referencia rústica: código de municipio del Catastro (5), sector (letra), polígono y parcela
+_REFERENCIA_RUSTICA = re.compile(r"^(\d{5})[A-Z]\d{8}")
+
+# Código postal delante del nombre, como lo muestra la sede en las fichas urbanas
+_CODIGO_POSTAL = re.compile(r"^\d{5}\s+")
+
+# Artículo al final, en la forma del Catastro: "VALL D'UIXO (LA)", "Vall d'Uixó, la"
+_ARTICULO_FINAL = re.compile(r"\s*(?:\(([^)]*)\)|,\s*(\S+))\s*$")
+
+_ARTICULOS = frozenset({"el", "la", "els", "les", "l", "los", "las", "lo"})
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+
+def _normalizar_articulo(texto: str) -> str:
+    return texto.strip().strip("'’").lower()
+
+
+def normalizar_municipio(nombre: str) -> str:
+    """
+    Clave de búsqueda de un nombre de municipio
+
+    Args:
+        nombre: Nombre tal como aparece en la ficha catastral o en los datos GVA
+
+    Returns:
+        Nombre sin tildes, en minúsculas, sin artículo inicial ni código postal
+    """
+    nombre = _CODIGO_POSTAL.sub("", (nombre or "").strip())
+    articulo = _ARTICULO_FINAL.search(nombre)
+    if articulo and _normalizar_articulo(articulo.group(1) or articulo.group(2)) in _ARTICULOS:
+        nombre = nombre[:articulo.start()]
+    nombre = unicodedata.normalize("NFKD", nombre.replace("_", " "))
+    nombre = "".join(c for c in nombre if not unicodedata.combining(c)).lower()
+
+    palabras = _NO_ALFANUMERICO.sub(" ", nombre).split()
+    if len(palabras) > 1 and palabras[0] in _ARTICULOS:
+        palabras = palabras[1:]
+    return " ".join(palabras)
+
+
+def variantes_nombre(nombre: str) -> Iterable[str]:
+    """Claves de un nombre con forma valenciana y castellana ("València/Valencia")"""
+    for parte in (nombre or "").split("/"):
+        clave = normalizar_municipio(parte)
+        if clave:
+            yield clave
+
+
+class IndiceAmbitos:
+    """
+    Búsqueda del ámbito territorial por nombre de municipio o por referencia
+    """
+
+    def __init__(self, por_nombre: Dict[str, str], por_codigo: Dict[str, str]):
+        """
+        Args:
+            por_nombre: {nombre normalizado: clave del ámbito}
+            por_codigo: {código de municipio del Catastro: clave del ámbito}
+        """
+        self.por_nombre = por_nombre
+        self.por_codigo = por_codigo
+        contenido = json.dumps([por_nombre, por_codigo], sort_keys=True)
+        self.version = hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def desde_datos(cls, datos: Dict) -> "IndiceAmbitos":
+        """
+        Genera el índice a partir del JSON de valores GVA
+
+        Args:
+            datos: Contenido de valores_gva_*.json
+        """
+        por_nombre = {}
+        por_codigo = {}
+
+        for clave_ambito, ambito in datos.get("ambitos_territoriales", {}).items():
+            for municipio in ambito.get("municipios_incluidos", []):
+                for variante in variantes_nombre(municipio):
+                    por_nombre[variante] = clave_ambito
+
+        # La sección municipios aporta nombres alternativos y códigos
+        for clave_municipio, municipio in datos.get("municipios", {}).items():
+            clave_ambito = municipio.get("ambito_territorial")
+            if not clave_ambito:
+                continue
+            nombres = [clave_municipio, municipio.get("nombre_oficial", "")]
+            nombres += municipio.get("nombres_alternativos", [])
+            for nombre in nombres:
+                for variante in variantes_nombre(nombre):
+                    por_nombre.setdefault(variante, clave_ambito)
+            codigo = municipio.get("codigo_catastro")
+            if codigo:
+                por_codigo[str(codigo).zfill(5)] = clave_ambito
+
+        return cls(por_nombre, por_codigo)
+
+    @classmethod
+    def desde_archivo(cls, ruta: str = RUTA_VALORES_GVA) -> "IndiceAmbitos":
+        """Genera el índice a partir de un archivo JSON (vacío si no existe)"""
+        if not os.path.exists(ruta):
+            print(f"⚠️  No se encontró {ruta}: sin ámbitos territoriales")
+            return cls({}, {})
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return cls.desde_datos(json.load(f))
+
+    def ambito_municipio(self, municipio: str) -> Optional[str]:
+        """Ámbito de un municipio por su nombre"""
+        for variante in variantes_nombre(municipio):
+            ambito = self.por_nombre.get(variante)
+            if ambito:
+                return ambito
+        return None
+
+    def ambito_referencia(self, referencia: str) -> Optional[str]:
+        """Ámbito de una referencia rústica por su código de municipio"""
+        coincidencia = _REFERENCIA_RUSTICA.match(referencia or "")
+        if coincidencia:
+            return self.por_codigo.get(coincidencia.group(1))
+        return None
+
+    def buscar(self, municipio: str = "", referencia: str = "") -> Optional[str]:
+        """
+        Ámbito territorial de un inmueble
+
+        Args:
+            municipio: Nombre del municipio
+            referencia: Referencia catastral (solo las rústicas llevan el municipio)
+
+        Returns:
+            Clave del ámbito, o None si el municipio no pertenece a ninguno
+        """
+        return self.ambito_referencia(referencia) or self.ambito_municipio(municipio)
+
+    def __len__(self):
+        return len(self.por_nombre)
+
+
+@lru_cache(maxsize=MAX_INDICES_CARGADOS)
+def _indice_cacheado(ruta: str, mtime: float) -> IndiceAmbitos:
+    return IndiceAmbitos.desde_archivo(ruta)
+
+
+def indice_ambitos(ruta: str = RUTA_VALORES_GVA) -> IndiceAmbitos:
+    """
+    Índice del archivo indicado, generado una sola vez por proceso
+
+    Si el archivo cambia (otra fecha de modificación) se genera de nuevo.
+    """
+    mtime = os.path.getmtime(ruta) if os.path.exists(ruta) else 0.0
+    return _indice_cacheado(ruta, mtime)
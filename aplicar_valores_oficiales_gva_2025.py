@@ -9,10 +9,15 @@ import os
 import shutil
 from datetime import datetime
 
+from tablas_valoracion import SECCION_TABLAS, escribir_tablas
+
 
 def aplicar_valores_oficiales_gva():
     """
     Aplica los valores oficiales del JSON al valorador
+
+    Los módulos de valor se guardan en la sección "tablas_valorador" del
+    mismo JSON, de donde los carga CriteriosValoracion.
     """
     print("=" * 70)
     print("APLICACIÓN DE VALORES OFICIALES GVA 2025")
@@ -125,101 +130,18 @@ def aplicar_valores_oficiales_gva():
         return
 
     # Crear backup
-    valorador_path = "valorador_inmuebles.py"
-    if not os.path.exists(valorador_path):
-        print(f"❌ No se encontró: {valorador_path}")
-        return
-
-    backup_path = f"{valorador_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    shutil.copy2(valorador_path, backup_path)
+    backup_path = f"{json_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    shutil.copy2(json_path, backup_path)
     print(f"✓ Backup creado: {backup_path}")
 
-    # Leer archivo actual
-    with open(valorador_path, 'r', encoding='utf-8') as f:
-        contenido = f.read()
-
-    # Generar nuevo código Python para PRECIOS_RUSTICO
-    nuevo_precios = "    PRECIOS_RUSTICO = {\n"
-
-    # Ámbito 13
-    nuevo_precios += "        # Ámbito 13: Safor-Litoral (Oliva, Piles)\n"
-    nuevo_precios += "        # Fuente: NNTT_2025 GVA - Anejo II\n"
-    nuevo_precios += "        \"ambito_13_safor_litoral\": {\n"
-    for key, valor in precios_rustico['ambito_13_safor_litoral'].items():
-        nuevo_precios += f"            \"{key}\": {valor},\n"
-    nuevo_precios += "        },\n\n"
-
-    # Ámbito 17
-    nuevo_precios += "        # Ámbito 17: Marina Alta-Interior (Vall de Gallinera)\n"
-    nuevo_precios += "        # Fuente: NNTT_2025 GVA - Anejo II\n"
-    nuevo_precios += "        \"ambito_17_marina_alta_interior\": {\n"
-    for key, valor in precios_rustico['ambito_17_marina_alta_interior'].items():
-        nuevo_precios += f"            \"{key}\": {valor},\n"
-    nuevo_precios += "        },\n\n"
-
-    # Valencia (fallback)
-    nuevo_precios += "        # Comunidad Valenciana (fallback general - usa Ámbito 13)\n"
-    nuevo_precios += "        \"valencia\": {\n"
-    for key, valor in precios_rustico['valencia'].items():
-        nuevo_precios += f"            \"{key}\": {valor},\n"
-    nuevo_precios += "        },\n\n"
-
-    # Nacional
-    nuevo_precios += "        # Nacional (media España)\n"
-    nuevo_precios += "        \"nacional\": {\n"
-    for key, valor in precios_rustico['nacional'].items():
-        nuevo_precios += f"            \"{key}\": {valor},\n"
-    nuevo_precios += "        },\n\n"
-
-    # Default
-    nuevo_precios += "        # Default\n"
-    nuevo_precios += "        \"default\": {\n"
-    for key, valor in precios_rustico['default'].items():
-        nuevo_precios += f"            \"{key}\": {valor},\n"
-    nuevo_precios += "        }\n"
-
-    nuevo_precios += "    }"
-
-    # Reemplazar PRECIOS_RUSTICO
-    import re
-    patron_rustico = r'PRECIOS_RUSTICO\s*=\s*\{[^}]*(?:\{[^}]*\}[^}]*)*\}'
-
-    if re.search(patron_rustico, contenido, re.DOTALL):
-        contenido = re.sub(patron_rustico, nuevo_precios, contenido, flags=re.DOTALL)
-        print("✓ PRECIOS_RUSTICO actualizado con valores oficiales GVA")
-    else:
-        print("⚠️  No se pudo encontrar PRECIOS_RUSTICO")
-        return
+    # Guardar las tablas en el JSON: el valorador las carga en tiempo de
+    # ejecución y el servidor las recarga sin reiniciarse
+    fuente = (f"{datos_gva['fuente']['documento']} - vigencia "
+              f"{datos_gva['fuente']['vigencia']['desde']} → {datos_gva['fuente']['vigencia']['hasta']} - "
+              f"aplicado {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    escribir_tablas(json_path, {"PRECIOS_RUSTICO": precios_rustico}, fuente=fuente)
 
-    # Añadir comentario con fuente
-    comentario_fuente = f'''
-    # ============================================================================
-    # VALORES OFICIALES GVA 2025 - SISTEMA DE ÁMBITOS TERRITORIALES
-    # ============================================================================
-    # Fuente: {datos_gva['fuente']['documento']}
-    # Organismo: {datos_gva['fuente']['organismo']}
-    # Vigencia: {datos_gva['fuente']['vigencia']['desde']} → {datos_gva['fuente']['vigencia']['hasta']}
-    # Aplicado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-    #
-    # Ámbitos Territoriales:
-    # - Ámbito 13 (Safor-Litoral): Oliva, Piles
-    # - Ámbito 17 (Marina Alta-Interior): Vall de Gallinera
-    # ============================================================================
-
-'''
-
-    # Insertar comentario
-    if '# Precios medios de terrenos rústicos' in contenido:
-        contenido = contenido.replace(
-            '    # Precios medios de terrenos rústicos',
-            comentario_fuente + '    # Módulos de valor por ámbito territorial (€/hectárea)'
-        )
-
-    # Guardar archivo actualizado
-    with open(valorador_path, 'w', encoding='utf-8') as f:
-        f.write(contenido)
-
-    print(f"✓ Archivo actualizado: {valorador_path}")
+    print(f"✓ PRECIOS_RUSTICO guardado en la sección \"{SECCION_TABLAS}\" de {json_path}")
     print()
 
     print("=" * 70)
@@ -228,10 +150,8 @@ def aplicar_valores_oficiales_gva():
     print()
     print("PRÓXIMOS PASOS:")
     print()
-    print("1. Verificar que identificar_region() usa ámbitos territoriales")
-    print("   El método debe identificar:")
-    print("   - Oliva, Piles → ambito_13_safor_litoral")
-    print("   - Vall de Gallinera → ambito_17_marina_alta_interior")
+    print("1. Si el servidor está en marcha, recarga las tablas solo")
+    print("   (las valoraciones en curso terminan con los valores anteriores)")
     print()
     print("2. Regenerar valoraciones:")
     print("   python valorador_inmuebles.py")
@@ -240,7 +160,7 @@ def aplicar_valores_oficiales_gva():
     print("   python consolidar_valoraciones.py")
     print()
     print("4. Si algo falla, restaurar backup:")
-    print(f"   cp {backup_path} {valorador_path}")
+    print(f"   cp {backup_path} {json_path}")
     print()
 
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga del catálogo: JSON con indent=2 frente al almacén SQLite
+
+Replica las propiedades del JSON del frontend hasta el tamaño indicado y mide:
+
+  - json.load del archivo completo (lo que hacen las etapas sin --almacen)
+  - AlmacenCatastral.propiedades: registros completos reconstruidos (lo que
+    hace almacen_catastral.py exportar)
+  - AlmacenCatastral.propiedades_para_valorar: lo que lee valorador_inmuebles.py --almacen
+  - AlmacenCatastral.columnas: solo referencia, superficie y valor de referencia
+
+Uso: python benchmark_almacen.py [propiedades]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from almacen_catastral import ARCHIVO_FRONTEND, AlmacenCatastral
+
+
+def catalogo(tamano: int):
+    """Copias de las propiedades del frontend con referencias distintas"""
+    with open(ARCHIVO_FRONTEND, encoding="utf-8") as f:
+        base = json.load(f)
+    for i in range(tamano):
+        propiedad = dict(base[i % len(base)])
+        propiedad["referencia_catastral"] = f"{propiedad['referencia_catastral']}-{i}"
+        yield propiedad
+
+
+def medir(funcion, repeticiones: int = 3) -> float:
+    """Mejor tiempo de varias ejecuciones, en milisegundos"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def main():
+    tamano = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print("=" * 60)
+    print("BENCHMARK DE CARGA DEL CATÁLOGO")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, "catalogo.json")
+        with open(ruta_json, "w", encoding="utf-8") as f:
+            json.dump(list(catalogo(tamano)), f, indent=2, ensure_ascii=False)
+
+        with AlmacenCatastral(os.path.join(directorio, "catalogo.sqlite3")) as almacen:
+            inicio = time.perf_counter()
+            with open(ruta_json, encoding="utf-8") as f:
+                almacen.guardar_propiedades(json.load(f))
+            ms_migracion = (time.perf_counter() - inicio) * 1000
+
+            def cargar_json():
+                with open(ruta_json, encoding="utf-8") as f:
+                    json.load(f)
+
+            ms_json = medir(cargar_json)
+            ms_completo = medir(lambda: sum(1 for _ in almacen.propiedades()))
+            ms_valorar = medir(lambda: sum(1 for _ in almacen.propiedades_para_valorar()))
+            ms_columnas = medir(lambda: sum(1 for _ in almacen.columnas(
+                ["referencia_catastral", "superficie_m2", "valor_referencia"]
+            )))
+
+            # En modo WAL los datos siguen en el archivo -wal hasta el checkpoint
+            almacen.conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+            print(f"\nPropiedades: {tamano}")
+            print(f"  Tamaño JSON (indent=2):   {os.path.getsize(ruta_json) / 1e6:8.2f} MB")
+            print(f"  Tamaño SQLite:            {os.path.getsize(almacen.ruta) / 1e6:8.2f} MB")
+            print(f"  Migración JSON → SQLite:  {ms_migracion:8.1f} ms\n")
+            print(f"  json.load completo:       {ms_json:8.1f} ms")
+            print(f"  Almacén, registros:       {ms_completo:8.1f} ms")
+            print(f"  Almacén, para valorar:    {ms_valorar:8.1f} ms")
+            print(f"  Almacén, 3 columnas:      {ms_columnas:8.1f} ms")
+            print(f"\n  Aceleración por columnas: x{ms_json / ms_columnas:.0f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del clasificador de cultivos
+
+Compara el coste por fila de la implementación anterior de
+identificar_tipo_cultivo (diccionario reconstruido en cada llamada y cadena
+de comprobaciones "in") con el clasificador precompilado y con caché.
+
+Uso: python benchmark_clasificador_cultivos.py [filas]
+"""
+
+import sys
+import timeit
+
+from valorador_inmuebles import (
+    _CACHE_TIPO_CULTIVO,
+    _clasificar_cultivo_sin_cache,
+    clasificar_cultivo,
+)
+
+
+# Textos reales de "cultivo_aprovechamiento" y algunos sin código
+TEXTOS_CULTIVO = [
+    "O- Olivos secano",
+    "O- Olivos regadío",
+    "F- Frutales secano",
+    "NR Agrios regadío",
+    "MM Pinar maderable",
+    "MT Matorral",
+    "I- Improductivo",
+    "I- IMPRODUCTIVO",
+    "E- Pastos",
+    "CR Labor o labradío regadío",
+    "CL Labor o labradío secano",
+    "V- Viña secano",
+    "Olivar de regadío",
+    "Almendros",
+    "Huerta",
+    "Cereal secano",
+    "Erial",
+]
+
+
+def identificar_tipo_cultivo_anterior(texto_cultivo: str) -> str:
+    """Implementación anterior, conservada solo para comparar"""
+    texto = texto_cultivo.strip()
+    texto_lower = texto.lower()
+    codigo = texto.split()[0].upper() if texto else ""
+
+    es_regadio = "regadio" in texto_lower or "regadío" in texto_lower
+
+    MAPEO_EXACTO = {
+        "MM": "pinar_maderable",
+        "MT": "matorral",
+        "I-": "improductivo",
+        "E-": "pastos",
+        "NR": "citricos_regadio",
+    }
+
+    if codigo in MAPEO_EXACTO:
+        return MAPEO_EXACTO[codigo]
+    if codigo == "O-":
+        return "olivar_regadio" if es_regadio else "olivar_secano"
+    if codigo == "F-":
+        return "almendro_regadio" if es_regadio else "almendro_secano"
+    if codigo == "CR" or codigo == "CL":
+        return "labor_regadio" if es_regadio else "labor_secano"
+    if codigo == "V-":
+        return "vina_regadio" if es_regadio else "vina_secano"
+    if codigo == "FRT":
+        return "frutal_regadio" if es_regadio else "frutal_secano"
+
+    if "olivo" in texto_lower or "oliv" in texto_lower:
+        return "olivar_regadio" if es_regadio else "olivar_secano"
+    if "almendro" in texto_lower or "almendra" in texto_lower or "fruto" in texto_lower:
+        return "almendro_regadio" if es_regadio else "almendro_secano"
+    if "vid" in texto_lower or "viña" in texto_lower:
+        return "vina_regadio" if es_regadio else "vina_secano"
+    if "labor" in texto_lower or "labradio" in texto_lower or "labradío" in texto_lower:
+        return "labor_regadio" if es_regadio else "labor_secano"
+    if "cereal" in texto_lower or "trigo" in texto_lower or "cebada" in texto_lower:
+        return "cereal_regadio" if es_regadio else "cereal_secano"
+    if "past" in texto_lower or "prado" in texto_lower:
+        return "pastos"
+    if "citrico" in texto_lower or "agrio" in texto_lower or "naranj" in texto_lower:
+        return "citricos_regadio"
+    if "hortícola" in texto_lower or "horticola" in texto_lower or "huert" in texto_lower:
+        return "horticola_regadio"
+    if "forestal" in texto_lower:
+        return "forestal"
+
+    return "default"
+
+
+def medir(funcion, filas, repeticiones=5):
+    """Devuelve el mejor tiempo por fila en nanosegundos"""
+    temporizador = timeit.Timer(lambda: [funcion(t) for t in filas])
+    mejor = min(temporizador.repeat(repeat=repeticiones, number=1))
+    return mejor / len(filas) * 1e9
+
+
+def main():
+    num_filas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    filas = [TEXTOS_CULTIVO[i % len(TEXTOS_CULTIVO)] for i in range(num_filas)]
+
+    # Las dos implementaciones deben coincidir en todos los textos
+    for texto in TEXTOS_CULTIVO:
+        anterior = identificar_tipo_cultivo_anterior(texto)
+        nuevo = clasificar_cultivo(texto)
+        assert anterior == nuevo, f"{texto!r}: {anterior} != {nuevo}"
+
+    print("=" * 60)
+    print("MICROBENCHMARK CLASIFICADOR DE CULTIVOS")
+    print("=" * 60)
+    print(f"\nFilas: {num_filas:,} ({len(TEXTOS_CULTIVO)} textos distintos)\n")
+
+    t_anterior = medir(identificar_tipo_cultivo_anterior, filas)
+    t_sin_cache = medir(_clasificar_cultivo_sin_cache, filas)
+    _CACHE_TIPO_CULTIVO.clear()
+    t_con_cache = medir(clasificar_cultivo, filas)
+
+    print(f"  Anterior:                 {t_anterior:8.1f} ns/fila")
+    print(f"  Precompilado sin caché:   {t_sin_cache:8.1f} ns/fila")
+    print(f"  Precompilado con caché:   {t_con_cache:8.1f} ns/fila")
+    print(f"\n  Aceleración: x{t_anterior / t_con_cache:.1f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark de extracción de la ficha OVCConCiud: lxml frente a Selenium
+
+Mide, sobre las copias de la sede en fixtures/ovc/, el coste de extraer los
+bloques tblInmueble, tblFinca y tblCultivos:
+
+  - lxml: parsear_ficha sobre el HTML (camino HTTP directo)
+  - Selenium por elementos: implementación anterior de extraer_ficha, con
+    una llamada al navegador por cada etiqueta, valor, fila y celda
+  - Selenium en una pasada: CatastroRealScraper.extraer_ficha, que lee
+    page_source una vez y lo procesa con lxml
+
+Si Chrome no está disponible solo se mide el parser lxml.
+
+Uso: python benchmark_parser_ovc.py [repeticiones]
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+import timeit
+
+from parser_ovc_catastro import agregar_dato_descriptivo, agregar_dato_parcela, crear_cultivo, parsear_ficha
+
+
+DIRECTORIO_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ovc")
+DATOS_ESPERADOS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "angular-catastro", "src", "assets", "datos_catastrales_mergeados.json"
+)
+
+CAMPOS = ("datos_descriptivos", "parcela_catastral", "cultivos")
+
+
+def extraer_ficha_por_elementos(driver):
+    """
+    Implementación anterior de CatastroRealScraper.extraer_ficha
+
+    Cada find_element y cada .text es una petición al navegador: una parcela
+    con 20 subparcelas cuesta del orden de 100 peticiones.
+    """
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.common.by import By
+
+    ficha = {"datos_descriptivos": {}, "parcela_catastral": {}, "cultivos": []}
+
+    tabla_inmueble = driver.find_element(By.ID, "ctl00_Contenido_tblInmueble")
+    for grupo in tabla_inmueble.find_elements(By.CLASS_NAME, "form-group"):
+        label_elem = grupo.find_element(By.CLASS_NAME, "col-md-4")
+        valor_elem = grupo.find_element(By.CLASS_NAME, "col-md-8")
+        agregar_dato_descriptivo(ficha["datos_descriptivos"], label_elem.text.strip(), valor_elem.text.strip())
+
+    tabla_finca = driver.find_element(By.ID, "ctl00_Contenido_tblFinca")
+    for grupo in tabla_finca.find_elements(By.CLASS_NAME, "form-group"):
+        label_elem = grupo.find_element(By.CLASS_NAME, "col-md-3")
+        valor_elem = grupo.find_element(By.CLASS_NAME, "col-md-9")
+        agregar_dato_parcela(ficha["parcela_catastral"], label_elem.text.strip(), valor_elem.text.strip())
+
+    try:
+        tabla_cultivos = driver.find_element(By.ID, "ctl00_Contenido_tblCultivos")
+        for fila in tabla_cultivos.find_elements(By.TAG_NAME, "tr")[1:]:
+            celdas = fila.find_elements(By.TAG_NAME, "td")
+            cultivo = crear_cultivo([celda.text.strip() for celda in celdas])
+            if cultivo:
+                ficha["cultivos"].append(cultivo)
+    except NoSuchElementException:
+        pass
+
+    return ficha
+
+
+def cargar_fichas():
+    """Devuelve {referencia: (ruta, html)} de las fichas de fixtures/ovc"""
+    fichas = {}
+    for ruta in sorted(glob.glob(os.path.join(DIRECTORIO_FIXTURES, "OVCConCiud_*.html"))):
+        referencia = os.path.basename(ruta)[len("OVCConCiud_"):-len(".html")]
+        with open(ruta, "rb") as f:
+            fichas[referencia] = (ruta, f.read())
+    return fichas
+
+
+def medir_lxml(fichas, repeticiones: int) -> float:
+    """Milisegundos por ficha con el parser lxml"""
+    paginas = [html for _, html in fichas.values()]
+    segundos = timeit.timeit(lambda: [parsear_ficha(html) for html in paginas], number=repeticiones)
+    return segundos * 1000 / (repeticiones * len(paginas))
+
+
+def medir_selenium(fichas, esperados, repeticiones: int):
+    """
+    Milisegundos por ficha con Selenium
+
+    Returns:
+        {"carga", "por_elementos", "una_pasada"} o None si no se puede arrancar Chrome
+    """
+    try:
+        from extraer_datos_reales import CatastroRealScraper
+        scraper = CatastroRealScraper(headless=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            driver = scraper.crear_navegador()
+    except (Exception, SystemExit) as e:
+        print(f"  ⏭️  Selenium omitido: Chrome no disponible ({type(e).__name__})")
+        return None
+
+    extractores = {
+        "por_elementos": extraer_ficha_por_elementos,
+        "una_pasada": scraper.extraer_ficha,
+    }
+    tiempos = dict.fromkeys(["carga", *extractores], 0.0)
+
+    try:
+        for _ in range(repeticiones):
+            for referencia, (ruta, _) in fichas.items():
+                inicio = time.perf_counter()
+                driver.get(f"file://{ruta}")
+                tiempos["carga"] += time.perf_counter() - inicio
+
+                for nombre, extraer in extractores.items():
+                    inicio = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        ficha = extraer(driver)
+                    tiempos[nombre] += time.perf_counter() - inicio
+
+                    for campo in CAMPOS:
+                        assert ficha[campo] == esperados[referencia][campo], (nombre, referencia, campo)
+    finally:
+        driver.quit()
+
+    n = repeticiones * len(fichas)
+    return {nombre: segundos * 1000 / n for nombre, segundos in tiempos.items()}
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    fichas = cargar_fichas()
+    with open(DATOS_ESPERADOS, encoding="utf-8") as f:
+        esperados = {p["referencia_catastral"]: p for p in json.load(f)}
+
+    # El parser debe reproducir los datos extraídos con el navegador
+    for referencia, (_, html) in fichas.items():
+        ficha = parsear_ficha(html)
+        for campo in CAMPOS:
+            assert ficha[campo] == esperados[referencia][campo], f"{referencia}: {campo}"
+
+    print("=" * 60)
+    print("BENCHMARK EXTRACCIÓN DE LA FICHA OVCConCiud")
+    print("=" * 60)
+    print(f"\nFichas: {len(fichas)} · repeticiones: {repeticiones}\n")
+
+    ms_lxml = medir_lxml(fichas, repeticiones)
+    print(f"  lxml (parsear_ficha):       {ms_lxml:8.3f} ms/ficha")
+
+    selenium = medir_selenium(fichas, esperados, max(1, repeticiones // 20))
+    if selenium:
+        print(f"  Selenium (carga página):    {selenium['carga']:8.3f} ms/ficha")
+        print(f"  Selenium por elementos:     {selenium['por_elementos']:8.3f} ms/ficha")
+        print(f"  Selenium en una pasada:     {selenium['una_pasada']:8.3f} ms/ficha")
+        print(f"\n  Aceleración de una pasada:  x{selenium['por_elementos'] / selenium['una_pasada']:.1f}")
+        print(f"  Aceleración de HTTP + lxml: x{selenium['por_elementos'] / ms_lxml:.0f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Caché en disco de las consultas al Catastro
+
+Guarda las respuestas de la OVC y los datos extraídos con Selenium en una
+base de datos SQLite. Cada entrada se identifica por (endpoint, referencia,
+ejercicio) y apunta a un blob comprimido con zlib y direccionado por su
+hash SHA-256, de modo que respuestas idénticas se guardan una sola vez.
+
+Cada fuente tiene su propio tiempo de validez. Las respuestas HTTP guardan
+además ETag y Last-Modified para revalidarlas con peticiones condicionales
+cuando caducan.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, NamedTuple, Optional
+
+
+RUTA_CACHE = os.path.join("data", "cache_catastro.sqlite")
+
+DIA = 24 * 3600
+
+# Validez de las entradas de cada fuente (segundos). Los datos de una parcela
+# cambian muy poco; el valor de referencia es fijo para cada ejercicio.
+TTL_POR_FUENTE = {
+    "ovc_cpmrc": 30 * DIA,
+    "sede_datos": 30 * DIA,
+    "valor_referencia": 365 * DIA,
+}
+
+TTL_POR_DEFECTO = 7 * DIA
+
+
+class EntradaCache(NamedTuple):
+    """Entrada de la caché con su contenido y sus validadores HTTP"""
+    contenido: bytes
+    fecha: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresca: bool
+
+
+class CacheCatastro:
+    """
+    Caché persistente y compartida de respuestas del Catastro
+
+    Es segura para uso concurrente desde varios hilos del mismo proceso.
+    Con refrescar=True no se devuelve ninguna entrada (se fuerza la consulta
+    a la red), pero las nuevas respuestas se siguen guardando.
+    """
+
+    def __init__(self, ruta: str = RUTA_CACHE, ttl_por_fuente: Optional[Dict[str, float]] = None,
+                 refrescar: bool = False):
+        """
+        Args:
+            ruta: Ruta del archivo SQLite
+            ttl_por_fuente: Validez en segundos por endpoint (se combina con TTL_POR_FUENTE)
+            refrescar: Si True, ignora las entradas guardadas (opción --refresh)
+        """
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        self.ruta = ruta
+        self.ttl_por_fuente = {**TTL_POR_FUENTE, **(ttl_por_fuente or {})}
+        self.refrescar = refrescar
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        with self._conexion:
+            self._conexion.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    datos BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS entradas (
+                    endpoint TEXT NOT NULL,
+                    referencia TEXT NOT NULL,
+                    ejercicio TEXT NOT NULL DEFAULT '',
+                    hash TEXT NOT NULL REFERENCES blobs(hash),
+                    fecha REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    PRIMARY KEY (endpoint, referencia, ejercicio)
+                );
+            """)
+
+    def ttl(self, endpoint: str) -> float:
+        """Validez en segundos de las entradas de un endpoint"""
+        return self.ttl_por_fuente.get(endpoint, TTL_POR_DEFECTO)
+
+    def entrada(self, endpoint: str, referencia: str, ejercicio: str = "") -> Optional[EntradaCache]:
+        """
+        Devuelve la entrada guardada aunque haya caducado
+
+        Sirve para revalidar con ETag/Last-Modified. Con refrescar=True
+        devuelve None.
+
+        Args:
+            endpoint: Fuente de los datos (ej: "ovc_cpmrc")
+            referencia: Referencia catastral
+            ejercicio: Ejercicio de los datos ('' si no aplica)
+        """
+        if self.refrescar:
+            return None
+
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT b.datos, e.fecha, e.etag, e.last_modified "
+                "FROM entradas e JOIN blobs b ON b.hash = e.hash "
+                "WHERE e.endpoint = ? AND e.referencia = ? AND e.ejercicio = ?",
+                (endpoint, referencia, str(ejercicio))
+            ).fetchone()
+
+        if fila is None:
+            return None
+
+        datos, fecha, etag, last_modified = fila
+        fresca = time.time() - fecha <= self.ttl(endpoint)
+        return EntradaCache(zlib.decompress(datos), fecha, etag, last_modified, fresca)
+
+    def obtener(self, endpoint: str, referencia: str, ejercicio: str = "") -> Optional[bytes]:
+        """
+        Devuelve el contenido guardado si sigue vigente, o None
+
+        Args:
+            endpoint: Fuente de los datos
+            referencia: Referencia catastral
+            ejercicio: Ejercicio de los datos ('' si no aplica)
+        """
+        entrada = self.entrada(endpoint, referencia, ejercicio)
+
+        with self._lock:
+            if entrada is None or not entrada.fresca:
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+
+        return entrada.contenido
+
+    def guardar(self, endpoint: str, referencia: str, contenido: bytes, ejercicio: str = "",
+                etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """
+        Guarda una respuesta
+
+        Args:
+            endpoint: Fuente de los datos
+            referencia: Referencia catastral
+            contenido: Cuerpo de la respuesta o datos serializados
+            ejercicio: Ejercicio de los datos ('' si no aplica)
+            etag: Cabecera ETag de la respuesta HTTP
+            last_modified: Cabecera Last-Modified de la respuesta HTTP
+        """
+        huella = hashlib.sha256(contenido).hexdigest()
+
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "INSERT OR IGNORE INTO blobs (hash, datos) VALUES (?, ?)",
+                (huella, zlib.compress(contenido))
+            )
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO entradas "
+                "(endpoint, referencia, ejercicio, hash, fecha, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (endpoint, referencia, str(ejercicio), huella, time.time(), etag, last_modified)
+            )
+
+    def renovar(self, endpoint: str, referencia: str, ejercicio: str = ""):
+        """Marca como vigente una entrada revalidada (respuesta 304)"""
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "UPDATE entradas SET fecha = ? WHERE endpoint = ? AND referencia = ? AND ejercicio = ?",
+                (time.time(), endpoint, referencia, str(ejercicio))
+            )
+
+    def obtener_json(self, endpoint: str, referencia: str, ejercicio: str = "") -> Optional[Dict]:
+        """Devuelve unos datos JSON guardados si siguen vigentes, o None"""
+        contenido = self.obtener(endpoint, referencia, ejercicio)
+        if contenido is None:
+            return None
+        return json.loads(contenido.decode("utf-8"))
+
+    def guardar_json(self, endpoint: str, referencia: str, datos: Dict, ejercicio: str = ""):
+        """Guarda unos datos serializados como JSON"""
+        contenido = json.dumps(datos, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        self.guardar(endpoint, referencia, contenido, ejercicio)
+
+    def purgar(self) -> int:
+        """
+        Elimina las entradas caducadas y los blobs que ya nadie usa
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        ahora = time.time()
+        eliminadas = 0
+
+        with self._lock, self._conexion:
+            endpoints = [fila[0] for fila in self._conexion.execute("SELECT DISTINCT endpoint FROM entradas")]
+            for endpoint in endpoints:
+                cursor = self._conexion.execute(
+                    "DELETE FROM entradas WHERE endpoint = ? AND fecha < ?",
+                    (endpoint, ahora - self.ttl(endpoint))
+                )
+                eliminadas += cursor.rowcount
+            self._conexion.execute(
+                "DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM entradas)"
+            )
+
+        return eliminadas
+
+    def estadisticas(self) -> Dict:
+        """Devuelve el tamaño y los contadores de uso de la caché"""
+        with self._lock:
+            entradas = self._conexion.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+            blobs, bytes_comprimidos = self._conexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(datos)), 0) FROM blobs"
+            ).fetchone()
+            consultas = self.aciertos + self.fallos
+
+            return {
+                "entradas": entradas,
+                "blobs": blobs,
+                "bytes_comprimidos": bytes_comprimidos,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0,
+            }
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos"""
+        with self._lock:
+            self._conexion.close()
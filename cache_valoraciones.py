@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Caché de valoraciones direccionada por contenido
+
+La clave de cada entrada es un hash estable del registro catastral
+normalizado más la versión de los criterios de valoración, de modo que
+una propiedad solo se vuelve a valorar cuando cambian sus datos o los
+criterios aplicados.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+# Campos que cambian en cada extracción o valoración pero no afectan al valor
+CAMPOS_VOLATILES = frozenset({
+    "fecha_extraccion",
+    "fecha_consulta",
+    "fecha_valoracion",
+})
+
+
+class CacheValoraciones:
+    """
+    Caché LRU acotada, con caducidad opcional y contadores de aciertos/fallos
+
+    Es segura para uso concurrente desde varios hilos.
+    """
+
+    def __init__(self, max_entradas: int = 10000, ttl: Optional[float] = None):
+        """
+        Args:
+            max_entradas: Número máximo de valoraciones guardadas
+            ttl: Segundos de validez de cada entrada (None = sin caducidad)
+        """
+        if max_entradas <= 0:
+            raise ValueError("max_entradas debe ser mayor que 0")
+
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsadas = 0
+        self.caducadas = 0
+
+    @staticmethod
+    def clave(propiedad: Dict, version_criterios: str) -> str:
+        """
+        Calcula la clave de una propiedad para una versión de criterios
+
+        Args:
+            propiedad: Registro catastral de la propiedad
+            version_criterios: Versión de los criterios de valoración
+
+        Returns:
+            Hash SHA-256 en hexadecimal
+        """
+        normalizada = {k: v for k, v in propiedad.items() if k not in CAMPOS_VOLATILES}
+        contenido = json.dumps(
+            [version_criterios, normalizada],
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def obtener(self, clave: str) -> Optional[Dict]:
+        """
+        Devuelve la valoración guardada para una clave, o None si no está
+
+        Args:
+            clave: Clave calculada con clave()
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+
+            if entrada is not None and self.ttl is not None:
+                if time.monotonic() - entrada[0] > self.ttl:
+                    del self._entradas[clave]
+                    self.caducadas += 1
+                    entrada = None
+
+            if entrada is None:
+                self.fallos += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave: str, valoracion: Dict):
+        """
+        Guarda una valoración, expulsando la menos usada si la caché está llena
+
+        Args:
+            clave: Clave calculada con clave()
+            valoracion: Valoración a guardar
+        """
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), valoracion)
+            self._entradas.move_to_end(clave)
+
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsadas += 1
+
+    def limpiar(self):
+        """Elimina todas las entradas (los contadores se conservan)"""
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict:
+        """Devuelve los contadores de uso de la caché"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0,
+                "expulsadas": self.expulsadas,
+                "caducadas": self.caducadas,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entradas)
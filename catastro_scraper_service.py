@@ -11,10 +11,110 @@ Para uso en producción, se recomienda:
 """
 
 import json
-from typing import Dict, List, Optional
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 from datetime import datetime
 import os
 
+from json_incremental import iterar_array_json
+
+# Archivos agregados que el servicio guarda junto a los de cada referencia
+ARCHIVO_CONSOLIDADO = "datos_catastrales_consolidados.json"
+ARCHIVO_RESUMEN = "resumen_propiedades.json"
+
+# Archivo individual de una referencia: data/<referencia>.json
+_ARCHIVO_REFERENCIA = re.compile(r"^[0-9A-Z]{14,20}\.json$")
+
+
+class EstadisticaCorriente:
+    """
+    Cuenta, suma, media, desviación típica, mínimo y máximo de una serie
+
+    Se actualiza valor a valor (algoritmo de Welford) sin guardar la serie.
+    """
+
+    __slots__ = ("cuenta", "total", "media", "_m2", "minimo", "maximo")
+
+    def __init__(self):
+        self.cuenta = 0
+        self.total = 0.0
+        self.media = 0.0
+        self._m2 = 0.0
+        self.minimo = None
+        self.maximo = None
+
+    def agregar(self, valor: float):
+        self.cuenta += 1
+        self.total += valor
+        delta = valor - self.media
+        self.media += delta / self.cuenta
+        self._m2 += delta * (valor - self.media)
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+
+    def resumen(self) -> Dict:
+        return {
+            "cuenta": self.cuenta,
+            "media": round(self.media, 2) if self.cuenta else None,
+            "desviacion": round(math.sqrt(self._m2 / self.cuenta), 2) if self.cuenta else None,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+        }
+
+
+class AcumuladorResumen:
+    """
+    Estadísticas del resumen de propiedades calculadas en una sola pasada
+
+    Cada registro se procesa y se descarta: la memoria no crece con el
+    número de propiedades.
+    """
+
+    def __init__(self):
+        self.total_propiedades = 0
+        self.valor_catastral = EstadisticaCorriente()
+        self.superficie_construida = EstadisticaCorriente()
+        self.tipos_inmuebles = Counter()
+
+    def agregar(self, registro: Dict):
+        """Incorpora al resumen los datos extraídos de una referencia"""
+        self.total_propiedades += 1
+
+        valor = registro.get("datos_catastrales", {}).get("valor_catastral")
+        if isinstance(valor, (int, float)):
+            self.valor_catastral.agregar(valor)
+
+        inmueble = registro.get("datos_inmueble", {})
+        superficie = inmueble.get("superficie_construida")
+        if isinstance(superficie, (int, float)):
+            self.superficie_construida.agregar(superficie)
+
+        self.tipos_inmuebles[inmueble.get("tipo", "Desconocido")] += 1
+
+    def agregar_todos(self, registros: Iterable[Dict]) -> "AcumuladorResumen":
+        for registro in registros:
+            self.agregar(registro)
+        return self
+
+    def resumen(self) -> Dict:
+        """
+        Returns:
+            Diccionario con el total de propiedades y sus estadísticas
+        """
+        return {
+            "total_propiedades": self.total_propiedades,
+            "fecha_generacion": datetime.now().isoformat(),
+            "estadisticas": {
+                "valor_catastral_total": self.valor_catastral.total,
+                "superficie_total_construida": self.superficie_construida.total,
+                "tipos_inmuebles": dict(self.tipos_inmuebles),
+                "valor_catastral": self.valor_catastral.resumen(),
+                "superficie_construida": self.superficie_construida.resumen(),
+            },
+        }
+
 
 class CatastroScraperService:
     """
@@ -152,7 +252,7 @@ class CatastroScraperService:
                 })
 
         if guardar_consolidado and resultados:
-            archivo_consolidado = os.path.join(self.data_dir, "datos_catastrales_consolidados.json")
+            archivo_consolidado = os.path.join(self.data_dir, ARCHIVO_CONSOLIDADO)
             self._guardar_json(resultados, archivo_consolidado)
             print(f"\n✓ Datos consolidados guardados en: {archivo_consolidado}")
 
@@ -175,46 +275,60 @@ class CatastroScraperService:
             print(f"Error cargando datos: {e}")
             return None
 
-    def generar_resumen(self, referencias: List[str]) -> Dict:
+    def iterar_registros_guardados(self, referencias: Optional[List[str]] = None) -> Iterator[Dict]:
         """
-        Genera un resumen de las propiedades consultadas
+        Recorre los datos ya extraídos que hay en data_dir, uno a uno
 
         Args:
-            referencias: Lista de referencias catastrales
+            referencias: Referencias cuyos archivos individuales se leen. Si se
+                omite, se lee el consolidado o, si no existe, todos los
+                archivos individuales del directorio
+
+        Returns:
+            Iterador de diccionarios con los datos de cada referencia
+        """
+        if referencias is None:
+            archivo_consolidado = os.path.join(self.data_dir, ARCHIVO_CONSOLIDADO)
+            if os.path.exists(archivo_consolidado):
+                yield from iterar_array_json(archivo_consolidado)
+                return
+            referencias = sorted(
+                nombre[:-len(".json")] for nombre in os.listdir(self.data_dir)
+                if _ARCHIVO_REFERENCIA.match(nombre)
+            )
+
+        for ref in referencias:
+            archivo = os.path.join(self.data_dir, f"{ref}.json")
+            if not os.path.exists(archivo):
+                print(f"  ⚠️  Sin datos extraídos para {ref}")
+                continue
+            datos = self.cargar_datos(archivo)
+            if datos is not None:
+                yield datos
+
+    def generar_resumen(self, registros: Optional[Iterable[Union[Dict, str]]] = None) -> Dict:
+        """
+        Genera un resumen de las propiedades ya extraídas, sin volver a consultarlas
+
+        Args:
+            registros: Datos extraídos (p. ej. la lista de procesar_multiples_referencias)
+                o referencias catastrales, cuyos archivos se leen de data_dir. Si se
+                omite, se resume lo guardado en data_dir
 
         Returns:
             Diccionario con estadísticas resumidas
         """
-        resultados = self.procesar_multiples_referencias(
-            referencias,
-            guardar_individual=False,
-            guardar_consolidado=False
-        )
-
-        resumen = {
-            "total_propiedades": len(resultados),
-            "fecha_generacion": datetime.now().isoformat(),
-            "estadisticas": {
-                "valor_catastral_total": sum(
-                    r.get("datos_catastrales", {}).get("valor_catastral", 0)
-                    for r in resultados
-                ),
-                "superficie_total_construida": sum(
-                    r.get("datos_inmueble", {}).get("superficie_construida", 0)
-                    for r in resultados
-                ),
-                "tipos_inmuebles": {}
-            },
-            "propiedades": resultados
-        }
+        if registros is None:
+            registros = self.iterar_registros_guardados()
 
-        # Contar tipos de inmuebles
-        for r in resultados:
-            tipo = r.get("datos_inmueble", {}).get("tipo", "Desconocido")
-            resumen["estadisticas"]["tipos_inmuebles"][tipo] = \
-                resumen["estadisticas"]["tipos_inmuebles"].get(tipo, 0) + 1
+        acumulador = AcumuladorResumen()
+        for registro in registros:
+            if isinstance(registro, str):
+                acumulador.agregar_todos(self.iterar_registros_guardados([registro]))
+            else:
+                acumulador.agregar(registro)
 
-        return resumen
+        return acumulador.resumen()
 
 
 def main():
@@ -247,8 +361,8 @@ def main():
     print("GENERANDO RESUMEN")
     print("="*60)
 
-    resumen = servicio.generar_resumen(referencias)
-    archivo_resumen = os.path.join(servicio.data_dir, "resumen_propiedades.json")
+    resumen = servicio.generar_resumen(resultados)
+    archivo_resumen = os.path.join(servicio.data_dir, ARCHIVO_RESUMEN)
     servicio._guardar_json(resumen, archivo_resumen)
 
     print(f"\n✓ Resumen guardado en: {archivo_resumen}")
@@ -4,12 +4,185 @@ Servicio para consultar información catastral usando la API oficial del Catastr
 API Documentation: http://www.catastro.meh.es/ws/webservices_catastro.pdf
 """
 
+import asyncio
+import io
+import random
+import sys
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional
+from urllib.parse import urlparse
 import json
 import xml.etree.ElementTree as ET
 from datetime import datetime
 
+from cache_catastro import CacheCatastro
+
+
+# Nombre de esta fuente en la caché de consultas al Catastro
+ENDPOINT_CACHE = "ovc_cpmrc"
+
+# Códigos HTTP que indican un fallo transitorio y justifican reintentar
+CODIGOS_REINTENTABLES = frozenset({429, 500, 502, 503, 504})
+
+
+# Elementos que forman un registro independiente en las respuestas de la OVC:
+# bico (bien inmueble), rcdnp (inmueble de una lista) y coord (coordenadas)
+ETIQUETAS_REGISTRO = frozenset({"bico", "rcdnp", "coord"})
+
+# Elementos que se devuelven siempre como lista aunque aparezcan una sola vez
+# (subparcelas y unidades constructivas de un inmueble)
+ETIQUETAS_LISTA = frozenset({"spr", "cons"})
+
+
+def _sin_namespace(etiqueta: str) -> str:
+    """Quita el namespace de una etiqueta ('{http://...}bico' -> 'bico')"""
+    return etiqueta.rsplit('}', 1)[-1]
+
+
+def _elemento_a_dict(elem: ET.Element):
+    """
+    Convierte un elemento XML en un diccionario
+
+    Los elementos sin hijos se convierten en su texto. Las etiquetas
+    repetidas (y las de ETIQUETAS_LISTA) se agrupan en listas en lugar de
+    sobrescribirse.
+    """
+    if len(elem) == 0:
+        return (elem.text or "").strip()
+
+    resultado = {}
+    repetidas = set()
+
+    for hijo in elem:
+        etiqueta = _sin_namespace(hijo.tag)
+        valor = _elemento_a_dict(hijo)
+
+        if etiqueta in ETIQUETAS_LISTA:
+            resultado.setdefault(etiqueta, []).append(valor)
+        elif etiqueta in resultado:
+            if etiqueta not in repetidas:
+                resultado[etiqueta] = [resultado[etiqueta]]
+                repetidas.add(etiqueta)
+            resultado[etiqueta].append(valor)
+        else:
+            resultado[etiqueta] = valor
+
+    return resultado
+
+
+def iterar_registros_xml(fuente, datos: Optional[Dict] = None):
+    """
+    Recorre en streaming los registros de una respuesta XML del Catastro
+
+    Emite un diccionario por cada elemento bico/rcdnp/coord y descarta los
+    elementos ya procesados, de modo que la memoria no crece con el tamaño
+    del documento.
+
+    Args:
+        fuente: Archivo o flujo binario con el XML
+        datos: Diccionario opcional donde se acumula el texto de cada
+               etiqueta (formato plano de versiones anteriores)
+
+    Returns:
+        Iterador de registros
+    """
+    pila = []
+    abiertos = 0
+
+    for evento, elem in ET.iterparse(fuente, events=("start", "end")):
+        etiqueta = _sin_namespace(elem.tag)
+
+        if evento == "start":
+            pila.append(elem)
+            if etiqueta in ETIQUETAS_REGISTRO:
+                abiertos += 1
+            continue
+
+        pila.pop()
+
+        if datos is not None and elem.text and elem.text.strip():
+            datos[elem.tag] = elem.text.strip()
+
+        if etiqueta in ETIQUETAS_REGISTRO:
+            abiertos -= 1
+            if abiertos == 0:
+                yield _elemento_a_dict(elem)
+
+        # Fuera de un registro, los elementos terminados ya no hacen falta
+        if abiertos == 0 and pila:
+            elem.clear()
+            pila[-1].remove(elem)
+
+
+class LimitadorTokens:
+    """
+    Limitador de peticiones por cubo de tokens (token bucket)
+
+    Permite ráfagas de hasta `capacidad` peticiones y, en promedio, no más de
+    `tasa` peticiones por segundo. Se usa desde un único bucle asyncio, por lo
+    que no necesita cerrojos.
+    """
+
+    def __init__(self, tasa: float, capacidad: Optional[float] = None):
+        """
+        Args:
+            tasa: Peticiones por segundo permitidas
+            capacidad: Tamaño máximo de ráfaga (por defecto, igual a la tasa)
+        """
+        if tasa <= 0:
+            raise ValueError("La tasa debe ser mayor que 0")
+
+        self.tasa = tasa
+        self.capacidad = max(1.0, capacidad if capacidad is not None else tasa)
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+
+    async def adquirir(self):
+        """Espera hasta que haya un token disponible y lo consume"""
+        while True:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+            self.ultimo = ahora
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+
+class LimitadorCortesia:
+    """
+    Limitador global de cortesía con la sede del Catastro
+
+    Garantiza un intervalo mínimo entre el inicio de dos consultas, sea cual
+    sea el navegador que las haga. Cada hilo reserva su turno bajo el
+    cerrojo y espera fuera de él.
+    """
+
+    def __init__(self, intervalo: float):
+        """
+        Args:
+            intervalo: Segundos mínimos entre dos consultas
+        """
+        self.intervalo = intervalo
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        """Bloquea hasta que le toque el turno a la siguiente consulta"""
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
 
 class CatastroService:
     """
@@ -25,12 +198,53 @@ class CatastroService:
     # URL para consultas de coordenadas
     BASE_URL_CPMRC = "http://ovc.catastro.meh.es/ovcservweb/OVCSWLocalizacionRC/OVCCoordenadas.asmx/Consulta_CPMRC"
 
-    def __init__(self):
+    def __init__(self, concurrencia: int = 8, peticiones_por_segundo: float = 5.0,
+                 reintentos: int = 3, timeout: float = 30, espera_base: float = 0.5,
+                 espera_maxima: float = 30.0, archivo_xml_debug: Optional[str] = None,
+                 cache: Optional[CacheCatastro] = None):
+        """
+        Args:
+            concurrencia: Número máximo de consultas simultáneas
+            peticiones_por_segundo: Límite de peticiones por segundo a cada host
+            reintentos: Reintentos ante errores de red o respuestas 429/5xx
+            timeout: Timeout de cada petición en segundos
+            espera_base: Espera base (segundos) del backoff exponencial
+            espera_maxima: Espera máxima (segundos) entre reintentos
+            archivo_xml_debug: Si se indica, guarda aquí el último XML recibido
+            cache: Caché en disco que se consulta antes de acceder a la red
+        """
+        self.concurrencia = max(1, concurrencia)
+        self.peticiones_por_segundo = peticiones_por_segundo
+        self.reintentos = reintentos
+        self.timeout = timeout
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.archivo_xml_debug = archivo_xml_debug
+        self.cache = cache
+
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (compatible; CatastroService/1.0)'
         })
 
+        self._montar_adaptador()
+
+    def _montar_adaptador(self):
+        """Ajusta el pool de conexiones keep-alive al tamaño de la concurrencia"""
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrencia)
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+
+    @staticmethod
+    def _parametros(referencia: str) -> Dict:
+        """Parámetros de consulta de una referencia catastral"""
+        # Los primeros 2 dígitos son la provincia y los 3 siguientes el municipio
+        return {
+            'Provincia': referencia[:2],
+            'Municipio': referencia[2:5],
+            'RC': referencia
+        }
+
     def consultar_referencia_catastral(self, referencia: str) -> Optional[Dict]:
         """
         Consulta información de una referencia catastral
@@ -42,36 +256,23 @@ class CatastroService:
             Diccionario con la información catastral o None si hay error
         """
         try:
-            # Extraer provincia y municipio de la referencia
-            # Los primeros 2 dígitos son la provincia
-            provincia = referencia[:2]
-            municipio = referencia[2:5]
-
-            # Parámetros para la consulta
-            params = {
-                'Provincia': provincia,
-                'Municipio': municipio,
-                'RC': referencia
-            }
+            params = self._parametros(referencia)
 
             print(f"Consultando referencia catastral: {referencia}")
-            print(f"Provincia: {provincia}, Municipio: {municipio}")
+            print(f"Provincia: {params['Provincia']}, Municipio: {params['Municipio']}")
+
+            datos = self._consultar_cache(referencia)
+            if datos is not None:
+                print("Respuesta obtenida de la caché")
+                return datos
 
             # Realizar petición a la API
-            response = self.session.get(
-                self.BASE_URL_CPMRC,
-                params=params,
-                timeout=30
-            )
+            response, datos = self._peticion(referencia)
 
             print(f"Status Code: {response.status_code}")
 
-            if response.status_code != 200:
+            if datos is None:
                 print(f"Error: Código {response.status_code}")
-                return None
-
-            # Parsear respuesta XML
-            datos = self._parsear_respuesta_xml(response.text, referencia)
 
             return datos
 
@@ -84,26 +285,27 @@ class CatastroService:
     def _parsear_respuesta_xml(self, xml_text: str, referencia: str) -> Dict:
         """
         Parsea la respuesta XML de la API del Catastro
+
+        Además del diccionario plano "datos" (texto de cada etiqueta), devuelve
+        en "registros" un diccionario estructurado por cada bico/rcdnp/coord,
+        con las etiquetas repetidas agrupadas en listas.
         """
         try:
-            # Guardar XML para inspección
-            with open('/home/user/gestion-herencia/catastro_response.xml', 'w', encoding='utf-8') as f:
-                f.write(xml_text)
-
-            root = ET.fromstring(xml_text)
+            # Guardar XML para inspección (solo si se ha pedido)
+            if self.archivo_xml_debug:
+                with open(self.archivo_xml_debug, 'w', encoding='utf-8') as f:
+                    f.write(xml_text)
 
             # Crear estructura de datos
             datos = {
                 "referencia_catastral": referencia,
                 "fecha_consulta": datetime.now().isoformat(),
-                "datos": {}
+                "datos": {},
+                "registros": []
             }
 
-            # Buscar información en el XML
-            # El formato exacto depende de la respuesta de la API
-            for elem in root.iter():
-                if elem.text and elem.text.strip():
-                    datos["datos"][elem.tag] = elem.text.strip()
+            fuente = io.BytesIO(xml_text.encode('utf-8'))
+            datos["registros"] = list(iterar_registros_xml(fuente, datos["datos"]))
 
             return datos
 
@@ -117,32 +319,176 @@ class CatastroService:
                 "datos": {}
             }
 
-    def consultar_multiples_referencias(self, referencias: List[str]) -> List[Dict]:
+    def iterar_registros(self, url: str, params: Dict):
+        """
+        Consulta un servicio de la OVC y recorre sus registros en streaming
+
+        Pensado para consultas masivas (p. ej. todos los inmuebles de un
+        municipio): la respuesta se parsea según llega, sin cargarla entera
+        en memoria.
+
+        Args:
+            url: URL del servicio (ej: BASE_URL_DNPRC)
+            params: Parámetros de la consulta
+
+        Returns:
+            Iterador de registros (un diccionario por bico/rcdnp)
+        """
+        with self.session.get(url, params=params, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield from iterar_registros_xml(response.raw)
+
+    def _espera_reintento(self, intento: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Calcula la espera antes de un reintento
+
+        Usa backoff exponencial con jitter completo (espera aleatoria entre 0 y
+        el tope del intento) y respeta la cabecera Retry-After si la hay.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.espera_maxima, float(retry_after))
+
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * (2 ** intento)))
+
+    def _consultar_cache(self, referencia: str) -> Optional[Dict]:
+        """Devuelve los datos de una referencia si están vigentes en la caché"""
+        if self.cache is None:
+            return None
+
+        contenido = self.cache.obtener(ENDPOINT_CACHE, referencia)
+        if contenido is None:
+            return None
+        return self._parsear_respuesta_xml(contenido.decode('utf-8'), referencia)
+
+    def _peticion(self, referencia: str):
+        """
+        Realiza una petición y parsea la respuesta (se ejecuta en un hilo)
+
+        Si la caché tiene una respuesta caducada con ETag o Last-Modified, la
+        petición es condicional y un 304 reutiliza la respuesta guardada.
+        """
+        anterior = self.cache.entrada(ENDPOINT_CACHE, referencia) if self.cache else None
+        cabeceras = {}
+        if anterior is not None:
+            if anterior.etag:
+                cabeceras['If-None-Match'] = anterior.etag
+            if anterior.last_modified:
+                cabeceras['If-Modified-Since'] = anterior.last_modified
+
+        response = self.session.get(
+            self.BASE_URL_CPMRC,
+            params=self._parametros(referencia),
+            headers=cabeceras,
+            timeout=self.timeout
+        )
+
+        if response.status_code == 304 and anterior is not None:
+            self.cache.renovar(ENDPOINT_CACHE, referencia)
+            return response, self._parsear_respuesta_xml(anterior.contenido.decode('utf-8'), referencia)
+
+        if response.status_code != 200:
+            return response, None
+
+        if self.cache is not None:
+            self.cache.guardar(
+                ENDPOINT_CACHE, referencia, response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+
+        return response, self._parsear_respuesta_xml(response.text, referencia)
+
+    async def _consultar_async(self, referencia: str, semaforo: asyncio.Semaphore,
+                               limitadores: Dict[str, LimitadorTokens],
+                               ejecutor: ThreadPoolExecutor) -> Dict:
+        """Consulta una referencia con límite de concurrencia, de tasa y reintentos"""
+        loop = asyncio.get_running_loop()
+        host = urlparse(self.BASE_URL_CPMRC).netloc
+        limitador = limitadores.setdefault(host, LimitadorTokens(self.peticiones_por_segundo))
+        error = "No se pudo obtener información"
+
+        # Las respuestas vigentes en caché no consumen cupo de peticiones
+        datos = self._consultar_cache(referencia)
+        if datos is not None:
+            print(f"✓ {referencia} (caché)")
+            return datos
+
+        for intento in range(self.reintentos + 1):
+            response = None
+
+            async with semaforo:
+                await limitador.adquirir()
+                try:
+                    response, datos = await loop.run_in_executor(ejecutor, self._peticion, referencia)
+                except requests.RequestException as e:
+                    error = f"No se pudo obtener información: {e}"
+                else:
+                    if datos is not None:
+                        print(f"✓ {referencia}")
+                        return datos
+                    error = f"No se pudo obtener información (HTTP {response.status_code})"
+                    if response.status_code not in CODIGOS_REINTENTABLES:
+                        break
+
+            if intento < self.reintentos:
+                await asyncio.sleep(self._espera_reintento(intento, response))
+
+        print(f"✗ {referencia}: {error}")
+        return {
+            "referencia_catastral": referencia,
+            "fecha_consulta": datetime.now().isoformat(),
+            "error": error
+        }
+
+    async def consultar_multiples_referencias_async(self, referencias: List[str]) -> List[Dict]:
+        """
+        Consulta múltiples referencias catastrales de forma concurrente
+
+        Las consultas comparten las conexiones keep-alive de la sesión, se
+        limitan a `concurrencia` simultáneas y a `peticiones_por_segundo` por
+        host, y se reintentan con backoff exponencial y jitter ante errores de
+        red o respuestas 429/5xx.
+
+        Args:
+            referencias: Lista de referencias catastrales
+
+        Returns:
+            Lista de diccionarios con la información, en el orden de entrada
+        """
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        limitadores = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrencia) as ejecutor:
+            return await asyncio.gather(*(
+                self._consultar_async(ref, semaforo, limitadores, ejecutor)
+                for ref in referencias
+            ))
+
+    def consultar_multiples_referencias(self, referencias: List[str],
+                                        concurrencia: Optional[int] = None) -> List[Dict]:
         """
         Consulta múltiples referencias catastrales
 
+        Desde código asíncrono, usar consultar_multiples_referencias_async().
+
         Args:
             referencias: Lista de referencias catastrales
+            concurrencia: Número máximo de consultas simultáneas (por defecto, el del servicio)
 
         Returns:
             Lista de diccionarios con la información
         """
-        resultados = []
+        if concurrencia is not None and max(1, concurrencia) != self.concurrencia:
+            self.concurrencia = max(1, concurrencia)
+            self._montar_adaptador()
 
-        for ref in referencias:
-            print(f"\n{'='*60}")
-            resultado = self.consultar_referencia_catastral(ref)
-            if resultado:
-                resultados.append(resultado)
-            else:
-                # Agregar entrada de error
-                resultados.append({
-                    "referencia_catastral": ref,
-                    "fecha_consulta": datetime.now().isoformat(),
-                    "error": "No se pudo obtener información"
-                })
+        print(f"Consultando {len(referencias)} referencias "
+              f"(concurrencia: {self.concurrencia}, {self.peticiones_por_segundo} peticiones/s)")
 
-        return resultados
+        return asyncio.run(self.consultar_multiples_referencias_async(referencias))
 
     def guardar_resultados_json(self, resultados: List[Dict], archivo: str):
         """
@@ -165,9 +511,12 @@ class CatastroService:
 def main():
     """
     Función principal para probar el servicio
+
+    Uso: python catastro_service.py [--refresh]
+    (--refresh ignora la caché en disco y vuelve a consultar el Catastro)
     """
-    # Crear instancia del servicio
-    servicio = CatastroService()
+    # Crear instancia del servicio (con caché en disco de las respuestas)
+    servicio = CatastroService(cache=CacheCatastro(refrescar="--refresh" in sys.argv))
 
     # Referencia catastral de ejemplo
     referencia_ejemplo = "03106A002000090000YL"
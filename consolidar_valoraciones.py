@@ -1,135 +1,299 @@
 #!/usr/bin/env python3
 """
 Consolida valoraciones calculadas con valores de referencia oficiales
+
+Los datos catastrales se recorren en streaming y se cruzan con índices en
+memoria de las valoraciones y de los valores de referencia, que son mucho
+más pequeños. Cada registro consolidado se escribe en cuanto se construye y
+las estadísticas del resumen se acumulan en la misma pasada.
+
+Con --almacen solo se leen del almacén SQLite las columnas del cruce
+(referencias y valores estimados) y el resultado se guarda en su tabla de
+consolidación; el JSON para frontend/ lo escribe almacen_catastral.py exportar.
+
+Uso: python consolidar_valoraciones.py [--almacen]
 """
 
 import json
 import os
+import sys
 from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from catastro_scraper_service import EstadisticaCorriente
+from diario_extraccion import escribir_json_atomico
+from json_incremental import iterar_array_json
+
+
+def indexar_valoraciones(ruta: str) -> Dict[str, Dict]:
+    """Índice referencia -> valoración calculada de valoraciones.json"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        data_val = json.load(f)
+    return {
+        val["referencia_catastral"]: val
+        for val in data_val.get("valoraciones", []) if val.get("referencia_catastral")
+    }
+
+
+def indexar_valoraciones_almacen(almacen) -> Dict[str, Dict]:
+    """
+    Índice referencia -> valoración con solo las columnas que usa el cruce
+
+    La valoración completa no se reconstruye: la consolidación del almacén
+    solo necesita el valor estimado, y las valoraciones sin valor (urbanas
+    sin valor catastral) cuentan igualmente como valoradas.
+    """
+    return {
+        referencia: {"referencia_catastral": referencia} if valor is None
+        else {"referencia_catastral": referencia, "valor_estimado_euros": valor}
+        for referencia, valor in almacen.columnas(["referencia_catastral", "valor_estimado_euros"], "valoraciones")
+    }
+
+
+def fecha_mas_reciente(valoraciones: Iterable[Dict]) -> Optional[str]:
+    """Fecha (ISO) de la valoración más reciente, o None si ninguna tiene fecha"""
+    fechas = [val.get("fecha_valoracion") for val in valoraciones]
+    return max((fecha for fecha in fechas if isinstance(fecha, str)), default=None)
 
 
-def consolidar_valoraciones():
+def actualizar_valoraciones_almacen(almacen, archivo_valoraciones: str):
+    """
+    Deja en el almacén las valoraciones más recientes
+
+    Si valoraciones.json es más reciente que las valoraciones del almacén
+    (se valoró sin --almacen), sustituye a las del almacén; si no, se
+    ignora. En ambos casos se avisa de la fuente descartada.
+
+    Args:
+        almacen: AlmacenCatastral de la consolidación
+        archivo_valoraciones: Ruta de valoraciones.json (puede no existir)
+    """
+    if not os.path.exists(archivo_valoraciones):
+        return
+
+    del_archivo = indexar_valoraciones(archivo_valoraciones)
+    fecha_archivo = fecha_mas_reciente(del_archivo.values())
+    fecha_almacen = almacen.ultima_valoracion()
+
+    if almacen.contar("valoraciones"):
+        if (fecha_archivo or "") <= (fecha_almacen or ""):
+            print(f"⚠️  Se ignora {archivo_valoraciones} ({fecha_archivo or 'sin fecha'}): "
+                  f"el almacén tiene valoraciones más recientes ({fecha_almacen or 'sin fecha'})")
+            return
+        print(f"⚠️  {archivo_valoraciones} ({fecha_archivo}) es más reciente que las valoraciones "
+              f"del almacén ({fecha_almacen or 'sin fecha'}): sustituye a las del almacén")
+
+    total = almacen.guardar_valoraciones(del_archivo.values(), sustituir=True)
+    print(f"✓ Importadas {total} valoraciones de {archivo_valoraciones} al almacén")
+
+
+def indexar_valores_referencia(ruta: str) -> Dict[str, Dict]:
+    """Índice referencia -> valor de referencia oficial de valores_referencia.json"""
+    return {
+        ref_data["referencia_catastral"]: ref_data
+        for ref_data in iterar_array_json(ruta) if ref_data.get("referencia_catastral")
+    }
+
+
+def consolidar_registro(inmueble: Dict, valoracion: Optional[Dict], valor_ref: Optional[Dict]) -> Dict:
+    """
+    Añade a un inmueble su valoración, su valor de referencia y la comparación
+
+    El diccionario del inmueble se completa en el sitio: viene recién leído
+    del archivo y no se vuelve a usar.
+    """
+    inmueble["valoracion_calculada"] = valoracion
+    inmueble["valor_referencia_oficial"] = valor_ref
+
+    # Calcular diferencia si hay ambos valores
+    if valoracion and valor_ref:
+        val_calc = valoracion.get("valor_estimado_euros", 0)
+        val_ref = valor_ref.get("valor_referencia", 0)
+
+        if val_calc > 0 and val_ref > 0:
+            diferencia = val_calc - val_ref
+            diferencia_pct = (diferencia / val_ref) * 100
+
+            inmueble["comparacion"] = {
+                "valor_calculado": val_calc,
+                "valor_oficial": val_ref,
+                "diferencia_euros": round(diferencia, 2),
+                "diferencia_porcentaje": round(diferencia_pct, 2),
+                "mayor": "calculado" if val_calc > val_ref else "oficial" if val_ref > val_calc else "igual"
+            }
+
+    return inmueble
+
+
+class ResumenConsolidacion:
+    """Estadísticas de la consolidación acumuladas registro a registro"""
+
+    def __init__(self):
+        self.total_inmuebles = 0
+        self.con_valoracion_calculada = 0
+        self.con_valor_referencia = 0
+        self.valor_calculado = EstadisticaCorriente()
+        self.valor_oficial = EstadisticaCorriente()
+        self.diferencia_porcentaje = EstadisticaCorriente()
+
+    def agregar(self, registro: Dict):
+        self.total_inmuebles += 1
+        self.con_valoracion_calculada += bool(registro.get("valoracion_calculada"))
+        self.con_valor_referencia += bool(registro.get("valor_referencia_oficial"))
+
+        comparacion = registro.get("comparacion")
+        if comparacion:
+            self.valor_calculado.agregar(comparacion["valor_calculado"])
+            self.valor_oficial.agregar(comparacion["valor_oficial"])
+            self.diferencia_porcentaje.agregar(comparacion["diferencia_porcentaje"])
+
+    def resultado(self) -> Dict:
+        resumen = {
+            "fecha_consolidacion": datetime.now().isoformat(),
+            "total_inmuebles": self.total_inmuebles,
+            "con_valoracion_calculada": self.con_valoracion_calculada,
+            "con_valor_referencia": self.con_valor_referencia,
+            "con_comparacion": self.diferencia_porcentaje.cuenta,
+            "estadisticas": {}
+        }
+
+        if self.diferencia_porcentaje.cuenta:
+            total_val_calc = self.valor_calculado.total
+            total_val_ref = self.valor_oficial.total
+            resumen["estadisticas"] = {
+                "suma_valoraciones_calculadas": round(total_val_calc, 2),
+                "suma_valores_referencia": round(total_val_ref, 2),
+                "diferencia_total_euros": round(total_val_calc - total_val_ref, 2),
+                "diferencia_media_porcentaje": round(
+                    self.diferencia_porcentaje.total / self.diferencia_porcentaje.cuenta, 2
+                ),
+                "diferencia_minima_porcentaje": round(self.diferencia_porcentaje.minimo, 2),
+                "diferencia_maxima_porcentaje": round(self.diferencia_porcentaje.maximo, 2)
+            }
+
+        return resumen
+
+
+def mostrar_registro(registro: Dict):
+    """Muestra en pantalla el detalle de un inmueble consolidado"""
+    ref = registro.get("referencia_catastral")
+    print(f"\n📋 {ref}")
+
+    if registro.get("valoracion_calculada"):
+        val_calc = registro["valoracion_calculada"].get("valor_estimado_euros", 0)
+        print(f"   💰 Valoración calculada: {val_calc:,.2f} €")
+
+    if registro.get("valor_referencia_oficial"):
+        val_ref = registro["valor_referencia_oficial"].get("valor_referencia", 0)
+        print(f"   📊 Valor referencia oficial: {val_ref:,.2f} €")
+
+    if registro.get("comparacion"):
+        comp = registro["comparacion"]
+        print(f"   📈 Diferencia: {comp['diferencia_euros']:+,.2f} € ({comp['diferencia_porcentaje']:+.2f}%)")
+        if comp["mayor"] == "calculado":
+            print(f"      → Valoración calculada es {abs(comp['diferencia_porcentaje']):.2f}% mayor")
+        elif comp["mayor"] == "oficial":
+            print(f"      → Valor oficial es {abs(comp['diferencia_porcentaje']):.2f}% mayor")
+        else:
+            print(f"      → Valores son iguales")
+
+
+def consolidar_valoraciones(directorio: str = "data", almacen=None, mostrar_detalle: bool = True) -> Optional[Dict]:
     """
     Combina las valoraciones calculadas con los valores de referencia oficiales
+
+    Args:
+        directorio: Directorio con los JSON de entrada y salida
+        almacen: AlmacenCatastral del que leer las referencias y las
+            valoraciones y en el que guardar la consolidación, en lugar de
+            los JSON de directorio (valores_referencia.json se sigue leyendo)
+        mostrar_detalle: Si True, muestra cada inmueble según se consolida
+
+    Returns:
+        Resumen de la consolidación, o None si no hay datos catastrales
     """
     print("=" * 60)
     print("CONSOLIDACIÓN DE VALORACIONES")
     print("=" * 60)
     print()
 
-    # Cargar datos catastrales
-    archivo_datos = "data/datos_catastrales_consolidados.json"
-    if not os.path.exists(archivo_datos):
-        print(f"❌ No se encontró: {archivo_datos}")
-        return
-
-    with open(archivo_datos, 'r', encoding='utf-8') as f:
-        datos_catastrales = json.load(f)
-
-    print(f"✓ Cargados {len(datos_catastrales)} inmuebles")
-
-    # Cargar valoraciones calculadas
-    archivo_valoraciones = "data/valoraciones.json"
+    # Datos catastrales: se recorren sin cargarlos enteros
+    if almacen is not None:
+        print(f"✓ Almacén: {almacen.ruta} ({almacen.contar()} inmuebles)")
+        inmuebles: Iterator[Dict] = (
+            {"referencia_catastral": referencia} for (referencia,) in almacen.columnas(["referencia_catastral"])
+        )
+    else:
+        archivo_datos = os.path.join(directorio, "datos_catastrales_consolidados.json")
+        if not os.path.exists(archivo_datos):
+            print(f"❌ No se encontró: {archivo_datos}")
+            return None
+        print(f"✓ Datos catastrales: {archivo_datos}")
+        inmuebles = iterar_array_json(archivo_datos)
+
+    # Índices de valoraciones calculadas y valores de referencia
+    archivo_valoraciones = os.path.join(directorio, "valoraciones.json")
     valoraciones_calculadas = {}
 
-    if os.path.exists(archivo_valoraciones):
-        with open(archivo_valoraciones, 'r', encoding='utf-8') as f:
-            data_val = json.load(f)
-            for val in data_val.get("valoraciones", []):
-                ref = val.get("referencia_catastral")
-                if ref:
-                    valoraciones_calculadas[ref] = val
+    if almacen is not None:
+        actualizar_valoraciones_almacen(almacen, archivo_valoraciones)
+        valoraciones_calculadas = indexar_valoraciones_almacen(almacen)
+        if valoraciones_calculadas:
+            print(f"✓ Cargadas {len(valoraciones_calculadas)} valoraciones calculadas del almacén")
+        else:
+            print(f"⚠️  No hay valoraciones en el almacén: {almacen.ruta}")
+            print("   Ejecuta: python valorador_inmuebles.py --almacen")
+    elif os.path.exists(archivo_valoraciones):
+        valoraciones_calculadas = indexar_valoraciones(archivo_valoraciones)
         print(f"✓ Cargadas {len(valoraciones_calculadas)} valoraciones calculadas")
     else:
         print(f"⚠️  No se encontró: {archivo_valoraciones}")
         print("   Ejecuta: python valorador_inmuebles.py")
 
-    # Cargar valores de referencia oficiales
-    archivo_ref = "data/valores_referencia.json"
+    archivo_ref = os.path.join(directorio, "valores_referencia.json")
     valores_referencia = {}
 
     if os.path.exists(archivo_ref):
-        with open(archivo_ref, 'r', encoding='utf-8') as f:
-            data_ref = json.load(f)
-            for ref_data in data_ref:
-                ref = ref_data.get("referencia_catastral")
-                if ref:
-                    valores_referencia[ref] = ref_data
+        valores_referencia = indexar_valores_referencia(archivo_ref)
         print(f"✓ Cargados {len(valores_referencia)} valores de referencia oficiales")
     else:
         print(f"⚠️  No se encontró: {archivo_ref}")
         print("   Ejecuta: python extraer_valores_referencia.py")
 
-    # Consolidar todo
+    # Consolidar todo en una pasada: cruzar, escribir, acumular y mostrar
     print("\n📊 Consolidando información...")
-
-    consolidado = []
-
-    for inmueble in datos_catastrales:
-        ref = inmueble.get("referencia_catastral")
-
-        # Crear registro consolidado
-        registro = {
-            **inmueble,  # Datos catastrales base
-            "valoracion_calculada": valoraciones_calculadas.get(ref),
-            "valor_referencia_oficial": valores_referencia.get(ref)
-        }
-
-        # Calcular diferencia si hay ambos valores
-        if registro["valoracion_calculada"] and registro["valor_referencia_oficial"]:
-            val_calc = registro["valoracion_calculada"].get("valor_estimado_euros", 0)
-            val_ref = registro["valor_referencia_oficial"].get("valor_referencia", 0)
-
-            if val_calc > 0 and val_ref > 0:
-                diferencia = val_calc - val_ref
-                diferencia_pct = (diferencia / val_ref) * 100
-
-                registro["comparacion"] = {
-                    "valor_calculado": val_calc,
-                    "valor_oficial": val_ref,
-                    "diferencia_euros": round(diferencia, 2),
-                    "diferencia_porcentaje": round(diferencia_pct, 2),
-                    "mayor": "calculado" if val_calc > val_ref else "oficial" if val_ref > val_calc else "igual"
-                }
-
-        consolidado.append(registro)
-
-    # Guardar consolidado
-    archivo_salida = "data/datos_catastrales_consolidados_completo.json"
-    with open(archivo_salida, 'w', encoding='utf-8') as f:
-        json.dump(consolidado, f, indent=2, ensure_ascii=False)
-
-    print(f"✓ Datos consolidados guardados en: {archivo_salida}")
-
-    # Crear resumen
-    resumen = {
-        "fecha_consolidacion": datetime.now().isoformat(),
-        "total_inmuebles": len(consolidado),
-        "con_valoracion_calculada": sum(1 for r in consolidado if r.get("valoracion_calculada")),
-        "con_valor_referencia": sum(1 for r in consolidado if r.get("valor_referencia_oficial")),
-        "con_comparacion": sum(1 for r in consolidado if r.get("comparacion")),
-        "estadisticas": {}
-    }
-
-    # Calcular estadísticas de comparación
-    if any(r.get("comparacion") for r in consolidado):
-        comparaciones = [r["comparacion"] for r in consolidado if r.get("comparacion")]
-
-        total_val_calc = sum(c["valor_calculado"] for c in comparaciones)
-        total_val_ref = sum(c["valor_oficial"] for c in comparaciones)
-        diferencias = [c["diferencia_porcentaje"] for c in comparaciones]
-
-        resumen["estadisticas"] = {
-            "suma_valoraciones_calculadas": round(total_val_calc, 2),
-            "suma_valores_referencia": round(total_val_ref, 2),
-            "diferencia_total_euros": round(total_val_calc - total_val_ref, 2),
-            "diferencia_media_porcentaje": round(sum(diferencias) / len(diferencias), 2),
-            "diferencia_minima_porcentaje": round(min(diferencias), 2),
-            "diferencia_maxima_porcentaje": round(max(diferencias), 2)
-        }
+    if mostrar_detalle:
+        print("\n" + "=" * 60)
+        print("DETALLE POR INMUEBLE")
+        print("=" * 60)
+
+    acumulador = ResumenConsolidacion()
+
+    def consolidados() -> Iterator[Dict]:
+        for inmueble in inmuebles:
+            ref = inmueble.get("referencia_catastral")
+            registro = consolidar_registro(inmueble, valoraciones_calculadas.get(ref), valores_referencia.get(ref))
+            acumulador.agregar(registro)
+            if mostrar_detalle:
+                mostrar_registro(registro)
+            yield registro
+
+    if almacen is not None:
+        almacen.guardar_consolidacion(
+            {campo: registro[campo] for campo in ("referencia_catastral", "valor_referencia_oficial", "comparacion")
+             if campo in registro}
+            for registro in consolidados()
+        )
+        print(f"\n✓ Consolidación guardada en el almacén: {almacen.ruta}")
+        print("   Para el frontend: python almacen_catastral.py exportar")
+    else:
+        archivo_salida = os.path.join(directorio, "datos_catastrales_consolidados_completo.json")
+        escribir_json_atomico(archivo_salida, consolidados())
+        print(f"\n✓ Datos consolidados guardados en: {archivo_salida}")
 
     # Guardar resumen
-    archivo_resumen = "data/resumen_consolidado.json"
+    resumen = acumulador.resultado()
+    archivo_resumen = os.path.join(directorio, "resumen_consolidado.json")
     with open(archivo_resumen, 'w', encoding='utf-8') as f:
         json.dump(resumen, f, indent=2, ensure_ascii=False)
 
@@ -154,38 +318,23 @@ def consolidar_valoraciones():
         print(f"  Diferencia mínima:            {stats['diferencia_minima_porcentaje']:+.2f}%")
         print(f"  Diferencia máxima:            {stats['diferencia_maxima_porcentaje']:+.2f}%")
 
-    # Mostrar detalle por inmueble
     print("\n" + "=" * 60)
-    print("DETALLE POR INMUEBLE")
+    print("✅ CONSOLIDACIÓN COMPLETADA")
     print("=" * 60)
+    print()
 
-    for registro in consolidado:
-        ref = registro.get("referencia_catastral")
-        print(f"\n📋 {ref}")
-
-        if registro.get("valoracion_calculada"):
-            val_calc = registro["valoracion_calculada"].get("valor_estimado_euros", 0)
-            print(f"   💰 Valoración calculada: {val_calc:,.2f} €")
+    return resumen
 
-        if registro.get("valor_referencia_oficial"):
-            val_ref = registro["valor_referencia_oficial"].get("valor_referencia", 0)
-            print(f"   📊 Valor referencia oficial: {val_ref:,.2f} €")
 
-        if registro.get("comparacion"):
-            comp = registro["comparacion"]
-            print(f"   📈 Diferencia: {comp['diferencia_euros']:+,.2f} € ({comp['diferencia_porcentaje']:+.2f}%)")
-            if comp["mayor"] == "calculado":
-                print(f"      → Valoración calculada es {abs(comp['diferencia_porcentaje']):.2f}% mayor")
-            elif comp["mayor"] == "oficial":
-                print(f"      → Valor oficial es {abs(comp['diferencia_porcentaje']):.2f}% mayor")
-            else:
-                print(f"      → Valores son iguales")
+def main():
+    if "--almacen" in sys.argv:
+        from almacen_catastral import AlmacenCatastral
 
-    print("\n" + "=" * 60)
-    print("✅ CONSOLIDACIÓN COMPLETADA")
-    print("=" * 60)
-    print()
+        with AlmacenCatastral() as almacen:
+            consolidar_valoraciones(almacen=almacen)
+    else:
+        consolidar_valoraciones()
 
 
 if __name__ == "__main__":
-    consolidar_valoraciones()
+    main()
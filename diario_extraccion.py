@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Diario de los trabajos de extracción masiva
+
+Cada referencia procesada añade una línea a un archivo JSONL de solo
+escritura al final (estado, intento, fecha y, si se completó, sus datos).
+Al relanzar un trabajo interrumpido, el diario indica qué referencias ya
+están completadas, cuáles fallaron y cuántas veces, de modo que solo se
+procesan las pendientes y las fallidas que no han agotado sus intentos.
+
+El archivo consolidado se reconstruye a partir del diario cada pocas
+referencias, leyendo los datos del propio archivo y reemplazando el
+consolidado de forma atómica: nunca queda a medio escribir.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+
+COMPLETADA = "completada"
+FALLIDA = "fallida"
+
+# Intentos por referencia (sumando todas las ejecuciones) antes de darla por perdida
+MAX_INTENTOS = 3
+
+# Referencias completadas entre dos reconstrucciones del consolidado
+CONSOLIDAR_CADA = 10
+
+
+def escribir_json_atomico(ruta: str, elementos: Iterator[Dict]):
+    """
+    Escribe una lista JSON elemento a elemento y la coloca en su sitio con os.replace
+
+    El resultado es idéntico al de json.dump(lista, f, indent=2, ensure_ascii=False).
+    """
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        primero = True
+        for elemento in elementos:
+            f.write("[\n  " if primero else ",\n  ")
+            # Los saltos de línea de json.dumps son solo de formato (los de los textos van escapados)
+            f.write(json.dumps(elemento, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            primero = False
+        f.write("[]" if primero else "\n]")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class DiarioExtraccion:
+    """
+    Diario JSONL del estado de cada referencia de un trabajo de extracción
+
+    En memoria solo se guarda el estado de cada referencia y la posición en
+    el archivo de su última línea completada; los datos se leen del archivo
+    al consolidar. Es seguro entre hilos.
+    """
+
+    def __init__(self, ruta: str, max_intentos: int = MAX_INTENTOS, reiniciar: bool = False):
+        """
+        Args:
+            ruta: Archivo JSONL del diario
+            max_intentos: Intentos por referencia antes de dejar de reintentarla
+            reiniciar: Si True, descarta el diario anterior (opción --refresh)
+        """
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        self.ruta = ruta
+        self.max_intentos = max_intentos
+        self._estados: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self.consolidado: Optional[str] = None
+        self._orden: List[str] = []
+        self._consolidar_cada = CONSOLIDAR_CADA
+        self._sin_consolidar = 0
+
+        if reiniciar and os.path.exists(ruta):
+            os.remove(ruta)
+        self._cargar()
+        self._archivo = open(ruta, "ab")
+
+    def _cargar(self):
+        """Lee el diario existente, descartando una última línea a medio escribir"""
+        if not os.path.exists(self.ruta):
+            return
+
+        valido = 0
+        with open(self.ruta, "rb") as f:
+            while True:
+                posicion = f.tell()
+                linea = f.readline()
+                if not linea:
+                    break
+                try:
+                    if not linea.endswith(b"\n"):
+                        raise ValueError("línea incompleta")
+                    entrada = json.loads(linea)
+                except ValueError:
+                    print(f"⚠️  Diario {self.ruta}: se descarta una línea incompleta")
+                    break
+                self._aplicar(entrada, posicion)
+                valido = f.tell()
+
+        # Lo que siga a la última línea válida (una escritura interrumpida) se elimina
+        if valido < os.path.getsize(self.ruta):
+            with open(self.ruta, "r+b") as f:
+                f.truncate(valido)
+
+    def _aplicar(self, entrada: Dict, posicion: int):
+        estado = self._estados.setdefault(entrada["referencia"], {"estado": None, "intentos": 0, "posicion": None})
+        estado["estado"] = entrada["estado"]
+        estado["intentos"] = entrada["intento"]
+        if entrada["estado"] == COMPLETADA:
+            estado["posicion"] = posicion
+
+    def registrar(self, referencia: str, datos: Optional[Dict], error: Optional[str] = None):
+        """
+        Añade al diario el resultado de procesar una referencia
+
+        Args:
+            referencia: Referencia catastral
+            datos: Datos extraídos, o None si la extracción falló
+            error: Descripción del fallo
+        """
+        with self._lock:
+            intento = self._estados.get(referencia, {}).get("intentos", 0) + 1
+            entrada = {
+                "referencia": referencia,
+                "estado": COMPLETADA if datos else FALLIDA,
+                "intento": intento,
+                "fecha": datetime.now().isoformat(),
+            }
+            if datos:
+                entrada["datos"] = datos
+            else:
+                entrada["error"] = error or "No se pudieron extraer datos"
+
+            posicion = self._archivo.tell()
+            self._archivo.write(json.dumps(entrada, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+            self._aplicar(entrada, posicion)
+
+            if datos and self.consolidado:
+                self._sin_consolidar += 1
+                if self._sin_consolidar >= self._consolidar_cada:
+                    self._escribir_consolidado()
+
+    def completada(self, referencia: str) -> bool:
+        return self._estados.get(referencia, {}).get("estado") == COMPLETADA
+
+    def intentos(self, referencia: str) -> int:
+        return self._estados.get(referencia, {}).get("intentos", 0)
+
+    def pendientes(self, referencias: List[str]) -> List[str]:
+        """Referencias sin completar que aún no han agotado sus intentos"""
+        return [
+            ref for ref in dict.fromkeys(referencias)
+            if not self.completada(ref) and self.intentos(ref) < self.max_intentos
+        ]
+
+    def agotadas(self, referencias: List[str]) -> List[str]:
+        """Referencias fallidas en todos sus intentos"""
+        return [
+            ref for ref in dict.fromkeys(referencias)
+            if not self.completada(ref) and self.intentos(ref) >= self.max_intentos
+        ]
+
+    def iterar_datos(self, referencias: List[str]) -> Iterator[Dict]:
+        """Datos de las referencias completadas, en el orden indicado, leídos del diario"""
+        with open(self.ruta, "rb") as f:
+            for ref in dict.fromkeys(referencias):
+                posicion = self._estados.get(ref, {}).get("posicion")
+                if self.completada(ref) and posicion is not None:
+                    f.seek(posicion)
+                    yield json.loads(f.readline())["datos"]
+
+    def datos(self, referencias: List[str]) -> List[Dict]:
+        """Lista con los datos de las referencias completadas"""
+        return list(self.iterar_datos(referencias))
+
+    def vincular_consolidado(self, ruta: str, referencias: List[str], cada: int = CONSOLIDAR_CADA):
+        """
+        Reconstruye el consolidado cada `cada` referencias completadas
+
+        Args:
+            ruta: Archivo JSON consolidado
+            referencias: Orden de las referencias en el consolidado
+            cada: Referencias completadas entre dos reconstrucciones
+        """
+        self.consolidado = ruta
+        self._orden = list(referencias)
+        self._consolidar_cada = max(1, cada)
+
+    def _escribir_consolidado(self):
+        escribir_json_atomico(self.consolidado, self.iterar_datos(self._orden))
+        self._sin_consolidar = 0
+
+    def consolidar(self, ruta: Optional[str] = None, referencias: Optional[List[str]] = None) -> int:
+        """
+        Reconstruye el consolidado a partir del diario
+
+        Args:
+            ruta: Archivo JSON (por defecto, el vinculado)
+            referencias: Orden de las referencias (por defecto, el vinculado)
+
+        Returns:
+            Número de referencias en el consolidado
+        """
+        with self._lock:
+            if ruta is not None:
+                self.consolidado = ruta
+            if referencias is not None:
+                self._orden = list(referencias)
+            if not self.consolidado:
+                raise ValueError("No hay archivo consolidado vinculado al diario")
+
+            self._escribir_consolidado()
+            return sum(1 for ref in dict.fromkeys(self._orden) if self.completada(ref))
+
+    def resumen(self, referencias: List[str]) -> Dict[str, int]:
+        """Cuenta las referencias completadas, pendientes y agotadas"""
+        completadas = sum(1 for ref in dict.fromkeys(referencias) if self.completada(ref))
+        return {
+            "completadas": completadas,
+            "pendientes": len(self.pendientes(referencias)),
+            "agotadas": len(self.agotadas(referencias)),
+        }
+
+    def cerrar(self):
+        """Cierra el archivo del diario"""
+        with self._lock:
+            self._archivo.close()
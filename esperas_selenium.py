@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Esperas por eventos para los extractores con Selenium
+
+Sustituye las pausas fijas (time.sleep) por esperas sobre condiciones
+concretas del DOM: que aparezca la tabla de resultados, que DivErrorRC se
+haga visible o que cambie la URL. El tiempo máximo de cada paso se adapta a
+lo observado (percentil 95 de las últimas esperas) y se registra un
+histograma de tiempos por paso para ver en qué se van los segundos.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+# Límites superiores (segundos) de los intervalos del histograma
+LIMITES_HISTOGRAMA = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+# Timeout por defecto mientras no hay muestras suficientes de un paso
+TIMEOUT_INICIAL = 15.0
+TIMEOUT_MINIMO = 5.0
+TIMEOUT_MAXIMO = 60.0
+
+# Margen sobre el percentil 95 y muestras necesarias para adaptar el timeout
+MARGEN_TIMEOUT = 3.0
+MUESTRAS_MINIMAS = 5
+VENTANA_MUESTRAS = 50
+
+# Intervalo (segundos) con el que se comprueban las condiciones
+INTERVALO_SONDEO = 0.1
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class EstadisticasTiempos:
+    """
+    Tiempos de cada paso de los extractores y timeouts adaptativos
+
+    Puede compartirse entre varios navegadores (es segura entre hilos).
+    """
+
+    def __init__(self, timeout_inicial: float = TIMEOUT_INICIAL,
+                 timeout_minimo: float = TIMEOUT_MINIMO,
+                 timeout_maximo: float = TIMEOUT_MAXIMO,
+                 margen: float = MARGEN_TIMEOUT):
+        """
+        Args:
+            timeout_inicial: Timeout de un paso sin muestras suficientes
+            timeout_minimo: Límite inferior del timeout adaptativo
+            timeout_maximo: Límite superior del timeout adaptativo
+            margen: Factor aplicado al percentil 95 observado
+        """
+        self.timeout_inicial = timeout_inicial
+        self.timeout_minimo = timeout_minimo
+        self.timeout_maximo = timeout_maximo
+        self.margen = margen
+
+        self._lock = threading.Lock()
+        self._recientes = defaultdict(lambda: deque(maxlen=VENTANA_MUESTRAS))
+        self._histogramas = defaultdict(lambda: [0] * (len(LIMITES_HISTOGRAMA) + 1))
+        self._totales = defaultdict(float)
+        self._maximos = defaultdict(float)
+        self._agotados = defaultdict(int)
+        self._ultimo_agotado = set()
+
+    def registrar(self, paso: str, segundos: float, agotado: bool = False):
+        """
+        Registra la duración de un paso
+
+        Args:
+            paso: Nombre del paso (ej: "resultado")
+            segundos: Duración de la espera
+            agotado: True si la espera terminó por timeout
+        """
+        with self._lock:
+            self._histogramas[paso][bisect_right(LIMITES_HISTOGRAMA, segundos)] += 1
+            self._totales[paso] += segundos
+            self._maximos[paso] = max(self._maximos[paso], segundos)
+
+            if agotado:
+                self._agotados[paso] += 1
+                self._ultimo_agotado.add(paso)
+            else:
+                self._recientes[paso].append(segundos)
+                self._ultimo_agotado.discard(paso)
+
+    def timeout(self, paso: str) -> float:
+        """
+        Timeout adaptativo de un paso
+
+        Es el percentil 95 de las últimas esperas multiplicado por el margen,
+        acotado entre el mínimo y el máximo. Tras un timeout, el siguiente
+        intento del paso usa el máximo.
+        """
+        with self._lock:
+            if paso in self._ultimo_agotado:
+                return self.timeout_maximo
+
+            recientes = self._recientes[paso]
+            if len(recientes) < MUESTRAS_MINIMAS:
+                return self.timeout_inicial
+
+            adaptado = _percentil(list(recientes), 0.95) * self.margen
+
+        return min(self.timeout_maximo, max(self.timeout_minimo, adaptado))
+
+    def resumen(self) -> Dict[str, Dict]:
+        """
+        Devuelve las estadísticas de cada paso
+
+        Returns:
+            Diccionario {paso: {n, total, media, p50, p95, max, agotados, histograma}}
+        """
+        etiquetas = [f"<{limite}s" for limite in LIMITES_HISTOGRAMA] + [f">={LIMITES_HISTOGRAMA[-1]}s"]
+
+        with self._lock:
+            resumen = {}
+            for paso, histograma in self._histogramas.items():
+                n = sum(histograma)
+                recientes = list(self._recientes[paso])
+                resumen[paso] = {
+                    "n": n,
+                    "total": round(self._totales[paso], 3),
+                    "media": round(self._totales[paso] / n, 3),
+                    "p50": round(_percentil(recientes, 0.5), 3) if recientes else None,
+                    "p95": round(_percentil(recientes, 0.95), 3) if recientes else None,
+                    "max": round(self._maximos[paso], 3),
+                    "agotados": self._agotados[paso],
+                    "histograma": dict(zip(etiquetas, histograma)),
+                }
+            return resumen
+
+    def imprimir_resumen(self):
+        """Muestra por pantalla los tiempos de cada paso, de más a menos costoso"""
+        resumen = self.resumen()
+        if not resumen:
+            return
+
+        print("\n⏱️  TIEMPOS POR PASO")
+        print(f"  {'Paso':<20} {'n':>5} {'total':>9} {'media':>8} {'p95':>8} {'máx':>8} {'timeouts':>9}")
+
+        for paso, datos in sorted(resumen.items(), key=lambda item: -item[1]["total"]):
+            p95 = f"{datos['p95']:.2f}s" if datos["p95"] is not None else "-"
+            print(f"  {paso:<20} {datos['n']:>5} {datos['total']:>8.1f}s {datos['media']:>7.2f}s "
+                  f"{p95:>8} {datos['max']:>7.2f}s {datos['agotados']:>9}")
+
+            maximo = max(datos["histograma"].values())
+            for etiqueta, cuenta in datos["histograma"].items():
+                if cuenta:
+                    barra = "█" * max(1, round(20 * cuenta / maximo))
+                    print(f"      {etiqueta:>7} {barra} {cuenta}")
+
+
+# Estadísticas compartidas por defecto por todos los extractores del proceso
+ESTADISTICAS = EstadisticasTiempos()
+
+
+class EsperasSelenium:
+    """
+    Esperas sobre condiciones del DOM con timeout adaptativo y medición de tiempos
+    """
+
+    def __init__(self, driver, estadisticas: Optional[EstadisticasTiempos] = None):
+        """
+        Args:
+            driver: WebDriver de Selenium
+            estadisticas: Estadísticas donde registrar los tiempos (por defecto, las compartidas)
+        """
+        self.driver = driver
+        self.estadisticas = estadisticas if estadisticas is not None else ESTADISTICAS
+
+    def hasta(self, paso: str, condicion, timeout: Optional[float] = None,
+              intervalo: float = INTERVALO_SONDEO):
+        """
+        Espera a que se cumpla una condición y registra cuánto ha tardado
+
+        Args:
+            paso: Nombre del paso para las estadísticas
+            condicion: Función driver -> valor (como las de expected_conditions)
+            timeout: Segundos máximos (por defecto, el adaptativo del paso)
+            intervalo: Segundos entre comprobaciones
+
+        Returns:
+            El valor devuelto por la condición
+
+        Raises:
+            TimeoutException: Si la condición no se cumple a tiempo
+        """
+        limite = timeout if timeout is not None else self.estadisticas.timeout(paso)
+        inicio = time.monotonic()
+
+        try:
+            # Durante una navegación los elementos pueden quedar obsoletos: se reintenta
+            resultado = WebDriverWait(
+                self.driver, limite, poll_frequency=intervalo,
+                ignored_exceptions=(StaleElementReferenceException,)
+            ).until(condicion)
+        except TimeoutException:
+            self.estadisticas.registrar(paso, time.monotonic() - inicio, agotado=True)
+            raise
+
+        self.estadisticas.registrar(paso, time.monotonic() - inicio)
+        return resultado
+
+    @contextmanager
+    def medir(self, paso: str):
+        """Mide un bloque de código (navegación, extracción...) como un paso más"""
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.estadisticas.registrar(paso, time.monotonic() - inicio)
+
+    def presente(self, paso: str, localizador: Tuple[str, str], timeout: Optional[float] = None):
+        """Espera a que un elemento exista en el DOM y lo devuelve"""
+        return self.hasta(paso, EC.presence_of_element_located(localizador), timeout)
+
+    def visible(self, paso: str, localizador: Tuple[str, str], timeout: Optional[float] = None):
+        """Espera a que un elemento sea visible y lo devuelve"""
+        return self.hasta(paso, EC.visibility_of_element_located(localizador), timeout)
+
+    def clicable(self, paso: str, localizador: Tuple[str, str], timeout: Optional[float] = None):
+        """Espera a que un elemento sea visible y esté habilitado, y lo devuelve"""
+        return self.hasta(paso, EC.element_to_be_clickable(localizador), timeout)
+
+    def url_cambia(self, paso: str, url_anterior: str, timeout: Optional[float] = None) -> str:
+        """Espera a que la URL deje de ser url_anterior y devuelve la nueva"""
+        self.hasta(paso, EC.url_changes(url_anterior), timeout)
+        return self.driver.current_url
+
+    def url_contiene(self, paso: str, fragmento: str, timeout: Optional[float] = None,
+                     intervalo: float = INTERVALO_SONDEO):
+        """Espera a que la URL contenga un fragmento"""
+        return self.hasta(paso, EC.url_contains(fragmento), timeout, intervalo)
+
+    def resultado_o_error(self, paso: str, localizador_resultado: Tuple[str, str],
+                          localizador_error: Tuple[str, str],
+                          timeout: Optional[float] = None) -> str:
+        """
+        Espera a que aparezca el resultado o a que se muestre el error
+
+        Returns:
+            "resultado" o "error", según lo que ocurra antes
+        """
+        def condicion(driver):
+            if driver.find_elements(*localizador_resultado):
+                return "resultado"
+            errores = driver.find_elements(*localizador_error)
+            if errores and errores[0].is_displayed():
+                return "error"
+            return False
+
+        return self.hasta(paso, condicion, timeout)
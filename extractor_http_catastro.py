@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Extractor de datos del catastro por HTTP directo, sin navegador
+
+La ficha de un inmueble es accesible directamente en OVCConCiud.aspx con la
+referencia en la URL. Este extractor la descarga con una sesión HTTP con
+conexiones reutilizables y la procesa con lxml (parser_ovc_catastro),
+produciendo el mismo diccionario que CatastroRealScraper. Solo si la sede
+bloquea las peticiones se recurre a Selenium.
+"""
+
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_catastro import CacheCatastro
+from catastro_service import LimitadorCortesia
+from diario_extraccion import DiarioExtraccion
+from parser_ovc_catastro import cargar_documento, construir_datos, hay_error_referencia, parsear_ficha
+
+# Misma fuente que extraer_datos_reales: ambos extractores comparten las entradas de caché
+ENDPOINT_CACHE = "sede_datos"
+
+# Diario del trabajo (el mismo que el del extractor con Selenium: son intercambiables)
+ARCHIVO_DIARIO = "diario_datos_catastrales.jsonl"
+
+# Segundos mínimos entre dos consultas a la sede
+INTERVALO_CORTESIA = 3.0
+
+# Códigos con los que la sede (o su cortafuegos) rechaza las peticiones
+CODIGOS_BLOQUEO = {403, 429, 503}
+
+# Referencias rústicas: provincia (2), municipio (3), sector (letra), polígono y parcela
+_REFERENCIA_RUSTICA = re.compile(r"^(\d{2})(\d{3})[A-Z]\d{8}")
+
+# Cabeceras de un navegador normal
+CABECERAS_NAVEGADOR = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Referer': 'https://www1.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx'
+}
+
+
+class ExtractorHttpCatastro:
+    """
+    Extractor de fichas OVCConCiud por HTTP con respaldo en Selenium
+    """
+
+    # URL de la ficha del inmueble
+    URL_FICHA = "https://www1.sedecatastro.gob.es/CYCBienInmueble/OVCConCiud.aspx"
+
+    def __init__(self, cache: Optional[CacheCatastro] = None,
+                 intervalo_cortesia: float = INTERVALO_CORTESIA,
+                 conexiones: int = 2, timeout: float = 30,
+                 usar_selenium: bool = True, headless: bool = True):
+        """
+        Args:
+            cache: Caché en disco que se consulta antes de acceder a la sede
+            intervalo_cortesia: Segundos mínimos entre consultas (global a todos los hilos)
+            conexiones: Consultas simultáneas (y tamaño del pool de conexiones)
+            timeout: Timeout de cada petición en segundos
+            usar_selenium: Si True, recurre a Selenium cuando la sede bloquea las peticiones
+            headless: Si el navegador de respaldo se ejecuta sin ventana
+        """
+        self.cache = cache
+        self.limitador = LimitadorCortesia(intervalo_cortesia)
+        self.conexiones = max(1, conexiones)
+        self.timeout = timeout
+        self.usar_selenium = usar_selenium
+        self.headless = headless
+        self.data_dir = "data"
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        self.session.headers.update(CABECERAS_NAVEGADOR)
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.conexiones)
+        self.session.mount("https://", adaptador)
+        self.session.mount("http://", adaptador)
+
+        # Una vez bloqueados, el resto de referencias va directamente a Selenium
+        self.bloqueado = False
+        self.contadores = Counter()
+        self._scraper = None
+        self._lock = threading.Lock()
+
+    def parametros_ficha(self, referencia: str) -> Dict[str, str]:
+        """
+        Parámetros de la URL de la ficha, como los envía el formulario de búsqueda
+
+        Para las referencias rústicas la delegación y el municipio salen de la
+        propia referencia; en las urbanas no se pueden deducir y se omiten.
+        """
+        parametros = {
+            "UrbRus": "U",
+            "RefC": referencia,
+            "esBice": "",
+            "RCBice1": "",
+            "RCBice2": "",
+            "DenoBice": "",
+            "from": "OVCBusqueda",
+            "pest": "rc",
+            "RCCompleta": referencia,
+            "final": "",
+        }
+
+        rustica = _REFERENCIA_RUSTICA.match(referencia)
+        if rustica:
+            parametros["UrbRus"] = "R"
+            parametros["del"] = str(int(rustica.group(1)))
+            parametros["mun"] = str(int(rustica.group(2)))
+
+        return parametros
+
+    def descargar_ficha(self, referencia: str) -> Tuple[str, Optional[Dict], str]:
+        """
+        Descarga y procesa la ficha de una referencia
+
+        Returns:
+            (estado, ficha, url): estado es "resultado", "error" (la referencia
+            no existe) o "bloqueado" (la sede no ha devuelto la ficha)
+        """
+        self.limitador.esperar()
+
+        try:
+            respuesta = self.session.get(self.URL_FICHA, params=self.parametros_ficha(referencia),
+                                         timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"  ⚠️  Error de red: {e}")
+            return "bloqueado", None, self.URL_FICHA
+
+        if respuesta.status_code in CODIGOS_BLOQUEO:
+            print(f"  🚫 La sede ha respondido {respuesta.status_code}")
+            return "bloqueado", None, respuesta.url
+
+        documento = cargar_documento(respuesta.content)
+        ficha = parsear_ficha(documento)
+
+        if ficha is not None:
+            return "resultado", ficha, respuesta.url
+        if hay_error_referencia(documento):
+            return "error", None, respuesta.url
+
+        # Ni ficha ni aviso de error: captcha, cortafuegos o página inesperada
+        print(f"  🚫 La sede no ha devuelto la ficha (HTTP {respuesta.status_code})")
+        return "bloqueado", None, respuesta.url
+
+    def _scraper_selenium(self):
+        """Crea el extractor con Selenium de respaldo la primera vez que hace falta"""
+        if self._scraper is None:
+            from extraer_datos_reales import CatastroRealScraper
+
+            self._scraper = CatastroRealScraper(headless=self.headless, cache=self.cache)
+            self._scraper.data_dir = self.data_dir
+            # Mismo intervalo de cortesía para los dos caminos
+            self._scraper.limitador = self.limitador
+        return self._scraper
+
+    def _extraer_con_selenium(self, referencia: str) -> Optional[Dict]:
+        """Extrae una referencia con el navegador (uno solo, compartido)"""
+        if not self.usar_selenium:
+            return None
+
+        if importlib.util.find_spec("selenium") is None:
+            print("  ❌ Selenium no está instalado: no se puede usar el navegador de respaldo")
+            return None
+
+        with self._lock:
+            self.contadores["selenium"] += 1
+            return self._scraper_selenium().extraer_datos_catastro(referencia)
+
+    def extraer_datos_catastro(self, referencia: str) -> Optional[Dict]:
+        """
+        Extrae los datos de una referencia
+
+        Args:
+            referencia: Referencia catastral
+
+        Returns:
+            Diccionario con los datos extraídos (mismo formato que
+            CatastroRealScraper) o None si hay error
+        """
+        if self.cache is not None:
+            datos = self.cache.obtener_json(ENDPOINT_CACHE, referencia)
+            if datos is not None:
+                print(f"  💾 Datos obtenidos de la caché")
+                self.contadores["cache"] += 1
+                return datos
+
+        if self.bloqueado:
+            return self._extraer_con_selenium(referencia)
+
+        estado, ficha, url = self.descargar_ficha(referencia)
+
+        if estado == "error":
+            print(f"  ❌ Error: Referencia catastral no encontrada")
+            self.contadores["no_encontradas"] += 1
+            return None
+
+        if estado == "bloqueado":
+            if self.usar_selenium:
+                print(f"  🌐 Se continúa con el navegador")
+            self.bloqueado = True
+            return self._extraer_con_selenium(referencia)
+
+        datos = construir_datos(referencia, url, ficha)
+        self.contadores["http"] += 1
+
+        if self.cache is not None:
+            self.cache.guardar_json(ENDPOINT_CACHE, referencia, datos)
+
+        return datos
+
+    def _procesar(self, indice: int, total: int, referencia: str,
+                  diario: Optional[DiarioExtraccion]) -> Optional[Dict]:
+        print(f"\n[{indice + 1}/{total}] Procesando: {referencia}")
+
+        datos = self.extraer_datos_catastro(referencia)
+
+        if diario is not None:
+            diario.registrar(referencia, datos)
+
+        if datos:
+            archivo = os.path.join(self.data_dir, f"{referencia}.json")
+            with open(archivo, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, indent=2, ensure_ascii=False)
+            print(f"  💾 Guardado en: {archivo}")
+        else:
+            print(f"  ✗ No se pudieron extraer datos: {referencia}")
+
+        return datos
+
+    def procesar_lista(self, referencias: List[str],
+                       diario: Optional[DiarioExtraccion] = None) -> List[Dict]:
+        """
+        Extrae los datos de una lista de referencias
+
+        Args:
+            referencias: Lista de referencias catastrales
+            diario: Diario donde anotar el resultado de cada referencia
+
+        Returns:
+            Datos extraídos, en el orden de las referencias (sin las fallidas)
+        """
+        total = len(referencias)
+        with ThreadPoolExecutor(max_workers=self.conexiones) as executor:
+            resultados = list(executor.map(
+                lambda item: self._procesar(item[0], total, item[1], diario), enumerate(referencias)
+            ))
+
+        return [datos for datos in resultados if datos]
+
+    def cerrar(self):
+        """Cierra la sesión HTTP y, si se llegó a abrir, el navegador de respaldo"""
+        self.session.close()
+        if self._scraper is not None:
+            self._scraper.cerrar_navegador()
+
+
+def main():
+    """
+    Función principal
+
+    Uso: python extractor_http_catastro.py [archivo] [--refresh] [--sin-navegador]
+    (--refresh ignora la caché en disco y el diario de ejecuciones
+    anteriores; --sin-navegador no recurre a Selenium
+    aunque la sede bloquee las peticiones)
+    """
+    argumentos = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    archivo_referencias = argumentos[0] if argumentos else "referencias.txt"
+
+    print("=" * 60)
+    print("  EXTRACTOR DE DATOS DEL CATASTRO POR HTTP")
+    print("=" * 60)
+
+    if not os.path.exists(archivo_referencias):
+        print(f"❌ No se encontró '{archivo_referencias}'")
+        return
+
+    with open(archivo_referencias, 'r', encoding='utf-8') as f:
+        referencias = [linea.strip() for linea in f if linea.strip() and not linea.startswith('#')]
+
+    print(f"\n✓ Encontradas {len(referencias)} referencias")
+
+    extractor = ExtractorHttpCatastro(
+        cache=CacheCatastro(refrescar="--refresh" in sys.argv),
+        usar_selenium="--sin-navegador" not in sys.argv
+    )
+
+    diario = DiarioExtraccion(os.path.join(extractor.data_dir, ARCHIVO_DIARIO),
+                              reiniciar="--refresh" in sys.argv)
+    archivo_consolidado = os.path.join(extractor.data_dir, "datos_catastrales_consolidados.json")
+    diario.vincular_consolidado(archivo_consolidado, referencias)
+
+    pendientes = diario.pendientes(referencias)
+    print(f"📒 Pendientes según el diario: {len(pendientes)}")
+
+    try:
+        extractor.procesar_lista(pendientes, diario)
+    finally:
+        extractor.cerrar()
+        estado = diario.resumen(referencias)
+        if estado["completadas"]:
+            diario.consolidar()
+            print(f"\n✓ Datos consolidados guardados en: {archivo_consolidado}")
+        diario.cerrar()
+
+    print("\n" + "=" * 60)
+    print(f"Referencias extraídas: {estado['completadas']}/{len(referencias)}")
+    if estado["agotadas"]:
+        print(f"  sin más reintentos: {estado['agotadas']}")
+    for origen, cuenta in sorted(extractor.contadores.items()):
+        print(f"  {origen}: {cuenta}")
+    if extractor.bloqueado:
+        print("⚠️  La sede bloqueó las peticiones HTTP directas")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,43 +7,76 @@ Extrae datos reales accediendo al formulario de búsqueda oficial
 import time
 import json
 import os
-import re
-from datetime import datetime
+import queue
+import sys
+import threading
 from typing import Dict, Optional, List
 
 try:
     from selenium import webdriver
     from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
     from selenium.webdriver.chrome.options import Options
-    from selenium.common.exceptions import TimeoutException, NoSuchElementException
+    from selenium.common.exceptions import TimeoutException
 except ImportError:
     print("❌ ERROR: Selenium no está instalado")
     print("\nInstala con: pip install selenium")
     print("\nTambién necesitas Chrome instalado en tu sistema")
     exit(1)
 
+from cache_catastro import CacheCatastro
+from catastro_service import LimitadorCortesia
+from diario_extraccion import DiarioExtraccion
+from esperas_selenium import ESTADISTICAS, EsperasSelenium
+from parser_ovc_catastro import construir_datos, parsear_ficha, parsear_localizacion
+
+# Nombre de esta fuente en la caché de consultas al Catastro
+ENDPOINT_CACHE = "sede_datos"
+
+# Diario de progreso de procesar_referencias (dentro de data_dir)
+ARCHIVO_DIARIO = "diario_datos_catastrales.jsonl"
+
+# Segundos mínimos entre dos consultas a la sede, sumando todos los navegadores
+INTERVALO_CORTESIA = 3.0
+
 
 class CatastroRealScraper:
     """
     Extractor REAL de datos del catastro usando Selenium
     """
 
-    def __init__(self, headless: bool = False):
+    # URL del formulario de búsqueda
+    URL_BUSQUEDA = "https://www1.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx"
+
+    def __init__(self, headless: bool = False, cache: Optional[CacheCatastro] = None,
+                 num_navegadores: int = 1, intervalo_cortesia: float = INTERVALO_CORTESIA):
         """
         Inicializa el scraper
 
         Args:
             headless: Si True, ejecuta Chrome sin ventana visible
+            cache: Caché en disco que se consulta antes de abrir el navegador
+            num_navegadores: Número de navegadores que procesan referencias en paralelo
+            intervalo_cortesia: Segundos mínimos entre consultas (global a todos los navegadores)
         """
         self.headless = headless
         self.driver = None
+        self.cache = cache
+        self.num_navegadores = max(1, num_navegadores)
+        self.limitador = LimitadorCortesia(intervalo_cortesia)
         self.data_dir = "data"
         os.makedirs(self.data_dir, exist_ok=True)
 
     def iniciar_navegador(self):
         """Inicia Chrome con Selenium"""
+        self.driver = self.crear_navegador()
+
+    def crear_navegador(self):
+        """
+        Crea una instancia de Chrome con Selenium
+
+        Returns:
+            WebDriver listo para usar
+        """
         print("🌐 Iniciando navegador Chrome...")
 
         chrome_options = Options()
@@ -62,9 +95,10 @@ class CatastroRealScraper:
         chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
 
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.driver.maximize_window()
+            driver = webdriver.Chrome(options=chrome_options)
+            driver.maximize_window()
             print("✓ Navegador iniciado correctamente\n")
+            return driver
         except Exception as e:
             print(f"❌ Error al iniciar Chrome: {e}")
             print("\nAsegúrate de tener Chrome instalado.")
@@ -82,254 +116,222 @@ class CatastroRealScraper:
 
         Ejemplo: "Polígono 2 Parcela 9\nEL LLOMBO. PLANES (ALICANTE)"
         """
-        resultado = {
-            "poligono": "",
-            "parcela": "",
-            "partida": "",
-            "municipio": "",
-            "provincia": ""
-        }
-
-        try:
-            # Dividir por saltos de línea
-            lineas = texto_localizacion.strip().split('\n')
-
-            # Primera línea: Polígono X Parcela Y
-            if len(lineas) > 0:
-                primera = lineas[0]
-
-                # Extraer Polígono
-                match_pol = re.search(r'Polígono\s+(\d+)', primera, re.IGNORECASE)
-                if match_pol:
-                    resultado["poligono"] = match_pol.group(1)
-
-                # Extraer Parcela
-                match_par = re.search(r'Parcela\s+(\d+)', primera, re.IGNORECASE)
-                if match_par:
-                    resultado["parcela"] = match_par.group(1)
-
-            # Segunda línea: PARTIDA. MUNICIPIO (PROVINCIA)
-            if len(lineas) > 1:
-                segunda = lineas[1]
-
-                # Extraer Provincia (entre paréntesis)
-                match_prov = re.search(r'\(([^)]+)\)', segunda)
-                if match_prov:
-                    resultado["provincia"] = match_prov.group(1).strip()
-                    # Quitar la provincia del texto
-                    segunda = re.sub(r'\([^)]+\)', '', segunda).strip()
-
-                # Lo que queda: PARTIDA. MUNICIPIO
-                partes = segunda.split('.')
-                if len(partes) >= 2:
-                    resultado["partida"] = partes[0].strip()
-                    resultado["municipio"] = partes[1].strip()
-                elif len(partes) == 1:
-                    # Si solo hay una parte, asumir que es municipio
-                    resultado["municipio"] = partes[0].strip()
+        return parsear_localizacion(texto_localizacion)
 
-        except Exception as e:
-            print(f"      ⚠️  Error parseando localización: {e}")
-
-        return resultado
-
-    def extraer_datos_catastro(self, referencia: str) -> Optional[Dict]:
+    def extraer_datos_catastro(self, referencia: str, driver=None) -> Optional[Dict]:
         """
         Extrae datos REALES del catastro para una referencia
 
         Args:
             referencia: Referencia catastral
+            driver: Navegador a usar (por defecto, el del scraper)
 
         Returns:
             Diccionario con los datos extraídos o None si hay error
         """
-        # URL del formulario de búsqueda
-        url = "https://www1.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx"
+        if self.cache is not None:
+            datos = self.cache.obtener_json(ENDPOINT_CACHE, referencia)
+            if datos is not None:
+                print(f"  💾 Datos obtenidos de la caché")
+                return datos
+
+        # El navegador solo se inicia si hace falta consultar la sede
+        if driver is None:
+            if self.driver is None:
+                self.iniciar_navegador()
+            driver = self.driver
 
         try:
-            print(f"  📡 Accediendo al formulario de búsqueda...")
-            self.driver.get(url)
+            # Respetar el intervalo de cortesía común a todos los navegadores
+            self.limitador.esperar()
+
+            esperas = EsperasSelenium(driver)
 
-            # Esperar a que cargue el formulario
-            wait = WebDriverWait(self.driver, 15)
+            print(f"  📡 Accediendo al formulario de búsqueda...")
+            with esperas.medir("navegacion"):
+                driver.get(self.URL_BUSQUEDA)
 
             # Buscar el input de referencia catastral: ctl00_Contenido_txtRC2
             print(f"  ✏️  Introduciendo referencia catastral...")
-            input_ref = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Contenido_txtRC2"))
-            )
+            input_ref = esperas.presente("formulario", (By.ID, "ctl00_Contenido_txtRC2"))
 
             # Limpiar y escribir la referencia
             input_ref.clear()
             input_ref.send_keys(referencia)
 
-            time.sleep(1)
-
             # Hacer clic en el botón DATOS: ctl00_Contenido_btnDatos
             print(f"  🔍 Buscando datos...")
-            boton_datos = wait.until(
-                EC.element_to_be_clickable((By.ID, "ctl00_Contenido_btnDatos"))
-            )
+            boton_datos = esperas.clicable("boton_datos", (By.ID, "ctl00_Contenido_btnDatos"))
             boton_datos.click()
 
-            # Esperar a que cargue la página de resultados
-            time.sleep(3)
+            # Esperar a la ficha del inmueble o al mensaje de error
+            estado = esperas.resultado_o_error(
+                "resultado",
+                (By.ID, "ctl00_Contenido_tblInmueble"),
+                (By.ID, "DivErrorRC")
+            )
 
-            # Verificar si hay error
-            try:
-                error = self.driver.find_element(By.ID, "DivErrorRC")
-                if error.is_displayed():
-                    print(f"  ❌ Error: Referencia catastral no encontrada")
-                    return None
-            except NoSuchElementException:
-                pass  # No hay error, continuamos
+            if estado == "error":
+                print(f"  ❌ Error: Referencia catastral no encontrada")
+                return None
 
             print(f"  📊 Extrayendo datos del inmueble...")
+            inicio_extraccion = time.monotonic()
 
-            # Inicializar estructura de datos
-            datos = {
-                "referencia_catastral": referencia,
-                "fecha_extraccion": datetime.now().isoformat(),
-                "url_consultada": self.driver.current_url,
-                "datos_descriptivos": {},
-                "parcela_catastral": {},
-                "cultivos": []
-            }
-
-            # === EXTRAER DATOS DESCRIPTIVOS DEL INMUEBLE ===
-            try:
-                # Buscar el contenedor: ctl00_Contenido_tblInmueble
-                tabla_inmueble = self.driver.find_element(By.ID, "ctl00_Contenido_tblInmueble")
-
-                # Extraer todos los form-group
-                grupos = tabla_inmueble.find_elements(By.CLASS_NAME, "form-group")
-
-                for grupo in grupos:
-                    try:
-                        # Buscar label (col-md-4) y valor (col-md-8)
-                        label_elem = grupo.find_element(By.CLASS_NAME, "col-md-4")
-                        valor_elem = grupo.find_element(By.CLASS_NAME, "col-md-8")
+            datos = construir_datos(referencia, driver.current_url, self.extraer_ficha(driver))
 
-                        label = label_elem.text.strip()
-                        valor = valor_elem.text.strip()
-
-                        if label and valor:
-                            # Procesar según el campo
-                            if "Referencia catastral" in label:
-                                # Limpiar iconos y espacios extras
-                                valor_limpio = re.sub(r'copiar|código de barras', '', valor, flags=re.IGNORECASE).strip()
-                                datos["datos_descriptivos"]["referencia_catastral"] = valor_limpio
-
-                            elif "Localización" in label or "Localizacion" in label:
-                                # Parsear localización
-                                loc_parseada = self.parsear_localizacion(valor)
-                                datos["datos_descriptivos"]["localizacion"] = {
-                                    "texto_completo": valor,
-                                    "poligono": loc_parseada["poligono"],
-                                    "parcela": loc_parseada["parcela"],
-                                    "partida": loc_parseada["partida"],
-                                    "municipio": loc_parseada["municipio"],
-                                    "provincia": loc_parseada["provincia"]
-                                }
+            esperas.estadisticas.registrar("extraccion", time.monotonic() - inicio_extraccion)
+            print(f"  ✅ Extracción completada para: {referencia}")
 
-                            elif "Clase" in label:
-                                datos["datos_descriptivos"]["clase"] = valor
+            if self.cache is not None:
+                self.cache.guardar_json(ENDPOINT_CACHE, referencia, datos)
 
-                            elif "Uso principal" in label:
-                                datos["datos_descriptivos"]["uso_principal"] = valor
+            return datos
 
-                            else:
-                                # Cualquier otro campo
-                                datos["datos_descriptivos"][label.lower().replace(" ", "_")] = valor
+        except TimeoutException:
+            print(f"  ❌ Timeout: La página tardó demasiado en cargar")
+            return None
+        except Exception as e:
+            print(f"  ❌ Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
 
-                    except Exception as e:
-                        continue
+    def extraer_ficha(self, driver) -> Dict:
+        """
+        Extrae los bloques de la ficha del inmueble cargada en el navegador
 
-                print(f"      ✓ Datos descriptivos extraídos")
+        Lee el HTML de la página con una sola llamada al navegador
+        (page_source) y lo procesa localmente con el mismo parser que el
+        extractor HTTP, en lugar de pedir cada etiqueta y cada celda por
+        separado.
 
-            except Exception as e:
-                print(f"      ⚠️  Error extrayendo datos descriptivos: {e}")
+        Args:
+            driver: Navegador con la página OVCConCiud cargada
 
-            # === EXTRAER PARCELA CATASTRAL ===
-            try:
-                # Buscar el contenedor: ctl00_Contenido_tblFinca
-                tabla_finca = self.driver.find_element(By.ID, "ctl00_Contenido_tblFinca")
+        Returns:
+            {"datos_descriptivos", "parcela_catastral", "cultivos"}
+        """
+        ficha = parsear_ficha(driver.page_source)
 
-                grupos = tabla_finca.find_elements(By.CLASS_NAME, "form-group")
+        if ficha is None:
+            print(f"      ⚠️  La página no contiene la ficha del inmueble")
+            return {
+                "datos_descriptivos": {},
+                "parcela_catastral": {},
+                "cultivos": []
+            }
 
-                for grupo in grupos:
-                    try:
-                        label_elem = grupo.find_element(By.CLASS_NAME, "col-md-3")
-                        valor_elem = grupo.find_element(By.CLASS_NAME, "col-md-9")
+        print(f"      ✓ Datos descriptivos extraídos")
+        if ficha["parcela_catastral"]:
+            print(f"      ✓ Parcela catastral extraída")
+        if ficha["cultivos"]:
+            print(f"      ✓ {len(ficha['cultivos'])} cultivo(s) extraído(s)")
+        else:
+            print(f"      ℹ️  No hay datos de cultivos (puede ser normal para urbanos)")
+
+        return ficha
+
+    def _necesita_navegador(self, referencia: str) -> bool:
+        """Indica si una referencia no está vigente en la caché"""
+        if self.cache is None:
+            return True
+        entrada = self.cache.entrada(ENDPOINT_CACHE, referencia)
+        return entrada is None or not entrada.fresca
+
+    def _trabajador(self, cola: queue.Queue, resultados: List[Optional[Dict]],
+                    diario: Optional[DiarioExtraccion] = None):
+        """
+        Procesa referencias de la cola compartida con un navegador propio
 
-                        label = label_elem.text.strip()
-                        valor = valor_elem.text.strip()
+        El navegador se crea al necesitarlo por primera vez y se reutiliza
+        para todas las referencias que procese este trabajador. Si hay
+        diario, cada resultado se anota en él en cuanto se obtiene.
+        """
+        driver = None
 
-                        if label and valor:
-                            # Saltar Localización (ya la tenemos)
-                            if "Localización" in label or "Localizacion" in label:
-                                continue
+        try:
+            while True:
+                try:
+                    indice, ref = cola.get_nowait()
+                except queue.Empty:
+                    return
 
-                            # Limpiar etiquetas HTML del valor
-                            valor_limpio = re.sub(r'<[^>]+>', '', valor)
+                print(f"\n[{indice + 1}/{len(resultados)}] Procesando: {ref}")
+                print("-" * 60)
 
-                            datos["parcela_catastral"][label.lower().replace(" ", "_")] = valor_limpio
+                if driver is None and self._necesita_navegador(ref):
+                    driver = self.crear_navegador()
 
-                    except Exception as e:
-                        continue
+                datos = self.extraer_datos_catastro(ref, driver)
 
-                print(f"      ✓ Parcela catastral extraída")
+                if diario is not None:
+                    diario.registrar(ref, datos)
 
-            except Exception as e:
-                print(f"      ⚠️  Error extrayendo parcela catastral: {e}")
+                if datos:
+                    resultados[indice] = datos
 
-            # === EXTRAER CULTIVOS ===
-            try:
-                # Buscar la tabla de cultivos: ctl00_Contenido_tblCultivos
-                tabla_cultivos = self.driver.find_element(By.ID, "ctl00_Contenido_tblCultivos")
+                    # Guardar individualmente
+                    archivo = os.path.join(self.data_dir, f"{ref}.json")
+                    with open(archivo, 'w', encoding='utf-8') as f:
+                        json.dump(datos, f, indent=2, ensure_ascii=False)
+                    print(f"  💾 Guardado en: {archivo}")
+                else:
+                    print(f"  ✗ No se pudieron extraer datos: {ref}")
+        finally:
+            if driver is not None:
+                driver.quit()
 
-                # Extraer filas (saltando el header)
-                filas = tabla_cultivos.find_elements(By.TAG_NAME, "tr")[1:]  # Saltar header
+    def procesar_lista(self, referencias: List[str],
+                       diario: Optional[DiarioExtraccion] = None) -> List[Dict]:
+        """
+        Extrae los datos de una lista de referencias con el pool de navegadores
 
-                for fila in filas:
-                    celdas = fila.find_elements(By.TAG_NAME, "td")
+        Cada uno de los `num_navegadores` trabajadores toma referencias de una
+        cola compartida y reutiliza su navegador; el limitador de cortesía es
+        común a todos ellos.
 
-                    if len(celdas) >= 4:
-                        cultivo = {
-                            "subparcela": celdas[0].text.strip(),
-                            "cultivo_aprovechamiento": celdas[1].text.strip(),
-                            "intensidad_productiva": celdas[2].text.strip(),
-                            "superficie_m2": celdas[3].text.strip()
-                        }
-                        datos["cultivos"].append(cultivo)
+        Args:
+            referencias: Lista de referencias catastrales
+            diario: Diario donde anotar el resultado de cada referencia
 
-                if datos["cultivos"]:
-                    print(f"      ✓ {len(datos['cultivos'])} cultivo(s) extraído(s)")
+        Returns:
+            Datos extraídos, en el orden de las referencias (sin las fallidas)
+        """
+        cola = queue.Queue()
+        for indice, ref in enumerate(referencias):
+            cola.put((indice, ref))
 
-            except NoSuchElementException:
-                print(f"      ℹ️  No hay datos de cultivos (puede ser normal para urbanos)")
-            except Exception as e:
-                print(f"      ⚠️  Error extrayendo cultivos: {e}")
+        resultados: List[Optional[Dict]] = [None] * len(referencias)
+        num_trabajadores = min(self.num_navegadores, len(referencias))
 
-            print(f"  ✅ Extracción completada para: {referencia}")
+        if num_trabajadores > 1:
+            print(f"🚀 Procesando con {num_trabajadores} navegadores en paralelo\n")
 
-            return datos
+        hilos = [
+            threading.Thread(target=self._trabajador, args=(cola, resultados, diario), daemon=True)
+            for _ in range(num_trabajadores)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
 
-        except TimeoutException:
-            print(f"  ❌ Timeout: La página tardó demasiado en cargar")
-            return None
-        except Exception as e:
-            print(f"  ❌ Error: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+        return [datos for datos in resultados if datos]
 
-    def procesar_referencias(self, archivo_referencias: str = "referencias.txt") -> List[Dict]:
+    def procesar_referencias(self, archivo_referencias: str = "referencias.txt",
+                             reiniciar: bool = False) -> List[Dict]:
         """
         Procesa un archivo con referencias catastrales
 
+        El progreso se anota en un diario: si el proceso se interrumpe, la
+        siguiente ejecución salta las referencias completadas y reintenta
+        las fallidas (hasta MAX_INTENTOS). El consolidado se reconstruye a
+        partir del diario durante el proceso y al terminar.
+
         Args:
             archivo_referencias: Ruta al archivo con referencias
+            reiniciar: Si True, descarta el diario de ejecuciones anteriores
 
         Returns:
             Lista de diccionarios con los datos extraídos
@@ -355,50 +357,42 @@ class CatastroRealScraper:
         print(f"✓ Encontradas {len(referencias)} referencias\n")
         print("=" * 60)
 
-        # Iniciar navegador
-        self.iniciar_navegador()
+        diario = DiarioExtraccion(os.path.join(self.data_dir, ARCHIVO_DIARIO), reiniciar=reiniciar)
+        # Consolidado en el orden del archivo de referencias
+        archivo_consolidado = os.path.join(self.data_dir, "datos_catastrales_consolidados.json")
+        diario.vincular_consolidado(archivo_consolidado, referencias)
 
-        resultados = []
+        pendientes = diario.pendientes(referencias)
+        if len(pendientes) < len(referencias):
+            estado = diario.resumen(referencias)
+            print(f"📒 Diario: {estado['completadas']} completadas, {estado['agotadas']} sin más "
+                  f"reintentos; quedan {len(pendientes)} por procesar\n")
 
         try:
-            for i, ref in enumerate(referencias, 1):
-                print(f"\n[{i}/{len(referencias)}] Procesando: {ref}")
-                print("-" * 60)
-
-                datos = self.extraer_datos_catastro(ref)
-
-                if datos:
-                    resultados.append(datos)
-
-                    # Guardar individualmente
-                    archivo = os.path.join(self.data_dir, f"{ref}.json")
-                    with open(archivo, 'w', encoding='utf-8') as f:
-                        json.dump(datos, f, indent=2, ensure_ascii=False)
-                    print(f"  💾 Guardado en: {archivo}")
-                else:
-                    print(f"  ✗ No se pudieron extraer datos")
-
-                # Pausa entre peticiones
-                if i < len(referencias):
-                    print(f"\n  ⏳ Esperando 3 segundos antes de la siguiente petición...")
-                    time.sleep(3)
-
+            self.procesar_lista(pendientes, diario)
         finally:
-            self.cerrar_navegador()
+            ESTADISTICAS.imprimir_resumen()
+
+            if diario.resumen(referencias)["completadas"]:
+                diario.consolidar()
+                print(f"\n✓ Datos consolidados guardados en: {archivo_consolidado}")
 
-        # Guardar consolidado
-        if resultados:
-            archivo_consolidado = os.path.join(self.data_dir, "datos_catastrales_consolidados.json")
-            with open(archivo_consolidado, 'w', encoding='utf-8') as f:
-                json.dump(resultados, f, indent=2, ensure_ascii=False)
-            print(f"\n✓ Datos consolidados guardados en: {archivo_consolidado}")
+            agotadas = diario.agotadas(referencias)
+            if agotadas:
+                print(f"⚠️  {len(agotadas)} referencia(s) fallidas {diario.max_intentos} veces: {', '.join(agotadas)}")
+            diario.cerrar()
 
-        return resultados
+        return diario.datos(referencias)
 
 
 def main():
     """
     Función principal
+
+    Uso: python extraer_datos_reales.py [--refresh] [--navegadores N]
+    (--refresh ignora la caché en disco y el diario de ejecuciones
+    anteriores y vuelve a consultar el Catastro; --navegadores indica
+    cuántos navegadores trabajan en paralelo)
     """
     print("=" * 60)
     print("  EXTRACTOR REAL DE DATOS DEL CATASTRO")
@@ -428,11 +422,19 @@ def main():
 
     print()
 
+    num_navegadores = 1
+    if "--navegadores" in sys.argv:
+        num_navegadores = int(sys.argv[sys.argv.index("--navegadores") + 1])
+
     # Crear scraper
-    scraper = CatastroRealScraper(headless=headless)
+    scraper = CatastroRealScraper(
+        headless=headless,
+        cache=CacheCatastro(refrescar="--refresh" in sys.argv),
+        num_navegadores=num_navegadores
+    )
 
     # Procesar
-    resultados = scraper.procesar_referencias(archivo_referencias)
+    resultados = scraper.procesar_referencias(archivo_referencias, reiniciar="--refresh" in sys.argv)
 
     # Resumen
     print("\n" + "=" * 60)
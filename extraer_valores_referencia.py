@@ -10,35 +10,90 @@ Proceso:
 4. Guarda los resultados en JSON
 """
 
-import json
 import os
+import sys
 import time
 from datetime import datetime
 from typing import List, Dict, Optional
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+from cache_catastro import CacheCatastro
+from catastro_service import LimitadorCortesia
+from diario_extraccion import DiarioExtraccion
+from esperas_selenium import ESTADISTICAS, EsperasSelenium
+
+# Nombre de esta fuente en la caché de consultas al Catastro
+ENDPOINT_CACHE = "valor_referencia"
+
+# Segundos mínimos entre dos consultas de valor de referencia a la sede
+INTERVALO_CORTESIA = 1.0
+
+# Resultados consolidados y diario del trabajo (uno por ejercicio)
+ARCHIVO_SALIDA = os.path.join("data", "valores_referencia.json")
+ARCHIVO_DIARIO = os.path.join("data", "diario_valores_referencia_{ejercicio}.jsonl")
+
+# Página de búsqueda a la que se llega tras autenticarse
+URL_BUSQUEDA = "https://www.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx"
+
+# Valor del desplegable de finalidad: Impuesto sobre Sucesiones y Donaciones
+FINALIDAD_SUCESIONES = "3"
+
+# Etiqueta con el valor de referencia en la página de resultado
+XPATH_VALOR = "//span[contains(text(), 'Valor de Referencia')]/..//label"
+LOCALIZADOR_VALOR = (By.XPATH, XPATH_VALOR)
+
+# Estado del formulario de búsqueda, leído en una sola llamada al navegador. Retira
+# además el resultado o el error de la consulta anterior, para que la espera de la
+# siguiente no los confunda con su respuesta si la página no se recarga.
+ESTADO_FORMULARIO_JS = f"""
+var error = document.getElementById('DivErrorRC');
+if (error) {{ error.style.display = 'none'; }}
+var previos = document.evaluate("{XPATH_VALOR}", document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (var i = 0; i < previos.snapshotLength; i++) {{ previos.snapshotItem(i).remove(); }}
+var rc = document.getElementById('ctl00_Contenido_txtRC2');
+var finalidad = document.getElementById('ctl00_Contenido_ddlFinalidad');
+var fecha = document.getElementById('ctl00_Contenido_txtFechaConsulta');
+return {{
+    rc: rc !== null,
+    finalidad: finalidad ? finalidad.value : null,
+    fecha: fecha ? fecha.value : null
+}};
+"""
+
 
 class ExtractorValoresReferencia:
     """
     Extrae los valores de referencia oficiales del catastro
     """
 
-    def __init__(self, headless: bool = False):
+    def __init__(self, headless: bool = False, cache: Optional[CacheCatastro] = None):
         """
         Inicializa el extractor
 
         Args:
             headless: Si True, ejecuta el navegador sin interfaz gráfica
+            cache: Caché en disco que se consulta antes de acceder a la sede
         """
         self.headless = headless
         self.driver = None
         self.autenticado = False
         self.ejercicio = "2025"
+        self.cache = cache
+        self.limitador = LimitadorCortesia(INTERVALO_CORTESIA)
+        self.esperas = None
+
+    def desde_cache(self, referencia: str) -> Optional[Dict]:
+        """Devuelve el valor de referencia guardado para el ejercicio, o None"""
+        if self.cache is None:
+            return None
+        return self.cache.obtener_json(ENDPOINT_CACHE, referencia, self.ejercicio)
+
+    def referencias_pendientes(self, referencias: List[str]) -> List[str]:
+        """Referencias cuyo valor no está vigente en la caché"""
+        return [ref for ref in referencias if self.desde_cache(ref) is None]
 
     def iniciar_navegador(self):
         """Inicia el navegador Chrome"""
@@ -53,6 +108,7 @@ class ExtractorValoresReferencia:
 
         self.driver = webdriver.Chrome(options=options)
         self.driver.maximize_window()
+        self.esperas = EsperasSelenium(self.driver)
         print("✓ Navegador iniciado")
 
     def cerrar_navegador(self):
@@ -71,50 +127,41 @@ class ExtractorValoresReferencia:
         print("=" * 60)
 
         # Paso 1: Acceder al portal
-        self.driver.get("https://www.sedecatastro.gob.es/OVCInicio.aspx?Seguir=S")
-        time.sleep(2)
+        with self.esperas.medir("navegacion"):
+            self.driver.get("https://www.sedecatastro.gob.es/OVCInicio.aspx?Seguir=S")
+
+        # Cada paso espera a que el enlace del siguiente esté disponible
 
         # Paso 2: Click en "Valor de referencia"
         print("\nPASO 2: Accediendo a Valor de Referencia...")
         try:
-            enlace_vr = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.ID, "ctl00_Contenido_aVdR"))
-            )
+            enlace_vr = self.esperas.clicable("enlace_valor_referencia", (By.ID, "ctl00_Contenido_aVdR"))
             enlace_vr.click()
-            time.sleep(2)
         except:
             print("⚠️  No se encontró el enlace 'Valor de Referencia'. Continuando...")
 
         # Paso 3: Activar desplegable de 2025
         print("\nPASO 3: Abriendo valores de referencia 2025...")
         try:
-            desplegable = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "a[href='#serv2025']"))
-            )
+            desplegable = self.esperas.clicable("desplegable_2025", (By.CSS_SELECTOR, "a[href='#serv2025']"))
             desplegable.click()
-            time.sleep(1)
         except:
             print("⚠️  No se encontró el desplegable 2025. Continuando...")
 
         # Paso 4: Click en "Consulta de valor de referencia"
         print("\nPASO 4: Accediendo al buscador...")
         try:
-            consulta_vr = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.ID, "a20252"))
-            )
+            # El enlace está dentro del desplegable: hay que esperar a que se muestre
+            consulta_vr = self.esperas.clicable("enlace_consulta", (By.ID, "a20252"))
             consulta_vr.click()
-            time.sleep(2)
         except:
             print("⚠️  No se encontró el enlace de consulta. Continuando...")
 
         # Paso 5: Click en Cl@ve
         print("\nPASO 5: Accediendo a autenticación Cl@ve...")
         try:
-            clave_btn = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.ID, "ctl00_Contenido_aAccesoClavePIN"))
-            )
+            clave_btn = self.esperas.clicable("boton_clave", (By.ID, "ctl00_Contenido_aAccesoClavePIN"))
             clave_btn.click()
-            time.sleep(2)
         except:
             print("⚠️  No se encontró el botón Cl@ve. Continuando...")
 
@@ -122,11 +169,8 @@ class ExtractorValoresReferencia:
         print("\nPASO 6: Seleccionando Cl@ve Móvil...")
         try:
             # Buscar el botón de Cl@ve Móvil
-            clave_movil = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Cl@ve Móvil')]"))
-            )
+            clave_movil = self.esperas.clicable("boton_clave_movil", (By.XPATH, "//button[contains(., 'Cl@ve Móvil')]"))
             clave_movil.click()
-            time.sleep(2)
         except:
             print("⚠️  No se encontró el botón Cl@ve Móvil. Continuando...")
 
@@ -143,28 +187,93 @@ class ExtractorValoresReferencia:
         print("   (El script continuará automáticamente cuando estés autenticado)")
 
         # Esperar hasta que llegue a la página de búsqueda
-        url_esperada = "https://www.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx"
         max_espera = 300  # 5 minutos
         inicio = time.time()
 
-        while time.time() - inicio < max_espera:
-            if url_esperada in self.driver.current_url:
-                print("\n✓ Autenticación completada!")
-                self.autenticado = True
-                time.sleep(2)
-                return True
+        def autenticado(driver):
+            print(f"\r   Esperando... {int(time.time() - inicio)}s", end="", flush=True)
+            return URL_BUSQUEDA in driver.current_url
+
+        try:
+            self.esperas.hasta("autenticacion", autenticado, timeout=max_espera, intervalo=2)
+        except TimeoutException:
+            print("\n\n⚠️  Tiempo de espera agotado. Por favor, intenta nuevamente.")
+            return False
+
+        # La página de búsqueda está lista cuando aparece el formulario
+        self.esperas.presente("formulario", (By.ID, "ctl00_Contenido_txtRC2"))
+        print("\n✓ Autenticación completada!")
+        self.autenticado = True
+        return True
+
+    def estado_formulario(self) -> Dict:
+        """
+        Lee en una sola llamada al navegador el estado del formulario de búsqueda
+
+        También retira de la página el resultado o el error de la consulta anterior.
+
+        Returns:
+            {"rc": hay campo de referencia, "finalidad": valor, "fecha": valor}
+        """
+        return self.driver.execute_script(ESTADO_FORMULARIO_JS) or {"rc": False}
+
+    def volver_al_formulario(self):
+        """
+        Vuelve al formulario de búsqueda desde la página de resultado
+
+        Primero se intenta volver atrás en el historial (el navegador conserva
+        la página y sus controles); solo si falla se carga de nuevo.
+        """
+        try:
+            with self.esperas.medir("volver"):
+                self.driver.back()
+            self.esperas.presente("formulario", (By.ID, "ctl00_Contenido_txtRC2"))
+        except Exception:
+            with self.esperas.medir("volver"):
+                self.driver.get(f"{URL_BUSQUEDA}?VR=SI&ejercicio={self.ejercicio}")
+            self.esperas.presente("formulario", (By.ID, "ctl00_Contenido_txtRC2"))
+
+    def preparar_formulario(self, fecha_consulta: str):
+        """
+        Deja el formulario listo para consultar: finalidad y fecha de consulta
+
+        Solo se tocan los controles cuyo valor no es ya el esperado, así que
+        en una tanda de consultas se rellenan una vez.
 
-            time.sleep(2)
-            tiempo_transcurrido = int(time.time() - inicio)
-            print(f"\r   Esperando... {tiempo_transcurrido}s", end="", flush=True)
+        Args:
+            fecha_consulta: Fecha de consulta en formato DD/MM/YYYY
+        """
+        estado = self.estado_formulario()
+        if not estado.get("rc"):
+            self.volver_al_formulario()
+            estado = self.estado_formulario()
 
-        print("\n\n⚠️  Tiempo de espera agotado. Por favor, intenta nuevamente.")
-        return False
+        # Paso 8: Seleccionar finalidad
+        if estado.get("finalidad") != FINALIDAD_SUCESIONES:
+            try:
+                select_finalidad = Select(self.esperas.presente("finalidad", (By.ID, "ctl00_Contenido_ddlFinalidad")))
+                select_finalidad.select_by_value(FINALIDAD_SUCESIONES)  # Impuesto sobre Sucesiones y Donaciones
+            except Exception as e:
+                print(f"   ⚠️  Error al seleccionar finalidad: {e}")
+
+        # Paso 8b: Introducir fecha de consulta
+        if estado.get("fecha") != fecha_consulta:
+            try:
+                campo_fecha = self.driver.find_element(By.ID, "ctl00_Contenido_txtFechaConsulta")
+                campo_fecha.clear()
+                campo_fecha.send_keys(fecha_consulta)
+            except Exception as e:
+                print(f"   ⚠️  Error al introducir fecha: {e}")
 
     def consultar_valor_referencia(self, referencia: str, fecha_consulta: str = None) -> Optional[Dict]:
         """
         Consulta el valor de referencia de una referencia catastral
 
+        La sesión autenticada se reutiliza entre consultas: tras cada
+        resultado no se recarga el buscador, y finalidad y fecha solo se
+        rellenan si han cambiado. Por consulta solo cambia el campo de la
+        referencia.
+
         Args:
             referencia: Referencia catastral
             fecha_consulta: Fecha de consulta en formato DD/MM/YYYY
@@ -172,6 +281,11 @@ class ExtractorValoresReferencia:
         Returns:
             Diccionario con el valor de referencia o None si hay error
         """
+        resultado = self.desde_cache(referencia)
+        if resultado is not None:
+            print(f"\n📋 {referencia}: {resultado['valor_referencia_texto']} (caché)")
+            return resultado
+
         if not self.autenticado:
             print("❌ No autenticado. Ejecuta navegar_a_valores_referencia() primero")
             return None
@@ -179,120 +293,118 @@ class ExtractorValoresReferencia:
         if fecha_consulta is None:
             fecha_consulta = datetime.now().strftime("%d/%m/%Y")
 
+        # Respetar el intervalo de cortesía con la sede
+        self.limitador.esperar()
+
         print(f"\n📋 Consultando: {referencia}")
 
         try:
-            # Paso 8: Seleccionar finalidad
-            try:
-                select_finalidad = Select(WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.ID, "ctl00_Contenido_ddlFinalidad"))
-                ))
-                select_finalidad.select_by_value("3")  # Impuesto sobre Sucesiones y Donaciones
-                time.sleep(1)
-            except Exception as e:
-                print(f"   ⚠️  Error al seleccionar finalidad: {e}")
-
-            # Paso 8b: Introducir fecha de consulta
-            try:
-                campo_fecha = self.driver.find_element(By.ID, "ctl00_Contenido_txtFechaConsulta")
-                campo_fecha.clear()
-                campo_fecha.send_keys(fecha_consulta)
-                time.sleep(0.5)
-            except Exception as e:
-                print(f"   ⚠️  Error al introducir fecha: {e}")
+            self.preparar_formulario(fecha_consulta)
 
             # Paso 9: Introducir referencia catastral
-            campo_ref = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "ctl00_Contenido_txtRC2"))
-            )
+            campo_ref = self.esperas.presente("campo_referencia", (By.ID, "ctl00_Contenido_txtRC2"))
             campo_ref.clear()
             campo_ref.send_keys(referencia)
-            time.sleep(0.5)
 
             # Paso 10: Click en "VALOR DE REFERENCIA"
             btn_buscar = self.driver.find_element(By.ID, "ctl00_Contenido_btnValorReferencia")
             btn_buscar.click()
 
-            # Esperar a que cargue la página de resultados
-            time.sleep(3)
-
-            # Paso 11: Extraer el valor de referencia
-            try:
-                # Buscar el valor de referencia en la página
-                valor_elemento = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//span[contains(text(), 'Valor de Referencia')]/..//label"))
-                )
-                valor_texto = valor_elemento.text.strip()
+            # Paso 11: Esperar al valor de referencia o al mensaje de error
+            estado = self.esperas.resultado_o_error("resultado", LOCALIZADOR_VALOR, (By.ID, "DivErrorRC"))
+            if estado == "error":
+                print(f"   ❌ Error al extraer valor: Referencia catastral no encontrada")
+                return None
 
-                # Limpiar el valor (ej: "931,10 €" -> 931.10)
-                valor_numerico = float(valor_texto.replace('€', '').replace('.', '').replace(',', '.').strip())
+            valor_texto = self.driver.find_element(*LOCALIZADOR_VALOR).text.strip()
 
-                print(f"   ✓ Valor de referencia: {valor_texto}")
+            # Limpiar el valor (ej: "931,10 €" -> 931.10)
+            valor_numerico = float(valor_texto.replace('€', '').replace('.', '').replace(',', '.').strip())
 
-                resultado = {
-                    "referencia_catastral": referencia,
-                    "valor_referencia": valor_numerico,
-                    "valor_referencia_texto": valor_texto,
-                    "fecha_consulta": fecha_consulta,
-                    "ejercicio": self.ejercicio,
-                    "finalidad": "Tributación en Impuesto sobre Sucesiones y Donaciones",
-                    "fecha_extraccion": datetime.now().isoformat()
-                }
+            print(f"   ✓ Valor de referencia: {valor_texto}")
 
-                # Paso 12: Volver a la página de búsqueda
-                self.driver.get(f"https://www.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx?VR=SI&ejercicio={self.ejercicio}")
-                time.sleep(2)
+            resultado = {
+                "referencia_catastral": referencia,
+                "valor_referencia": valor_numerico,
+                "valor_referencia_texto": valor_texto,
+                "fecha_consulta": fecha_consulta,
+                "ejercicio": self.ejercicio,
+                "finalidad": "Tributación en Impuesto sobre Sucesiones y Donaciones",
+                "fecha_extraccion": datetime.now().isoformat()
+            }
 
-                return resultado
+            if self.cache is not None:
+                self.cache.guardar_json(ENDPOINT_CACHE, referencia, resultado, self.ejercicio)
 
-            except Exception as e:
-                print(f"   ❌ Error al extraer valor: {e}")
-                # Intentar volver a la página de búsqueda
-                try:
-                    self.driver.get(f"https://www.sedecatastro.gob.es/CYCBienInmueble/OVCBusqueda.aspx?VR=SI&ejercicio={self.ejercicio}")
-                    time.sleep(2)
-                except:
-                    pass
-                return None
+            # La vuelta al formulario se hace al preparar la siguiente consulta
+            return resultado
 
         except Exception as e:
             print(f"   ❌ Error en la consulta: {e}")
             return None
 
-    def procesar_referencias(self, referencias: List[str], fecha_consulta: str = None) -> List[Dict]:
+    def procesar_referencias(self, referencias: List[str], fecha_consulta: str = None,
+                             diario: Optional[DiarioExtraccion] = None) -> List[Dict]:
         """
         Procesa múltiples referencias catastrales
 
+        Finalidad y fecha se fijan una vez para toda la tanda y entre
+        consultas solo cambia la referencia. Con diario, solo se consultan
+        las referencias pendientes en él, cada resultado se anota en cuanto
+        se obtiene y el consolidado vinculado al diario se reconstruye al
+        terminar.
+
         Args:
             referencias: Lista de referencias catastrales
             fecha_consulta: Fecha de consulta
+            diario: Diario del trabajo (permite reanudarlo si se interrumpe)
 
         Returns:
             Lista de resultados
         """
         resultados = []
+        pendientes = diario.pendientes(referencias) if diario is not None else referencias
+
+        # Toda la tanda se consulta con la misma fecha: el formulario se rellena una vez
+        if fecha_consulta is None:
+            fecha_consulta = datetime.now().strftime("%d/%m/%Y")
 
         print("\n" + "=" * 60)
-        print(f"PROCESANDO {len(referencias)} REFERENCIAS")
+        print(f"PROCESANDO {len(pendientes)} REFERENCIAS")
+        if len(pendientes) < len(referencias):
+            print(f"({len(referencias) - len(pendientes)} ya completadas o sin más reintentos según el diario)")
         print("=" * 60)
 
-        for i, ref in enumerate(referencias, 1):
-            print(f"\n[{i}/{len(referencias)}]", end=" ")
-            resultado = self.consultar_valor_referencia(ref, fecha_consulta)
-
-            if resultado:
-                resultados.append(resultado)
-            else:
-                print(f"   ⚠️  No se pudo obtener el valor de referencia")
-
-            # Pequeña pausa entre consultas
-            time.sleep(1)
-
+        try:
+            for i, ref in enumerate(pendientes, 1):
+                print(f"\n[{i}/{len(pendientes)}]", end=" ")
+                resultado = self.consultar_valor_referencia(ref, fecha_consulta)
+
+                if diario is not None:
+                    diario.registrar(ref, resultado)
+                elif resultado:
+                    resultados.append(resultado)
+
+                if not resultado:
+                    print(f"   ⚠️  No se pudo obtener el valor de referencia")
+        finally:
+            ESTADISTICAS.imprimir_resumen()
+            if diario is not None and diario.consolidado and diario.resumen(referencias)["completadas"]:
+                diario.consolidar()
+
+        if diario is not None:
+            return diario.datos(referencias)
         return resultados
 
 
 def main():
-    """Función principal"""
+    """
+    Función principal
+
+    Uso: python extraer_valores_referencia.py [--refresh]
+    (--refresh ignora la caché en disco y el diario de ejecuciones
+    anteriores y vuelve a consultar el Catastro)
+    """
     print("=" * 60)
     print("EXTRACTOR DE VALORES DE REFERENCIA DEL CATASTRO")
     print("=" * 60)
@@ -315,32 +427,41 @@ def main():
     print(f"\nFecha de consulta: {fecha_consulta}")
 
     # Crear extractor
-    extractor = ExtractorValoresReferencia(headless=False)
+    extractor = ExtractorValoresReferencia(
+        headless=False,
+        cache=CacheCatastro(refrescar="--refresh" in sys.argv)
+    )
 
-    try:
-        # Iniciar navegador
-        extractor.iniciar_navegador()
+    diario = DiarioExtraccion(
+        ARCHIVO_DIARIO.format(ejercicio=extractor.ejercicio),
+        reiniciar="--refresh" in sys.argv
+    )
+    diario.vincular_consolidado(ARCHIVO_SALIDA, referencias)
 
-        # Navegar y autenticar
-        if not extractor.navegar_a_valores_referencia():
-            print("\n❌ No se pudo completar la autenticación")
-            return
+    try:
+        # Solo hace falta el navegador (y Cl@ve) si hay referencias pendientes fuera de la caché
+        por_procesar = diario.pendientes(referencias)
+        pendientes = extractor.referencias_pendientes(por_procesar)
+        print(f"Completadas en el diario: {len(referencias) - len(por_procesar)}, "
+              f"en caché: {len(por_procesar) - len(pendientes)}, pendientes: {len(pendientes)}")
 
-        # Procesar referencias
-        resultados = extractor.procesar_referencias(referencias, fecha_consulta)
+        if pendientes:
+            # Iniciar navegador
+            extractor.iniciar_navegador()
 
-        # Guardar resultados
-        if resultados:
-            archivo_salida = "data/valores_referencia.json"
-            os.makedirs("data", exist_ok=True)
+            # Navegar y autenticar
+            if not extractor.navegar_a_valores_referencia():
+                print("\n❌ No se pudo completar la autenticación")
+                return
 
-            with open(archivo_salida, 'w', encoding='utf-8') as f:
-                json.dump(resultados, f, indent=2, ensure_ascii=False)
+        # Procesar referencias (el consolidado se reconstruye desde el diario)
+        resultados = extractor.procesar_referencias(referencias, fecha_consulta, diario)
 
+        if resultados:
             print("\n" + "=" * 60)
             print("✅ PROCESO COMPLETADO")
             print("=" * 60)
-            print(f"\nResultados guardados en: {archivo_salida}")
+            print(f"\nResultados guardados en: {ARCHIVO_SALIDA}")
             print(f"Total extraído: {len(resultados)}/{len(referencias)} referencias")
 
             # Mostrar resumen
@@ -359,9 +480,12 @@ def main():
         traceback.print_exc()
 
     finally:
+        diario.cerrar()
+
         # Cerrar navegador
-        input("\n\nPresiona ENTER para cerrar el navegador...")
-        extractor.cerrar_navegador()
+        if extractor.driver:
+            input("\n\nPresiona ENTER para cerrar el navegador...")
+            extractor.cerrar_navegador()
 
 
 if __name__ == "__main__":
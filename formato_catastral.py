@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Conversión de los textos con formato español de la Sede del Catastro
+
+Funciones pequeñas y sin dependencias que comparten el valorador, el almacén
+SQLite y el reparto de herencias para leer los mismos campos de la misma
+forma.
+"""
+
+import re
+from typing import Optional
+
+_NUMERO = re.compile(r"[\d.,]+")
+
+
+def superficie_a_m2(texto) -> Optional[float]:
+    """
+    Convierte una superficie con formato español a número
+
+    Args:
+        texto: Superficie tal como la muestra el catastro ("1.197 m2", "0,5")
+
+    Returns:
+        Superficie en m², o None si el texto no contiene un número
+    """
+    if not isinstance(texto, str):
+        return None
+    coincidencia = _NUMERO.search(texto)
+    if not coincidencia:
+        return None
+    try:
+        return float(coincidencia.group().replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
@@ -2,7 +2,9 @@
 """
 Script para importar datos extraídos del PDF GVA al valorador
 
-IMPORTANTE: Este script MODIFICA valorador_inmuebles.py
+IMPORTANTE: Este script MODIFICA las tablas del valorador (sección
+"tablas_valorador" de data/valores_gva_2025_oficial.json), que el valorador
+y el servidor cargan en tiempo de ejecución.
 Solo ejecutar cuando los datos estén completos y verificados
 """
 
@@ -11,6 +13,9 @@ import os
 import shutil
 from datetime import datetime
 
+from ambitos_territoriales import RUTA_VALORES_GVA, IndiceAmbitos, indice_ambitos
+from tablas_valoracion import SECCION_TABLAS, escribir_tablas
+
 
 def importar_datos_gva():
     """
@@ -20,7 +25,7 @@ def importar_datos_gva():
     print("IMPORTAR DATOS GVA AL VALORADOR")
     print("=" * 70)
     print()
-    print("⚠️  ADVERTENCIA: Este script modificará valorador_inmuebles.py")
+    print(f"⚠️  ADVERTENCIA: Este script modificará las tablas del valorador en {RUTA_VALORES_GVA}")
     print()
 
     # Verificar que existen los datos
@@ -76,18 +81,24 @@ def importar_datos_gva():
         return
 
     # Crear backup
-    valorador_path = "valorador_inmuebles.py"
-    if not os.path.exists(valorador_path):
-        print(f"❌ No se encontró: {valorador_path}")
+    tablas_path = RUTA_VALORES_GVA
+    if not os.path.exists(tablas_path):
+        print(f"❌ No se encontró: {tablas_path}")
         return
 
-    backup_path = f"{valorador_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    shutil.copy2(valorador_path, backup_path)
+    backup_path = f"{tablas_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    shutil.copy2(tablas_path, backup_path)
     print(f"✓ Backup creado: {backup_path}")
 
-    # Leer valorador actual
-    with open(valorador_path, 'r', encoding='utf-8') as f:
-        contenido = f.read()
+    # Cada municipio se guarda con la clave de su ámbito territorial, que es
+    # la región que identificar_region() devuelve para él
+    ambitos_datos = IndiceAmbitos.desde_datos(datos)
+    ambitos_oficiales = indice_ambitos(tablas_path)
+
+    def region_municipio(muni_key: str) -> str:
+        return (ambitos_datos.ambito_municipio(muni_key)
+                or ambitos_oficiales.ambito_municipio(muni_key)
+                or muni_key)
 
     # Preparar nuevos PRECIOS_RUSTICO
     nuevos_precios_rustico = {}
@@ -109,7 +120,7 @@ def importar_datos_gva():
             else:
                 precios_muni['default'] = 10000
 
-        nuevos_precios_rustico[muni_key] = precios_muni
+        nuevos_precios_rustico[region_municipio(muni_key)] = precios_muni
 
     # Preparar nuevos COEFICIENTES_URBANO
     nuevos_coef_urbano = {}
@@ -127,65 +138,26 @@ def importar_datos_gva():
         if 'default' not in coef_muni:
             coef_muni['default'] = 0.5
 
-        nuevos_coef_urbano[muni_key] = coef_muni
+        nuevos_coef_urbano[region_municipio(muni_key)] = coef_muni
 
     # Añadir valencia como fallback (usar valores de oliva)
-    if 'oliva' in nuevos_precios_rustico:
-        nuevos_precios_rustico['valencia'] = nuevos_precios_rustico['oliva'].copy()
-        nuevos_coef_urbano['valencia'] = nuevos_coef_urbano['oliva'].copy()
-
-    # Generar código Python para los diccionarios
-    import pprint
-
-    codigo_precios = "    PRECIOS_RUSTICO = " + pprint.pformat(nuevos_precios_rustico, indent=8, width=100)
-    codigo_precios = codigo_precios.replace("'", '"')  # Usar comillas dobles
-
-    codigo_coef = "    COEFICIENTES_URBANO = " + pprint.pformat(nuevos_coef_urbano, indent=8, width=100)
-    codigo_coef = codigo_coef.replace("'", '"')  # Usar comillas dobles
-
-    # Buscar y reemplazar PRECIOS_RUSTICO en el contenido
-    import re
-
-    # Buscar el bloque PRECIOS_RUSTICO = {...}
-    patron_rustico = r'PRECIOS_RUSTICO\s*=\s*\{[^}]*(?:\{[^}]*\}[^}]*)*\}'
-    if re.search(patron_rustico, contenido, re.DOTALL):
-        contenido = re.sub(patron_rustico, codigo_precios.strip(), contenido, flags=re.DOTALL)
-        print("✓ PRECIOS_RUSTICO actualizado")
-    else:
-        print("⚠️  No se pudo encontrar PRECIOS_RUSTICO en el archivo")
-
-    # Buscar y reemplazar COEFICIENTES_URBANO
-    patron_urbano = r'COEFICIENTES_URBANO\s*=\s*\{[^}]*(?:\{[^}]*\}[^}]*)*\}'
-    if re.search(patron_urbano, contenido, re.DOTALL):
-        contenido = re.sub(patron_urbano, codigo_coef.strip(), contenido, flags=re.DOTALL)
-        print("✓ COEFICIENTES_URBANO actualizado")
-    else:
-        print("⚠️  No se pudo encontrar COEFICIENTES_URBANO en el archivo")
-
-    # Añadir comentario con fuente de datos
-    comentario_fuente = f'''
-    # ============================================================================
-    # VALORES OFICIALES GVA 2025
-    # ============================================================================
-    # Fuente: {datos['fuente']['documento']}
-    # Organismo: {datos['fuente']['organismo']}
-    # Vigencia: {datos['fuente']['vigencia']['desde']} → {datos['fuente']['vigencia']['hasta']}
-    # Importado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-    # ============================================================================
-
-'''
-
-    # Insertar comentario antes de PRECIOS_RUSTICO
-    contenido = contenido.replace(
-        '    # Precios medios de terrenos rústicos',
-        comentario_fuente + '    # Precios medios de terrenos rústicos'
+    if 'oliva' in datos['municipios']:
+        region_oliva = region_municipio('oliva')
+        nuevos_precios_rustico['valencia'] = nuevos_precios_rustico[region_oliva].copy()
+        nuevos_coef_urbano['valencia'] = nuevos_coef_urbano[region_oliva].copy()
+
+    # Guardar las tablas (reemplazo atómico del archivo)
+    fuente = (f"{datos['fuente']['documento']} - {datos['fuente']['organismo']} - vigencia "
+              f"{datos['fuente']['vigencia']['desde']} → {datos['fuente']['vigencia']['hasta']} - "
+              f"importado {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    escribir_tablas(
+        tablas_path,
+        {"PRECIOS_RUSTICO": nuevos_precios_rustico, "COEFICIENTES_URBANO": nuevos_coef_urbano},
+        fuente=fuente
     )
-
-    # Guardar archivo actualizado
-    with open(valorador_path, 'w', encoding='utf-8') as f:
-        f.write(contenido)
-
-    print(f"✓ Archivo actualizado: {valorador_path}")
+    print("✓ PRECIOS_RUSTICO actualizado")
+    print("✓ COEFICIENTES_URBANO actualizado")
+    print(f"✓ Sección \"{SECCION_TABLAS}\" actualizada: {tablas_path}")
     print()
 
     # Mostrar valores aplicados
@@ -195,19 +167,20 @@ def importar_datos_gva():
     print()
 
     for muni_key in ['oliva', 'planes', 'vall_de_gallinera']:
-        if muni_key in nuevos_precios_rustico:
+        region = region_municipio(muni_key)
+        if muni_key in datos['municipios'] and region in nuevos_precios_rustico:
             nombre = datos['municipios'][muni_key]['nombre_oficial']
-            print(f"\n{nombre.upper()}:")
+            print(f"\n{nombre.upper()} ({region}):")
             print("-" * 70)
 
             print("\n  Rústico (€/ha) - Ejemplos:")
-            precios = nuevos_precios_rustico[muni_key]
+            precios = nuevos_precios_rustico[region]
             for k, v in list(precios.items())[:5]:
                 if k != 'default':
                     print(f"    {k:25s}: {v:>10,.0f} €/ha")
 
             print("\n  Urbano (coef) - Ejemplos:")
-            coefs = nuevos_coef_urbano[muni_key]
+            coefs = nuevos_coef_urbano[region]
             for k, v in list(coefs.items())[:5]:
                 if k != 'default':
                     print(f"    {k:25s}: {v:>10.2f}")
@@ -219,13 +192,13 @@ def importar_datos_gva():
     print("PRÓXIMOS PASOS:")
     print()
     print("1. Verificar cambios:")
-    print(f"   diff {backup_path} {valorador_path}")
+    print(f"   diff {backup_path} {tablas_path}")
     print()
-    print("2. Regenerar valoraciones:")
+    print("2. Regenerar valoraciones (el servidor recarga las tablas solo):")
     print("   python valorador_inmuebles.py")
     print()
     print("3. Si algo falla, restaurar backup:")
-    print(f"   cp {backup_path} {valorador_path}")
+    print(f"   cp {backup_path} {tablas_path}")
     print()
 
 
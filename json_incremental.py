@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Lectura incremental de JSON
+
+Permite recorrer un array JSON de nivel superior o un flujo NDJSON (un
+objeto por línea) objeto a objeto, sin cargar el documento completo en
+memoria. Se usa para valorar y consolidar carteras grandes en streaming.
+"""
+
+import codecs
+import json
+from typing import Any, Iterator
+
+TAM_BLOQUE = 64 * 1024
+
+_decodificador = json.JSONDecoder()
+
+# Caracteres que pueden seguir a un elemento de un array JSON
+_FIN_ELEMENTO = frozenset(",] \t\r\n")
+
+
+def _leer_texto(lector, tam_bloque: int = TAM_BLOQUE) -> Iterator[str]:
+    """Lee bloques de texto de un flujo binario o de texto"""
+    decodificador_utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    while True:
+        bloque = lector.read(tam_bloque)
+        if not bloque:
+            break
+        if isinstance(bloque, bytes):
+            bloque = decodificador_utf8.decode(bloque)
+        if bloque:
+            yield bloque
+
+    resto = decodificador_utf8.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+def _saltar_espacios(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and buffer[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _iterar_array(bloques: Iterator[str], buffer: str) -> Iterator[Any]:
+    """Recorre los elementos de un array JSON cuyo '[' inicial ya se ha consumido"""
+    pos = 0
+    esperando_coma = False
+
+    while True:
+        pos = _saltar_espacios(buffer, pos)
+
+        if pos >= len(buffer):
+            siguiente = next(bloques, None)
+            if siguiente is None:
+                raise ValueError("Array JSON incompleto")
+            buffer = buffer[pos:] + siguiente
+            pos = 0
+            continue
+
+        caracter = buffer[pos]
+        if caracter == "]":
+            return
+        if esperando_coma:
+            if caracter != ",":
+                raise ValueError(f"Se esperaba ',' o ']' en la posición {pos}")
+            pos += 1
+            esperando_coma = False
+            continue
+
+        try:
+            objeto, fin = _decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # El elemento continúa en el siguiente bloque
+            siguiente = next(bloques, None)
+            if siguiente is None:
+                raise
+            buffer = buffer[pos:] + siguiente
+            pos = 0
+            continue
+
+        es_numero = isinstance(objeto, (int, float)) and not isinstance(objeto, bool)
+        if es_numero and (fin == len(buffer) or buffer[fin] not in _FIN_ELEMENTO):
+            # Un número cortado por el bloque (p. ej. "1." de "1.5") puede continuar
+            siguiente = next(bloques, None)
+            if siguiente is not None:
+                buffer = buffer[pos:] + siguiente
+                pos = 0
+                continue
+
+        yield objeto
+        # Lo ya procesado se descarta al leer el siguiente bloque
+        pos = fin
+        esperando_coma = True
+
+
+def _iterar_lineas(bloques: Iterator[str], buffer: str) -> Iterator[Any]:
+    """Recorre un flujo NDJSON (un objeto JSON por línea)"""
+    while True:
+        lineas = buffer.split("\n")
+        buffer = lineas.pop()
+        for linea in lineas:
+            if linea.strip():
+                yield json.loads(linea)
+
+        siguiente = next(bloques, None)
+        if siguiente is None:
+            break
+        buffer += siguiente
+
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+def iterar_json(lector, tam_bloque: int = TAM_BLOQUE) -> Iterator[Any]:
+    """
+    Recorre un flujo JSON objeto a objeto
+
+    Si el primer carácter significativo es '[' se interpreta como un array
+    JSON y se devuelven sus elementos; en otro caso se interpreta como NDJSON.
+
+    Args:
+        lector: Objeto con método read() (binario UTF-8 o texto)
+        tam_bloque: Tamaño de los bloques de lectura
+
+    Returns:
+        Iterador de objetos JSON
+    """
+    bloques = _leer_texto(lector, tam_bloque)
+    buffer = ""
+
+    for bloque in bloques:
+        buffer += bloque
+        pos = _saltar_espacios(buffer, 0)
+        if pos < len(buffer):
+            if buffer[pos] == "[":
+                return _iterar_array(bloques, buffer[pos + 1:])
+            return _iterar_lineas(bloques, buffer[pos:])
+
+    return iter(())
+
+
+def iterar_array_json(ruta: str, tam_bloque: int = TAM_BLOQUE) -> Iterator[Any]:
+    """
+    Recorre los elementos de un archivo JSON (array) o NDJSON
+
+    Args:
+        ruta: Ruta del archivo
+
+    Returns:
+        Iterador de objetos JSON
+    """
+    with open(ruta, "rb") as f:
+        yield from iterar_json(f, tam_bloque)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Parser de la ficha OVCConCiud de la Sede Electrónica del Catastro
+
+Extrae de la página HTML los bloques ctl00_Contenido_tblInmueble,
+ctl00_Contenido_tblFinca y ctl00_Contenido_tblCultivos con lxml, sin
+navegador. Las funciones que convierten etiqueta/valor en campos del
+diccionario son las mismas que usa el extractor con Selenium, de modo que
+los dos caminos producen exactamente el mismo resultado.
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+from lxml import etree
+
+
+# Identificadores de los bloques de la ficha
+ID_INMUEBLE = "ctl00_Contenido_tblInmueble"
+ID_FINCA = "ctl00_Contenido_tblFinca"
+ID_CULTIVOS = "ctl00_Contenido_tblCultivos"
+ID_ERROR = "DivErrorRC"
+
+# Elementos que el navegador muestra en su propia línea
+_ETIQUETAS_BLOQUE = {
+    "address", "article", "blockquote", "dd", "div", "dl", "dt", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "li", "ol", "p", "pre", "section",
+    "table", "tbody", "thead", "tfoot", "tr", "ul",
+}
+
+# Elementos cuyo contenido nunca es texto visible
+_ETIQUETAS_OCULTAS = {"script", "style", "noscript", "template", "head"}
+
+# Marca de salto de línea visible, distinta de los "\n" del código fuente
+_SALTO = "\x00"
+_ESPACIOS = re.compile(r"[ \t\r\n\f\xa0]+")
+_OCULTO = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+
+
+# Expresiones XPath compiladas una sola vez
+_POR_ID = etree.XPath("//*[@id=$id]")
+_POR_CLASE = etree.XPath(".//*[contains(concat(' ', normalize-space(@class), ' '), concat(' ', $clase, ' '))]")
+# Parser HTML con elementos lxml básicos (más rápidos que los de lxml.html)
+_PARSER_HTML = etree.HTMLParser()
+
+_FILAS = etree.XPath(".//tr")
+_CELDAS = etree.XPath(".//td")
+
+
+def _oculto(elem) -> bool:
+    return elem.tag in _ETIQUETAS_OCULTAS or bool(_OCULTO.search(elem.get("style", "")))
+
+
+def texto_visible(elem) -> str:
+    """
+    Texto de un elemento tal como lo devuelve WebElement.text
+
+    Colapsa los espacios del código fuente, convierte <br> y los elementos de
+    bloque en saltos de línea y descarta los elementos ocultos.
+    """
+    partes: List[str] = []
+
+    def recorrer(e):
+        if not isinstance(e.tag, str) or _oculto(e):
+            return
+        if e.tag == "br":
+            partes.append(_SALTO)
+            return
+
+        bloque = e.tag in _ETIQUETAS_BLOQUE
+        if bloque:
+            partes.append(_SALTO)
+        if e.text:
+            partes.append(e.text)
+        for hijo in e:
+            recorrer(hijo)
+            if hijo.tail:
+                partes.append(hijo.tail)
+        if bloque:
+            partes.append(_SALTO)
+
+    if not _oculto(elem):
+        recorrer(elem)
+
+    lineas = (_ESPACIOS.sub(" ", linea).strip() for linea in "".join(partes).split(_SALTO))
+    return "\n".join(linea for linea in lineas if linea)
+
+
+def parsear_localizacion(texto_localizacion: str) -> Dict:
+    """
+    Parsea el texto de localización y extrae: Polígono, Parcela, Partida, Municipio, Provincia
+
+    Ejemplo: "Polígono 2 Parcela 9\nEL LLOMBO. PLANES (ALICANTE)"
+    """
+    resultado = {
+        "poligono": "",
+        "parcela": "",
+        "partida": "",
+        "municipio": "",
+        "provincia": ""
+    }
+
+    try:
+        # Dividir por saltos de línea
+        lineas = texto_localizacion.strip().split('\n')
+
+        # Primera línea: Polígono X Parcela Y
+        if len(lineas) > 0:
+            primera = lineas[0]
+
+            # Extraer Polígono
+            match_pol = re.search(r'Polígono\s+(\d+)', primera, re.IGNORECASE)
+            if match_pol:
+                resultado["poligono"] = match_pol.group(1)
+
+            # Extraer Parcela
+            match_par = re.search(r'Parcela\s+(\d+)', primera, re.IGNORECASE)
+            if match_par:
+                resultado["parcela"] = match_par.group(1)
+
+        # Segunda línea: PARTIDA. MUNICIPIO (PROVINCIA)
+        if len(lineas) > 1:
+            segunda = lineas[1]
+
+            # Extraer Provincia (entre paréntesis)
+            match_prov = re.search(r'\(([^)]+)\)', segunda)
+            if match_prov:
+                resultado["provincia"] = match_prov.group(1).strip()
+                # Quitar la provincia del texto
+                segunda = re.sub(r'\([^)]+\)', '', segunda).strip()
+
+            # Lo que queda: PARTIDA. MUNICIPIO
+            partes = segunda.split('.')
+            if len(partes) >= 2:
+                resultado["partida"] = partes[0].strip()
+                resultado["municipio"] = partes[1].strip()
+            elif len(partes) == 1:
+                # Si solo hay una parte, asumir que es municipio
+                resultado["municipio"] = partes[0].strip()
+
+    except Exception as e:
+        print(f"      ⚠️  Error parseando localización: {e}")
+
+    return resultado
+
+
+def agregar_dato_descriptivo(datos_descriptivos: Dict, label: str, valor: str):
+    """Añade un par etiqueta/valor del bloque tblInmueble a los datos descriptivos"""
+    if not (label and valor):
+        return
+
+    if "Referencia catastral" in label:
+        # Limpiar iconos y espacios extras
+        valor_limpio = re.sub(r'copiar|código de barras', '', valor, flags=re.IGNORECASE).strip()
+        datos_descriptivos["referencia_catastral"] = valor_limpio
+
+    elif "Localización" in label or "Localizacion" in label:
+        loc_parseada = parsear_localizacion(valor)
+        datos_descriptivos["localizacion"] = {
+            "texto_completo": valor,
+            "poligono": loc_parseada["poligono"],
+            "parcela": loc_parseada["parcela"],
+            "partida": loc_parseada["partida"],
+            "municipio": loc_parseada["municipio"],
+            "provincia": loc_parseada["provincia"]
+        }
+
+    elif "Clase" in label:
+        datos_descriptivos["clase"] = valor
+
+    elif "Uso principal" in label:
+        datos_descriptivos["uso_principal"] = valor
+
+    else:
+        # Cualquier otro campo
+        datos_descriptivos[label.lower().replace(" ", "_")] = valor
+
+
+def agregar_dato_parcela(parcela_catastral: Dict, label: str, valor: str):
+    """Añade un par etiqueta/valor del bloque tblFinca a la parcela catastral"""
+    if not (label and valor):
+        return
+
+    # Saltar Localización (ya está en los datos descriptivos)
+    if "Localización" in label or "Localizacion" in label:
+        return
+
+    # Limpiar etiquetas HTML del valor
+    valor_limpio = re.sub(r'<[^>]+>', '', valor)
+    parcela_catastral[label.lower().replace(" ", "_")] = valor_limpio
+
+
+def crear_cultivo(celdas: List[str]) -> Optional[Dict]:
+    """Convierte los textos de una fila de tblCultivos en un cultivo"""
+    if len(celdas) < 4:
+        return None
+
+    return {
+        "subparcela": celdas[0],
+        "cultivo_aprovechamiento": celdas[1],
+        "intensidad_productiva": celdas[2],
+        "superficie_m2": celdas[3]
+    }
+
+
+def cargar_documento(html: Union[str, bytes]):
+    """
+    Construye el árbol lxml de una página
+
+    Admite texto o bytes; con bytes la codificación sale del <meta charset>.
+    """
+    return etree.fromstring(html, _PARSER_HTML)
+
+
+def _pares_etiqueta_valor(bloque, clase_label: str, clase_valor: str):
+    """Recorre los form-group de un bloque devolviendo (etiqueta, valor)"""
+    for grupo in _POR_CLASE(bloque, clase="form-group"):
+        labels = _POR_CLASE(grupo, clase=clase_label)
+        valores = _POR_CLASE(grupo, clase=clase_valor)
+        if labels and valores:
+            yield texto_visible(labels[0]), texto_visible(valores[0])
+
+
+def hay_error_referencia(documento) -> bool:
+    """Indica si la página muestra el aviso de referencia inexistente"""
+    errores = _POR_ID(documento, id=ID_ERROR)
+    return bool(errores) and not _oculto(errores[0])
+
+
+def parsear_ficha(documento) -> Optional[Dict]:
+    """
+    Extrae los bloques de la ficha de un inmueble
+
+    Args:
+        documento: Árbol lxml de la página (ver cargar_documento) o su HTML
+
+    Returns:
+        {"datos_descriptivos", "parcela_catastral", "cultivos"} o None si la
+        página no contiene la ficha de un inmueble
+    """
+    if isinstance(documento, (str, bytes)):
+        documento = cargar_documento(documento)
+
+    inmuebles = _POR_ID(documento, id=ID_INMUEBLE)
+    if not inmuebles:
+        return None
+
+    ficha = {
+        "datos_descriptivos": {},
+        "parcela_catastral": {},
+        "cultivos": []
+    }
+
+    for label, valor in _pares_etiqueta_valor(inmuebles[0], "col-md-4", "col-md-8"):
+        agregar_dato_descriptivo(ficha["datos_descriptivos"], label, valor)
+
+    for finca in _POR_ID(documento, id=ID_FINCA)[:1]:
+        for label, valor in _pares_etiqueta_valor(finca, "col-md-3", "col-md-9"):
+            agregar_dato_parcela(ficha["parcela_catastral"], label, valor)
+
+    for tabla in _POR_ID(documento, id=ID_CULTIVOS)[:1]:
+        # La primera fila es la cabecera
+        for fila in _FILAS(tabla)[1:]:
+            cultivo = crear_cultivo([texto_visible(celda) for celda in _CELDAS(fila)])
+            if cultivo:
+                ficha["cultivos"].append(cultivo)
+
+    return ficha
+
+
+def construir_datos(referencia: str, url: str, ficha: Dict) -> Dict:
+    """
+    Compone el diccionario de una referencia con el formato de los extractores
+
+    Args:
+        referencia: Referencia catastral consultada
+        url: URL de la ficha
+        ficha: Bloques devueltos por parsear_ficha
+
+    Returns:
+        Diccionario con referencia, fecha de extracción, URL y bloques de la ficha
+    """
+    return {
+        "referencia_catastral": referencia,
+        "fecha_extraccion": datetime.now().isoformat(),
+        "url_consultada": url,
+        "datos_descriptivos": ficha["datos_descriptivos"],
+        "parcela_catastral": ficha["parcela_catastral"],
+        "cultivos": ficha["cultivos"]
+    }
@@ -6,7 +6,7 @@ Uso: python procesar_referencias.py [archivo]
 
 import sys
 import os
-from catastro_scraper_service import CatastroScraperService
+from catastro_scraper_service import ARCHIVO_RESUMEN, CatastroScraperService
 
 def main():
     """
@@ -82,8 +82,8 @@ def main():
     print("GENERANDO RESUMEN")
     print("=" * 60)
 
-    resumen = servicio.generar_resumen(referencias)
-    archivo_resumen = os.path.join(servicio.data_dir, "resumen_propiedades.json")
+    resumen = servicio.generar_resumen(resultados)
+    archivo_resumen = os.path.join(servicio.data_dir, ARCHIVO_RESUMEN)
     servicio._guardar_json(resumen, archivo_resumen)
 
     print(f"\n✓ Resumen guardado en: {archivo_resumen}")
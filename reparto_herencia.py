@@ -0,0 +1,1030 @@
+#!/usr/bin/env python3
+"""
+Reparto automático de una herencia entre herederos
+
+Versión en el servidor de RepartoService.repartirAutomaticamente (Angular),
+para repartos con muchas propiedades. El reparto se hace en tres fases:
+
+1. LPT con un montículo: las propiedades, de mayor a menor valor, van al
+   heredero con menos valor acumulado (O(n log n + n log k)).
+2. Karmarkar-Karp (método de diferencias) para k herederos; se queda el
+   mejor de los dos repartos iniciales.
+3. Búsqueda local: mover una propiedad o intercambiar dos entre el heredero
+   con más valor y el de menos (y el resto de parejas), mientras reduzca la
+   dispersión y quede presupuesto de tiempo.
+
+Con criterioBalance "mixto" las rústicas y las urbanas se reparten por
+separado y la búsqueda local solo intercambia propiedades del mismo tipo,
+de modo que no cambia cuántas de cada tipo recibe cada heredero.
+
+Con criterioBalance "exacto" se añade una cuarta fase: ramificación y poda
+sobre las asignaciones propiedad -> heredero que minimiza la diferencia
+entre el heredero con más valor y el de menos. Si se agota el tiempo se
+devuelve el mejor reparto encontrado con su distancia al óptimo (gap). Está
+pensado para herencias de pocas decenas de propiedades.
+
+Las propiedades que deben ir juntas (las rústicas de un mismo polígono, o
+grupos de referencias indicados) se reparten como un único lote.
+
+El resultado tiene la forma de los modelos Heredero y EstadisticasReparto
+del frontend (reparto.model.ts), con sus nombres de campo.
+
+Con "cuotas" cada heredero recibe su parte de la herencia (legítima,
+mejora y libre disposición repartidas de forma desigual) en lugar de
+partes iguales, y con "pesosBalance" se equilibran también la superficie y
+el número de rústicas y urbanas según esas mismas cuotas.
+
+Uso: python reparto_herencia.py [herederos] [--mixto | --exacto] [--poligonos]
+                                [--cuotas 1/2,1/4,1/4]
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+from fractions import Fraction
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from formato_catastral import superficie_a_m2
+
+CRITERIOS_BALANCE = ("valor", "mixto", "exacto")
+
+# Segundos máximos por reparto (las dos primeras fases siempre se completan)
+PRESUPUESTO_SEGUNDOS = 2.0
+
+# Presupuesto más alto que se admite; los mayores se recortan a este
+PRESUPUESTO_MAXIMO_SEGUNDOS = 30.0
+
+# Diferencia máxima/mínima (% del promedio) para considerar el reparto equilibrado
+PORCENTAJE_DESEQUILIBRIO_MAXIMO = 10
+
+TIPOS_PROPIEDAD = ("rustico", "urbano")
+
+# Criterios que se pueden equilibrar además del valor (configuracion["pesosBalance"])
+PESOS_BALANCE = ("valor", "superficie", "cantidad")
+
+# Tipo de un lote con propiedades rústicas y urbanas
+TIPO_VARIOS = "varios"
+
+# Nodos de la ramificación y poda entre comprobaciones del reloj
+NODOS_ENTRE_COMPROBACIONES = 1024
+
+# Referencia rústica: municipio del Catastro (5), sector (letra), polígono (3) y parcela (5)
+_REFERENCIA_RUSTICA = re.compile(r"^(\d{5})[A-Z](\d{3})\d{5}")
+
+
+# ============================================================================
+# PROPIEDADES Y HEREDEROS
+# ============================================================================
+
+def _numero(valor) -> float:
+    if isinstance(valor, bool):
+        return 0.0
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return superficie_a_m2(valor) or 0.0
+
+
+def determinar_tipo(propiedad: Dict) -> str:
+    """"rustico" o "urbano" según la clase del inmueble (en cualquiera de los dos formatos)"""
+    datos = propiedad.get("datos_descriptivos") or propiedad.get("datos_inmueble") or {}
+    clase = (datos.get("clase") or "").lower()
+    return "rustico" if "rústico" in clase or "rustico" in clase else "urbano"
+
+
+def calcular_superficie(propiedad: Dict) -> float:
+    """Superficie en hectáreas: la de los cultivos o, si no hay, la construida"""
+    cultivos = propiedad.get("cultivos") or []
+    if cultivos:
+        return sum(_numero(cultivo.get("superficie_m2")) for cultivo in cultivos) / 10000
+    datos = propiedad.get("datos_descriptivos") or propiedad.get("datos_inmueble") or {}
+    return _numero(datos.get("superficie_construida")) / 10000
+
+
+def crear_propiedad_asignada(propiedad: Dict, valoracion: Dict) -> Dict:
+    """PropiedadAsignada: la propiedad con su valoración, valor, superficie y tipo"""
+    return {
+        "propiedad": propiedad,
+        "valoracion": valoracion,
+        "valor": valoracion.get("valor_estimado_euros") or 0,
+        "superficie": calcular_superficie(propiedad),
+        "tipo": determinar_tipo(propiedad),
+    }
+
+
+def normalizar_cuotas(cuotas: Optional[Sequence], numero_herederos: int) -> List[float]:
+    """
+    Cuotas de los herederos como fracciones que suman 1
+
+    Args:
+        cuotas: Una cuota por heredero, en cualquier escala: números o
+            fracciones en texto ("1/3", "2/9"). None reparte a partes iguales.
+        numero_herederos: Número de herederos
+
+    Returns:
+        Fracción de la herencia que corresponde a cada heredero
+
+    Raises:
+        ValueError: Si no hay una cuota positiva por heredero
+    """
+    if cuotas is None:
+        return [1 / numero_herederos] * numero_herederos
+    if len(cuotas) != numero_herederos:
+        raise ValueError(f"Se esperaban {numero_herederos} cuotas y hay {len(cuotas)}")
+    try:
+        fracciones = [Fraction(str(cuota)) for cuota in cuotas]
+    except (ValueError, ZeroDivisionError):
+        raise ValueError(f"Cuotas no válidas: {cuotas}")
+    if any(fraccion <= 0 for fraccion in fracciones):
+        raise ValueError("Todas las cuotas deben ser positivas")
+    total = sum(fracciones)
+    return [float(fraccion / total) for fraccion in fracciones]
+
+
+def inicializar_herederos(numero_herederos: int, cuotas: Optional[Sequence[float]] = None) -> List[Dict]:
+    """Herederos vacíos numerados desde 1, con su cuota de la herencia"""
+    cuotas = cuotas or [1 / numero_herederos] * numero_herederos
+    return [
+        {
+            "id": i + 1,
+            "nombre": f"Heredero {i + 1}",
+            "cuota": cuotas[i],
+            "propiedades": [],
+            "valorTotal": 0,
+            "valorObjetivo": 0,
+            "superficieTotal": 0,
+            "cantidadRusticas": 0,
+            "cantidadUrbanas": 0,
+        }
+        for i in range(numero_herederos)
+    ]
+
+
+def recalcular_totales(heredero: Dict) -> Dict:
+    """Recalcula valor, superficie y número de propiedades de un heredero"""
+    propiedades = heredero["propiedades"]
+    heredero["valorTotal"] = sum(p["valor"] for p in propiedades)
+    heredero["superficieTotal"] = sum(p["superficie"] for p in propiedades)
+    heredero["cantidadRusticas"] = sum(1 for p in propiedades if p["tipo"] == "rustico")
+    heredero["cantidadUrbanas"] = len(propiedades) - heredero["cantidadRusticas"]
+    return heredero
+
+
+def clave_poligono(propiedad: Dict) -> Optional[str]:
+    """Municipio y polígono de una propiedad rústica ("03106-002"), o None"""
+    if determinar_tipo(propiedad) != "rustico":
+        return None
+    coincidencia = _REFERENCIA_RUSTICA.match(propiedad.get("referencia_catastral") or "")
+    return f"{coincidencia.group(1)}-{coincidencia.group(2)}" if coincidencia else None
+
+
+def formar_lotes(propiedades: List[Dict], agrupar_por_poligono: bool = False,
+                 mantener_juntas: Sequence[Sequence[str]] = ()) -> List[List[int]]:
+    """
+    Agrupa las propiedades que tienen que ir al mismo heredero
+
+    Args:
+        propiedades: Propiedades a repartir
+        agrupar_por_poligono: Juntar las rústicas de un mismo polígono
+        mantener_juntas: Grupos de referencias catastrales que no se separan
+
+    Returns:
+        Lotes como listas de índices de propiedades, en el orden de la primera
+        propiedad de cada lote
+    """
+    padre = list(range(len(propiedades)))
+
+    def raiz(i):
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+
+    def unir(i, j):
+        i, j = raiz(i), raiz(j)
+        if i != j:
+            padre[max(i, j)] = min(i, j)
+
+    primero = {}
+    if agrupar_por_poligono:
+        for i, propiedad in enumerate(propiedades):
+            clave = clave_poligono(propiedad)
+            if clave is not None:
+                unir(primero.setdefault(("poligono", clave), i), i)
+
+    por_referencia = {}
+    for i, propiedad in enumerate(propiedades):
+        por_referencia.setdefault(propiedad.get("referencia_catastral"), i)
+    for grupo in mantener_juntas:
+        indices = [por_referencia[r] for r in grupo if r in por_referencia]
+        for i in indices[1:]:
+            unir(indices[0], i)
+
+    lotes = {}
+    for i in range(len(propiedades)):
+        lotes.setdefault(raiz(i), []).append(i)
+    return list(lotes.values())
+
+
+def calcular_estadisticas(herederos: List[Dict],
+                          porcentaje_maximo: float = PORCENTAJE_DESEQUILIBRIO_MAXIMO) -> Dict:
+    """
+    EstadisticasReparto de un reparto (como RepartoService.calcularEstadisticas)
+
+    Las desviaciones se miden respecto al valor que corresponde a cada
+    heredero por su cuota; con cuotas iguales es el promedio, como en el
+    frontend. El heredero mayor y el menor son el que más excede su objetivo
+    y el que más se queda por debajo.
+
+    Args:
+        herederos: Herederos con sus totales calculados (y su "cuota"; sin
+            ella, a partes iguales)
+        porcentaje_maximo: Diferencia máxima/mínima (% del promedio) para
+            considerar el reparto equilibrado
+
+    Returns:
+        Diccionario con los campos de EstadisticasReparto
+    """
+    if not herederos:
+        return {
+            "valorTotal": 0,
+            "valorPromedioPorHeredero": 0,
+            "desviacionEstandar": 0,
+            "desviacionPorcentual": 0,
+            "diferenciaMaxMin": 0,
+            "herederoMayor": {"id": 0, "valor": 0},
+            "herederoMenor": {"id": 0, "valor": 0},
+            "equilibrado": True,
+        }
+
+    valor_total = sum(h["valorTotal"] for h in herederos)
+    promedio = valor_total / len(herederos)
+    objetivos = [h.get("cuota", 1 / len(herederos)) * valor_total for h in herederos]
+    excesos = [h["valorTotal"] - objetivo for h, objetivo in zip(herederos, objetivos)]
+
+    varianza = sum(exceso ** 2 for exceso in excesos) / len(herederos)
+    desviacion = math.sqrt(varianza)
+
+    # El primero con el exceso máximo/mínimo, como el reduce del frontend
+    def clave(i):
+        return excesos[i], herederos[i]["valorTotal"]
+
+    mayor = max(range(len(herederos)), key=clave)
+    menor = min(range(len(herederos)), key=clave)
+    diferencia = ((herederos[mayor]["valorTotal"] - herederos[menor]["valorTotal"])
+                  - (objetivos[mayor] - objetivos[menor]))
+
+    return {
+        "valorTotal": valor_total,
+        "valorPromedioPorHeredero": promedio,
+        "desviacionEstandar": desviacion,
+        "desviacionPorcentual": desviacion / promedio * 100 if promedio > 0 else 0,
+        "diferenciaMaxMin": diferencia,
+        "herederoMayor": {"id": herederos[mayor]["id"], "valor": herederos[mayor]["valorTotal"]},
+        "herederoMenor": {"id": herederos[menor]["id"], "valor": herederos[menor]["valorTotal"]},
+        "equilibrado": (diferencia / promedio * 100 if promedio > 0 else 0) <= porcentaje_maximo,
+    }
+
+
+# ============================================================================
+# ALGORITMOS DE REPARTO
+# ============================================================================
+# Trabajan sobre la lista de valores y devuelven la asignación: para cada
+# propiedad, el índice (desde 0) del heredero que la recibe.
+
+def cargas_asignacion(valores: Sequence[float], asignacion: Sequence[int], k: int) -> List[float]:
+    """Valor total que recibe cada heredero"""
+    cargas = [0.0] * k
+    for valor, heredero in zip(valores, asignacion):
+        cargas[heredero] += valor
+    return cargas
+
+
+def calidad(valores: Sequence[float], asignacion: Sequence[int], k: int) -> Tuple[float, float]:
+    """(diferencia máx-mín, suma de cuadrados de las cargas): menor es mejor"""
+    cargas = cargas_asignacion(valores, asignacion, k)
+    return max(cargas) - min(cargas), sum(c * c for c in cargas)
+
+
+def reparto_lpt(valores: Sequence[float], k: int) -> List[int]:
+    """
+    Reparto voraz LPT: cada propiedad, de mayor a menor valor, al heredero
+    con menos valor acumulado (el de menor índice en caso de empate)
+    """
+    asignacion = [0] * len(valores)
+    monticulo = [(0.0, h) for h in range(k)]
+    for i in sorted(range(len(valores)), key=lambda i: -valores[i]):
+        carga, heredero = heapq.heappop(monticulo)
+        asignacion[i] = heredero
+        heapq.heappush(monticulo, (carga + valores[i], heredero))
+    return asignacion
+
+
+def _aplanar(grupo) -> List[int]:
+    """Índices de un grupo guardado como tuplas anidadas"""
+    indices = []
+    pila = [grupo]
+    while pila:
+        elemento = pila.pop()
+        if isinstance(elemento, int):
+            indices.append(elemento)
+        else:
+            pila.extend(elemento)
+    return indices
+
+
+def reparto_karmarkar_karp(valores: Sequence[float], k: int) -> List[int]:
+    """
+    Método de diferencias de Karmarkar-Karp para k herederos
+
+    Cada propiedad empieza como un reparto parcial de k grupos (ella sola y
+    k-1 vacíos). En cada paso se combinan los dos repartos parciales con más
+    diferencia entre su grupo mayor y su grupo menor, uniendo el grupo mayor
+    de uno con el menor del otro, y se restan los mínimos. Los grupos se
+    guardan como tuplas anidadas para que unirlos cueste O(1).
+    """
+    if not valores:
+        return []
+
+    monticulo = []
+    for i, valor in enumerate(valores):
+        grupos = [(valor, (i,))] + [(0.0, ())] * (k - 1)
+        monticulo.append((-valor, i, grupos))
+    heapq.heapify(monticulo)
+
+    contador = len(valores)
+    while len(monticulo) > 1:
+        _, _, a = heapq.heappop(monticulo)
+        _, _, b = heapq.heappop(monticulo)
+        combinados = sorted(
+            ((suma_a + suma_b, (grupo_a, grupo_b)) for (suma_a, grupo_a), (suma_b, grupo_b) in zip(a, reversed(b))),
+            key=lambda grupo: -grupo[0]
+        )
+        minimo = combinados[-1][0]
+        combinados = [(suma - minimo, grupo) for suma, grupo in combinados]
+        heapq.heappush(monticulo, (-combinados[0][0], contador, combinados))
+        contador += 1
+
+    asignacion = [0] * len(valores)
+    for heredero, (_, grupo) in enumerate(monticulo[0][2]):
+        for i in _aplanar(grupo):
+            asignacion[i] = heredero
+    return asignacion
+
+
+def mejor_reparto_inicial(valores: Sequence[float], k: int) -> Tuple[List[int], str]:
+    """
+    El mejor reparto entre LPT y Karmarkar-Karp
+
+    Returns:
+        (asignación, "lpt" o "karmarkar_karp")
+    """
+    lpt = reparto_lpt(valores, k)
+    kk = reparto_karmarkar_karp(valores, k)
+    if calidad(valores, kk, k) < calidad(valores, lpt, k):
+        return kk, "karmarkar_karp"
+    return lpt, "lpt"
+
+
+def reparto_ponderado(valores: Sequence[float], k: int, cuotas: Sequence[float],
+                      secundarias: Sequence[Tuple[float, Sequence[float]]] = ()) -> List[int]:
+    """
+    Reparto voraz hacia la cuota de cada heredero y con varios criterios
+
+    Cada propiedad, de mayor a menor valor, va al heredero con menos carga
+    normalizada (el de mayor déficit): la suma, para el valor y para cada
+    criterio secundario en el que la propiedad cuenta, de lo que ya ha
+    recibido dividido entre lo que le corresponde por su cuota y ponderado
+    por el peso del criterio. Hay un montículo por cada combinación de
+    criterios; al asignar una propiedad se añaden las claves nuevas de su
+    heredero y las antiguas se descartan al llegar a la cima (por versión),
+    con lo que cada asignación cuesta O(log k).
+
+    Con cuotas iguales y sin criterios secundarios es el reparto LPT.
+
+    Args:
+        valores: Valor de cada propiedad
+        k: Número de herederos
+        cuotas: Fracción de la herencia de cada heredero
+        secundarias: (peso, valor de cada propiedad) de los demás criterios
+            (superficie, número de rústicas...), con el valor de peso 1
+
+    Returns:
+        Asignación de cada propiedad a un heredero
+    """
+    dimensiones = [valores] + [vector for peso, vector in secundarias if peso > 0]
+    pesos = [1.0] + [peso for peso, _ in secundarias if peso > 0]
+    totales = [sum(vector) for vector in dimensiones]
+    escalas = [peso / total if total > 0 else 0.0 for peso, total in zip(pesos, totales)]
+
+    cargas = [[0.0] * len(dimensiones) for _ in range(k)]
+    version = [0] * k
+    monticulos = {}
+
+    def clave(heredero, criterios):
+        return sum(escalas[d] * cargas[heredero][d] for d in criterios) / cuotas[heredero]
+
+    asignacion = [0] * len(valores)
+    for i in sorted(range(len(valores)), key=lambda i: -valores[i]):
+        criterios = (0,) + tuple(d for d in range(1, len(dimensiones)) if dimensiones[d][i])
+        monticulo = monticulos.get(criterios)
+        if monticulo is None:
+            monticulo = [(clave(h, criterios), h, version[h]) for h in range(k)]
+            heapq.heapify(monticulo)
+            monticulos[criterios] = monticulo
+        while monticulo[0][2] != version[monticulo[0][1]]:
+            heapq.heappop(monticulo)
+
+        heredero = monticulo[0][1]
+        asignacion[i] = heredero
+        for d, vector in enumerate(dimensiones):
+            cargas[heredero][d] += vector[i]
+        version[heredero] += 1
+        for criterios_monticulo, otro in monticulos.items():
+            heapq.heappush(otro, (clave(heredero, criterios_monticulo), heredero, version[heredero]))
+
+    return asignacion
+
+
+def _mejor_cambio(valores: Sequence[float], tipos: Optional[Sequence[str]],
+                  de: set, a: set, diferencia: float, tolerancia: float,
+                  mover: bool, secundarias: Sequence[Tuple[float, Sequence[float], float]] = ()
+                  ) -> Optional[Tuple[float, int, Optional[int]]]:
+    """
+    Mejor movimiento o intercambio entre dos herederos
+
+    Pasar un valor d del heredero con más exceso sobre su objetivo al otro
+    cambia la suma de cuadrados de los excesos en 2·d·(d - diferencia):
+    mejora si 0 < d < diferencia y la mejora es máxima con d = diferencia / 2.
+    Los criterios secundarios suman su propio término, ponderado, y el
+    cambio solo se acepta si el total también mejora.
+
+    Returns:
+        (ganancia, propiedad que sale, propiedad que entra o None), o None
+    """
+    mejor = None
+
+    def considerar(d, sale, entra):
+        nonlocal mejor
+        if tolerancia < d < diferencia - tolerancia:
+            ganancia = d * (diferencia - d)
+            for peso, vector, diferencia_criterio in secundarias:
+                delta = vector[sale] - (vector[entra] if entra is not None else 0)
+                ganancia += peso * delta * (diferencia_criterio - delta)
+            if ganancia > 0 and (mejor is None or ganancia > mejor[0]):
+                mejor = (ganancia, sale, entra)
+
+    if mover:
+        for i in de:
+            considerar(valores[i], i, None)
+
+    # Intercambios: para cada x, el y más próximo a x - diferencia/2 del mismo tipo
+    destino = {}
+    for j in a:
+        destino.setdefault(tipos[j] if tipos else None, []).append((valores[j], j))
+    for lista in destino.values():
+        lista.sort()
+    claves = {tipo: [valor for valor, _ in lista] for tipo, lista in destino.items()}
+
+    for i in de:
+        tipo = tipos[i] if tipos else None
+        lista = destino.get(tipo)
+        if not lista:
+            continue
+        objetivo = valores[i] - diferencia / 2
+        posicion = bisect_left(claves[tipo], objetivo)
+        for p in (posicion - 1, posicion):
+            if 0 <= p < len(lista):
+                considerar(valores[i] - lista[p][0], i, lista[p][1])
+
+    return mejor
+
+
+def busqueda_local(valores: Sequence[float], asignacion: List[int], k: int,
+                   limite: Optional[float] = None, tipos: Optional[Sequence[str]] = None,
+                   objetivos: Optional[Sequence[float]] = None,
+                   secundarias: Sequence[Tuple[float, Sequence[float], Sequence[float]]] = ()
+                   ) -> Tuple[List[int], int, bool]:
+    """
+    Mejora un reparto moviendo o intercambiando propiedades entre herederos
+
+    Se recorren las parejas de herederos de mayor a menor diferencia entre
+    su exceso sobre el objetivo (con cuotas iguales, entre su valor) y se
+    aplica el mejor cambio de la primera pareja que lo tenga, hasta que
+    ninguna pareja mejore o se agote el tiempo.
+
+    Args:
+        valores: Valor de cada propiedad
+        asignacion: Reparto inicial (se modifica en el sitio)
+        k: Número de herederos
+        limite: Instante (time.monotonic()) en el que hay que parar
+        tipos: Tipo de cada propiedad; si se indica, solo se intercambian
+            propiedades del mismo tipo y no se mueven sueltas
+        objetivos: Valor que corresponde a cada heredero (por defecto, el
+            mismo para todos)
+        secundarias: (peso, valor de cada propiedad, objetivo de cada
+            heredero) de los demás criterios; el peso convierte su término
+            a unidades del valor
+
+    Returns:
+        (asignación, número de cambios aplicados, True si se agotó el tiempo)
+    """
+    cargas = cargas_asignacion(valores, asignacion, k)
+    if objetivos is not None:
+        cargas = [carga - objetivo for carga, objetivo in zip(cargas, objetivos)]
+    excesos = [
+        [carga - objetivo for carga, objetivo in zip(cargas_asignacion(vector, asignacion, k), objetivos_criterio)]
+        for _, vector, objetivos_criterio in secundarias
+    ]
+    por_heredero = [set() for _ in range(k)]
+    for i, heredero in enumerate(asignacion):
+        por_heredero[heredero].add(i)
+
+    tolerancia = 1e-9 * max(1.0, sum(abs(v) for v in valores))
+    cambios = 0
+
+    while True:
+        orden = sorted(range(k), key=cargas.__getitem__, reverse=True)
+        aplicado = False
+
+        for posicion, origen in enumerate(orden):
+            for destino in reversed(orden[posicion + 1:]):
+                if limite is not None and time.monotonic() >= limite:
+                    return asignacion, cambios, True
+
+                diferencia = cargas[origen] - cargas[destino]
+                if diferencia <= tolerancia:
+                    break
+                cambio = _mejor_cambio(
+                    valores, tipos, por_heredero[origen], por_heredero[destino], diferencia, tolerancia,
+                    mover=tipos is None,
+                    secundarias=[(peso, vector, exceso[origen] - exceso[destino])
+                                 for (peso, vector, _), exceso in zip(secundarias, excesos)],
+                )
+                if cambio is None:
+                    continue
+
+                _, sale, entra = cambio
+                por_heredero[origen].remove(sale)
+                por_heredero[destino].add(sale)
+                asignacion[sale] = destino
+                transferido = valores[sale]
+                if entra is not None:
+                    por_heredero[destino].remove(entra)
+                    por_heredero[origen].add(entra)
+                    asignacion[entra] = origen
+                    transferido -= valores[entra]
+                cargas[origen] -= transferido
+                cargas[destino] += transferido
+                for (_, vector, _), exceso in zip(secundarias, excesos):
+                    delta = vector[sale] - (vector[entra] if entra is not None else 0)
+                    exceso[origen] -= delta
+                    exceso[destino] += delta
+                cambios += 1
+                aplicado = True
+                break
+            if aplicado:
+                break
+
+        if not aplicado:
+            return asignacion, cambios, False
+
+
+def cota_inferior(valores: Sequence[float], k: int, objetivos: Optional[Sequence[float]] = None) -> float:
+    """
+    Cota inferior de la diferencia máx-mín de los excesos sobre el objetivo
+
+    El heredero de la propiedad más valiosa excede su objetivo al menos en
+    su valor menos el mayor objetivo, y como los excesos suman cero, el que
+    menos tiene queda por debajo de menos la parte proporcional de ese
+    exceso. Si hay menos propiedades que herederos, alguno no recibe nada.
+    """
+    if k <= 1 or not valores:
+        return 0.0
+    if objetivos is None:
+        objetivos = [sum(valores) / k] * k
+    exceso = max(valores) - max(objetivos)
+    if len(valores) < k:
+        return max(0.0, exceso) + min(objetivos)
+    return max(0.0, exceso * k / (k - 1))
+
+
+def reparto_exacto(valores: Sequence[float], k: int, limite: Optional[float] = None,
+                   inicial: Optional[List[int]] = None,
+                   objetivos: Optional[Sequence[float]] = None) -> Tuple[List[int], Dict]:
+    """
+    Reparto que minimiza la diferencia máx-mín por ramificación y poda
+
+    Se trabaja con el exceso de cada heredero sobre su objetivo (con cuotas
+    iguales, sobre la media), que al final suma cero. Las propiedades se
+    asignan de mayor a menor valor, probando primero el heredero con menos
+    exceso y una sola vez cada exceso distinto (los herederos con el mismo
+    exceso son intercambiables). Una rama se poda si ya no puede mejorar el
+    mejor reparto conocido: algún heredero excede su objetivo en esa
+    diferencia, a los demás no les llega lo que queda por repartir para
+    quedarse por encima de menos la diferencia, o el que más excede su
+    objetivo supera en esa diferencia lo máximo que puede llegar a tener el
+    que menos.
+
+    Args:
+        valores: Valor de cada propiedad
+        k: Número de herederos
+        limite: Instante (time.monotonic()) en el que hay que parar
+        inicial: Reparto del que partir (por defecto, el mejor de LPT y
+            Karmarkar-Karp)
+        objetivos: Valor que corresponde a cada heredero (por defecto, la media)
+
+    Returns:
+        (asignación, {"optimo", "diferencia", "cotaInferior", "gap",
+        "gapPorcentual", "nodos", "presupuestoAgotado"})
+    """
+    n = len(valores)
+    total = sum(valores)
+    media = total / k
+    if objetivos is None:
+        objetivos = [media] * k
+
+    if inicial is None:
+        inicial, _ = mejor_reparto_inicial(valores, k)
+    mejor = list(inicial)
+    excesos_mejor = [c - o for c, o in zip(cargas_asignacion(valores, mejor, k), objetivos)]
+    diferencia = max(excesos_mejor) - min(excesos_mejor)
+
+    cota = cota_inferior(valores, k, objetivos)
+    tolerancia = 1e-9 * max(1.0, total)
+
+    orden = sorted(range(n), key=lambda i: -valores[i])
+    v = [valores[i] for i in orden]
+    resto = [0.0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        resto[i] = resto[i + 1] + v[i]
+
+    cargas = [-objetivo for objetivo in objetivos]
+    elegido = [-1] * n
+    candidatos = [()] * n
+    posicion = [0] * n
+    nodos = 0
+    agotado = False
+
+    def podar(siguiente: int) -> bool:
+        umbral = diferencia - tolerancia
+        maxima = max(cargas)
+        if maxima >= umbral:
+            return True
+        if sum(-umbral - c for c in cargas if c < -umbral) > resto[siguiente]:
+            return True
+        techo_menor = min(min(cargas) + resto[siguiente], -maxima / (k - 1))
+        return maxima - techo_menor >= umbral
+
+    def generar() -> Tuple[int, ...]:
+        vistas = set()
+        herederos = []
+        for h in sorted(range(k), key=cargas.__getitem__):
+            if cargas[h] not in vistas:
+                vistas.add(cargas[h])
+                herederos.append(h)
+        return tuple(herederos)
+
+    i = 0
+    if k > 1 and n and diferencia > cota + tolerancia:
+        candidatos[0] = generar()
+    else:
+        i = -1
+
+    while i >= 0:
+        if elegido[i] >= 0:
+            cargas[elegido[i]] -= v[i]
+            elegido[i] = -1
+        if posicion[i] == len(candidatos[i]):
+            i -= 1
+            continue
+
+        h = candidatos[i][posicion[i]]
+        posicion[i] += 1
+        cargas[h] += v[i]
+        elegido[i] = h
+        nodos += 1
+        if limite is not None and nodos % NODOS_ENTRE_COMPROBACIONES == 0 and time.monotonic() >= limite:
+            agotado = True
+            break
+
+        if i == n - 1:
+            nueva = max(cargas) - min(cargas)
+            if nueva < diferencia - tolerancia:
+                diferencia = nueva
+                for j, heredero in zip(orden, elegido):
+                    mejor[j] = heredero
+                if diferencia <= cota + tolerancia:
+                    break
+            continue
+
+        if podar(i + 1):
+            continue
+        i += 1
+        candidatos[i] = generar()
+        posicion[i] = 0
+        elegido[i] = -1
+
+    # Si la búsqueda terminó, el mejor reparto encontrado es el óptimo
+    if not agotado:
+        cota = diferencia
+    gap = max(0.0, diferencia - cota)
+    return mejor, {
+        "optimo": gap <= tolerancia,
+        "diferencia": diferencia,
+        "cotaInferior": cota,
+        "gap": gap,
+        "gapPorcentual": gap / media * 100 if media > 0 else 0,
+        "nodos": nodos,
+        "presupuestoAgotado": agotado,
+    }
+
+
+def _reparto_por_tipo(valores: Sequence[float], tipos: Sequence[str], k: int) -> List[int]:
+    """
+    Reparte por separado rústicas y urbanas y combina los grupos
+
+    Los grupos de urbanas, de mayor a menor valor, van a los herederos con
+    menos valor en rústicas (y después los lotes que mezclan los dos tipos).
+    """
+    asignacion = [0] * len(valores)
+    cargas = [0.0] * k
+    for tipo in dict.fromkeys([*TIPOS_PROPIEDAD, *tipos]):
+        indices = [i for i, t in enumerate(tipos) if t == tipo]
+        if not indices:
+            continue
+        parcial, _ = mejor_reparto_inicial([valores[i] for i in indices], k)
+        sumas = cargas_asignacion([valores[i] for i in indices], parcial, k)
+        grupos = sorted(range(k), key=lambda g: -sumas[g])
+        herederos = sorted(range(k), key=lambda h: cargas[h])
+        destino = dict(zip(grupos, herederos))
+        for i, grupo in zip(indices, parcial):
+            asignacion[i] = destino[grupo]
+        for grupo, heredero in destino.items():
+            cargas[heredero] += sumas[grupo]
+    return asignacion
+
+
+def limitar_presupuesto(segundos) -> float:
+    """
+    Presupuesto de tiempo válido, recortado a PRESUPUESTO_MAXIMO_SEGUNDOS
+
+    Raises:
+        ValueError: Si no es un número finito mayor o igual que cero
+    """
+    try:
+        segundos = float(segundos)
+    except (TypeError, ValueError):
+        raise ValueError(f"Presupuesto de tiempo no válido: {segundos!r}")
+    if not math.isfinite(segundos) or segundos < 0:
+        raise ValueError(f"Presupuesto de tiempo no válido: {segundos!r}")
+    return min(segundos, PRESUPUESTO_MAXIMO_SEGUNDOS)
+
+
+def repartir_valores(valores: Sequence[float], k: int, criterio: str = "valor",
+                     tipos: Optional[Sequence[str]] = None,
+                     presupuesto_segundos: float = PRESUPUESTO_SEGUNDOS,
+                     cuotas: Optional[Sequence[float]] = None,
+                     secundarias: Sequence[Tuple[float, Sequence[float]]] = ()) -> Tuple[List[int], Dict]:
+    """
+    Reparte una lista de valores entre k herederos
+
+    Con cuotas distintas o criterios secundarios, el reparto inicial es el
+    voraz ponderado (reparto_ponderado) y las fases siguientes equilibran el
+    exceso de cada heredero sobre lo que le corresponde. La ramificación y
+    poda del criterio "exacto" solo tiene en cuenta el valor.
+
+    Args:
+        valores: Valor de cada propiedad
+        k: Número de herederos
+        criterio: "valor", "mixto" (necesita tipos) o "exacto"
+        tipos: Tipo ("rustico"/"urbano") de cada propiedad
+        presupuesto_segundos: Tiempo máximo para la búsqueda local y, con
+            "exacto", la ramificación y poda (como mucho
+            PRESUPUESTO_MAXIMO_SEGUNDOS)
+        cuotas: Fracción de la herencia de cada heredero (suman 1); por
+            defecto, partes iguales
+        secundarias: (peso, valor de cada propiedad) de los demás criterios
+            a equilibrar según las cuotas, con el valor de peso 1
+
+    Returns:
+        (asignación, información de las fases: reparto inicial, cambios de la
+        búsqueda local, si se agotó el tiempo y segundos empleados; con
+        "exacto", además si el reparto es óptimo, la cota inferior y el gap)
+
+    Raises:
+        ValueError: Si el presupuesto de tiempo no es un número finito no negativo
+    """
+    inicio = time.monotonic()
+    presupuesto_segundos = limitar_presupuesto(presupuesto_segundos)
+
+    secundarias = [(peso, vector) for peso, vector in secundarias if peso > 0 and sum(vector) > 0]
+    ponderado = bool(secundarias) or (cuotas is not None and len(set(cuotas)) > 1)
+    cuotas = cuotas or [1 / k] * k
+    total = sum(valores)
+
+    if ponderado:
+        asignacion, inicial = reparto_ponderado(valores, k, cuotas, secundarias), "ponderado"
+    elif criterio == "mixto":
+        asignacion, inicial = _reparto_por_tipo(valores, tipos, k), "por_tipo"
+    else:
+        asignacion, inicial = mejor_reparto_inicial(valores, k)
+    if criterio != "mixto":
+        tipos = None
+
+    # Cada criterio secundario, en unidades del valor: pesa lo mismo una
+    # desviación de un 1 % del total en cualquiera de ellos
+    objetivos = [cuota * total for cuota in cuotas] if ponderado else None
+    ajustadas = []
+    for peso, vector in secundarias:
+        total_criterio = sum(vector)
+        ajustadas.append((peso * (total / total_criterio) ** 2, vector,
+                          [cuota * total_criterio for cuota in cuotas]))
+
+    limite = inicio + presupuesto_segundos
+    asignacion, cambios, agotado = busqueda_local(valores, asignacion, k, limite=limite, tipos=tipos,
+                                                  objetivos=objetivos, secundarias=ajustadas)
+    algoritmo = {
+        "criterio": criterio,
+        "repartoInicial": inicial,
+        "cambiosBusquedaLocal": cambios,
+    }
+
+    if criterio == "exacto":
+        asignacion, exacto = reparto_exacto(valores, k, limite=limite, inicial=asignacion, objetivos=objetivos)
+        agotado = exacto.pop("presupuestoAgotado") or agotado
+        algoritmo.update(exacto)
+
+    algoritmo["presupuestoAgotado"] = agotado
+    algoritmo["segundos"] = round(time.monotonic() - inicio, 4)
+    return asignacion, algoritmo
+
+
+def repartir(propiedades: List[Dict], valoraciones: List[Dict], configuracion: Dict,
+             presupuesto_segundos: float = PRESUPUESTO_SEGUNDOS) -> Dict:
+    """
+    Reparto automático de las propiedades valoradas entre los herederos
+
+    Args:
+        propiedades: Propiedades del catastro
+        valoraciones: Valoraciones de las propiedades (las propiedades sin
+            valoración no se reparten, como en el frontend)
+        configuracion: ConfiguracionReparto {"numeroHerederos", "criterioBalance",
+            "porcentajeDesequilibrioMaximo", ...} y, opcionalmente:
+            "cuotas" (una por heredero, p. ej. ["1/2", "1/4", "1/4"]),
+            "pesosBalance" ({"superficie": 0.5, "cantidad": 0.5}: cuánto
+            pesan, frente al valor, la superficie y el número de rústicas y
+            urbanas), y las restricciones "agruparPorPoligono" (bool) y
+            "mantenerJuntas" (grupos de referencias catastrales)
+        presupuesto_segundos: Tiempo máximo para la búsqueda local y la
+            ramificación y poda
+
+    Returns:
+        {"herederos": [Heredero], "estadisticas": EstadisticasReparto, "algoritmo": {...}}
+
+    Raises:
+        ValueError: Si el número de herederos, el criterio, las cuotas, los
+            pesos o el presupuesto de tiempo no son válidos
+    """
+    k = int(configuracion.get("numeroHerederos") or 0)
+    if k < 1:
+        raise ValueError("numeroHerederos debe ser al menos 1")
+    criterio = configuracion.get("criterioBalance") or "valor"
+    if criterio not in CRITERIOS_BALANCE:
+        raise ValueError(f"Criterio de balance desconocido: {criterio}")
+    cuotas = normalizar_cuotas(configuracion.get("cuotas"), k)
+
+    pesos = dict(configuracion.get("pesosBalance") or {})
+    desconocidos = set(pesos) - set(PESOS_BALANCE)
+    if desconocidos:
+        raise ValueError(f"Pesos de balance desconocidos: {sorted(desconocidos)}")
+    if any(not isinstance(peso, (int, float)) or peso < 0 for peso in pesos.values()):
+        raise ValueError("Los pesos de balance deben ser números no negativos")
+    if pesos.get("valor", 1) <= 0:
+        raise ValueError("El peso del valor debe ser positivo")
+    # Con cuotas distintas, "mixto" equilibra también el número de rústicas y urbanas
+    if criterio == "mixto" and configuracion.get("cuotas") is not None:
+        pesos.setdefault("cantidad", 1.0)
+    escala = 1 / pesos.get("valor", 1)
+
+    por_referencia = {v.get("referencia_catastral"): v for v in valoraciones}
+    asignables = [
+        crear_propiedad_asignada(propiedad, por_referencia[propiedad.get("referencia_catastral")])
+        for propiedad in propiedades
+        if propiedad.get("referencia_catastral") in por_referencia
+    ]
+    # De mayor a menor valor, el orden en que el frontend las lista
+    asignables.sort(key=lambda p: -p["valor"])
+
+    lotes = formar_lotes(
+        [p["propiedad"] for p in asignables],
+        agrupar_por_poligono=bool(configuracion.get("agruparPorPoligono")),
+        mantener_juntas=configuracion.get("mantenerJuntas") or (),
+    )
+    tipos = []
+    for lote in lotes:
+        tipos_lote = {asignables[i]["tipo"] for i in lote}
+        tipos.append(tipos_lote.pop() if len(tipos_lote) == 1 else TIPO_VARIOS)
+
+    secundarias = []
+    if pesos.get("superficie"):
+        superficies = [sum(asignables[i]["superficie"] for i in lote) for lote in lotes]
+        secundarias.append((pesos["superficie"] * escala, superficies))
+    if pesos.get("cantidad"):
+        for tipo in TIPOS_PROPIEDAD:
+            cantidades = [sum(1 for i in lote if asignables[i]["tipo"] == tipo) for lote in lotes]
+            secundarias.append((pesos["cantidad"] * escala, cantidades))
+
+    asignacion, algoritmo = repartir_valores(
+        [sum(asignables[i]["valor"] for i in lote) for lote in lotes], k, criterio,
+        tipos=tipos, presupuesto_segundos=presupuesto_segundos, cuotas=cuotas, secundarias=secundarias
+    )
+    algoritmo["lotes"] = len(lotes)
+
+    herederos = inicializar_herederos(k, cuotas)
+    por_propiedad = [0] * len(asignables)
+    for lote, heredero in zip(lotes, asignacion):
+        for i in lote:
+            por_propiedad[i] = heredero
+    for propiedad, heredero in zip(asignables, por_propiedad):
+        herederos[heredero]["propiedades"].append(propiedad)
+    for heredero in herederos:
+        recalcular_totales(heredero)
+    valor_total = sum(heredero["valorTotal"] for heredero in herederos)
+    for heredero in herederos:
+        heredero["valorObjetivo"] = heredero["cuota"] * valor_total
+
+    porcentaje = configuracion.get("porcentajeDesequilibrioMaximo")
+    if porcentaje is None:
+        porcentaje = PORCENTAJE_DESEQUILIBRIO_MAXIMO
+
+    return {
+        "herederos": herederos,
+        "estadisticas": calcular_estadisticas(herederos, porcentaje),
+        "algoritmo": algoritmo,
+    }
+
+
+def main():
+    """Reparte las valoraciones de data/valoraciones.json y muestra el resultado"""
+    argumentos = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    cuotas = None
+    if "--cuotas" in sys.argv:
+        texto_cuotas = sys.argv[sys.argv.index("--cuotas") + 1]
+        argumentos.remove(texto_cuotas)
+        cuotas = texto_cuotas.split(",")
+    numero_herederos = int(argumentos[0]) if argumentos else len(cuotas) if cuotas else 3
+    criterio = "mixto" if "--mixto" in sys.argv else "exacto" if "--exacto" in sys.argv else "valor"
+
+    print("=" * 60)
+    print("REPARTO DE HERENCIA")
+    print("=" * 60)
+    print()
+
+    archivo_datos = "data/datos_catastrales_consolidados.json"
+    archivo_valoraciones = "data/valoraciones.json"
+    for archivo in (archivo_datos, archivo_valoraciones):
+        if not os.path.exists(archivo):
+            print(f"❌ No se encontró: {archivo}")
+            print("   Ejecuta: python valorador_inmuebles.py")
+            return
+
+    with open(archivo_datos, 'r', encoding='utf-8') as f:
+        propiedades = json.load(f)
+    with open(archivo_valoraciones, 'r', encoding='utf-8') as f:
+        valoraciones = json.load(f).get("valoraciones", [])
+
+    print(f"✓ {len(propiedades)} propiedades, {len(valoraciones)} valoraciones")
+    print(f"  Herederos: {numero_herederos} · Criterio: {criterio}\n")
+
+    resultado = repartir(propiedades, valoraciones, {
+        "numeroHerederos": numero_herederos,
+        "criterioBalance": criterio,
+        "agruparPorPoligono": "--poligonos" in sys.argv,
+        "cuotas": cuotas,
+    })
+
+    for heredero in resultado["herederos"]:
+        print(f"👤 {heredero['nombre']} ({heredero['cuota']:.2%}): {heredero['valorTotal']:,.2f} € "
+              f"de {heredero['valorObjetivo']:,.2f} € "
+              f"({heredero['cantidadRusticas']} rústicas, {heredero['cantidadUrbanas']} urbanas)")
+
+    estadisticas = resultado["estadisticas"]
+    algoritmo = resultado["algoritmo"]
+    print()
+    print(f"Diferencia máx-mín: {estadisticas['diferenciaMaxMin']:,.2f} € "
+          f"(desviación {estadisticas['desviacionPorcentual']:.2f}%)")
+    print(f"Equilibrado: {'✓ SÍ' if estadisticas['equilibrado'] else '✗ NO'}")
+    print(f"Reparto inicial: {algoritmo['repartoInicial']} · "
+          f"cambios de búsqueda local: {algoritmo['cambiosBusquedaLocal']} · {algoritmo['segundos']} s")
+    if criterio == "exacto":
+        print(f"Óptimo: {'✓ SÍ' if algoritmo['optimo'] else '✗ NO'} "
+              f"(gap {algoritmo['gap']:,.2f} €, {algoritmo['gapPorcentual']:.2f}% · {algoritmo['nodos']} nodos)")
+
+
+if __name__ == "__main__":
+    main()
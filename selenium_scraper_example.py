@@ -15,15 +15,15 @@ Para Firefox:
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 # from webdriver_manager.chrome import ChromeDriverManager
 import json
-import time
 from typing import Dict, Optional
 
+from catastro_service import LimitadorCortesia
+from esperas_selenium import ESTADISTICAS, EsperasSelenium
+
 
 class SeleniumCatastroScraper:
     """
@@ -39,6 +39,8 @@ class SeleniumCatastroScraper:
         """
         self.headless = headless
         self.driver = None
+        # Pausa de cortesía entre peticiones para evitar bloqueos
+        self.limitador = LimitadorCortesia(3.0)
 
     def iniciar_navegador(self):
         """Inicia el navegador Chrome"""
@@ -91,16 +93,19 @@ class SeleniumCatastroScraper:
         url = f"https://www1.sedecatastro.gob.es/CYCBienInmueble/OVCConCiud.aspx?RefC={referencia}"
 
         try:
-            print(f"Accediendo a: {url}")
-            self.driver.get(url)
+            self.limitador.esperar()
+            esperas = EsperasSelenium(self.driver)
 
-            # Esperar a que cargue la página (ajustar selector según página real)
-            WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
+            print(f"Accediendo a: {url}")
+            with esperas.medir("navegacion"):
+                self.driver.get(url)
 
-            # Pequeña espera adicional para asegurar que todo cargó
-            time.sleep(2)
+            # Esperar a la ficha del inmueble o al mensaje de error
+            # (ajustar selectores según página real)
+            if esperas.resultado_o_error("resultado", (By.ID, "ctl00_Contenido_tblInmueble"),
+                                         (By.ID, "DivErrorRC")) == "error":
+                print("  Referencia catastral no encontrada")
+                return None
 
             # Aquí extraer los datos según la estructura HTML real
             # Estos son ejemplos - ajustar según la página real del catastro
@@ -169,11 +174,9 @@ class SeleniumCatastroScraper:
                 if datos:
                     resultados.append(datos)
 
-                # Pausa entre peticiones para evitar bloqueos
-                time.sleep(3)
-
         finally:
             self.cerrar_navegador()
+            ESTADISTICAS.imprimir_resumen()
 
         return resultados
 
@@ -4,16 +4,324 @@ Servidor HTTP simple para servir el frontend
 """
 
 import http.server
-import socketserver
 import os
 import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
-from urllib.parse import urlparse
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+from cache_valoraciones import CacheValoraciones
+from json_incremental import iterar_json
+from reparto_herencia import PRESUPUESTO_SEGUNDOS, limitar_presupuesto, repartir
+from valorador_inmuebles import FUENTE_CRITERIOS, CriteriosValoracion, ValoradorInmuebles, PortafolioValorado
 
 PORT = 8000
 # Usar el directorio donde está ubicado este script (funciona en Windows, macOS y Linux)
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
+# A partir de este número de propiedades, /api/valorar reparte el trabajo
+# entre los procesos del pool en lugar de valorar en el hilo de la petición
+UMBRAL_POOL_PROCESOS = 500
+
+# Caché de valoraciones: número máximo de entradas y caducidad (None = sin caducidad)
+CACHE_MAX_ENTRADAS = 50000
+CACHE_TTL_SEGUNDOS = None
+
+# Número máximo de sesiones de valoración guardadas para /api/valorar/incremental
+MAX_SESIONES = 64
+
+# Propiedades que /api/valorar/stream valora juntas antes de enviar sus resultados
+TAM_LOTE_STREAM = 64
+
+
+# Valoradores que conserva cada proceso trabajador, por versión de criterios
+MAX_VALORADORES_TRABAJADOR = 4
+
+_valoradores_trabajador = OrderedDict()
+
+
+def _valorador_trabajador(criterios: CriteriosValoracion) -> ValoradorInmuebles:
+    """Valorador del proceso trabajador para unos criterios, creado una vez por versión"""
+    valorador = _valoradores_trabajador.get(criterios.version)
+    if valorador is not None:
+        _valoradores_trabajador.move_to_end(criterios.version)
+        return valorador
+
+    valorador = ValoradorInmuebles(criterios)
+    _valoradores_trabajador[criterios.version] = valorador
+    while len(_valoradores_trabajador) > MAX_VALORADORES_TRABAJADOR:
+        _valoradores_trabajador.popitem(last=False)
+    return valorador
+
+
+def _iniciar_trabajador(criterios: CriteriosValoracion):
+    """
+    Inicializador del pool: cada proceso crea al arrancar el valorador de los
+    criterios vigentes (y carga el índice de ámbitos)
+    """
+    _valorador_trabajador(criterios)
+
+
+def _valorar_lote(propiedades: List[Dict], criterios: CriteriosValoracion, modo: str) -> List[Dict]:
+    """
+    Valora un lote de propiedades en un proceso trabajador
+
+    Los criterios viajan con el lote, de modo que el trabajador usa la misma
+    versión de las tablas que la petición aunque se hayan recargado después.
+    El valorador de esa versión se reutiliza en los lotes siguientes.
+    """
+    return _valorador_trabajador(criterios).valorar_lista(propiedades, modo)
+
+
+class SesionNoEncontrada(KeyError):
+    """La sesión de valoración indicada no existe o ha expirado"""
+
+
+class ServicioValoracion:
+    """
+    Valorador precalentado compartido por todos los hilos del servidor
+
+    Los criterios base se leen de data/valores_gva_*.json y se recargan sin
+    reiniciar el servidor cuando cambian los archivos. Cada petición toma los
+    criterios vigentes al empezar y, si trae criterios personalizados, su
+    propia capa inmutable encima, sin modificar el estado compartido: una
+    petición en curso termina con la versión con la que empezó. Las peticiones
+    grandes se dividen en lotes que se valoran en paralelo en un
+    ProcessPoolExecutor. Delante del valorador hay una caché LRU por
+    (propiedad, versión de criterios).
+    """
+
+    def __init__(self, procesos: Optional[int] = None, umbral_pool: int = UMBRAL_POOL_PROCESOS,
+                 cache: Optional[CacheValoraciones] = None, fuente=None):
+        """
+        Args:
+            procesos: Número de procesos del pool (por defecto, número de CPUs)
+            umbral_pool: Número de propiedades a partir del cual se usa el pool
+            cache: Caché de valoraciones compartida por todas las peticiones
+            fuente: FuenteTablas de los criterios base (por defecto, la de
+                data/valores_gva_*.json)
+        """
+        self.fuente = fuente if fuente is not None else FUENTE_CRITERIOS
+        criterios = self.fuente.actual()
+        self.cache = cache if cache is not None else CacheValoraciones(CACHE_MAX_ENTRADAS, CACHE_TTL_SEGUNDOS)
+        self.sesiones = OrderedDict()
+        self._lock_sesiones = threading.Lock()
+        self.procesos = procesos or os.cpu_count() or 1
+        self.umbral_pool = umbral_pool
+        self.pool = None
+
+        if self.procesos > 1:
+            self.pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_iniciar_trabajador,
+                                            initargs=(criterios,))
+
+    def criterios(self, personalizados: Optional[Dict] = None, fecha_devengo=None) -> CriteriosValoracion:
+        """
+        Criterios de una petición: las tablas aplicables en la fecha de devengo
+        (por defecto, hoy) con los valores personalizados encima
+        """
+        return self.fuente.para_fecha(fecha_devengo).con_personalizados(personalizados)
+
+    def valorar(self, propiedades: List[Dict], personalizados: Optional[Dict] = None,
+                modo: str = "secuencial", sesion: bool = False, fecha_devengo=None):
+        """
+        Valora propiedades con criterios opcionales
+
+        Las propiedades ya valoradas con los mismos datos y criterios se toman
+        de la caché; solo las pendientes se valoran (en el pool si son muchas).
+
+        Args:
+            sesion: Si True, guarda la cartera valorada para revaloraciones
+                    incrementales y devuelve también el identificador de sesión
+            fecha_devengo: Fecha (texto ISO) cuyas tablas de valores se aplican
+
+        Returns:
+            Diccionario {"resumen", "valoraciones"} (y el id de sesión si sesion=True)
+        """
+        criterios = self.criterios(personalizados, fecha_devengo)
+        valorador = ValoradorInmuebles(criterios, cache=self.cache)
+
+        def ejecutor(pendientes: List[Dict]) -> List[Dict]:
+            if self.pool is None or len(pendientes) < self.umbral_pool:
+                return valorador._valorar_sin_cache(pendientes, modo)
+
+            tam_lote = -(-len(pendientes) // self.procesos)
+            futuros = [
+                self.pool.submit(_valorar_lote, pendientes[i:i + tam_lote], criterios, modo)
+                for i in range(0, len(pendientes), tam_lote)
+            ]
+
+            valoraciones = []
+            for futuro in futuros:
+                valoraciones.extend(futuro.result())
+            return valoraciones
+
+        resultado = valorador.generar_resultado(valorador.valorar_lista(propiedades, modo, ejecutor))
+        if fecha_devengo:
+            resultado["resumen"]["fecha_devengo"] = fecha_devengo
+
+        if not sesion:
+            return resultado
+
+        return resultado, self._guardar_sesion((resultado, criterios, propiedades))
+
+    def valorar_flujo(self, objetos: Iterator[Dict], modo: str = "secuencial",
+                      tam_lote: int = TAM_LOTE_STREAM) -> Iterator[Dict]:
+        """
+        Valora un flujo de propiedades a medida que llegan
+
+        Si el primer objeto del flujo es {"criterios": {...}} (sin referencia
+        catastral) se usa como criterios personalizados de toda la valoración.
+        Las propiedades se valoran en lotes pequeños, de modo que nunca se
+        guarda la cartera completa en memoria.
+
+        Args:
+            objetos: Iterador de propiedades (p. ej. de iterar_json)
+            modo: "secuencial" o "vectorizado"
+            tam_lote: Número de propiedades valoradas en cada lote
+
+        Returns:
+            Iterador de valoraciones, terminado con {"resumen": {...}}
+        """
+        objetos = iter(objetos)
+        primero = next(objetos, None)
+        personalizados = None
+
+        if isinstance(primero, dict) and "criterios" in primero and "referencia_catastral" not in primero:
+            personalizados = primero["criterios"]
+            modo = primero.get("modo", modo)
+            primero = None
+
+        criterios = self.criterios(personalizados)
+        valorador = ValoradorInmuebles(criterios, cache=self.cache)
+
+        total_propiedades = 0
+        valor_total = 0
+        lote = [] if primero is None else [primero]
+
+        for propiedad in objetos:
+            lote.append(propiedad)
+            if len(lote) < tam_lote:
+                continue
+            for valoracion in valorador.valorar_lista(lote, modo):
+                total_propiedades += 1
+                valor_total += valoracion.get("valor_estimado_euros", 0)
+                yield valoracion
+            lote = []
+
+        if lote:
+            for valoracion in valorador.valorar_lista(lote, modo):
+                total_propiedades += 1
+                valor_total += valoracion.get("valor_estimado_euros", 0)
+                yield valoracion
+
+        yield {"resumen": valorador.generar_resumen(total_propiedades, valor_total)}
+
+    def _guardar_sesion(self, datos) -> str:
+        """Guarda una cartera valorada y devuelve su identificador"""
+        id_sesion = uuid.uuid4().hex
+        with self._lock_sesiones:
+            self.sesiones[id_sesion] = [threading.Lock(), datos]
+            while len(self.sesiones) > MAX_SESIONES:
+                self.sesiones.popitem(last=False)
+        return id_sesion
+
+    def revalorar_incremental(self, cambios: Dict, id_sesion: Optional[str] = None,
+                              resultado: Optional[Dict] = None,
+                              personalizados: Optional[Dict] = None,
+                              propiedades: Optional[List[Dict]] = None) -> Dict:
+        """
+        Aplica un diff de criterios a una cartera ya valorada
+
+        La cartera se toma de la sesión indicada o, si no hay sesión, del
+        resultado enviado por el cliente (valorado con los criterios
+        personalizados indicados). El índice inverso de la sesión se construye
+        en la primera revaloración y se reutiliza en las siguientes.
+
+        Returns:
+            Valoraciones modificadas, resumen actualizado e id de sesión
+
+        Raises:
+            SesionNoEncontrada: Si la sesión no existe (o ha expirado)
+            ValueError: Si los cambios no son válidos
+        """
+        if id_sesion is None:
+            if resultado is None:
+                raise ValueError("Se necesita una sesión o el resultado de la valoración previa")
+            criterios = self.criterios(personalizados)
+            id_sesion = self._guardar_sesion((resultado, criterios, propiedades))
+
+        with self._lock_sesiones:
+            entrada = self.sesiones.get(id_sesion)
+            if entrada is None:
+                raise SesionNoEncontrada(id_sesion)
+            self.sesiones.move_to_end(id_sesion)
+
+        lock, datos = entrada
+        with lock:
+            if not isinstance(datos, PortafolioValorado):
+                datos = PortafolioValorado(*datos)
+                entrada[1] = datos
+            respuesta = datos.aplicar_cambios(cambios)
+
+        respuesta["sesion"] = id_sesion
+        return respuesta
+
+    def cerrar(self):
+        """Detiene el pool de procesos"""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+class LectorCuerpo:
+    """
+    Lector del cuerpo de una petición HTTP
+
+    Admite cuerpos con Content-Length y con Transfer-Encoding: chunked, y
+    permite leerlos por bloques sin cargarlos completos en memoria.
+    """
+
+    def __init__(self, rfile, headers):
+        self.rfile = rfile
+        self.chunked = headers.get('Transfer-Encoding', '').lower() == 'chunked'
+        self.restante = 0 if self.chunked else int(headers.get('Content-Length') or 0)
+        self.terminado = False
+
+    def _siguiente_chunk(self):
+        """Lee la cabecera del siguiente chunk (tamaño en hexadecimal)"""
+        linea = self.rfile.readline()
+        tamano = int(linea.split(b';', 1)[0].strip() or b'0', 16)
+        if tamano == 0:
+            # Trailers opcionales hasta la línea vacía final
+            while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            self.terminado = True
+        self.restante = tamano
+
+    def read(self, n: int = -1) -> bytes:
+        if self.terminado:
+            return b''
+
+        if self.chunked and self.restante == 0:
+            self._siguiente_chunk()
+            if self.terminado:
+                return b''
+
+        if n < 0 or n > self.restante:
+            n = self.restante
+        datos = self.rfile.read(n) if n else b''
+        self.restante -= len(datos)
+
+        if self.chunked and self.restante == 0:
+            self.rfile.readline()  # CRLF al final de cada chunk
+        elif not self.chunked and (self.restante == 0 or not datos):
+            self.terminado = True
+
+        return datos
+
 
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Handler personalizado con CORS habilitado y API para valoraciones"""
@@ -23,6 +331,7 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Expose-Headers', 'X-Sesion-Valoracion')
         super().end_headers()
 
     def do_OPTIONS(self):
@@ -30,6 +339,13 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_response(200)
         self.end_headers()
 
+    def do_GET(self):
+        """Manejar peticiones GET (API y archivos estáticos)"""
+        if urlparse(self.path).path == '/api/cache':
+            self.enviar_json(200, self.server.servicio.cache.estadisticas())
+        else:
+            super().do_GET()
+
     def do_POST(self):
         """Manejar peticiones POST"""
         parsed_path = urlparse(self.path)
@@ -37,6 +353,12 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         # Endpoint de valoración
         if parsed_path.path == '/api/valorar':
             self.handle_valoracion()
+        elif parsed_path.path == '/api/valorar/incremental':
+            self.handle_valoracion_incremental()
+        elif parsed_path.path == '/api/valorar/stream':
+            self.handle_valoracion_stream()
+        elif parsed_path.path == '/api/reparto':
+            self.handle_reparto()
         else:
             self.send_error(404, "Endpoint no encontrado")
 
@@ -48,61 +370,205 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
 
-            # Importar el valorador
-            import sys
-            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-            from valorador_inmuebles import ValoradorInmuebles, CriteriosValoracion
+            # Modo de valoración: "secuencial" (por defecto) o "vectorizado".
+            # Se puede indicar en la URL (?modo=vectorizado) o en el cuerpo.
+            modo = parse_qs(urlparse(self.path).query).get('modo', ['secuencial'])[0]
 
             # Extraer propiedades y criterios personalizados
+            fecha_devengo = None
             if isinstance(data, list):
                 # Formato antiguo: array de propiedades
                 propiedades = data
                 criterios_personalizados = None
             else:
-                # Formato nuevo: {propiedades: [...], criterios: {...}}
+                # Formato nuevo: {propiedades: [...], criterios: {...}, modo: "...",
+                #                 fecha_devengo: "AAAA-MM-DD"}
                 propiedades = data.get('propiedades', [])
                 criterios_personalizados = data.get('criterios')
+                modo = data.get('modo', modo)
+                fecha_devengo = data.get('fecha_devengo')
+
+            # Valorar propiedades con el servicio compartido del servidor
+            resultado, id_sesion = self.server.servicio.valorar(
+                propiedades, criterios_personalizados, modo, sesion=True, fecha_devengo=fecha_devengo
+            )
 
-            # Crear valorador
-            valorador = ValoradorInmuebles()
+            # Enviar respuesta (la sesión permite revaloraciones incrementales)
+            self.enviar_json(200, resultado, {'X-Sesion-Valoracion': id_sesion})
 
-            # Si hay criterios personalizados, aplicarlos
-            if criterios_personalizados:
-                self.aplicar_criterios_personalizados(valorador.criterios, criterios_personalizados)
+        except ValueError as e:
+            # JSON mal formado, criterios personalizados no válidos o modo desconocido
+            self.enviar_json(400, {
+                "error": str(e),
+                "mensaje": "Petición de valoración no válida"
+            })
+        except Exception as e:
+            # Error al valorar
+            self.enviar_json(500, {
+                "error": str(e),
+                "mensaje": "Error al valorar las propiedades"
+            })
 
-            # Valorar propiedades
-            resultado = valorador.valorar_multiples(propiedades)
+    def handle_valoracion_incremental(self):
+        """
+        Revalora solo lo afectado por un cambio de criterios
 
-            # Enviar respuesta
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(json.dumps(resultado, ensure_ascii=False).encode('utf-8'))
+        Cuerpo: {"sesion": "...", "cambios": {...}} con la sesión devuelta en la
+        cabecera X-Sesion-Valoracion de /api/valorar, o bien
+        {"valoraciones": {...}, "criterios": {...}, "propiedades": [...], "cambios": {...}}
+        con el resultado previo completo.
+        """
+        try:
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode('utf-8'))
 
+            respuesta = self.server.servicio.revalorar_incremental(
+                data.get('cambios', {}),
+                id_sesion=data.get('sesion'),
+                resultado=data.get('valoraciones'),
+                personalizados=data.get('criterios'),
+                propiedades=data.get('propiedades')
+            )
+            self.enviar_json(200, respuesta)
+
+        except SesionNoEncontrada as e:
+            self.enviar_json(404, {
+                "error": f"Sesión no encontrada: {e}",
+                "mensaje": "La sesión de valoración ha expirado, vuelve a valorar"
+            })
+        except ValueError as e:
+            self.enviar_json(400, {
+                "error": str(e),
+                "mensaje": "Cambios de criterios no válidos"
+            })
         except Exception as e:
-            # Error al valorar
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            error_response = {
+            self.enviar_json(500, {
+                "error": str(e),
+                "mensaje": "Error al revalorar las propiedades"
+            })
+
+    def handle_reparto(self):
+        """
+        Reparto automático de una herencia (RepartoService en el servidor)
+
+        Cuerpo: {"propiedades": [...], "configuracion": ConfiguracionReparto,
+        "valoraciones": [...], "presupuestoSegundos": 2}. Si no se envían las
+        valoraciones, las propiedades se valoran con los criterios vigentes.
+        """
+        try:
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self.enviar_json(400, {
+                "error": str(e),
+                "mensaje": "El cuerpo de la petición no es un JSON válido"
+            })
+            return
+
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Se esperaba un objeto {propiedades, configuracion, ...}")
+            # El presupuesto se valida antes de valorar: NaN o valores enormes
+            # dejarían el hilo ocupado indefinidamente
+            presupuesto = limitar_presupuesto(data.get('presupuestoSegundos', PRESUPUESTO_SEGUNDOS))
+
+            propiedades = data.get('propiedades', [])
+            valoraciones = data.get('valoraciones')
+            if valoraciones is None:
+                valoraciones = self.server.servicio.valorar(propiedades)["valoraciones"]
+
+            resultado = repartir(propiedades, valoraciones, data.get('configuracion', {}),
+                                 presupuesto_segundos=presupuesto)
+            self.enviar_json(200, resultado)
+
+        except ValueError as e:
+            self.enviar_json(400, {
+                "error": str(e),
+                "mensaje": "Configuración de reparto no válida"
+            })
+        except Exception as e:
+            self.enviar_json(500, {
+                "error": str(e),
+                "mensaje": "Error al repartir las propiedades"
+            })
+
+    def handle_valoracion_stream(self):
+        """
+        Valora una cartera grande en streaming
+
+        Cuerpo: NDJSON (una propiedad por línea) o un array JSON de propiedades,
+        que se lee de forma incremental. Opcionalmente, la primera línea puede
+        ser {"criterios": {...}}. La respuesta es NDJSON con codificación
+        chunked: una valoración por línea y una última línea {"resumen": {...}}.
+        """
+        modo = parse_qs(urlparse(self.path).query).get('modo', ['secuencial'])[0]
+        propiedades = iterar_json(LectorCuerpo(self.rfile, self.headers))
+        lineas = self.server.servicio.valorar_flujo(propiedades, modo)
+
+        # Los errores antes de la primera línea se devuelven como respuesta normal
+        try:
+            primera = next(lineas)
+        except ValueError as e:
+            # JSON mal formado, criterios no numéricos o modo desconocido
+            self.close_connection = True
+            self.enviar_json(400, {
+                "error": str(e),
+                "mensaje": "Petición de valoración no válida"
+            })
+            return
+        except Exception as e:
+            self.close_connection = True
+            self.enviar_json(500, {
                 "error": str(e),
                 "mensaje": "Error al valorar las propiedades"
-            }
-            self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
-
-    def aplicar_criterios_personalizados(self, criterios, personalizados):
-        """Aplica criterios personalizados al objeto de criterios"""
-        # Actualizar precios rústico
-        if 'PRECIOS_RUSTICO' in personalizados:
-            if 'valencia' in personalizados['PRECIOS_RUSTICO']:
-                for key, valor in personalizados['PRECIOS_RUSTICO']['valencia'].items():
-                    criterios.PRECIOS_RUSTICO['valencia'][key] = valor
-
-        # Actualizar coeficientes urbano
-        if 'COEFICIENTES_URBANO' in personalizados:
-            if 'valencia' in personalizados['COEFICIENTES_URBANO']:
-                for key, valor in personalizados['COEFICIENTES_URBANO']['valencia'].items():
-                    criterios.COEFICIENTES_URBANO['valencia'][key] = valor
+            })
+            return
+
+        # La codificación chunked requiere HTTP/1.1
+        self.protocol_version = 'HTTP/1.1'
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        pendiente = [primera]
+        try:
+            try:
+                for linea in lineas:
+                    pendiente.append(linea)
+                    if len(pendiente) >= TAM_LOTE_STREAM:
+                        self.enviar_chunk(pendiente)
+                        pendiente = []
+            except Exception as e:
+                # La cabecera ya se ha enviado: el error va como última línea
+                pendiente.append({
+                    "error": str(e),
+                    "mensaje": "Error al valorar las propiedades"
+                })
+            self.enviar_chunk(pendiente)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente ha cerrado la conexión
+            pass
+
+    def enviar_chunk(self, objetos: List[Dict]):
+        """Envía objetos como líneas NDJSON en un chunk HTTP"""
+        if not objetos:
+            return
+        datos = ''.join(json.dumps(o, ensure_ascii=False) + '\n' for o in objetos).encode('utf-8')
+        self.wfile.write(b'%x\r\n' % len(datos) + datos + b'\r\n')
+        self.wfile.flush()
+
+    def enviar_json(self, codigo: int, datos, cabeceras: Optional[Dict] = None):
+        """Envía una respuesta JSON"""
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(json.dumps(datos, ensure_ascii=False).encode('utf-8'))
 
     def log_message(self, format, *args):
         """Personalizar mensajes de log"""
@@ -120,12 +586,16 @@ def main():
 
     handler = partial(MyHTTPRequestHandler)
 
-    with socketserver.TCPServer(("", PORT), handler) as httpd:
+    # Servidor multihilo: una petición lenta no bloquea al resto de usuarios
+    with http.server.ThreadingHTTPServer(("", PORT), handler) as httpd:
+        httpd.servicio = ServicioValoracion()
+
         print("=" * 60)
         print("🚀 SERVIDOR HTTP INICIADO")
         print("=" * 60)
         print(f"\nServidor corriendo en: http://localhost:{PORT}")
         print(f"Directorio: {os.getcwd()}")
+        print(f"Procesos de valoración: {httpd.servicio.procesos}")
         print(f"\nDirectorios encontrados:")
         print(f"  - frontend/: {'✓ SÍ' if frontend_exists else '✗ NO'}")
         print(f"  - data/: {'✓ SÍ' if data_exists else '✗ NO'}")
@@ -151,6 +621,8 @@ def main():
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n\n⏹️  Servidor detenido")
+        finally:
+            httpd.servicio.cerrar()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Tablas del valorador cargadas en tiempo de ejecución
+
+Los módulos de valor rústico (PRECIOS_RUSTICO) y los coeficientes urbanos
+(COEFICIENTES_URBANO) se leen de la sección "tablas_valorador" de los
+archivos data/valores_gva_*.json. Actualizar los valores es editar el JSON
+(a mano o con los scripts aplicar_valores_oficiales_gva*.py,
+importar_datos_gva_a_valorador.py o actualizar_precios_mercado.py), no el
+código de valorador_inmuebles.py.
+
+Cada archivo declara su periodo de vigencia en fuente.vigencia, de modo que
+puede haber tablas de varios años (valores_gva_2024_oficial.json,
+valores_gva_2025_oficial.json...). FuenteTablas las indexa por fecha de
+inicio y devuelve las aplicables en una fecha de devengo; los criterios de
+cada periodo se construyen la primera vez que se piden y se guardan en una
+LRU pequeña.
+
+FuenteTablas vigila además los archivos por fecha de modificación: como
+mucho una vez cada INTERVALO_COMPROBACION segundos compara la firma (ruta,
+mtime, tamaño) de los archivos y, si ha cambiado, vuelve a indexarlos y
+sustituye el índice de una sola asignación. Quien ya tenía los criterios
+anteriores (una petición en curso, una sesión de revaloración) sigue
+usándolos hasta terminar.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Relativo al módulo, no al directorio de trabajo de quien lo importa
+PATRON_TABLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "valores_gva_*.json")
+SECCION_TABLAS = "tablas_valorador"
+TABLAS_VALORADOR = ("PRECIOS_RUSTICO", "COEFICIENTES_URBANO")
+
+# Segundos entre dos comprobaciones de la fecha de modificación de los archivos
+INTERVALO_COMPROBACION = 2.0
+
+# Periodos de vigencia (años) con las tablas construidas en memoria a la vez
+MAX_TABLAS_CARGADAS = 4
+
+
+def validar_tablas(tablas: Dict, origen: str = "tablas") -> Dict:
+    """
+    Comprueba que las tablas tienen la forma {tabla: {region: {clave: número}}}
+
+    Args:
+        tablas: Tablas a comprobar (las claves desconocidas se ignoran)
+        origen: Nombre del origen de las tablas, para los mensajes de error
+
+    Returns:
+        Las tablas conocidas, sin las claves que no son tablas del valorador
+
+    Raises:
+        ValueError: Si alguna región no es un diccionario o algún valor no es numérico
+    """
+    validas = {}
+    for nombre in TABLAS_VALORADOR:
+        regiones = tablas.get(nombre)
+        if regiones is None:
+            continue
+        if not isinstance(regiones, dict):
+            raise ValueError(f"{origen}: {nombre} debe ser un diccionario de regiones")
+        for region, valores in regiones.items():
+            if not isinstance(valores, dict):
+                raise ValueError(f"{origen}: {nombre}[{region}] debe ser un diccionario")
+            for clave, valor in valores.items():
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                    raise ValueError(f"Valor no numérico en {origen}: {nombre}[{region}][{clave}]: {valor!r}")
+        validas[nombre] = regiones
+    return validas
+
+
+def rutas_tablas(patron: str = PATRON_TABLAS) -> list:
+    """Archivos que coinciden con el patrón, en orden alfabético"""
+    return sorted(glob.glob(patron))
+
+
+def firma_archivos(rutas: Iterable[str]) -> Tuple:
+    """Firma (ruta, mtime, tamaño) de los archivos; cambia si alguno se modifica"""
+    firma = []
+    for ruta in rutas:
+        try:
+            estado = os.stat(ruta)
+        except FileNotFoundError:
+            continue
+        firma.append((ruta, estado.st_mtime_ns, estado.st_size))
+    return tuple(firma)
+
+
+def _leer_json(ruta: str):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{ruta}: JSON no válido ({e})") from e
+
+
+def leer_tablas(rutas: Iterable[str]) -> Dict[str, Dict[str, Dict]]:
+    """
+    Lee y combina las tablas del valorador de varios archivos
+
+    Solo se tienen en cuenta los archivos con sección "tablas_valorador".
+    Si varios definen la misma región, prevalece el último en orden alfabético.
+
+    Returns:
+        {"PRECIOS_RUSTICO": {region: {...}}, "COEFICIENTES_URBANO": {region: {...}}}
+
+    Raises:
+        ValueError: Si algún archivo no es JSON válido o tiene valores no numéricos
+    """
+    combinadas = {nombre: {} for nombre in TABLAS_VALORADOR}
+    for ruta in rutas:
+        datos = _leer_json(ruta)
+        seccion = datos.get(SECCION_TABLAS) if isinstance(datos, dict) else None
+        if not seccion:
+            continue
+        for nombre, regiones in validar_tablas(seccion, ruta).items():
+            combinadas[nombre].update(regiones)
+    return {nombre: regiones for nombre, regiones in combinadas.items() if regiones}
+
+
+def escribir_tablas(ruta: str, tablas: Dict, fuente: Optional[str] = None) -> Dict:
+    """
+    Guarda tablas del valorador en la sección "tablas_valorador" de un archivo
+
+    Las regiones indicadas sustituyen a las existentes; el resto del archivo
+    no cambia. El archivo se reemplaza de forma atómica, de modo que un
+    servidor que lo esté vigilando nunca lee un JSON a medio escribir.
+
+    Args:
+        ruta: Archivo data/valores_gva_*.json (se crea si no existe)
+        tablas: {"PRECIOS_RUSTICO": {region: {...}}, "COEFICIENTES_URBANO": {...}}
+        fuente: Descripción del origen de los valores
+
+    Returns:
+        La sección "tablas_valorador" resultante
+
+    Raises:
+        ValueError: Si algún valor no es numérico
+    """
+    tablas = validar_tablas(tablas, ruta)
+
+    datos = {}
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+
+    seccion = datos.setdefault(SECCION_TABLAS, {})
+    if fuente:
+        seccion["fuente"] = fuente
+    for nombre, regiones in tablas.items():
+        seccion.setdefault(nombre, {}).update(regiones)
+
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(temporal, ruta)
+
+    return seccion
+
+
+class Periodo(NamedTuple):
+    """Periodo de vigencia de unas tablas y firma de los archivos que las definen"""
+    desde: Optional[date]
+    hasta: Optional[date]
+    firma: Tuple
+
+    @property
+    def rutas(self) -> list:
+        return [ruta for ruta, _, _ in self.firma]
+
+    def contiene(self, fecha: date) -> bool:
+        return (self.desde is None or self.desde <= fecha) and (self.hasta is None or fecha <= self.hasta)
+
+    def vigencia(self) -> Dict:
+        """{"desde", "hasta"} en formato ISO (None si el archivo no la indica)"""
+        return {
+            "desde": self.desde.isoformat() if self.desde else None,
+            "hasta": self.hasta.isoformat() if self.hasta else None,
+        }
+
+
+def convertir_fecha(valor) -> Optional[date]:
+    """
+    Convierte una fecha de devengo a date
+
+    Args:
+        valor: date, datetime, texto ISO ("2024-03-15") o None
+
+    Returns:
+        La fecha, o None si no se indica
+
+    Raises:
+        ValueError: Si el texto no es una fecha ISO
+    """
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def leer_vigencia(datos: Dict, origen: str = "tablas") -> Tuple[Optional[date], Optional[date]]:
+    """Vigencia (desde, hasta) de fuente.vigencia de un archivo valores_gva_*.json"""
+    vigencia = (datos.get("fuente") or {}).get("vigencia") or {}
+    try:
+        return convertir_fecha(vigencia.get("desde")), convertir_fecha(vigencia.get("hasta"))
+    except ValueError as e:
+        raise ValueError(f"{origen}: vigencia no válida ({e})") from e
+
+
+def indexar_periodos(firma: Iterable[Tuple]) -> List[Periodo]:
+    """
+    Agrupa los archivos con tablas por periodo de vigencia
+
+    Los archivos sin sección "tablas_valorador" no forman parte de ningún
+    periodo. Los que comparten vigencia se combinan (ver leer_tablas()).
+
+    Args:
+        firma: Entradas (ruta, mtime, tamaño) de firma_archivos()
+
+    Returns:
+        Periodos ordenados por fecha de inicio
+
+    Raises:
+        ValueError: Si algún archivo no es JSON válido o tiene valores no numéricos
+    """
+    grupos = {}
+    for entrada in firma:
+        ruta = entrada[0]
+        datos = _leer_json(ruta)
+        seccion = datos.get(SECCION_TABLAS) if isinstance(datos, dict) else None
+        if not seccion:
+            continue
+        validar_tablas(seccion, ruta)
+        grupos.setdefault(leer_vigencia(datos, ruta), []).append(tuple(entrada))
+
+    periodos = [Periodo(desde, hasta, tuple(entradas)) for (desde, hasta), entradas in grupos.items()]
+    periodos.sort(key=lambda p: (p.desde or date.min, p.hasta or date.max))
+    return periodos
+
+
+class FuenteTablas:
+    """
+    Registro de las tablas de data/valores_gva_*.json por periodo de vigencia
+
+    Cada archivo indica su vigencia en fuente.vigencia (desde/hasta); los
+    archivos del mismo periodo se combinan. La búsqueda de la fecha de
+    devengo es una bisección sobre las fechas de inicio: se usa el periodo
+    que empieza en la fecha o antes (si ya ha terminado y no hay uno
+    posterior, sus tablas siguen aplicándose) y, para fechas anteriores a
+    todos los periodos, el primero. Quien necesite saberlo puede comparar la
+    fecha con periodo(fecha).contiene().
+
+    El objeto de cada periodo se construye la primera vez que se pide y se
+    guarda en una LRU de max_cargadas periodos. La clave de la LRU incluye la
+    firma de los archivos, así que un archivo modificado produce un objeto
+    nuevo; quien ya tenía el anterior (una petición en curso, una sesión de
+    revaloración) sigue usándolo. El índice se sustituye con la asignación
+    de una sola referencia. Si un archivo modificado no se puede leer (JSON
+    incompleto, valor no numérico) se mantiene el índice anterior y se
+    vuelve a intentar en la siguiente comprobación; si no hay índice
+    anterior, se construye con las tablas vacías (el valorador usa entonces
+    sus tablas integradas).
+    """
+
+    def __init__(self, construir: Callable[[Dict], object], patron: str = PATRON_TABLAS,
+                 intervalo: float = INTERVALO_COMPROBACION, max_cargadas: int = MAX_TABLAS_CARGADAS):
+        """
+        Args:
+            construir: Función que recibe las tablas leídas y devuelve el objeto
+                (p. ej. CriteriosValoracion)
+            patron: Patrón glob de los archivos de tablas
+            intervalo: Segundos mínimos entre comprobaciones (0 = en cada llamada)
+            max_cargadas: Número de periodos construidos que se mantienen en memoria
+        """
+        self.construir = construir
+        self.patron = patron
+        self.intervalo = intervalo
+        self.max_cargadas = max_cargadas
+        self._lock = threading.Lock()
+        self._firma = None
+        self._indice = None
+        self._cargadas = OrderedDict()
+        self._proxima_comprobacion = 0.0
+
+    def _vigilar(self):
+        if self._indice is None or time.monotonic() >= self._proxima_comprobacion:
+            self.comprobar()
+
+    def periodos(self) -> List[Periodo]:
+        """Periodos disponibles, ordenados por fecha de inicio"""
+        self._vigilar()
+        return list(self._indice[0])
+
+    def periodo(self, fecha=None) -> Optional[Periodo]:
+        """
+        Periodo cuyas tablas se aplican en una fecha de devengo
+
+        Args:
+            fecha: Fecha de devengo (por defecto, hoy)
+
+        Returns:
+            El periodo, o None si no hay ningún archivo con tablas
+        """
+        self._vigilar()
+        periodos, inicios = self._indice
+        if not periodos:
+            return None
+        i = bisect_right(inicios, convertir_fecha(fecha) or date.today()) - 1
+        return periodos[max(i, 0)]
+
+    def cargar(self, periodo: Optional[Periodo]):
+        """Objeto de un periodo, construido la primera vez que se pide"""
+        with self._lock:
+            objeto = self._cargadas.get(periodo)
+            if objeto is not None:
+                self._cargadas.move_to_end(periodo)
+                return objeto
+
+            objeto = self.construir(leer_tablas(periodo.rutas) if periodo else {})
+            self._cargadas[periodo] = objeto
+            while len(self._cargadas) > self.max_cargadas:
+                self._cargadas.popitem(last=False)
+            return objeto
+
+    def para_fecha(self, fecha=None):
+        """Objeto con las tablas aplicables en una fecha de devengo (por defecto, hoy)"""
+        return self.cargar(self.periodo(fecha))
+
+    def actual(self):
+        """Objeto con las tablas aplicables hoy, recargadas si los archivos han cambiado"""
+        return self.para_fecha()
+
+    def comprobar(self) -> bool:
+        """
+        Vuelve a indexar los periodos si algún archivo ha cambiado
+
+        Returns:
+            True si el índice ha cambiado
+        """
+        with self._lock:
+            self._proxima_comprobacion = time.monotonic() + self.intervalo
+            firma = firma_archivos(rutas_tablas(self.patron))
+            if firma == self._firma and self._indice is not None:
+                return False
+
+            try:
+                periodos = indexar_periodos(firma)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  No se pudieron cargar las tablas del valorador: {e}")
+                if self._indice is not None:
+                    return False
+                # Sin ningún índice previo se usan las tablas integradas
+                firma, periodos = None, []
+
+            self._firma = firma
+            self._indice = (periodos, [p.desde or date.min for p in periodos])
+            return True
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Pruebas del almacén SQLite del catálogo de propiedades
+"""
+
+import json
+import os
+import tempfile
+
+from almacen_catastral import AlmacenCatastral, migrar_json
+from valorador_inmuebles import ValoradorInmuebles
+
+ARCHIVO_MERGEADOS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "angular-catastro", "src", "assets", "datos_catastrales_mergeados.json"
+)
+
+
+def cargar_mergeados():
+    with open(ARCHIVO_MERGEADOS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_reconstruye_los_registros_sin_cambios():
+    propiedades = cargar_mergeados()
+
+    with AlmacenCatastral(":memory:") as almacen:
+        assert almacen.guardar_propiedades(propiedades) == len(propiedades)
+        assert almacen.contar("cultivos") == sum(len(p["cultivos"]) for p in propiedades)
+
+        # Mismo contenido y mismo orden de claves que el JSON del frontend
+        assert json.dumps(list(almacen.propiedades())) == json.dumps(propiedades)
+
+        seleccion = [propiedades[5]["referencia_catastral"], propiedades[2]["referencia_catastral"]]
+        assert list(almacen.propiedades(seleccion)) == [propiedades[5], propiedades[2]]
+
+        # Formato antiguo (catastro_scraper_service), sin columnas propias
+        antigua = {"referencia_catastral": "28079A01800223", "localizacion": {"provincia": "Madrid"},
+                   "datos_catastrales": {"valor_catastral": 85420.5}, "valor_referencia": None}
+        almacen.guardar_propiedades([antigua])
+        assert list(almacen.propiedades(["28079A01800223"])) == [antigua]
+
+
+def test_reconstruye_las_valoraciones_con_el_mismo_orden_de_claves():
+    propiedades = cargar_mergeados()
+    # Urbanas con y sin valor catastral (esta última, con error)
+    propiedades[-1] = dict(propiedades[-1], datos_catastrales={"valor_catastral": 52000.0})
+    valorador = ValoradorInmuebles()
+    valoraciones = valorador.valorar_lista(propiedades)
+    con_devengo = valorador.valorar_por_fecha(propiedades[:2] + propiedades[-2:], "2025-06-01")
+    for i, valoracion in enumerate(con_devengo):
+        valoracion["referencia_catastral"] += f"-devengo-{i}"
+    esperadas = valoraciones + con_devengo
+    assert {v["tipo_valoracion"] for v in esperadas} >= {"rustico", "urbano"}
+
+    with AlmacenCatastral(":memory:") as almacen:
+        almacen.guardar_valoraciones(esperadas)
+        assert json.dumps(list(almacen.valoraciones()), ensure_ascii=False) == json.dumps(esperadas, ensure_ascii=False)
+        assert [list(v) for v in almacen.valoraciones([esperadas[3]["referencia_catastral"]])] == [list(esperadas[3])]
+
+
+def test_lee_solo_las_columnas_pedidas():
+    propiedades = cargar_mergeados()
+
+    with AlmacenCatastral(":memory:") as almacen:
+        almacen.guardar_propiedades(propiedades)
+
+        filas = list(almacen.columnas(["referencia_catastral", "superficie_m2", "num_cultivos"]))
+        assert filas[0] == ("03106A002000090000YL", 1197.0, 1)
+        assert [f[0] for f in filas] == [p["referencia_catastral"] for p in propiedades]
+
+        cultivos = list(almacen.columnas(["cultivo_aprovechamiento", "superficie_m2"], "cultivos",
+                                         ["03106A002000090000YL"]))
+        assert cultivos == [("O- Olivos secano", 1197.0)]
+
+        # Actualizar una propiedad no cambia su posición en el catálogo
+        almacen.guardar_propiedades([dict(propiedades[0], escritura="Finca Nº 1")])
+        filas = list(almacen.columnas(["referencia_catastral", "escritura"]))
+        assert filas[0] == ("03106A002000090000YL", "Finca Nº 1")
+
+        try:
+            list(almacen.columnas(["referencia_catastral; DROP TABLE propiedades"]))
+            assert False, "columna desconocida aceptada"
+        except ValueError:
+            pass
+
+
+def test_propiedades_para_valorar_dan_las_mismas_valoraciones():
+    propiedades = cargar_mergeados()
+    # Urbana con valor catastral y registro en el formato antiguo, sin columnas propias
+    propiedades[-1] = dict(propiedades[-1], datos_catastrales={"valor_catastral": 52000.0})
+    propiedades.append({"referencia_catastral": "28079A01800223", "localizacion": {"provincia": "Madrid"},
+                        "datos_inmueble": {"clase": "Urbano", "tipo": "vivienda"},
+                        "datos_catastrales": {"valor_catastral": 85420.5}})
+
+    def sin_fecha(valoraciones):
+        return [{k: v for k, v in valoracion.items() if k != "fecha_valoracion"} for valoracion in valoraciones]
+
+    with AlmacenCatastral(":memory:") as almacen:
+        almacen.guardar_propiedades(propiedades)
+        registros = list(almacen.propiedades_para_valorar())
+
+    assert [r["referencia_catastral"] for r in registros] == [p["referencia_catastral"] for p in propiedades]
+    # Las rústicas salen de las columnas, sin los campos que no usa el valorador
+    rusticas = [r for r in registros if r.get("datos_descriptivos", {}).get("clase") == "Rústico"]
+    assert rusticas and all("url_consultada" not in r and "valor_referencia" not in r for r in rusticas)
+    assert registros[-1] == propiedades[-1]
+
+    valorador = ValoradorInmuebles()
+    for modo in ("secuencial", "vectorizado"):
+        assert sin_fecha(valorador.valorar_lista(registros, modo)) == sin_fecha(valorador.valorar_lista(propiedades, modo))
+
+
+def test_migra_y_exporta_los_json_existentes():
+    propiedades = cargar_mergeados()[:3]
+    valoracion = {"referencia_catastral": propiedades[0]["referencia_catastral"], "clase": "Rústico",
+                  "tipo_valoracion": "rustico", "valor_estimado_euros": 1234.5, "detalles_cultivos": []}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        completo = [dict(p, valoracion_calculada=valoracion if i == 0 else None,
+                         valor_referencia_oficial=None, comparacion=None)
+                    for i, p in enumerate(propiedades)]
+        with open(os.path.join(directorio, "datos_catastrales_consolidados_completo.json"), "w",
+                  encoding="utf-8") as f:
+            json.dump(completo, f, indent=2, ensure_ascii=False)
+        with open(os.path.join(directorio, "valoraciones.json"), "w", encoding="utf-8") as f:
+            json.dump({"valoraciones": [valoracion], "resumen": {}}, f)
+
+        with AlmacenCatastral(os.path.join(directorio, "catalogo.sqlite3")) as almacen:
+            importados = migrar_json(almacen, directorio)
+            assert sum(importados.values()) == 5
+            assert list(almacen.valoraciones()) == [valoracion]
+            assert list(almacen.columnas(["valor_estimado_euros"], "valoraciones")) == [(1234.5,)]
+
+            exportado = os.path.join(directorio, "frontend.json")
+            assert almacen.exportar_json(exportado) == 3
+            with open(exportado, encoding="utf-8") as f:
+                assert f.read() == json.dumps(propiedades, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_reconstruye_los_registros_sin_cambios,
+        test_reconstruye_las_valoraciones_con_el_mismo_orden_de_claves,
+        test_lee_solo_las_columnas_pedidas,
+        test_propiedades_para_valorar_dan_las_mismas_valoraciones,
+        test_migra_y_exporta_los_json_existentes,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pruebas del índice municipio -> ámbito territorial
+"""
+
+import json
+import os
+import re
+import tempfile
+
+from ambitos_territoriales import IndiceAmbitos, indice_ambitos, normalizar_municipio
+from valorador_inmuebles import ValoradorInmuebles
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+
+
+def test_normaliza_nombres_del_catastro_y_de_la_gva():
+    claves = {
+        normalizar_municipio(nombre)
+        for nombre in ("Vall de Gallinera", "03788 VALL DE GALLINERA", "la Vall de Gallinera",
+                       "VALL DE GALLINERA (LA)", "vall_de_gallinera")
+    }
+    assert claves == {"vall de gallinera"}
+    assert normalizar_municipio("Vall d'Uixó, la") == normalizar_municipio("LA VALL D'UIXO")
+    assert normalizar_municipio("Castelló de la Plana") == "castello de la plana"
+
+
+def test_indice_generado_de_los_datos_gva():
+    indice = indice_ambitos()
+
+    assert indice.buscar("OLIVA") == "ambito_13_safor_litoral"
+    assert indice.buscar("46780 OLIVA") == "ambito_13_safor_litoral"
+    assert indice.buscar("Piles") == "ambito_13_safor_litoral"
+    assert indice.buscar("PLANES") == "ambito_17_marina_alta_interior"
+    assert indice.buscar("Madrid") is None
+
+    # Las referencias rústicas llevan el código de municipio del Catastro
+    assert indice.buscar(referencia="03106A002000090000YL") == "ambito_17_marina_alta_interior"
+    assert indice.buscar(referencia="0119501YJ5101N0002AI") is None
+
+    # Mismo objeto mientras el archivo no cambie
+    assert indice_ambitos() is indice
+
+
+def test_indice_desde_otro_directorio():
+    """El JSON se busca junto al módulo, no en el directorio de trabajo"""
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.chdir(directorio)
+        try:
+            indice = IndiceAmbitos.desde_archivo()
+        finally:
+            os.chdir(anterior)
+    assert indice.buscar("Piles") == "ambito_13_safor_litoral"
+
+
+def test_codigos_catastro_coinciden_con_las_referencias():
+    """Cada codigo_catastro del JSON es el de las parcelas del Catastro de ese municipio"""
+    indice = indice_ambitos()
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+
+    codigos = set()
+    for propiedad in propiedades:
+        referencia = propiedad["referencia_catastral"]
+        municipio = propiedad["datos_descriptivos"]["localizacion"].get("municipio")
+        # Solo las referencias de parcela rústica (polígono y parcela) llevan el municipio
+        if not re.match(r"\d{5}[A-Z]\d{8}", referencia) or indice.buscar(municipio or "") is None:
+            continue
+        assert indice.buscar(referencia=referencia) == indice.buscar(municipio), referencia
+        codigos.add(referencia[:5])
+
+    assert codigos == set(indice.por_codigo) == {"03106", "03136", "46183", "46197"}
+
+
+def test_nuevo_ambito_es_un_cambio_de_datos():
+    datos = {
+        "ambitos_territoriales": {
+            "ambito_1_els_ports": {"municipios_incluidos": ["Morella", "Alacant/Alicante"]},
+        },
+        "municipios": {
+            "vilafranca": {"nombre_oficial": "Vilafranca", "nombres_alternativos": ["Villafranca del Cid"],
+                           "ambito_territorial": "ambito_1_els_ports", "codigo_catastro": "12129"},
+        },
+    }
+    valorador = ValoradorInmuebles(ambitos=IndiceAmbitos.desde_datos(datos))
+
+    assert valorador.identificar_region("CASTELLON", "MORELLA") == "ambito_1_els_ports"
+    assert valorador.identificar_region("ALICANTE", "ALICANTE") == "ambito_1_els_ports"
+    assert valorador.identificar_region("ALACANT", "Alacant") == "ambito_1_els_ports"
+    assert valorador.identificar_region("CASTELLON", "VILLAFRANCA DEL CID") == "ambito_1_els_ports"
+    assert valorador.identificar_region("", "", "12129A00100001") == "ambito_1_els_ports"
+
+    # Municipios fuera de los ámbitos: identificación por provincia
+    assert valorador.identificar_region("Valencia/València", "GANDIA") == "valencia"
+    assert valorador.identificar_region("CÁCERES", "PLASENCIA") == "extremadura"
+    assert valorador.identificar_region("MADRID", "MADRID") == "nacional"
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_normaliza_nombres_del_catastro_y_de_la_gva,
+        test_indice_generado_de_los_datos_gva,
+        test_indice_desde_otro_directorio,
+        test_codigos_catastro_coinciden_con_las_referencias,
+        test_nuevo_ambito_es_un_cambio_de_datos,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
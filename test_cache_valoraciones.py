@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché de valoraciones
+"""
+
+import json
+import time
+
+from cache_valoraciones import CacheValoraciones
+from valorador_inmuebles import CriteriosValoracion, ValoradorInmuebles
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+
+
+def test_expulsa_la_menos_usada():
+    cache = CacheValoraciones(max_entradas=2)
+    cache.guardar("a", {"valor": 1})
+    cache.guardar("b", {"valor": 2})
+    assert cache.obtener("a") == {"valor": 1}      # "b" pasa a ser la menos usada
+
+    cache.guardar("c", {"valor": 3})
+    assert len(cache) == 2
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") == {"valor": 1} and cache.obtener("c") == {"valor": 3}
+    assert cache.estadisticas()["expulsadas"] == 1
+
+    # Volver a guardar una clave no expulsa a nadie
+    cache.guardar("a", {"valor": 4})
+    assert cache.obtener("a") == {"valor": 4} and len(cache) == 2
+
+
+def test_caducidad():
+    cache = CacheValoraciones(ttl=0.05)
+    cache.guardar("a", {"valor": 1})
+    assert cache.obtener("a") == {"valor": 1}
+
+    time.sleep(0.1)
+    assert cache.obtener("a") is None
+    assert len(cache) == 0
+    estadisticas = cache.estadisticas()
+    assert estadisticas["caducadas"] == 1 and estadisticas["ttl_segundos"] == 0.05
+
+    # Sin ttl las entradas no caducan
+    cache = CacheValoraciones()
+    cache.guardar("a", {"valor": 1})
+    time.sleep(0.06)
+    assert cache.obtener("a") == {"valor": 1}
+
+
+def test_contadores_y_limpiar():
+    cache = CacheValoraciones()
+    assert cache.estadisticas()["tasa_aciertos"] == 0
+
+    cache.guardar("a", {"valor": 1})
+    cache.obtener("a")
+    cache.obtener("a")
+    cache.obtener("b")
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"], estadisticas["tasa_aciertos"]) == (2, 1, 0.6667)
+
+    cache.limpiar()
+    assert len(cache) == 0 and cache.estadisticas()["aciertos"] == 2
+
+    try:
+        CacheValoraciones(max_entradas=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Se esperaba ValueError con max_entradas=0")
+
+
+def test_clave_ignora_campos_volatiles():
+    propiedad = {"referencia_catastral": "03106A002000090000YL", "fecha_extraccion": "2025-11-08"}
+    otra_fecha = {**propiedad, "fecha_extraccion": "2026-01-01"}
+    assert CacheValoraciones.clave(propiedad, "v1") == CacheValoraciones.clave(otra_fecha, "v1")
+    assert CacheValoraciones.clave(propiedad, "v1") != CacheValoraciones.clave(propiedad, "v2")
+    assert CacheValoraciones.clave(propiedad, "v1") != \
+        CacheValoraciones.clave({**propiedad, "referencia_catastral": "03106A002001800000YO"}, "v1")
+
+
+def valores(valoraciones: list) -> list:
+    return [v.get("valor_estimado_euros", 0) for v in valoraciones]
+
+
+def test_valorador_invalida_al_cambiar_los_criterios():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+    cache = CacheValoraciones()
+    criterios = CriteriosValoracion()
+
+    primera = ValoradorInmuebles(criterios, cache=cache).valorar_lista(propiedades)
+    assert cache.estadisticas()["fallos"] == len(propiedades)
+
+    # Mismos criterios (aunque sea otra instancia): todo sale de la caché
+    segunda = ValoradorInmuebles(CriteriosValoracion(), cache=cache).valorar_lista(propiedades)
+    assert cache.estadisticas()["aciertos"] == len(propiedades)
+    assert valores(segunda) == valores(primera)
+
+    # Otros criterios: nada se reutiliza y los valores cambian
+    nuevos = criterios.con_personalizados({"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 20000}}})
+    tercera = ValoradorInmuebles(nuevos, cache=cache).valorar_lista(propiedades)
+    estadisticas = cache.estadisticas()
+    assert estadisticas["aciertos"] == len(propiedades) and estadisticas["fallos"] == 2 * len(propiedades)
+    assert valores(tercera) == valores(ValoradorInmuebles(nuevos).valorar_lista(propiedades))
+    assert sum(valores(tercera)) > sum(valores(primera))
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_expulsa_la_menos_usada,
+        test_caducidad,
+        test_contadores_y_limpiar,
+        test_clave_ignora_campos_volatiles,
+        test_valorador_invalida_al_cambiar_los_criterios,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
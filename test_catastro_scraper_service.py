@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Pruebas del resumen de propiedades de CatastroScraperService
+"""
+
+import json
+import os
+import tempfile
+
+from catastro_scraper_service import ARCHIVO_CONSOLIDADO, AcumuladorResumen, CatastroScraperService
+
+
+def registro(referencia: str, valor, superficie, tipo=None) -> dict:
+    inmueble = {"superficie_construida": superficie}
+    if tipo:
+        inmueble["tipo"] = tipo
+    return {
+        "referencia_catastral": referencia,
+        "datos_inmueble": inmueble,
+        "datos_catastrales": {"valor_catastral": valor},
+    }
+
+
+REGISTROS = [
+    registro("03106A002000090000YL", 1000.0, 100.0, "Vivienda"),
+    registro("03106A002000100000YM", 3000.0, 50.0, "Vivienda"),
+    registro("03106A002000110000YN", None, 30.0, "Almacén"),
+    registro("03106A002000120000YO", 2000.0, None),
+]
+
+
+def comprobar_estadisticas(resumen: dict):
+    estadisticas = resumen["estadisticas"]
+    assert resumen["total_propiedades"] == 4
+    assert estadisticas["valor_catastral_total"] == 6000.0
+    assert estadisticas["superficie_total_construida"] == 180.0
+    assert estadisticas["tipos_inmuebles"] == {"Vivienda": 2, "Almacén": 1, "Desconocido": 1}
+    assert estadisticas["valor_catastral"] == {
+        "cuenta": 3, "media": 2000.0, "desviacion": 816.5, "minimo": 1000.0, "maximo": 3000.0
+    }
+    assert estadisticas["superficie_construida"]["media"] == 60.0
+    assert "propiedades" not in resumen
+
+
+def test_acumulador_no_guarda_los_registros():
+    acumulador = AcumuladorResumen().agregar_todos(iter(REGISTROS))
+    comprobar_estadisticas(acumulador.resumen())
+
+
+def test_resumen_no_vuelve_a_extraer():
+    with tempfile.TemporaryDirectory() as directorio:
+        servicio = CatastroScraperService(data_dir=directorio)
+
+        def extraer(referencia):
+            raise AssertionError(f"No se debe volver a extraer {referencia}")
+
+        servicio.extraer_datos_catastro = extraer
+
+        # En memoria
+        comprobar_estadisticas(servicio.generar_resumen(REGISTROS))
+
+        # Desde los archivos individuales de data_dir
+        for datos in REGISTROS:
+            servicio._guardar_json(datos, os.path.join(directorio, f"{datos['referencia_catastral']}.json"))
+        servicio._guardar_json({"total_propiedades": 99}, os.path.join(directorio, "resumen_propiedades.json"))
+        comprobar_estadisticas(servicio.generar_resumen())
+        comprobar_estadisticas(servicio.generar_resumen([d["referencia_catastral"] for d in REGISTROS]))
+
+        # Desde el consolidado, que tiene prioridad sobre los individuales
+        with open(os.path.join(directorio, ARCHIVO_CONSOLIDADO), "w", encoding="utf-8") as f:
+            json.dump(REGISTROS, f, indent=2, ensure_ascii=False)
+        os.remove(os.path.join(directorio, "03106A002000090000YL.json"))
+        comprobar_estadisticas(servicio.generar_resumen())
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_acumulador_no_guarda_los_registros,
+        test_resumen_no_vuelve_a_extraer,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
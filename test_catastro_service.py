@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Pruebas del cliente concurrente del Catastro contra un servidor local
+
+Un servidor HTTP de prueba sirve respuestas XML fijas con el formato de
+Consulta_CPMRC, de modo que las pruebas no dependen de la red ni del
+servicio real del Catastro.
+"""
+
+import http.server
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from cache_catastro import CacheCatastro
+from catastro_service import CatastroService, iterar_registros_xml
+
+
+XML_CPMRC = """<?xml version="1.0" encoding="utf-8"?>
+<consulta_coordenadas xmlns="http://www.catastro.meh.es/">
+  <control><cucoor>1</cucoor><cuerr>0</cuerr></control>
+  <coordenadas>
+    <coord>
+      <pc><pc1>{pc1}</pc1><pc2>{pc2}</pc2></pc>
+      <geo><xcen>-0.2541</xcen><ycen>38.7712</ycen><srs>EPSG:4326</srs></geo>
+      <ldt>Polígono 2 Parcela 9 PLANES (ALICANTE)</ldt>
+    </coord>
+  </coordenadas>
+</consulta_coordenadas>
+"""
+
+NS = "{http://www.catastro.meh.es/}"
+
+XML_DNPRC_MUNICIPIO = """<?xml version="1.0" encoding="utf-8"?>
+<consulta_dnp xmlns="http://www.catastro.meh.es/">
+  <control><cudnp>{n}</cudnp></control>
+  <lrcdnp>{registros}</lrcdnp>
+</consulta_dnp>
+"""
+
+RCDNP = """<rcdnp>
+  <rc><pc1>03106A0</pc1><pc2>{pc2:08d}</pc2></rc>
+  <dt><np>ALICANTE</np><nm>PLANES</nm></dt>
+  <lspr>
+    <spr><cspr>a</cspr><dspr><ccc>AM</ccc><ssp>1200</ssp></dspr></spr>
+    <spr><cspr>b</cspr><dspr><ccc>O-</ccc><ssp>800</ssp></dspr></spr>
+  </lspr>
+</rcdnp>"""
+
+
+class StubCatastro(http.server.BaseHTTPRequestHandler):
+    """Servidor de prueba con respuestas fijas y fallos programables"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        servidor = self.server
+        rc = self.path.split("RC=")[-1].split("&")[0]
+
+        with servidor.lock:
+            servidor.peticiones[rc] += 1
+            servidor.conexiones.add(self.client_address)
+            intento = servidor.peticiones[rc]
+
+        etag = f'"{rc}"'
+        if rc in servidor.fallos_permanentes:
+            codigo, cuerpo = 404, b"no encontrada"
+        elif self.headers.get("If-None-Match") == etag:
+            codigo, cuerpo = 304, b""
+            with servidor.lock:
+                servidor.revalidadas += 1
+        elif intento <= servidor.fallos_transitorios.get(rc, 0):
+            codigo, cuerpo = 503, b"ocupado"
+        else:
+            codigo = 200
+            cuerpo = XML_CPMRC.format(pc1=rc[:7], pc2=rc[7:14]).encode("utf-8")
+
+        self.send_response(codigo)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def iniciar_stub(fallos_transitorios=None, fallos_permanentes=()):
+    """Arranca el servidor de prueba en un puerto libre"""
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubCatastro)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.peticiones = Counter()
+    servidor.conexiones = set()
+    servidor.revalidadas = 0
+    servidor.fallos_transitorios = fallos_transitorios or {}
+    servidor.fallos_permanentes = set(fallos_permanentes)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def crear_servicio(servidor, **kwargs) -> CatastroService:
+    """Crea un servicio que apunta al servidor de prueba"""
+    servicio = CatastroService(espera_base=0.01, **kwargs)
+    servicio.BASE_URL_CPMRC = f"http://127.0.0.1:{servidor.server_address[1]}/Consulta_CPMRC"
+    return servicio
+
+
+def referencias_prueba(n: int):
+    return [f"03106A{i:08d}0000YL" for i in range(n)]
+
+
+def test_resultados_en_orden_y_con_el_mismo_formato():
+    servidor = iniciar_stub()
+    try:
+        referencias = referencias_prueba(40)
+        resultados = crear_servicio(servidor, concurrencia=8, peticiones_por_segundo=1000) \
+            .consultar_multiples_referencias(referencias)
+
+        assert [r["referencia_catastral"] for r in resultados] == referencias
+        for ref, resultado in zip(referencias, resultados):
+            assert "error" not in resultado
+            assert "fecha_consulta" in resultado
+            assert resultado["datos"][NS + "pc1"] == ref[:7]
+            assert resultado["datos"][NS + "pc2"] == ref[7:14]
+    finally:
+        servidor.shutdown()
+
+
+def test_reintenta_fallos_transitorios():
+    referencias = referencias_prueba(5)
+    servidor = iniciar_stub(fallos_transitorios={referencias[1]: 2, referencias[3]: 1})
+    try:
+        resultados = crear_servicio(servidor, reintentos=3, peticiones_por_segundo=1000) \
+            .consultar_multiples_referencias(referencias)
+
+        assert all("error" not in r for r in resultados)
+        assert servidor.peticiones[referencias[1]] == 3
+        assert servidor.peticiones[referencias[3]] == 2
+        assert servidor.peticiones[referencias[0]] == 1
+    finally:
+        servidor.shutdown()
+
+
+def test_errores_devuelven_entrada_de_error():
+    referencias = referencias_prueba(3)
+    servidor = iniciar_stub(
+        fallos_transitorios={referencias[0]: 10},
+        fallos_permanentes={referencias[2]}
+    )
+    try:
+        resultados = crear_servicio(servidor, reintentos=2, peticiones_por_segundo=1000) \
+            .consultar_multiples_referencias(referencias)
+
+        assert "error" in resultados[0]
+        assert "error" not in resultados[1]
+        assert "error" in resultados[2]
+        assert servidor.peticiones[referencias[0]] == 3
+        # Un 404 no se reintenta
+        assert servidor.peticiones[referencias[2]] == 1
+    finally:
+        servidor.shutdown()
+
+
+def test_limite_de_tasa_por_host():
+    servidor = iniciar_stub()
+    try:
+        servicio = crear_servicio(servidor, concurrencia=10, peticiones_por_segundo=20)
+        inicio = time.monotonic()
+        servicio.consultar_multiples_referencias(referencias_prueba(30))
+        duracion = time.monotonic() - inicio
+
+        # Ráfaga inicial de 20 y después 20 por segundo: al menos ~0.5 s
+        assert duracion >= 0.45, duracion
+    finally:
+        servidor.shutdown()
+
+
+def test_reutiliza_conexiones_keep_alive():
+    servidor = iniciar_stub()
+    try:
+        crear_servicio(servidor, concurrencia=4, peticiones_por_segundo=1000) \
+            .consultar_multiples_referencias(referencias_prueba(60))
+
+        assert sum(servidor.peticiones.values()) == 60
+        assert len(servidor.conexiones) <= 4, len(servidor.conexiones)
+    finally:
+        servidor.shutdown()
+
+
+def test_parser_streaming_emite_un_registro_por_inmueble():
+    n = 500
+    xml = XML_DNPRC_MUNICIPIO.format(n=n, registros="".join(RCDNP.format(pc2=i) for i in range(n)))
+    datos = {}
+
+    registros = list(iterar_registros_xml(io.BytesIO(xml.encode("utf-8")), datos))
+
+    assert len(registros) == n
+    assert registros[7]["rc"] == {"pc1": "03106A0", "pc2": "00000007"}
+    # Las subparcelas repetidas se conservan como lista
+    assert [spr["dspr"]["ccc"] for spr in registros[0]["lspr"]["spr"]] == ["AM", "O-"]
+    assert datos[NS + "cudnp"] == str(n)
+
+
+def test_cache_en_disco_evita_consultas_repetidas():
+    servidor = iniciar_stub()
+    referencias = referencias_prueba(10)
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "cache.sqlite")
+
+            primera = crear_servicio(servidor, cache=CacheCatastro(ruta), peticiones_por_segundo=1000) \
+                .consultar_multiples_referencias(referencias)
+            assert sum(servidor.peticiones.values()) == 10
+
+            # Segunda ejecución: todo sale de la caché, sin tocar la red
+            cache = CacheCatastro(ruta)
+            segunda = crear_servicio(servidor, cache=cache, peticiones_por_segundo=1000) \
+                .consultar_multiples_referencias(referencias)
+            assert sum(servidor.peticiones.values()) == 10
+            assert cache.aciertos == 10
+            assert [r["datos"] for r in segunda] == [r["datos"] for r in primera]
+
+            # --refresh fuerza la consulta aunque la entrada esté vigente
+            crear_servicio(servidor, cache=CacheCatastro(ruta, refrescar=True), peticiones_por_segundo=1000) \
+                .consultar_multiples_referencias(referencias)
+            assert sum(servidor.peticiones.values()) == 20
+    finally:
+        servidor.shutdown()
+
+
+def test_cache_revalida_entradas_caducadas_con_etag():
+    servidor = iniciar_stub()
+    referencias = referencias_prueba(4)
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "cache.sqlite")
+            crear_servicio(servidor, cache=CacheCatastro(ruta), peticiones_por_segundo=1000) \
+                .consultar_multiples_referencias(referencias)
+
+            # Con TTL 0 las entradas están caducadas y se revalidan (304)
+            caducada = CacheCatastro(ruta, ttl_por_fuente={"ovc_cpmrc": 0})
+            resultados = crear_servicio(servidor, cache=caducada, peticiones_por_segundo=1000) \
+                .consultar_multiples_referencias(referencias)
+
+            assert servidor.revalidadas == 4
+            assert all("error" not in r and r["datos"] for r in resultados)
+            assert caducada.estadisticas()["blobs"] == 4
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    pruebas = [
+        test_resultados_en_orden_y_con_el_mismo_formato,
+        test_reintenta_fallos_transitorios,
+        test_errores_devuelven_entrada_de_error,
+        test_limite_de_tasa_por_host,
+        test_reutiliza_conexiones_keep_alive,
+        test_parser_streaming_emite_un_registro_por_inmueble,
+        test_cache_en_disco_evita_consultas_repetidas,
+        test_cache_revalida_entradas_caducadas_con_etag,
+    ]
+    for prueba in pruebas:
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Pruebas del clasificador de cultivos frente a la implementación original
+"""
+
+import glob
+import json
+import os
+
+from parser_ovc_catastro import cargar_documento, parsear_ficha
+from valorador_inmuebles import (
+    CODIGOS_CULTIVO_EXACTOS, CODIGOS_CULTIVO_VARIANTES, ValoradorInmuebles, _clasificar_cultivo_sin_cache,
+    clasificar_cultivo,
+)
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+DATOS_PRUEBA = os.path.join(DIRECTORIO, "angular-catastro", "src", "assets", "datos_catastrales_mergeados.json")
+
+
+def identificar_tipo_cultivo_original(texto_cultivo: str) -> str:
+    """identificar_tipo_cultivo tal como estaba antes de las tablas precalculadas"""
+    texto = texto_cultivo.strip()
+    texto_lower = texto.lower()
+    codigo = texto.split()[0].upper() if texto else ""
+    es_regadio = "regadio" in texto_lower or "regadío" in texto_lower
+
+    mapeo_exacto = {"MM": "pinar_maderable", "MT": "matorral", "I-": "improductivo", "E-": "pastos",
+                    "NR": "citricos_regadio"}
+    if codigo in mapeo_exacto:
+        return mapeo_exacto[codigo]
+    if codigo == "O-":
+        return "olivar_regadio" if es_regadio else "olivar_secano"
+    if codigo == "F-":
+        return "almendro_regadio" if es_regadio else "almendro_secano"
+    if codigo == "CR" or codigo == "CL":
+        return "labor_regadio" if es_regadio else "labor_secano"
+    if codigo == "V-":
+        return "vina_regadio" if es_regadio else "vina_secano"
+    if codigo == "FRT":
+        return "frutal_regadio" if es_regadio else "frutal_secano"
+
+    if "olivo" in texto_lower or "oliv" in texto_lower:
+        return "olivar_regadio" if es_regadio else "olivar_secano"
+    if "almendro" in texto_lower or "almendra" in texto_lower or "fruto" in texto_lower:
+        return "almendro_regadio" if es_regadio else "almendro_secano"
+    if "vid" in texto_lower or "viña" in texto_lower:
+        return "vina_regadio" if es_regadio else "vina_secano"
+    if "labor" in texto_lower or "labradio" in texto_lower or "labradío" in texto_lower:
+        return "labor_regadio" if es_regadio else "labor_secano"
+    if "cereal" in texto_lower or "trigo" in texto_lower or "cebada" in texto_lower:
+        return "cereal_regadio" if es_regadio else "cereal_secano"
+    if "past" in texto_lower or "prado" in texto_lower:
+        return "pastos"
+    if "citrico" in texto_lower or "agrio" in texto_lower or "naranj" in texto_lower:
+        return "citricos_regadio"
+    if "hortícola" in texto_lower or "horticola" in texto_lower or "huert" in texto_lower:
+        return "horticola_regadio"
+    if "forestal" in texto_lower:
+        return "forestal"
+    return "default"
+
+
+def textos_de_los_fixtures() -> set:
+    """Textos de cultivo del JSON del frontend y de las fichas OVC de fixtures/ovc"""
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        textos = {c["cultivo_aprovechamiento"] for p in json.load(f) for c in p.get("cultivos", [])}
+    for ruta in glob.glob(os.path.join(DIRECTORIO, "fixtures", "ovc", "OVCConCiud_*.html")):
+        with open(ruta, "rb") as f:
+            ficha = parsear_ficha(cargar_documento(f.read()))
+        textos.update(c["cultivo_aprovechamiento"] for c in (ficha or {}).get("cultivos", []))
+    return textos
+
+
+def textos_sinteticos() -> set:
+    """Cada código y cada palabra clave, con y sin regadío, y palabras solapadas"""
+    textos = {"", "   ", "XX", "Desconocido", "labradioliv", "Labradío olivar", "pastolivo", "prado de viña",
+              "huerta regadio", "Frutos secos regadío", "vid secano regadio", "Naranjos", "CEBADA"}
+    for codigo in list(CODIGOS_CULTIVO_EXACTOS) + list(CODIGOS_CULTIVO_VARIANTES):
+        for sufijo in ("", " Cultivo secano", " Cultivo regadío", " regadio", " olivar"):
+            textos.update({codigo + sufijo, codigo.lower() + sufijo, "  " + codigo + sufijo + "  "})
+    for palabra in ("olivo", "oliv", "almendro", "almendra", "fruto", "vid", "viña", "labor", "labradio", "labradío",
+                    "cereal", "trigo", "cebada", "past", "prado", "citrico", "agrio", "naranj", "hortícola",
+                    "horticola", "huert", "forestal"):
+        for texto in (palabra, palabra.upper(), f"Cultivo de {palabra} regadío", f"{palabra} secano"):
+            textos.add(texto)
+    return textos
+
+
+def test_igual_que_la_implementacion_original():
+    textos = textos_de_los_fixtures()
+    assert len(textos) >= 8
+    textos |= textos_sinteticos()
+
+    valorador = ValoradorInmuebles()
+    for texto in textos:
+        esperado = identificar_tipo_cultivo_original(texto)
+        assert _clasificar_cultivo_sin_cache(texto) == esperado, texto
+        assert clasificar_cultivo(texto) == esperado, texto
+        assert valorador.identificar_tipo_cultivo(texto) == esperado, texto
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_igual_que_la_implementacion_original,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la consolidación en streaming de valoraciones y valores de referencia
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+from almacen_catastral import AlmacenCatastral
+from consolidar_valoraciones import consolidar_valoraciones
+
+INMUEBLES = [
+    {"referencia_catastral": "A", "datos_descriptivos": {"clase": "Rústico"}, "cultivos": []},
+    {"referencia_catastral": "B", "datos_descriptivos": {"clase": "Rústico"}, "cultivos": []},
+    {"referencia_catastral": "C", "datos_descriptivos": {"clase": "Urbano"}},
+]
+VALORACIONES = [
+    {"referencia_catastral": "A", "valor_estimado_euros": 1500.0},
+    {"referencia_catastral": "C", "valor_estimado_euros": 800.0},
+]
+VALORES_REFERENCIA = [
+    {"referencia_catastral": "A", "valor_referencia": 1000.0},
+    {"referencia_catastral": "B", "valor_referencia": 2000.0},
+    {"referencia_catastral": "C", "valor_referencia": 1000.0},
+]
+
+
+def escribir(directorio: str, nombre: str, datos):
+    with open(os.path.join(directorio, nombre), "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+
+
+def consolidar(directorio: str, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        resumen = consolidar_valoraciones(directorio, **kwargs)
+    with open(os.path.join(directorio, "datos_catastrales_consolidados_completo.json"), encoding="utf-8") as f:
+        return resumen, f.read()
+
+
+def test_cruza_y_resume_en_una_pasada():
+    with tempfile.TemporaryDirectory() as directorio:
+        escribir(directorio, "datos_catastrales_consolidados.json", INMUEBLES)
+        escribir(directorio, "valoraciones.json", {"valoraciones": VALORACIONES, "resumen": {}})
+        escribir(directorio, "valores_referencia.json", VALORES_REFERENCIA)
+
+        resumen, texto = consolidar(directorio)
+        consolidado = json.loads(texto)
+
+        # Mismo formato que json.dump(indent=2)
+        assert texto == json.dumps(consolidado, indent=2, ensure_ascii=False)
+        assert [r["referencia_catastral"] for r in consolidado] == ["A", "B", "C"]
+        assert consolidado[0]["comparacion"]["diferencia_porcentaje"] == 50.0
+        assert consolidado[1]["valoracion_calculada"] is None and "comparacion" not in consolidado[1]
+        assert consolidado[2]["comparacion"]["mayor"] == "oficial"
+
+        assert resumen["total_inmuebles"] == 3
+        assert resumen["con_valoracion_calculada"] == 2
+        assert resumen["con_valor_referencia"] == 3
+        assert resumen["con_comparacion"] == 2
+        assert resumen["estadisticas"] == {
+            "suma_valoraciones_calculadas": 2300.0,
+            "suma_valores_referencia": 2000.0,
+            "diferencia_total_euros": 300.0,
+            "diferencia_media_porcentaje": 15.0,
+            "diferencia_minima_porcentaje": -20.0,
+            "diferencia_maxima_porcentaje": 50.0,
+        }
+
+
+def test_almacen_como_fuente():
+    with tempfile.TemporaryDirectory() as directorio:
+        escribir(directorio, "datos_catastrales_consolidados.json", INMUEBLES)
+        escribir(directorio, "valoraciones.json", {"valoraciones": VALORACIONES, "resumen": {}})
+        escribir(directorio, "valores_referencia.json", VALORES_REFERENCIA)
+        resumen_json, desde_json = consolidar(directorio)
+
+        # Sin los JSON consolidados: referencias y valoraciones salen del almacén
+        for nombre in ("datos_catastrales_consolidados.json", "valoraciones.json",
+                       "datos_catastrales_consolidados_completo.json"):
+            os.remove(os.path.join(directorio, nombre))
+        with AlmacenCatastral(":memory:") as almacen:
+            almacen.guardar_propiedades(INMUEBLES)
+            almacen.guardar_valoraciones(VALORACIONES)
+            with contextlib.redirect_stdout(io.StringIO()):
+                resumen_almacen = consolidar_valoraciones(directorio, almacen=almacen)
+
+            # La consolidación queda en el almacén; el JSON solo lo escribe la exportación
+            assert not os.path.exists(os.path.join(directorio, "datos_catastrales_consolidados_completo.json"))
+            assert almacen.contar("consolidacion") == 3
+            exportado = os.path.join(directorio, "exportado.json")
+            assert almacen.exportar_consolidado(exportado) == 3
+            with open(exportado, encoding="utf-8") as f:
+                assert f.read() == desde_json
+
+        del resumen_json["fecha_consolidacion"], resumen_almacen["fecha_consolidacion"]
+        assert resumen_almacen == resumen_json
+
+
+def test_almacen_usa_las_valoraciones_mas_recientes():
+    antiguas = [dict(val, fecha_valoracion="2025-01-10T09:00:00") for val in VALORACIONES]
+    recientes = [dict(val, fecha_valoracion="2025-03-05T18:30:00", valor_estimado_euros=val["valor_estimado_euros"] * 2)
+                 for val in VALORACIONES[:1]]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        escribir(directorio, "valores_referencia.json", VALORES_REFERENCIA)
+
+        # valoraciones.json más reciente: sustituye a las del almacén, con aviso
+        escribir(directorio, "valoraciones.json", {"valoraciones": recientes, "resumen": {}})
+        with AlmacenCatastral(":memory:") as almacen:
+            almacen.guardar_propiedades(INMUEBLES)
+            almacen.guardar_valoraciones(antiguas)
+            salida = io.StringIO()
+            with contextlib.redirect_stdout(salida):
+                resumen = consolidar_valoraciones(directorio, almacen=almacen)
+            assert "es más reciente que las valoraciones del almacén" in salida.getvalue()
+            assert list(almacen.valoraciones()) == recientes
+            assert resumen["con_valoracion_calculada"] == 1
+            assert resumen["estadisticas"]["suma_valoraciones_calculadas"] == 3000.0
+
+        # valoraciones.json anterior: se usan las del almacén y se avisa de que se ignora
+        escribir(directorio, "valoraciones.json", {"valoraciones": antiguas, "resumen": {}})
+        with AlmacenCatastral(":memory:") as almacen:
+            almacen.guardar_propiedades(INMUEBLES)
+            almacen.guardar_valoraciones(recientes)
+            salida = io.StringIO()
+            with contextlib.redirect_stdout(salida):
+                resumen = consolidar_valoraciones(directorio, almacen=almacen)
+            assert "Se ignora" in salida.getvalue()
+            assert list(almacen.valoraciones()) == recientes
+            assert resumen["estadisticas"]["suma_valoraciones_calculadas"] == 3000.0
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_cruza_y_resume_en_una_pasada,
+        test_almacen_como_fuente,
+        test_almacen_usa_las_valoraciones_mas_recientes,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
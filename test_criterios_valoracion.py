@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Pruebas de CriteriosValoracion y de la matriz de precios del valorador
+"""
+
+import operator
+import pickle
+
+from valorador_inmuebles import CriteriosValoracion, ValoradorInmuebles
+
+OLIVAR_17 = {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 20000}}}
+
+
+def debe_fallar(funcion, excepcion):
+    try:
+        funcion()
+    except excepcion:
+        return
+    raise AssertionError(f"Se esperaba {excepcion.__name__}")
+
+
+def test_criterios_inmutables():
+    criterios = CriteriosValoracion()
+
+    debe_fallar(lambda: setattr(criterios, "PRECIOS_RUSTICO", {}), AttributeError)
+    debe_fallar(lambda: setattr(criterios, "version", "otra"), AttributeError)
+    debe_fallar(lambda: operator.setitem(criterios.PRECIOS_RUSTICO["valencia"], "olivar_secano", 1), TypeError)
+    debe_fallar(lambda: operator.setitem(criterios.FACTORES_AJUSTE["estado"], "malo", 1), TypeError)
+
+    # Las tablas de la clase no cambian al construir ni al personalizar
+    criterios.con_personalizados(OLIVAR_17)
+    CriteriosValoracion({"PRECIOS_RUSTICO": {"valencia": {"olivar_secano": 1}}})
+    assert CriteriosValoracion.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]["olivar_secano"] == 13289
+    assert CriteriosValoracion.PRECIOS_RUSTICO["valencia"]["olivar_secano"] == 0
+
+
+def test_version_estable():
+    criterios = CriteriosValoracion()
+    assert criterios.version == CriteriosValoracion().version
+    assert criterios == CriteriosValoracion() and hash(criterios) == hash(CriteriosValoracion())
+
+    # Mismos valores, misma versión; otros valores, otra versión
+    personalizados = criterios.con_personalizados(OLIVAR_17)
+    assert personalizados.version == CriteriosValoracion().con_personalizados(OLIVAR_17).version
+    assert personalizados.version != criterios.version
+    assert criterios.con_personalizados({}) is criterios
+    assert criterios.con_personalizados({"PRECIOS_RUSTICO": {"valencia": {}}}) is criterios
+
+    # La versión se conserva al pasar los criterios a un proceso trabajador
+    copia = pickle.loads(pickle.dumps(personalizados))
+    assert copia.version == personalizados.version
+    assert copia.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]["olivar_secano"] == 20000
+
+
+def test_capas_personalizadas():
+    criterios = CriteriosValoracion()
+    primera = criterios.con_personalizados(OLIVAR_17)
+    segunda = primera.con_personalizados({
+        "PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 25000, "vina_secano": 9000},
+                            "ambito_nuevo": {"olivar_secano": 30000}},
+        "COEFICIENTES_URBANO": {"valencia": {"vivienda": 0.6}},
+    })
+
+    ambito = segunda.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]
+    assert ambito["olivar_secano"] == 25000          # la capa más reciente manda
+    assert ambito["vina_secano"] == 9000
+    assert ambito["almendro_secano"] == 9908         # lo demás sale de la tabla base
+    assert primera.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]["olivar_secano"] == 20000
+    assert criterios.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]["olivar_secano"] == 13289
+
+    # Una región que solo está en una capa se apoya en la tabla "default"
+    nuevo = segunda.PRECIOS_RUSTICO["ambito_nuevo"]
+    assert nuevo["olivar_secano"] == 30000
+    assert nuevo["default"] == criterios.PRECIOS_RUSTICO["default"]["default"]
+    assert "ambito_nuevo" in segunda.PRECIOS_RUSTICO and "ambito_nuevo" not in primera.PRECIOS_RUSTICO
+
+    assert segunda.COEFICIENTES_URBANO["valencia"]["vivienda"] == 0.6
+    assert segunda.COEFICIENTES_URBANO["valencia"]["garaje"] == 0.4
+    assert len(segunda.personalizados) == 2
+
+    # Un valor no numérico o una tabla mal formada se rechaza con ValueError
+    for personalizados in (
+        {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": "caro"}}},
+        {"PRECIOS_RUSTICO": {"valencia": 5}},
+        {"PRECIOS_RUSTICO": {"valencia": ["olivar_secano", 1]}},
+        {"PRECIOS_RUSTICO": ["valencia"]},
+        {"COEFICIENTES_URBANO": "0.5"},
+        ["PRECIOS_RUSTICO"],
+    ):
+        debe_fallar(lambda: primera.con_personalizados(personalizados), ValueError)
+
+
+def test_capas_sobre_otra_base():
+    personalizados = CriteriosValoracion().con_personalizados(OLIVAR_17).con_personalizados(
+        {"COEFICIENTES_URBANO": {"valencia": {"vivienda": 0.6}}})
+    base = CriteriosValoracion({"PRECIOS_RUSTICO": {
+        "ambito_17_marina_alta_interior": {"olivar_secano": 1000, "almendro_secano": 2000, "default": 3000},
+    }})
+
+    criterios = personalizados.con_base(base)
+    ambito = criterios.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]
+    assert ambito["olivar_secano"] == 20000          # capa personalizada
+    assert ambito["almendro_secano"] == 2000         # tabla de la nueva base
+    assert criterios.COEFICIENTES_URBANO["valencia"]["vivienda"] == 0.6
+    assert criterios.personalizados == personalizados.personalizados
+
+    # Mismas capas sobre la misma base: misma versión
+    assert criterios == base.con_personalizados(OLIVAR_17).con_personalizados(
+        {"COEFICIENTES_URBANO": {"valencia": {"vivienda": 0.6}}})
+    assert CriteriosValoracion().con_base(base) is base
+
+
+def test_matriz_de_precios_por_version():
+    criterios = CriteriosValoracion()
+    valorador = ValoradorInmuebles(criterios)
+
+    indice_regiones, indice_tipos, precios, matriz = valorador._matriz_precios()
+    assert valorador._matriz_precios()[3] is matriz
+    fila = indice_regiones["ambito_17_marina_alta_interior"]
+    assert matriz[fila, indice_tipos["olivar_secano"]] == 13289
+
+    # Con otros criterios se construye de nuevo
+    valorador.criterios = criterios.con_personalizados(
+        {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 20000}}})
+    indice_regiones, indice_tipos, _, otra = valorador._matriz_precios()
+    assert otra is not matriz
+    assert otra[indice_regiones["ambito_17_marina_alta_interior"], indice_tipos["olivar_secano"]] == 20000
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_criterios_inmutables,
+        test_version_estable,
+        test_capas_personalizadas,
+        test_capas_sobre_otra_base,
+        test_matriz_de_precios_por_version,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pruebas del diario de los trabajos de extracción masiva
+"""
+
+import json
+import os
+import tempfile
+
+from diario_extraccion import DiarioExtraccion, escribir_json_atomico
+
+
+def datos_de(referencia: str) -> dict:
+    return {"referencia_catastral": referencia, "texto": "Polígono 2\nPLANES", "valor": 931.1}
+
+
+def test_reanuda_saltando_las_completadas():
+    referencias = [f"REF{i:03d}" for i in range(10)]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "diario.jsonl")
+
+        # Primera ejecución: se interrumpe tras la referencia 6 (la 3 falla)
+        diario = DiarioExtraccion(ruta)
+        for ref in referencias[:7]:
+            diario.registrar(ref, None if ref == "REF003" else datos_de(ref))
+        diario.cerrar()
+
+        diario = DiarioExtraccion(ruta)
+        assert diario.pendientes(referencias) == ["REF003"] + referencias[7:]
+        assert diario.resumen(referencias) == {"completadas": 6, "pendientes": 4, "agotadas": 0}
+        assert [d["referencia_catastral"] for d in diario.datos(referencias)] == \
+            [ref for ref in referencias[:7] if ref != "REF003"]
+        diario.cerrar()
+
+
+def test_reintentos_limitados():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "diario.jsonl")
+
+        for ejecucion in range(3):
+            diario = DiarioExtraccion(ruta, max_intentos=3)
+            for ref in diario.pendientes(["A", "B"]):
+                diario.registrar(ref, None if ref == "A" else datos_de(ref), "Timeout")
+            assert diario.intentos("A") == ejecucion + 1
+            assert diario.intentos("B") == 1
+            diario.cerrar()
+
+        diario = DiarioExtraccion(ruta, max_intentos=3)
+        assert diario.intentos("A") == 3
+        assert diario.pendientes(["A", "B"]) == []
+        assert diario.agotadas(["A", "B"]) == ["A"]
+        diario.cerrar()
+
+        # --refresh descarta el diario anterior
+        diario = DiarioExtraccion(ruta, max_intentos=3, reiniciar=True)
+        assert diario.pendientes(["A", "B"]) == ["A", "B"]
+        diario.cerrar()
+
+
+def test_descarta_linea_incompleta_tras_un_corte():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "diario.jsonl")
+
+        diario = DiarioExtraccion(ruta)
+        diario.registrar("A", datos_de("A"))
+        diario.cerrar()
+        with open(ruta, "ab") as f:
+            f.write(b'{"referencia": "B", "estado": "compl')
+
+        diario = DiarioExtraccion(ruta)
+        assert diario.completada("A") and not diario.completada("B")
+        diario.registrar("B", datos_de("B"))
+        diario.cerrar()
+
+        with open(ruta, encoding="utf-8") as f:
+            lineas = [json.loads(linea) for linea in f]
+        assert [linea["referencia"] for linea in lineas] == ["A", "B"]
+
+
+def test_consolidado_incremental_identico_a_json_dump():
+    referencias = [f"REF{i:03d}" for i in range(7)]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        consolidado = os.path.join(directorio, "consolidado.json")
+        diario = DiarioExtraccion(os.path.join(directorio, "diario.jsonl"))
+        diario.vincular_consolidado(consolidado, referencias, cada=3)
+
+        # Se completan en otro orden: el consolidado sigue el de las referencias
+        for ref in reversed(referencias[:5]):
+            diario.registrar(ref, datos_de(ref))
+
+        # Tras 3 completadas ya se ha reconstruido una vez
+        with open(consolidado, encoding="utf-8") as f:
+            assert [d["referencia_catastral"] for d in json.load(f)] == referencias[2:5]
+
+        assert diario.consolidar() == 5
+        esperado = [datos_de(ref) for ref in referencias[:5]]
+        with open(consolidado, encoding="utf-8") as f:
+            assert f.read() == json.dumps(esperado, indent=2, ensure_ascii=False)
+        assert not os.path.exists(consolidado + ".tmp")
+        diario.cerrar()
+
+        ruta_vacia = os.path.join(directorio, "vacio.json")
+        escribir_json_atomico(ruta_vacia, iter([]))
+        with open(ruta_vacia, encoding="utf-8") as f:
+            assert f.read() == json.dumps([], indent=2)
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_reanuda_saltando_las_completadas,
+        test_reintentos_limitados,
+        test_descarta_linea_incompleta_tras_un_corte,
+        test_consolidado_incremental_identico_a_json_dump,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
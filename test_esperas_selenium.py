@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las esperas por eventos y de los timeouts adaptativos
+
+Las condiciones se evalúan sobre un objeto cualquiera, sin navegador, ya
+que WebDriverWait solo se lo pasa a la condición.
+"""
+
+import time
+
+from selenium.common.exceptions import TimeoutException
+
+from esperas_selenium import EsperasSelenium, EstadisticasTiempos, MUESTRAS_MINIMAS
+
+
+class PaginaSimulada:
+    """Página cuyo contenido aparece pasado un tiempo"""
+
+    def __init__(self, retraso: float):
+        self.lista_en = time.monotonic() + retraso
+
+    def cargada(self, _driver):
+        return time.monotonic() >= self.lista_en
+
+
+def test_espera_termina_cuando_se_cumple_la_condicion():
+    estadisticas = EstadisticasTiempos()
+    esperas = EsperasSelenium(object(), estadisticas)
+    pagina = PaginaSimulada(0.3)
+
+    inicio = time.monotonic()
+    assert esperas.hasta("resultado", pagina.cargada, intervalo=0.02) is True
+    duracion = time.monotonic() - inicio
+
+    # Sin pausas fijas: termina poco después de que la página esté lista
+    assert 0.3 <= duracion < 0.5, duracion
+    assert estadisticas.resumen()["resultado"]["n"] == 1
+
+
+def test_timeout_adaptativo_y_registro_de_agotados():
+    estadisticas = EstadisticasTiempos(timeout_inicial=15, timeout_minimo=0.2, timeout_maximo=30, margen=2)
+    assert estadisticas.timeout("resultado") == 15
+
+    for _ in range(MUESTRAS_MINIMAS):
+        estadisticas.registrar("resultado", 0.4)
+    assert abs(estadisticas.timeout("resultado") - 0.8) < 1e-9
+
+    esperas = EsperasSelenium(object(), estadisticas)
+    try:
+        esperas.hasta("resultado", lambda _driver: False, intervalo=0.05)
+        assert False, "debería agotar el timeout"
+    except TimeoutException:
+        pass
+
+    resumen = estadisticas.resumen()["resultado"]
+    assert resumen["agotados"] == 1
+    # Tras un timeout, el siguiente intento tiene el máximo
+    assert estadisticas.timeout("resultado") == 30
+
+
+def test_histograma_por_paso():
+    estadisticas = EstadisticasTiempos()
+    for segundos in (0.05, 0.3, 0.3, 1.5, 12):
+        estadisticas.registrar("navegacion", segundos)
+
+    histograma = estadisticas.resumen()["navegacion"]["histograma"]
+    assert histograma["<0.1s"] == 1
+    assert histograma["<0.5s"] == 2
+    assert histograma["<2s"] == 1
+    assert histograma["<30s"] == 1
+    assert sum(histograma.values()) == 5
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_espera_termina_cuando_se_cumple_la_condicion,
+        test_timeout_adaptativo_y_registro_de_agotados,
+        test_histograma_por_paso,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Pruebas del parser lxml de la ficha OVCConCiud y del extractor HTTP
+
+Se usan las copias de la sede en fixtures/ovc/, servidas por el mismo
+servidor local que las pruebas del extractor con Selenium.
+"""
+
+import glob
+import http.server
+import json
+import os
+import tempfile
+import threading
+
+from parser_ovc_catastro import cargar_documento, hay_error_referencia, parsear_ficha, texto_visible
+from extractor_http_catastro import ExtractorHttpCatastro
+from test_extraer_datos_reales import DATOS_ESPERADOS, DIRECTORIO_FIXTURES, iniciar_mock
+
+
+def cargar_esperados():
+    with open(DATOS_ESPERADOS, encoding="utf-8") as f:
+        return {p["referencia_catastral"]: p for p in json.load(f)}
+
+
+class SedeBloqueada(http.server.BaseHTTPRequestHandler):
+    """Responde como el cortafuegos de la sede cuando rechaza las peticiones"""
+
+    def do_GET(self):
+        cuerpo = b"<html><body>The requested URL was rejected</body></html>"
+        self.send_response(403)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def crear_extractor(servidor, directorio, **kwargs) -> ExtractorHttpCatastro:
+    extractor = ExtractorHttpCatastro(intervalo_cortesia=0, **kwargs)
+    extractor.URL_FICHA = f"http://127.0.0.1:{servidor.server_address[1]}/OVCConCiud.aspx"
+    extractor.data_dir = directorio
+    return extractor
+
+
+def test_texto_visible_como_selenium():
+    documento = cargar_documento(
+        "<div><span>Polígono 2\n   Parcela 9</span><br>"
+        "EL LLOMBO.&nbsp;PLANES <b>(ALICANTE)</b>"
+        "<span style='display: none'>oculto</span></div>"
+    )
+    assert texto_visible(documento) == "Polígono 2 Parcela 9\nEL LLOMBO. PLANES (ALICANTE)"
+
+
+def test_parser_coincide_con_los_datos_extraidos():
+    esperados = cargar_esperados()
+    fichas = glob.glob(os.path.join(DIRECTORIO_FIXTURES, "OVCConCiud_*.html"))
+    assert fichas
+
+    for ruta in fichas:
+        referencia = os.path.basename(ruta)[len("OVCConCiud_"):-len(".html")]
+        with open(ruta, "rb") as f:
+            ficha = parsear_ficha(f.read())
+
+        for campo in ("datos_descriptivos", "parcela_catastral", "cultivos"):
+            assert ficha[campo] == esperados[referencia][campo], (referencia, campo)
+
+
+def test_pagina_de_busqueda_no_es_una_ficha():
+    with open(os.path.join(DIRECTORIO_FIXTURES, "OVCBusqueda.html"), "rb") as f:
+        html = f.read()
+
+    assert parsear_ficha(html) is None
+    assert not hay_error_referencia(cargar_documento(html))
+    assert hay_error_referencia(cargar_documento(html.replace(b"display:none", b"display:block")))
+
+
+def test_extractor_http_contra_mock():
+    esperados = cargar_esperados()
+    referencias = ["03106A002000090000YL", "99999A999999990000XX", "0119501YJ5101N0002AI"]
+
+    servidor = iniciar_mock()
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            extractor = crear_extractor(servidor, directorio, usar_selenium=False)
+            resultados = extractor.procesar_lista(referencias)
+
+            assert [r["referencia_catastral"] for r in resultados] == [referencias[0], referencias[2]]
+            for resultado in resultados:
+                esperado = esperados[resultado["referencia_catastral"]]
+                assert list(resultado) == ["referencia_catastral", "fecha_extraccion", "url_consultada",
+                                           "datos_descriptivos", "parcela_catastral", "cultivos"]
+                for campo in ("datos_descriptivos", "parcela_catastral", "cultivos"):
+                    assert resultado[campo] == esperado[campo], campo
+
+            assert "UrbRus=R" in resultados[0]["url_consultada"]
+            assert "del=3&mun=106" in resultados[0]["url_consultada"]
+            assert "UrbRus=U" in resultados[1]["url_consultada"]
+            assert extractor.contadores["http"] == 2
+            assert extractor.contadores["no_encontradas"] == 1
+            assert not extractor.bloqueado
+    finally:
+        servidor.shutdown()
+
+
+def test_bloqueo_sin_respaldo_devuelve_none():
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SedeBloqueada)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            extractor = crear_extractor(servidor, directorio, usar_selenium=False)
+            assert extractor.extraer_datos_catastro("03106A002000090000YL") is None
+            assert extractor.bloqueado
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_texto_visible_como_selenium,
+        test_parser_coincide_con_los_datos_extraidos,
+        test_pagina_de_busqueda_no_es_una_ficha,
+        test_extractor_http_contra_mock,
+        test_bloqueo_sin_respaldo_devuelve_none,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Pruebas del pool de navegadores y de la extracción de CatastroRealScraper
+
+Un servidor HTTP local sirve copias estáticas de las páginas OVCBusqueda y
+OVCConCiud (fixtures/ovc/). Las pruebas que necesitan Chrome se omiten si
+no hay un navegador disponible.
+"""
+
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from urllib.parse import urlparse, parse_qs
+
+from extraer_datos_reales import CatastroRealScraper, LimitadorCortesia
+
+
+DIRECTORIO_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ovc")
+DATOS_ESPERADOS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "angular-catastro", "src", "assets", "datos_catastrales_mergeados.json"
+)
+
+
+class MockSedeCatastro(http.server.BaseHTTPRequestHandler):
+    """Sirve el formulario de búsqueda y las fichas OVCConCiud de fixtures/ovc"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+
+        if url.path.endswith("OVCBusqueda.aspx"):
+            pagina = "OVCBusqueda.html"
+            error = False
+        else:
+            referencia = parse_qs(url.query).get("RefC", [""])[0]
+            pagina = f"OVCConCiud_{referencia}.html"
+            error = not os.path.exists(os.path.join(DIRECTORIO_FIXTURES, pagina))
+            if error:
+                pagina = "OVCBusqueda.html"
+
+        with open(os.path.join(DIRECTORIO_FIXTURES, pagina), "rb") as f:
+            cuerpo = f.read()
+        if error:
+            cuerpo = cuerpo.replace(b'style="display:none"', b'style="display:block"')
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def iniciar_mock():
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockSedeCatastro)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def crear_scraper(servidor, directorio, **kwargs) -> CatastroRealScraper:
+    """Crea un scraper headless que apunta al mock local"""
+    scraper = CatastroRealScraper(headless=True, **kwargs)
+    scraper.URL_BUSQUEDA = f"http://127.0.0.1:{servidor.server_address[1]}/OVCBusqueda.aspx"
+    scraper.data_dir = directorio
+    return scraper
+
+
+def comprobar_navegador():
+    """Omite la prueba si no se puede arrancar Chrome"""
+    try:
+        CatastroRealScraper(headless=True).crear_navegador().quit()
+    except Exception as e:
+        raise unittest.SkipTest(f"Chrome no disponible: {e}")
+
+
+def test_limitador_cortesia_es_global():
+    limitador = LimitadorCortesia(0.05)
+    instantes = []
+    lock = threading.Lock()
+
+    def consultar():
+        for _ in range(3):
+            limitador.esperar()
+            with lock:
+                instantes.append(time.monotonic())
+
+    hilos = [threading.Thread(target=consultar) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    instantes.sort()
+    separaciones = [b - a for a, b in zip(instantes, instantes[1:])]
+    # 12 consultas de 4 hilos: nunca dos consultas en el mismo intervalo
+    assert len(instantes) == 12
+    assert min(separaciones) >= 0.04, separaciones
+
+
+class NavegadorSimulado:
+    """Driver que solo sabe devolver page_source y cuenta las llamadas"""
+
+    def __init__(self, ruta: str):
+        with open(ruta, encoding="utf-8") as f:
+            self.html = f.read()
+        self.llamadas = 0
+
+    @property
+    def page_source(self):
+        self.llamadas += 1
+        return self.html
+
+    def find_element(self, *args):
+        raise AssertionError("la ficha debe extraerse sin pedir elementos sueltos")
+
+    find_elements = find_element
+
+
+def test_extraer_ficha_en_una_sola_llamada():
+    with open(DATOS_ESPERADOS, encoding="utf-8") as f:
+        esperados = {p["referencia_catastral"]: p for p in json.load(f)}
+
+    referencia = "03106A002001800000YO"
+    driver = NavegadorSimulado(os.path.join(DIRECTORIO_FIXTURES, f"OVCConCiud_{referencia}.html"))
+    ficha = CatastroRealScraper(headless=True).extraer_ficha(driver)
+
+    assert driver.llamadas == 1
+    for campo in ("datos_descriptivos", "parcela_catastral", "cultivos"):
+        assert ficha[campo] == esperados[referencia][campo], campo
+
+
+def test_pool_de_navegadores_contra_mock():
+    comprobar_navegador()
+
+    with open(DATOS_ESPERADOS, encoding="utf-8") as f:
+        esperados = {p["referencia_catastral"]: p for p in json.load(f)}
+
+    referencias = [
+        "03106A002000090000YL",
+        "03106A002001800000YO",
+        "99999A999999990000XX",  # No existe: el mock muestra DivErrorRC
+        "0119501YJ5101N0002AI",
+    ]
+
+    servidor = iniciar_mock()
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            scraper = crear_scraper(servidor, directorio, num_navegadores=2, intervalo_cortesia=0.1)
+            resultados = scraper.procesar_lista(referencias)
+
+            validas = [ref for ref in referencias if ref in esperados]
+            assert [r["referencia_catastral"] for r in resultados] == validas
+
+            for resultado in resultados:
+                esperado = esperados[resultado["referencia_catastral"]]
+                for campo in ("datos_descriptivos", "parcela_catastral", "cultivos"):
+                    assert resultado[campo] == esperado[campo], campo
+
+            for ref in validas:
+                assert os.path.exists(os.path.join(directorio, f"{ref}.json"))
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    pruebas = [
+        test_limitador_cortesia_es_global,
+        test_extraer_ficha_en_una_sola_llamada,
+        test_pool_de_navegadores_contra_mock,
+    ]
+    for prueba in pruebas:
+        try:
+            prueba()
+            print(f"✅ {prueba.__name__}")
+        except unittest.SkipTest as e:
+            print(f"⏭️  {prueba.__name__}: {e}")
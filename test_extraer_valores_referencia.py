@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la reutilización del formulario en ExtractorValoresReferencia
+
+La sede se simula con un driver mínimo en el que el resultado aparece en la
+misma página que el formulario (postback), sin navegador ni Cl@ve.
+"""
+
+import os
+import tempfile
+from collections import Counter
+
+from diario_extraccion import DiarioExtraccion
+from esperas_selenium import EsperasSelenium, EstadisticasTiempos
+from extraer_valores_referencia import XPATH_VALOR, ExtractorValoresReferencia
+
+
+class Elemento:
+    def __init__(self, sede, identificador, texto=""):
+        self.sede = sede
+        self.identificador = identificador
+        self.text = texto
+        self.tag_name = "select" if identificador == "ctl00_Contenido_ddlFinalidad" else "input"
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def is_selected(self):
+        return self.sede.finalidad == self.identificador
+
+    def get_dom_attribute(self, nombre):
+        return None
+
+    def find_elements(self, by, selector):
+        # Opción del desplegable de finalidad: option[value ="3"]
+        return [Elemento(self.sede, selector.split('"')[1])]
+
+    def clear(self):
+        self.sede.llamadas[f"clear:{self.identificador}"] += 1
+
+    def send_keys(self, texto):
+        self.sede.llamadas[f"send_keys:{self.identificador}"] += 1
+        if self.identificador == "ctl00_Contenido_txtRC2":
+            self.sede.rc = texto
+        elif self.identificador == "ctl00_Contenido_txtFechaConsulta":
+            self.sede.fecha = texto
+
+    def click(self):
+        if self.identificador == "ctl00_Contenido_btnValorReferencia":
+            self.sede.buscar()
+        else:
+            self.sede.finalidad = self.identificador
+
+
+class SedeSimulada:
+    """Driver con el formulario de valor de referencia y resultado por postback"""
+
+    def __init__(self, valores):
+        self.valores = valores
+        self.finalidad = None
+        self.fecha = None
+        self.rc = ""
+        self.resultado = None
+        self.error = False
+        self.llamadas = Counter()
+
+    def buscar(self):
+        self.llamadas["buscar"] += 1
+        if self.rc in self.valores:
+            self.resultado = self.valores[self.rc]
+        else:
+            self.error = True
+
+    def execute_script(self, script, *args):
+        self.llamadas["execute_script"] += 1
+        # El script retira el resultado y el error de la consulta anterior
+        self.resultado = None
+        self.error = False
+        return {"rc": True, "finalidad": self.finalidad, "fecha": self.fecha}
+
+    def find_element(self, by, valor):
+        self.llamadas[f"find:{valor}"] += 1
+        if valor == XPATH_VALOR:
+            return Elemento(self, valor, self.resultado)
+        return Elemento(self, valor)
+
+    def find_elements(self, by, valor):
+        if valor == XPATH_VALOR and self.resultado:
+            return [Elemento(self, valor, self.resultado)]
+        if valor == "DivErrorRC" and self.error:
+            return [Elemento(self, valor)]
+        return []
+
+    def back(self):
+        self.llamadas["back"] += 1
+
+    def get(self, url):
+        self.llamadas["get"] += 1
+
+
+def crear_extractor(sede, **kwargs) -> ExtractorValoresReferencia:
+    extractor = ExtractorValoresReferencia(headless=True, **kwargs)
+    extractor.driver = sede
+    extractor.esperas = EsperasSelenium(sede, EstadisticasTiempos())
+    extractor.limitador.intervalo = 0
+    extractor.autenticado = True
+    return extractor
+
+
+def test_tanda_rellena_finalidad_y_fecha_una_vez():
+    sede = SedeSimulada({"REF1": "931,10 €", "REF2": "1.234,56 €", "REF3": "50,00 €"})
+    extractor = crear_extractor(sede)
+
+    resultados = extractor.procesar_referencias(["REF1", "REF2", "NOEXISTE", "REF3"], "01/02/2025")
+
+    assert [r["valor_referencia"] for r in resultados] == [931.10, 1234.56, 50.0]
+    assert all(r["fecha_consulta"] == "01/02/2025" for r in resultados)
+
+    # Finalidad y fecha se rellenan una sola vez; la referencia en cada consulta
+    assert sede.llamadas["send_keys:ctl00_Contenido_txtFechaConsulta"] == 1
+    assert sede.llamadas["find:ctl00_Contenido_ddlFinalidad"] == 1
+    assert sede.llamadas["send_keys:ctl00_Contenido_txtRC2"] == 4
+    assert sede.llamadas["buscar"] == 4
+
+    # Sin recargar el buscador entre consultas
+    assert sede.llamadas["get"] == 0
+    assert sede.llamadas["back"] == 0
+
+
+def test_resultados_pasan_por_el_diario():
+    sede = SedeSimulada({"REF1": "931,10 €", "REF2": "1.234,56 €"})
+
+    with tempfile.TemporaryDirectory() as directorio:
+        consolidado = os.path.join(directorio, "valores_referencia.json")
+        diario = DiarioExtraccion(os.path.join(directorio, "diario.jsonl"))
+        diario.vincular_consolidado(consolidado, ["REF1", "REF2"])
+        diario.registrar("REF1", {"referencia_catastral": "REF1", "valor_referencia": 931.1})
+
+        resultados = crear_extractor(sede).procesar_referencias(["REF1", "REF2"], "01/02/2025", diario)
+        diario.cerrar()
+
+        # REF1 ya estaba completada: solo se consulta REF2
+        assert sede.llamadas["buscar"] == 1
+        assert [r["referencia_catastral"] for r in resultados] == ["REF1", "REF2"]
+        assert os.path.exists(consolidado)
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_tanda_rellena_finalidad_y_fecha_una_vez,
+        test_resultados_pasan_por_el_diario,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la conversión de textos con formato español del catastro
+"""
+
+from formato_catastral import superficie_a_m2
+
+
+def test_superficie_con_formato_espanol():
+    assert superficie_a_m2("1.197 m2") == 1197.0
+    assert superficie_a_m2("0,5") == 0.5
+    assert superficie_a_m2("12.345,67 m²") == 12345.67
+
+
+def test_superficie_sin_numero():
+    for texto in (None, 1197, "", "sin datos", "."):
+        assert superficie_a_m2(texto) is None
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_superficie_con_formato_espanol,
+        test_superficie_sin_numero,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
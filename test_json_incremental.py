@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la lectura incremental de JSON y NDJSON
+"""
+
+import io
+import json
+import os
+import tempfile
+
+from json_incremental import iterar_array_json, iterar_json
+
+OBJETOS = [
+    {"referencia_catastral": "03106A002000090000YL", "superficie": "1.197 m2", "municipio": "VALL DE GALLINERA"},
+    {"referencia_catastral": "46183A020000880000HR", "partida": "LA PLANA", "valor": 1.5e3, "lista": [1, [2, 3]]},
+    {"texto": "Viña, olivar y \"agrios\" ] , [ {}", "vacio": {}},
+    12.75, -3, True, None, "ñandú",
+]
+
+
+def leer(texto: str, tam_bloque: int, binario: bool = True) -> list:
+    lector = io.BytesIO(texto.encode("utf-8")) if binario else io.StringIO(texto)
+    return list(iterar_json(lector, tam_bloque))
+
+
+def debe_fallar(texto: str, excepcion=ValueError):
+    for tam_bloque in (1, 5, 4096):
+        try:
+            leer(texto, tam_bloque)
+        except excepcion:
+            continue
+        raise AssertionError(f"Se esperaba {excepcion.__name__} con {texto!r} (bloques de {tam_bloque})")
+
+
+def test_array_en_bloques_de_cualquier_tamano():
+    texto = json.dumps(OBJETOS, ensure_ascii=False, indent=1)
+    # Bloques pequeños: objetos, números y caracteres multibyte cortados entre bloques
+    for tam_bloque in (1, 2, 3, 7, 64, 4096):
+        assert leer(texto, tam_bloque) == OBJETOS, tam_bloque
+        assert leer("  \n" + json.dumps(OBJETOS, ensure_ascii=False, separators=(",", ":")), tam_bloque) == OBJETOS
+    assert leer(texto, 3, binario=False) == OBJETOS
+    assert leer("[1.5,22,333]", 1) == [1.5, 22, 333]
+
+
+def test_ndjson():
+    texto = "\n".join(json.dumps(o, ensure_ascii=False) for o in OBJETOS if isinstance(o, dict))
+    esperados = [o for o in OBJETOS if isinstance(o, dict)]
+    for tam_bloque in (1, 3, 64, 4096):
+        assert leer(texto, tam_bloque) == esperados
+        # Líneas vacías, CRLF y salto de línea final
+        assert leer("\r\n" + texto.replace("\n", "\r\n\r\n") + "\n", tam_bloque) == esperados
+
+
+def test_vacio():
+    for texto in ("", "  \n\t", "[]", " [ \n ] "):
+        assert leer(texto, 2) == []
+
+
+def test_mal_formado():
+    debe_fallar("[1, 2")                 # array sin cerrar
+    debe_fallar("[1 2]")                 # falta la coma
+    debe_fallar("[{\"a\": }]")           # elemento no válido
+    debe_fallar("{\"a\": 1}\n{\"b\": ", json.JSONDecodeError)
+    debe_fallar("{\"a\": 1}\nno es json\n", json.JSONDecodeError)
+
+
+def test_archivo():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "propiedades.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(OBJETOS, f, ensure_ascii=False)
+        assert list(iterar_array_json(ruta, tam_bloque=5)) == OBJETOS
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_array_en_bloques_de_cualquier_tamano,
+        test_ndjson,
+        test_vacio,
+        test_mal_formado,
+        test_archivo,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
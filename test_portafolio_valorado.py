@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las revaloraciones incrementales de PortafolioValorado
+"""
+
+import copy
+import json
+
+from server import ServicioValoracion, SesionNoEncontrada
+from valorador_inmuebles import PortafolioValorado, ValoradorInmuebles, criterios_vigentes
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+
+CAMBIO_RUSTICO = {"PRECIOS_RUSTICO": {
+    "ambito_17_marina_alta_interior": {"olivar_secano": 20000, "almendro_secano": 9000},
+    "ambito_13_safor_litoral": {"citricos_regadio": 70000},
+}}
+CAMBIO_URBANO = {"COEFICIENTES_URBANO": {"valencia": {"vivienda": 0.65}, "default": {"default": 0.55}}}
+
+
+def cartera() -> list:
+    """Propiedades de prueba; las urbanas con valor catastral para poder valorarlas"""
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+    for n, propiedad in enumerate(p for p in propiedades if "rúst" not in p["datos_descriptivos"]["clase"].lower()):
+        propiedad["datos_catastrales"] = {"valor_catastral": 40000 + 5000 * n}
+        propiedad["datos_inmueble"] = {"tipo": "vivienda" if n % 2 else "garaje"}
+    return propiedades
+
+
+def valorar(propiedades, criterios) -> dict:
+    return ValoradorInmuebles(criterios).valorar_multiples(propiedades)
+
+
+def comprobar_igual_que_revalorar(portafolio, propiedades, criterios):
+    completo = valorar(propiedades, criterios)
+    valores = [v.get("valor_estimado_euros") for v in portafolio.valoraciones]
+    assert valores == [v.get("valor_estimado_euros") for v in completo["valoraciones"]]
+    assert abs(portafolio.resumen["valor_total_estimado"] - completo["resumen"]["valor_total_estimado"]) < 0.05
+
+
+def test_cambios_rusticos_y_urbanos_igual_que_revalorar():
+    propiedades = cartera()
+    criterios = criterios_vigentes()
+    portafolio = PortafolioValorado(valorar(propiedades, criterios), criterios, propiedades)
+    original = copy.deepcopy(portafolio.valoraciones)
+
+    respuesta = portafolio.aplicar_cambios(CAMBIO_RUSTICO)
+    criterios = criterios.con_personalizados(CAMBIO_RUSTICO)
+    comprobar_igual_que_revalorar(portafolio, propiedades, criterios)
+    modificadas = {m["indice"] for m in respuesta["valoraciones_modificadas"]}
+    assert modificadas and all(portafolio.valoraciones[i]["tipo_valoracion"] == "rustico" for i in modificadas)
+
+    respuesta = portafolio.aplicar_cambios(CAMBIO_URBANO)
+    criterios = criterios.con_personalizados(CAMBIO_URBANO)
+    comprobar_igual_que_revalorar(portafolio, propiedades, criterios)
+    assert {portafolio.valoraciones[m["indice"]]["tipo_valoracion"] for m in respuesta["valoraciones_modificadas"]} == {"urbano"}
+    assert respuesta["criterios_version"] == criterios.version
+
+    # Las valoraciones recibidas no se modifican
+    assert [v.get("valor_estimado_euros") for v in original] == \
+        [v.get("valor_estimado_euros") for v in valorar(propiedades, criterios_vigentes())["valoraciones"]]
+
+
+def test_cambio_rechazado_no_altera_la_cartera():
+    propiedades = cartera()
+    criterios = criterios_vigentes()
+    portafolio = PortafolioValorado(valorar(propiedades, criterios), criterios, propiedades)
+    resumen = dict(portafolio.resumen)
+
+    try:
+        portafolio.aplicar_cambios({"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": "caro"}}})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Se esperaba ValueError por un precio no numérico")
+
+    assert portafolio.resumen == resumen
+    assert portafolio.criterios is criterios
+
+    # Los cambios siguientes dan lo mismo que si el diff rechazado no hubiera existido
+    portafolio.aplicar_cambios(CAMBIO_RUSTICO)
+    comprobar_igual_que_revalorar(portafolio, propiedades, criterios.con_personalizados(CAMBIO_RUSTICO))
+    segundo = {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 15000}}}
+    portafolio.aplicar_cambios(segundo)
+    esperados = criterios.con_personalizados(CAMBIO_RUSTICO).con_personalizados(segundo)
+    comprobar_igual_que_revalorar(portafolio, propiedades, esperados)
+
+
+def test_sesion_con_cambio_rechazado():
+    propiedades = cartera()
+    servicio = ServicioValoracion(procesos=1)
+    resultado, sesion = servicio.valorar(propiedades, sesion=True)
+
+    # Un diff no válido es un error de la petición, no una sesión perdida
+    try:
+        servicio.revalorar_incremental({"COEFICIENTES_URBANO": {"valencia": {"vivienda": None}}}, id_sesion=sesion)
+    except SesionNoEncontrada:
+        raise AssertionError("La sesión existe")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Se esperaba ValueError por un coeficiente no numérico")
+
+    respuesta = servicio.revalorar_incremental(CAMBIO_URBANO, id_sesion=sesion)
+    esperado = valorar(propiedades, criterios_vigentes().con_personalizados(CAMBIO_URBANO))
+    assert abs(respuesta["resumen"]["valor_total_estimado"] - esperado["resumen"]["valor_total_estimado"]) < 0.05
+
+    try:
+        servicio.revalorar_incremental(CAMBIO_URBANO, id_sesion="no-existe")
+    except SesionNoEncontrada:
+        pass
+    else:
+        raise AssertionError("Se esperaba SesionNoEncontrada")
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_cambios_rusticos_y_urbanos_igual_que_revalorar,
+        test_cambio_rechazado_no_altera_la_cartera,
+        test_sesion_con_cambio_rechazado,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
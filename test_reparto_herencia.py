@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Pruebas del reparto automático de herencias
+"""
+
+import itertools
+import json
+import random
+import time
+
+from reparto_herencia import (
+    PRESUPUESTO_MAXIMO_SEGUNDOS, busqueda_local, calcular_estadisticas, calidad, cargas_asignacion, clave_poligono,
+    formar_lotes, limitar_presupuesto, normalizar_cuotas, repartir, repartir_valores, reparto_exacto, reparto_karmarkar_karp, reparto_lpt,
+    reparto_ponderado,
+)
+from valorador_inmuebles import ValoradorInmuebles
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+
+
+def valores_aleatorios(n: int, semilla: int = 7) -> list:
+    generador = random.Random(semilla)
+    return [round(generador.uniform(1_000, 400_000), 2) for _ in range(n)]
+
+
+def test_algoritmos_asignan_cada_propiedad_una_vez():
+    valores = valores_aleatorios(101)
+    for algoritmo in (reparto_lpt, reparto_karmarkar_karp):
+        asignacion = algoritmo(valores, 4)
+        assert len(asignacion) == len(valores)
+        assert set(asignacion) == {0, 1, 2, 3}
+    assert reparto_karmarkar_karp([], 3) == []
+
+
+def test_mejor_o_igual_que_el_voraz():
+    for n, k in ((12, 3), (60, 4), (500, 6)):
+        valores = valores_aleatorios(n, semilla=n)
+        asignacion, algoritmo = repartir_valores(valores, k)
+        assert calidad(valores, asignacion, k) <= calidad(valores, reparto_lpt(valores, k), k)
+        assert algoritmo["presupuestoAgotado"] is False
+
+
+def test_busqueda_local_encuentra_el_reparto_exacto():
+    # LPT da 7/5 para [3, 3, 2, 2, 2]; intercambiando se llega a 6/6
+    valores = [3, 3, 2, 2, 2]
+    asignacion = reparto_lpt(valores, 2)
+    assert calidad(valores, asignacion, 2)[0] == 2
+    asignacion, cambios, agotado = busqueda_local(valores, asignacion, 2)
+    assert calidad(valores, asignacion, 2)[0] == 0
+    assert cambios >= 1 and not agotado
+
+
+def test_respeta_el_presupuesto_de_tiempo():
+    valores = valores_aleatorios(3000)
+    inicio = time.monotonic()
+    asignacion, algoritmo = repartir_valores(valores, 8, presupuesto_segundos=0)
+    assert time.monotonic() - inicio < 5
+    assert algoritmo["presupuestoAgotado"] is True
+    assert algoritmo["cambiosBusquedaLocal"] == 0
+    assert len(asignacion) == len(valores)
+
+
+def test_mixto_solo_intercambia_propiedades_del_mismo_tipo():
+    valores = valores_aleatorios(90)
+    tipos = ["rustico" if i % 3 else "urbano" for i in range(len(valores))]
+
+    def cantidades(asignacion):
+        return [(sum(1 for a, t in zip(asignacion, tipos) if a == h and t == "rustico"),
+                 sum(1 for a, t in zip(asignacion, tipos) if a == h and t == "urbano")) for h in range(3)]
+
+    # La búsqueda local no cambia cuántas propiedades de cada tipo tiene cada heredero
+    inicial = reparto_lpt(valores, 3)
+    mejorado, _, _ = busqueda_local(valores, list(inicial), 3, tipos=tipos)
+    assert cantidades(mejorado) == cantidades(inicial)
+    assert calidad(valores, mejorado, 3) <= calidad(valores, inicial, 3)
+
+    asignacion, algoritmo = repartir_valores(valores, 3, "mixto", tipos)
+    assert algoritmo["repartoInicial"] == "por_tipo"
+    assert len(asignacion) == len(valores)
+
+
+def test_reparto_con_la_forma_del_frontend():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+    valoraciones = ValoradorInmuebles().valorar_multiples(propiedades)["valoraciones"]
+
+    resultado = repartir(propiedades, valoraciones, {"numeroHerederos": 3, "criterioBalance": "valor"})
+    herederos = resultado["herederos"]
+    assert [h["nombre"] for h in herederos] == ["Heredero 1", "Heredero 2", "Heredero 3"]
+    assert set(herederos[0]) == {"id", "nombre", "cuota", "propiedades", "valorTotal", "valorObjetivo",
+                                 "superficieTotal", "cantidadRusticas", "cantidadUrbanas"}
+    assert set(herederos[0]["propiedades"][0]) == {"propiedad", "valoracion", "valor", "superficie", "tipo"}
+
+    referencias = [p["propiedad"]["referencia_catastral"] for h in herederos for p in h["propiedades"]]
+    assert sorted(referencias) == sorted(p["referencia_catastral"] for p in propiedades)
+
+    estadisticas = resultado["estadisticas"]
+    total = sum(v.get("valor_estimado_euros") or 0 for v in valoraciones)
+    assert abs(estadisticas["valorTotal"] - total) < 0.01
+    assert estadisticas == calcular_estadisticas(herederos)
+    assert estadisticas["herederoMayor"]["valor"] - estadisticas["herederoMenor"]["valor"] == estadisticas["diferenciaMaxMin"]
+
+    # Las propiedades sin valoración no se reparten
+    parcial = repartir(propiedades, valoraciones[:5], {"numeroHerederos": 2})
+    assert sum(len(h["propiedades"]) for h in parcial["herederos"]) == 5
+
+
+def test_exacto_igual_que_la_busqueda_exhaustiva():
+    generador = random.Random(3)
+    for _ in range(40):
+        n, k = generador.randint(1, 8), generador.randint(2, 4)
+        valores = [round(generador.uniform(1, 1_000), 2) for _ in range(n)]
+        asignacion, resultado = reparto_exacto(valores, k)
+
+        optimo = min(max(c) - min(c) for c in (cargas_asignacion(valores, a, k)
+                                               for a in itertools.product(range(k), repeat=n)))
+        assert abs(calidad(valores, asignacion, k)[0] - optimo) < 1e-6
+        assert resultado["optimo"] and resultado["gap"] == 0
+
+
+def test_exacto_con_presupuesto_devuelve_el_mejor_y_su_gap():
+    valores = valores_aleatorios(40)
+    inicial, _ = repartir_valores(valores, 4)
+    inicio = time.monotonic()
+    asignacion, algoritmo = repartir_valores(valores, 4, "exacto", presupuesto_segundos=0.3)
+    assert time.monotonic() - inicio < 2
+
+    assert calidad(valores, asignacion, 4)[0] <= calidad(valores, inicial, 4)[0]
+    assert abs(algoritmo["diferencia"] - calidad(valores, asignacion, 4)[0]) < 1e-6
+    assert algoritmo["gap"] == algoritmo["diferencia"] - algoritmo["cotaInferior"]
+    if algoritmo["presupuestoAgotado"]:
+        assert not algoritmo["optimo"]
+
+
+def test_rusticas_del_mismo_poligono_juntas():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+    valoraciones = ValoradorInmuebles().valorar_multiples(propiedades)["valoraciones"]
+
+    poligonos = {}
+    for propiedad in propiedades:
+        clave = clave_poligono(propiedad)
+        if clave:
+            poligonos.setdefault(clave, set()).add(propiedad["referencia_catastral"])
+    assert any(len(referencias) > 1 for referencias in poligonos.values())
+
+    juntas = [propiedades[-1]["referencia_catastral"], propiedades[-2]["referencia_catastral"]]
+    for criterio in ("valor", "exacto"):
+        resultado = repartir(propiedades, valoraciones, {
+            "numeroHerederos": 3, "criterioBalance": criterio,
+            "agruparPorPoligono": True, "mantenerJuntas": [juntas],
+        }, presupuesto_segundos=0.3)
+        heredero_de = {p["propiedad"]["referencia_catastral"]: h["id"]
+                       for h in resultado["herederos"] for p in h["propiedades"]}
+        assert len(heredero_de) == len(propiedades)
+        for referencias in poligonos.values():
+            assert len({heredero_de[r] for r in referencias}) == 1
+        assert heredero_de[juntas[0]] == heredero_de[juntas[1]]
+        assert resultado["algoritmo"]["lotes"] < len(propiedades)
+
+    assert formar_lotes(propiedades[:3]) == [[0], [1], [2]]
+
+
+def desviacion_relativa(vector, asignacion, cuotas):
+    """Mayor desviación de un heredero respecto a su cuota, en tanto por uno"""
+    total = sum(vector)
+    cargas = cargas_asignacion(vector, asignacion, len(cuotas))
+    return max(abs(carga - cuota * total) / (cuota * total) for carga, cuota in zip(cargas, cuotas))
+
+
+def test_cuotas():
+    assert normalizar_cuotas(["1/2", "1/4", 0.25], 3) == [0.5, 0.25, 0.25]
+    assert normalizar_cuotas([2, 1, 1], 3) == [0.5, 0.25, 0.25]
+    assert normalizar_cuotas(None, 4) == [0.25] * 4
+    for cuotas in ([1, 1], [1, 0, 1], ["un tercio", 1, 1]):
+        try:
+            normalizar_cuotas(cuotas, 3)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Se esperaba ValueError con {cuotas}")
+
+    # Con cuotas iguales y solo el valor, el voraz ponderado es el LPT
+    valores = valores_aleatorios(200)
+    assert reparto_ponderado(valores, 5, [0.2] * 5) == reparto_lpt(valores, 5)
+
+
+def test_reparto_hacia_cuotas_desiguales():
+    valores = valores_aleatorios(300)
+    cuotas = normalizar_cuotas(["1/3", "2/9", "2/9", "2/9"], 4)
+    asignacion, algoritmo = repartir_valores(valores, 4, cuotas=cuotas)
+    assert algoritmo["repartoInicial"] == "ponderado"
+    assert desviacion_relativa(valores, asignacion, cuotas) < 0.001
+
+    # El exacto con cuotas coincide con la búsqueda exhaustiva
+    pequenos = valores_aleatorios(7, semilla=1)
+    cuotas = normalizar_cuotas([3, 2, 1], 3)
+    objetivos = [cuota * sum(pequenos) for cuota in cuotas]
+
+    def diferencia(a):
+        excesos = [c - o for c, o in zip(cargas_asignacion(pequenos, a, 3), objetivos)]
+        return max(excesos) - min(excesos)
+
+    asignacion, resultado = reparto_exacto(pequenos, 3, objetivos=objetivos)
+    assert resultado["optimo"]
+    assert abs(diferencia(asignacion) - min(map(diferencia, itertools.product(range(3), repeat=7)))) < 1e-6
+
+
+def test_equilibrio_de_superficie_y_tipos():
+    generador = random.Random(5)
+    n, k = 2000, 20
+    valores = valores_aleatorios(n)
+    superficies = [generador.uniform(0.01, 5) for _ in range(n)]
+    rusticas = [generador.randint(0, 1) for _ in range(n)]
+    urbanas = [1 - r for r in rusticas]
+    cuotas = normalizar_cuotas([generador.randint(1, 4) for _ in range(k)], k)
+
+    solo_valor, _ = repartir_valores(valores, k, cuotas=cuotas)
+    inicio = time.monotonic()
+    varios, algoritmo = repartir_valores(valores, k, cuotas=cuotas,
+                                         secundarias=[(1, superficies), (1, rusticas), (1, urbanas)])
+    assert time.monotonic() - inicio < 10
+    assert not algoritmo["presupuestoAgotado"]
+
+    assert desviacion_relativa(valores, varios, cuotas) < 0.001
+    assert desviacion_relativa(superficies, varios, cuotas) < desviacion_relativa(superficies, solo_valor, cuotas)
+    assert desviacion_relativa(rusticas, varios, cuotas) < desviacion_relativa(rusticas, solo_valor, cuotas)
+
+
+def test_reparto_con_cuotas_y_estadisticas():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+    valoraciones = ValoradorInmuebles().valorar_multiples(propiedades)["valoraciones"]
+
+    configuracion = {"numeroHerederos": 3, "cuotas": ["1/2", "1/4", "1/4"]}
+    solo_valor = repartir(propiedades, valoraciones, configuracion)
+    herederos = solo_valor["herederos"]
+    assert [h["cuota"] for h in herederos] == [0.5, 0.25, 0.25]
+    total = solo_valor["estadisticas"]["valorTotal"]
+    for heredero in herederos:
+        assert heredero["valorObjetivo"] == heredero["cuota"] * total
+
+    # Las desviaciones se miden respecto al objetivo de cada heredero, no a la media
+    estadisticas = solo_valor["estadisticas"]
+    assert estadisticas["equilibrado"]
+    assert estadisticas["diferenciaMaxMin"] < 0.001 * estadisticas["valorPromedioPorHeredero"]
+
+    # Con superficie y número de propiedades se cede algo de valor a cambio
+    varios = repartir(propiedades, valoraciones,
+                      {**configuracion, "pesosBalance": {"superficie": 0.5, "cantidad": 0.5}})
+    assert varios["estadisticas"]["equilibrado"]
+
+    def desviacion_superficie(resultado):
+        superficie = sum(h["superficieTotal"] for h in resultado["herederos"])
+        return max(abs(h["superficieTotal"] - h["cuota"] * superficie) for h in resultado["herederos"])
+
+    assert desviacion_superficie(varios) < desviacion_superficie(solo_valor)
+
+    for pesos in ({"antiguedad": 1}, {"superficie": -1}, {"valor": 0}):
+        try:
+            repartir(propiedades, valoraciones, {"numeroHerederos": 2, "pesosBalance": pesos})
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Se esperaba ValueError con {pesos}")
+
+
+def test_configuracion_no_valida():
+    for configuracion in ({"numeroHerederos": 0}, {"numeroHerederos": 2, "criterioBalance": "superficie"}):
+        try:
+            repartir([], [], configuracion)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Se esperaba ValueError con {configuracion}")
+
+    assert calcular_estadisticas([])["equilibrado"] is True
+
+
+def test_presupuesto_no_valido_o_excesivo():
+    for presupuesto in (float("nan"), float("inf"), -1, "mucho", None):
+        try:
+            repartir_valores([1000, 2000], 2, presupuesto_segundos=presupuesto)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"Se esperaba ValueError con presupuesto {presupuesto!r}")
+
+    assert limitar_presupuesto("1.5") == 1.5
+    assert limitar_presupuesto(0) == 0
+    assert limitar_presupuesto(1e9) == PRESUPUESTO_MAXIMO_SEGUNDOS
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_algoritmos_asignan_cada_propiedad_una_vez,
+        test_mejor_o_igual_que_el_voraz,
+        test_busqueda_local_encuentra_el_reparto_exacto,
+        test_respeta_el_presupuesto_de_tiempo,
+        test_mixto_solo_intercambia_propiedades_del_mismo_tipo,
+        test_reparto_con_la_forma_del_frontend,
+        test_exacto_igual_que_la_busqueda_exhaustiva,
+        test_exacto_con_presupuesto_devuelve_el_mejor_y_su_gap,
+        test_rusticas_del_mismo_poligono_juntas,
+        test_cuotas,
+        test_reparto_hacia_cuotas_desiguales,
+        test_equilibrio_de_superficie_y_tipos,
+        test_reparto_con_cuotas_y_estadisticas,
+        test_configuracion_no_valida,
+        test_presupuesto_no_valido_o_excesivo,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la API HTTP del servidor de valoraciones
+"""
+
+import http.client
+import http.server
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import server
+from server import MyHTTPRequestHandler, ServicioValoracion
+from valorador_inmuebles import ValoradorInmuebles
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+OLIVAR_17 = {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 20000}}}
+
+
+@contextmanager
+def servidor():
+    """Servidor multihilo en un puerto libre, como el de main()"""
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MyHTTPRequestHandler)
+    httpd.servicio = ServicioValoracion(procesos=1)
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield httpd.server_address[1]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        httpd.servicio.cerrar()
+
+
+def peticion(puerto: int, ruta: str, cuerpo, metodo: str = "POST", chunked: bool = False):
+    """Envía la petición y devuelve (código, cabeceras, cuerpo en texto)"""
+    if not isinstance(cuerpo, (bytes, str)):
+        cuerpo = json.dumps(cuerpo, ensure_ascii=False)
+    if isinstance(cuerpo, str):
+        cuerpo = cuerpo.encode("utf-8")
+    if chunked:
+        # Cuerpo en trozos de 100 bytes con Transfer-Encoding: chunked
+        datos = cuerpo
+        cuerpo = (datos[i:i + 100] for i in range(0, len(datos), 100))
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+    try:
+        conexion.request(metodo, ruta, body=cuerpo, encode_chunked=chunked)
+        respuesta = conexion.getresponse()
+        return respuesta.status, dict(respuesta.getheaders()), respuesta.read().decode("utf-8")
+    finally:
+        conexion.close()
+
+
+def propiedades_prueba() -> list:
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def lineas_ndjson(texto: str) -> list:
+    return [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+
+
+def valores(resultado: dict) -> list:
+    return [v.get("valor_estimado_euros") for v in resultado["valoraciones"]]
+
+
+def test_pool_de_procesos_igual_que_secuencial():
+    propiedades = propiedades_prueba() * 3
+    esperado = ValoradorInmuebles().valorar_multiples(propiedades)
+
+    servicio = ServicioValoracion(procesos=2, umbral_pool=10)
+    try:
+        assert servicio.pool is not None
+        for modo in ("secuencial", "vectorizado"):
+            servicio.cache.limpiar()
+            resultado = servicio.valorar(propiedades, modo=modo)
+            assert valores(resultado) == valores(esperado)
+            assert resultado["resumen"]["valor_total_estimado"] == esperado["resumen"]["valor_total_estimado"]
+
+        # Con criterios personalizados los trabajadores usan los de la petición
+        servicio.cache.limpiar()
+        personalizado = servicio.valorar(propiedades, OLIVAR_17)
+        assert valores(personalizado) == valores(ValoradorInmuebles(servicio.criterios(OLIVAR_17)).valorar_multiples(propiedades))
+    finally:
+        servicio.cerrar()
+
+
+def test_trabajador_reutiliza_el_valorador_por_version():
+    propiedades = propiedades_prueba()
+    servicio = ServicioValoracion(procesos=1)
+    criterios = servicio.criterios()
+    servicio.cerrar()
+    server._valoradores_trabajador.clear()
+
+    server._iniciar_trabajador(criterios)
+    valorador = server._valoradores_trabajador[criterios.version]
+    primera = server._valorar_lote(propiedades, criterios, "vectorizado")
+    assert server._valorador_trabajador(criterios) is valorador
+
+    # Otra versión, otro valorador; los más antiguos se descartan
+    otros = [criterios.con_personalizados({"COEFICIENTES_URBANO": {"valencia": {"vivienda": 0.5 + n / 100}}})
+             for n in range(1, server.MAX_VALORADORES_TRABAJADOR + 1)]
+    for otro in otros:
+        assert server._valorador_trabajador(otro) is not valorador
+    assert criterios.version not in server._valoradores_trabajador
+    assert len(server._valoradores_trabajador) == server.MAX_VALORADORES_TRABAJADOR
+    segunda = server._valorar_lote(propiedades, criterios, "vectorizado")
+    assert [v.get("valor_estimado_euros") for v in segunda] == [v.get("valor_estimado_euros") for v in primera]
+    server._valoradores_trabajador.clear()
+
+
+def test_peticiones_concurrentes():
+    propiedades = propiedades_prueba()
+    esperado = ValoradorInmuebles().valorar_multiples(propiedades)
+    olivar = ValoradorInmuebles(ServicioValoracion(procesos=1).criterios(OLIVAR_17)).valorar_multiples(propiedades)
+
+    with servidor() as puerto:
+        def valorar(n: int):
+            cuerpo = {"propiedades": propiedades, "modo": "vectorizado" if n % 2 else "secuencial"}
+            if n % 3 == 0:
+                cuerpo["criterios"] = OLIVAR_17
+            codigo, cabeceras, texto = peticion(puerto, "/api/valorar", cuerpo)
+            return n, codigo, cabeceras, json.loads(texto)
+
+        with ThreadPoolExecutor(max_workers=8) as hilos:
+            respuestas = list(hilos.map(valorar, range(24)))
+
+    sesiones = set()
+    for n, codigo, cabeceras, resultado in respuestas:
+        assert codigo == 200
+        assert valores(resultado) == valores(olivar if n % 3 == 0 else esperado)
+        sesiones.add(cabeceras["X-Sesion-Valoracion"])
+    assert len(sesiones) == len(respuestas)
+
+
+def test_sesiones_de_revaloracion():
+    propiedades = propiedades_prueba()
+    with servidor() as puerto:
+        codigo, cabeceras, _ = peticion(puerto, "/api/valorar", {"propiedades": propiedades})
+        assert codigo == 200
+        sesion = cabeceras["X-Sesion-Valoracion"]
+
+        codigo, _, texto = peticion(puerto, "/api/valorar/incremental", {"sesion": sesion, "cambios": OLIVAR_17})
+        assert codigo == 200
+        respuesta = json.loads(texto)
+        assert respuesta["sesion"] == sesion and respuesta["valoraciones_modificadas"]
+        esperado = ValoradorInmuebles(ServicioValoracion(procesos=1).criterios(OLIVAR_17)).valorar_multiples(propiedades)
+        assert abs(respuesta["resumen"]["valor_total_estimado"] - esperado["resumen"]["valor_total_estimado"]) < 0.05
+
+        # Un diff no válido no pierde la sesión; una sesión desconocida es un 404
+        cambio_roto = {"PRECIOS_RUSTICO": {"valencia": {"olivar_secano": "caro"}}}
+        codigo, _, _ = peticion(puerto, "/api/valorar/incremental", {"sesion": sesion, "cambios": cambio_roto})
+        assert codigo == 400
+        codigo, _, _ = peticion(puerto, "/api/valorar/incremental", {"sesion": "no-existe", "cambios": OLIVAR_17})
+        assert codigo == 404
+        codigo, _, _ = peticion(puerto, "/api/valorar/incremental", {"sesion": sesion, "cambios": {}})
+        assert codigo == 200
+
+    # Las sesiones más antiguas se descartan a partir de MAX_SESIONES
+    servicio = ServicioValoracion(procesos=1)
+    ids = [servicio.valorar(propiedades[:1], sesion=True)[1] for _ in range(server.MAX_SESIONES + 1)]
+    assert ids[0] not in servicio.sesiones and ids[-1] in servicio.sesiones
+    assert len(servicio.sesiones) == server.MAX_SESIONES
+
+
+def test_valorar_con_criterios_mal_formados():
+    propiedades = propiedades_prueba()[:3]
+    with servidor() as puerto:
+        for criterios in ({"PRECIOS_RUSTICO": {"valencia": 5}}, {"PRECIOS_RUSTICO": ["valencia"]}, ["PRECIOS_RUSTICO"]):
+            codigo, _, texto = peticion(puerto, "/api/valorar", {"propiedades": propiedades, "criterios": criterios})
+            assert codigo == 400, (criterios, texto)
+            assert json.loads(texto)["mensaje"] == "Petición de valoración no válida"
+
+        codigo, _, _ = peticion(puerto, "/api/valorar", '{"propiedades": [')
+        assert codigo == 400
+
+
+def test_stream_ndjson_y_array():
+    propiedades = propiedades_prueba()
+    esperado = ValoradorInmuebles().valorar_multiples(propiedades)
+    ndjson = "\n".join(json.dumps(p, ensure_ascii=False) for p in propiedades)
+
+    with servidor() as puerto:
+        for cuerpo, chunked, modo in ((ndjson, False, "secuencial"), (ndjson, True, "vectorizado"),
+                                      (propiedades, False, "vectorizado"), (propiedades, True, "secuencial")):
+            codigo, cabeceras, texto = peticion(puerto, f"/api/valorar/stream?modo={modo}", cuerpo, chunked=chunked)
+            assert codigo == 200
+            assert cabeceras["Content-Type"].startswith("application/x-ndjson")
+
+            lineas = lineas_ndjson(texto)
+            valoraciones, resumen = lineas[:-1], lineas[-1]["resumen"]
+            assert [v["referencia_catastral"] for v in valoraciones] == [p["referencia_catastral"] for p in propiedades]
+            assert [v.get("valor_estimado_euros") for v in valoraciones] == \
+                [v.get("valor_estimado_euros") for v in esperado["valoraciones"]]
+            assert resumen["total_propiedades"] == len(propiedades)
+            assert abs(resumen["valor_total_estimado"] - esperado["resumen"]["valor_total_estimado"]) < 0.05
+
+        # Cuerpo vacío: solo la línea de resumen
+        codigo, _, texto = peticion(puerto, "/api/valorar/stream", "")
+        assert codigo == 200 and lineas_ndjson(texto) == [{"resumen": lineas_ndjson(texto)[0]["resumen"]}]
+        assert lineas_ndjson(texto)[0]["resumen"]["total_propiedades"] == 0
+
+
+def test_stream_con_criterios_en_la_primera_linea():
+    propiedades = propiedades_prueba()
+    servicio = ServicioValoracion(procesos=1)
+    esperado = ValoradorInmuebles(servicio.criterios(OLIVAR_17)).valorar_multiples(propiedades)
+    servicio.cerrar()
+    cuerpo = "\n".join(json.dumps(o, ensure_ascii=False) for o in [{"criterios": OLIVAR_17}] + propiedades)
+
+    with servidor() as puerto:
+        codigo, _, texto = peticion(puerto, "/api/valorar/stream", cuerpo)
+        assert codigo == 200
+        lineas = lineas_ndjson(texto)
+        assert len(lineas) == len(propiedades) + 1
+        assert [v.get("valor_estimado_euros") for v in lineas[:-1]] == \
+            [v.get("valor_estimado_euros") for v in esperado["valoraciones"]]
+        assert abs(lineas[-1]["resumen"]["valor_total_estimado"] - esperado["resumen"]["valor_total_estimado"]) < 0.05
+
+
+def test_stream_mal_formado():
+    propiedades = propiedades_prueba()
+    with servidor() as puerto:
+        # Error antes de la primera valoración: respuesta 400 normal
+        for cuerpo, ruta in (('{"referencia_catastral": ', "/api/valorar/stream"),
+                             ('[{"referencia_catastral": "A"} {"b": 1}]', "/api/valorar/stream"),
+                             ('{"criterios": {"PRECIOS_RUSTICO": {"valencia": {"olivar_secano": "caro"}}}}\n',
+                              "/api/valorar/stream"),
+                             (propiedades[:2], "/api/valorar/stream?modo=paralelo")):
+            codigo, _, texto = peticion(puerto, ruta, cuerpo)
+            assert codigo == 400, (cuerpo, texto)
+            assert json.loads(texto)["mensaje"] == "Petición de valoración no válida"
+
+        # Error a mitad del flujo: las valoraciones ya enviadas y una última línea de error
+        cuerpo = "\n".join(json.dumps(p, ensure_ascii=False) for p in propiedades * 4) + "\n{roto\n"
+        codigo, _, texto = peticion(puerto, "/api/valorar/stream", cuerpo)
+        assert codigo == 200
+        lineas = lineas_ndjson(texto)
+        assert lineas[-1]["mensaje"] == "Error al valorar las propiedades"
+        assert all("referencia_catastral" in linea for linea in lineas[:-1])
+        assert not any("resumen" in linea for linea in lineas)
+
+
+def test_reparto_con_presupuesto_no_valido():
+    propiedades = [{"referencia_catastral": f"REF{n}"} for n in range(3)]
+    valoraciones = [{"referencia_catastral": f"REF{n}", "valor_estimado_euros": 1000.0 * (n + 1)} for n in range(3)]
+    cuerpo = {"propiedades": propiedades, "valoraciones": valoraciones, "configuracion": {"numeroHerederos": 2}}
+
+    with servidor() as puerto:
+        # json.dumps escribe NaN, que json.loads acepta
+        for presupuesto in (float("nan"), float("inf"), -2, "mucho"):
+            codigo, _, texto = peticion(puerto, "/api/reparto", {**cuerpo, "presupuestoSegundos": presupuesto})
+            assert codigo == 400, (presupuesto, texto)
+            assert json.loads(texto)["mensaje"] == "Configuración de reparto no válida"
+
+        # Un presupuesto enorme se recorta en lugar de bloquear el hilo
+        codigo, _, texto = peticion(puerto, "/api/reparto", {**cuerpo, "presupuestoSegundos": 1e9})
+        assert codigo == 200, texto
+        assert len(json.loads(texto)["herederos"]) == 2
+
+
+def test_reparto_con_json_mal_formado():
+    with servidor() as puerto:
+        codigo, _, texto = peticion(puerto, "/api/reparto", '{"propiedades": [')
+        assert codigo == 400
+        assert json.loads(texto)["mensaje"] == "El cuerpo de la petición no es un JSON válido"
+
+        codigo, _, texto = peticion(puerto, "/api/reparto", "[1, 2]")
+        assert codigo == 400
+        assert json.loads(texto)["mensaje"] == "Configuración de reparto no válida"
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_pool_de_procesos_igual_que_secuencial,
+        test_trabajador_reutiliza_el_valorador_por_version,
+        test_peticiones_concurrentes,
+        test_sesiones_de_revaloracion,
+        test_valorar_con_criterios_mal_formados,
+        test_stream_ndjson_y_array,
+        test_stream_con_criterios_en_la_primera_linea,
+        test_stream_mal_formado,
+        test_reparto_con_presupuesto_no_valido,
+        test_reparto_con_json_mal_formado,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la carga, la recarga en caliente y la selección por fecha de
+devengo de las tablas del valorador
+"""
+
+import json
+import os
+import pickle
+import tempfile
+
+from server import ServicioValoracion
+from datetime import date
+
+from tablas_valoracion import SECCION_TABLAS, FuenteTablas, escribir_tablas, leer_tablas
+from valorador_inmuebles import CriteriosValoracion, ValoradorInmuebles, criterios_vigentes
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+
+
+def tablas_escaladas(factor: float) -> dict:
+    """Tablas integradas con todos los precios rústicos multiplicados"""
+    return {"PRECIOS_RUSTICO": {
+        region: {clave: valor * factor for clave, valor in valores.items()}
+        for region, valores in CriteriosValoracion.PRECIOS_RUSTICO.items()
+    }}
+
+
+def modificar(ruta: str, tablas: dict):
+    """Escribe tablas nuevas y adelanta la fecha de modificación del archivo"""
+    escribir_tablas(ruta, tablas)
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+
+
+def tablas_anuales(directorio: str, factores: dict):
+    """Un archivo valores_gva_<año>_oficial.json por año, con su vigencia"""
+    for anio, factor in factores.items():
+        ruta = os.path.join(directorio, f"valores_gva_{anio}_oficial.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"fuente": {"vigencia": {"desde": f"{anio}-01-01", "hasta": f"{anio}-12-31"}}}, f)
+        escribir_tablas(ruta, tablas_escaladas(factor))
+
+
+def test_tablas_del_json_iguales_a_las_integradas():
+    # Los valores de data/ reproducen los integrados: misma versión, mismas cachés
+    assert criterios_vigentes() == CriteriosValoracion()
+
+
+def test_tablas_desde_otro_directorio():
+    # Los archivos se buscan junto al módulo, no en el directorio de trabajo
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.chdir(directorio)
+        try:
+            fuente = FuenteTablas(CriteriosValoracion)
+            periodo = fuente.periodo("2025-06-01")
+            criterios = fuente.cargar(periodo)
+        finally:
+            os.chdir(anterior)
+    assert periodo is not None and periodo.contiene(date(2025, 6, 1))
+    assert criterios == criterios_vigentes()
+
+
+def test_escribir_y_leer_tablas():
+    with tempfile.TemporaryDirectory() as directorio:
+        primero = os.path.join(directorio, "valores_gva_2024.json")
+        segundo = os.path.join(directorio, "valores_gva_2025.json")
+        with open(primero, "w", encoding="utf-8") as f:
+            json.dump({"fuente": {"version": "2024"}}, f)
+
+        escribir_tablas(primero, {"PRECIOS_RUSTICO": {"valencia": {"default": 1}, "nacional": {"default": 2}}},
+                        fuente="prueba")
+        escribir_tablas(segundo, {"PRECIOS_RUSTICO": {"valencia": {"default": 3}}})
+        escribir_tablas(primero, {"COEFICIENTES_URBANO": {"valencia": {"default": 0.7}}})
+
+        with open(primero, encoding="utf-8") as f:
+            datos = json.load(f)
+        assert datos["fuente"] == {"version": "2024"}
+        assert datos[SECCION_TABLAS]["fuente"] == "prueba"
+
+        # El último archivo en orden alfabético prevalece en las regiones repetidas
+        assert leer_tablas([primero, segundo]) == {
+            "PRECIOS_RUSTICO": {"valencia": {"default": 3}, "nacional": {"default": 2}},
+            "COEFICIENTES_URBANO": {"valencia": {"default": 0.7}},
+        }
+
+        try:
+            escribir_tablas(segundo, {"PRECIOS_RUSTICO": {"valencia": {"default": "mucho"}}})
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Se esperaba ValueError por un valor no numérico")
+
+
+def test_recarga_atomica_sin_afectar_a_los_criterios_en_uso():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "valores_gva_2025.json")
+        escribir_tablas(ruta, tablas_escaladas(1))
+        fuente = FuenteTablas(CriteriosValoracion, patron=os.path.join(directorio, "valores_gva_*.json"),
+                              intervalo=0)
+
+        anteriores = fuente.actual()
+        assert anteriores == CriteriosValoracion()
+        assert fuente.actual() is anteriores
+
+        modificar(ruta, tablas_escaladas(2))
+        nuevos = fuente.actual()
+        assert nuevos != anteriores
+        assert nuevos.PRECIOS_RUSTICO["valencia"]["olivar_regadio"] == 48800
+        assert anteriores.PRECIOS_RUSTICO["valencia"]["olivar_regadio"] == 24400
+
+        # Un archivo a medio escribir no sustituye a la versión vigente
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write('{"tablas_valorador": {"PRECIOS_RUS')
+        assert fuente.comprobar() is False
+        assert fuente.actual() is nuevos
+
+
+def test_criterios_serializables_para_el_pool():
+    criterios = criterios_vigentes().con_personalizados(
+        {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 20000}}}
+    )
+    copia = pickle.loads(pickle.dumps(criterios))
+    assert copia == criterios
+    assert copia.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]["olivar_secano"] == 20000
+    assert copia.PRECIOS_RUSTICO["ambito_17_marina_alta_interior"]["labor_secano"] == 6633
+    assert dict(copia.COEFICIENTES_URBANO["valencia"]) == dict(criterios.COEFICIENTES_URBANO["valencia"])
+
+
+def test_peticion_en_curso_conserva_su_version():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)[:6]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "valores_gva_2025.json")
+        escribir_tablas(ruta, tablas_escaladas(1))
+        fuente = FuenteTablas(CriteriosValoracion, patron=os.path.join(directorio, "valores_gva_*.json"),
+                              intervalo=0)
+        servicio = ServicioValoracion(procesos=1, fuente=fuente)
+
+        esperado = servicio.valorar(propiedades)["valoraciones"]
+        flujo = servicio.valorar_flujo(iter(propiedades), tam_lote=1)
+        primera = next(flujo)
+
+        # Las tablas cambian mientras el flujo está a medias
+        modificar(ruta, tablas_escaladas(2))
+        resto = list(flujo)[:-1]
+
+        valores = [v.get("valor_estimado_euros") for v in [primera] + resto]
+        assert valores == [v.get("valor_estimado_euros") for v in esperado]
+
+        # Las peticiones nuevas ya usan las tablas recargadas
+        recargado = servicio.valorar(propiedades)["valoraciones"]
+        rusticos = [(a, b) for a, b in zip(esperado, recargado) if a.get("tipo_valoracion") == "rustico"]
+        assert rusticos
+        for antes, despues in rusticos:
+            assert abs(despues["valor_estimado_euros"] - 2 * antes["valor_estimado_euros"]) <= 0.02
+
+
+def test_registro_por_fecha_de_devengo():
+    with tempfile.TemporaryDirectory() as directorio:
+        tablas_anuales(directorio, {2023: 1, 2024: 2, 2025: 3})
+        construidos = []
+
+        def construir(tablas):
+            construidos.append(tablas)
+            return CriteriosValoracion(tablas)
+
+        registro = FuenteTablas(construir, patron=os.path.join(directorio, "valores_gva_*.json"),
+                                intervalo=0, max_cargadas=2)
+        assert [p.desde.year for p in registro.periodos()] == [2023, 2024, 2025]
+        assert construidos == []
+
+        assert registro.periodo("2024-06-30").desde == date(2024, 1, 1)
+        assert registro.periodo(date(2025, 1, 1)).desde == date(2025, 1, 1)
+        # Antes del primer periodo se usa el primero; después del último, el último
+        assert registro.periodo("2019-05-01").desde == date(2023, 1, 1)
+        assert not registro.periodo("2026-02-01").contiene(date(2026, 2, 1))
+        assert registro.periodo("2026-02-01").desde == date(2025, 1, 1)
+
+        # Carga perezosa y LRU de dos periodos
+        criterios_2024 = registro.para_fecha("2024-06-30")
+        assert registro.para_fecha("2024-01-01") is criterios_2024
+        assert criterios_2024.PRECIOS_RUSTICO["valencia"]["olivar_regadio"] == 48800
+        registro.para_fecha("2025-03-01")
+        registro.para_fecha("2023-03-01")
+        assert len(construidos) == 3
+        assert registro.para_fecha("2024-02-02") is not criterios_2024
+        assert len(construidos) == 4
+
+
+def test_valorar_con_fechas_de_devengo_mezcladas():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)[:6]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        tablas_anuales(directorio, {2024: 1, 2025: 2})
+        construidos = []
+
+        def construir(tablas):
+            construidos.append(tablas)
+            return CriteriosValoracion(tablas)
+
+        registro = FuenteTablas(construir, patron=os.path.join(directorio, "valores_gva_*.json"), intervalo=0)
+        valorador = ValoradorInmuebles(registro.para_fecha("2024-01-01"), registro=registro)
+
+        fechas = ["2024-03-01", "2025-07-15", "2024-11-30", "2025-01-01", "2024-05-05", "2025-12-31"]
+        resultado = valorador.valorar_multiples(propiedades, fecha_devengo=fechas)
+        valoraciones = resultado["valoraciones"]
+
+        # Una carga por periodo aunque las fechas estén mezcladas
+        assert len(construidos) == 2
+        assert [v["referencia_catastral"] for v in valoraciones] == [p["referencia_catastral"] for p in propiedades]
+        assert [v["fecha_devengo"] for v in valoraciones] == fechas
+        assert [v["vigencia_tablas"]["desde"][:4] for v in valoraciones] == [f[:4] for f in fechas]
+
+        base = valorador.valorar_multiples(propiedades)["valoraciones"]
+        rusticos = 0
+        for fecha, antes, despues in zip(fechas, base, valoraciones):
+            if antes.get("tipo_valoracion") != "rustico":
+                continue
+            rusticos += 1
+            factor = 2 if fecha.startswith("2025") else 1
+            assert abs(despues["valor_estimado_euros"] - factor * antes["valor_estimado_euros"]) <= 0.02
+        assert rusticos
+
+        # Los valores personalizados se mantienen sobre las tablas de cada año
+        personalizado = ValoradorInmuebles(
+            valorador.criterios.con_personalizados({"PRECIOS_RUSTICO": {"nacional": {"default": 1}}}),
+            registro=registro,
+        )
+        criterios_2025 = personalizado.para_fecha("2025-06-01").criterios
+        assert criterios_2025.PRECIOS_RUSTICO["nacional"]["default"] == 1
+        assert criterios_2025.PRECIOS_RUSTICO["valencia"]["olivar_regadio"] == 48800
+        assert personalizado.valorar_propiedad(propiedades[0], fecha_devengo="2025-06-01")["fecha_devengo"] == "2025-06-01"
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_tablas_del_json_iguales_a_las_integradas,
+        test_tablas_desde_otro_directorio,
+        test_escribir_y_leer_tablas,
+        test_recarga_atomica_sin_afectar_a_los_criterios_en_uso,
+        test_criterios_serializables_para_el_pool,
+        test_peticion_en_curso_conserva_su_version,
+        test_registro_por_fecha_de_devengo,
+        test_valorar_con_fechas_de_devengo_mezcladas,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
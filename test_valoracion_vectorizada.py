@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Pruebas del modo vectorizado de valorar_multiples frente al secuencial
+"""
+
+import json
+import random
+
+from valorador_inmuebles import CriteriosValoracion, ValoradorInmuebles
+
+DATOS_PRUEBA = "angular-catastro/src/assets/datos_catastrales_mergeados.json"
+
+TEXTOS_CULTIVO = (
+    "O- Olivos secano", "O- Olivos regadío", "F- Frutales secano", "CR Labor o labradío regadío",
+    "CL Labor secano", "V- Viña secano", "FRT Frutales regadío", "NR Agrios regadío", "MM Pinar maderable",
+    "MT Matorral", "I- Improductivo", "E- Pastos", "Viña y olivar regadío", "Huerta", "Cereal secano",
+    "Forestal", "Prado natural", "Naranjos", "XX Desconocido", "",
+)
+LOCALIZACIONES = (
+    ("VALENCIA", "OLIVA"), ("VALENCIA", "PILES"), ("ALICANTE", "03788 VALL DE GALLINERA"),
+    ("ALICANTE", "PLANES"), ("Valencia/València", "GANDIA"), ("CÁCERES", "PLASENCIA"), ("MADRID", "MADRID"), ("", ""),
+)
+
+
+def numero_catastro(valor: float) -> str:
+    """Número con separador de miles y coma decimal, como en las fichas del Catastro"""
+    entero, decimales = f"{valor:.2f}".split(".")
+    texto = f"{int(entero):,}".replace(",", ".")
+    return texto if decimales == "00" else f"{texto},{decimales}"
+
+
+def rustica(generador: random.Random, n: int, max_cultivos: int) -> dict:
+    provincia, municipio = generador.choice(LOCALIZACIONES)
+    cultivos = []
+    for subparcela in range(generador.randint(0, max_cultivos)):
+        superficie = generador.choice((generador.randint(1, 90_000), round(generador.uniform(0.5, 5_000), 2)))
+        cultivos.append({
+            "subparcela": str(subparcela),
+            "cultivo_aprovechamiento": generador.choice(TEXTOS_CULTIVO),
+            "superficie_m2": numero_catastro(superficie),
+        })
+    return {
+        "referencia_catastral": f"99999A{n:03d}000010000XX",
+        "datos_descriptivos": {"clase": "Rústico", "uso_principal": "Agrario",
+                               "localizacion": {"provincia": provincia, "municipio": municipio}},
+        "parcela_catastral": {"superficie_gráfica": f"{numero_catastro(generador.randint(0, 200_000))} m2"},
+        "cultivos": cultivos,
+    }
+
+
+def criterios_aleatorios(generador: random.Random) -> CriteriosValoracion:
+    precios = {}
+    for region in ("ambito_13_safor_litoral", "ambito_17_marina_alta_interior", "valencia", "nacional", "default"):
+        tipos = generador.sample(sorted(CriteriosValoracion.PRECIOS_RUSTICO["valencia"]), 6)
+        precios[region] = {tipo: generador.choice((0, generador.randint(100, 60_000),
+                                                   round(generador.uniform(100, 60_000), 3)))
+                           for tipo in tipos}
+    precios["extremadura"] = {"olivar_secano": 7000.5}
+    return CriteriosValoracion().con_personalizados({"PRECIOS_RUSTICO": precios})
+
+
+def sin_fecha(resultado: dict) -> list:
+    return [{k: v for k, v in valoracion.items() if k != "fecha_valoracion"}
+            for valoracion in resultado["valoraciones"]]
+
+
+def comprobar_modos(valorador: ValoradorInmuebles, propiedades: list):
+    secuencial = valorador.valorar_multiples(propiedades)
+    vectorizado = valorador.valorar_multiples(propiedades, modo="vectorizado")
+    assert sin_fecha(vectorizado) == sin_fecha(secuencial)
+    assert vectorizado["resumen"]["valor_total_estimado"] == secuencial["resumen"]["valor_total_estimado"]
+
+
+def test_propiedades_aleatorias_con_criterios_personalizados():
+    generador = random.Random(11)
+    for _ in range(8):
+        propiedades = [rustica(generador, n, max_cultivos=6) for n in range(120)]
+        comprobar_modos(ValoradorInmuebles(criterios_aleatorios(generador)), propiedades)
+
+
+def test_sin_cultivos_y_con_un_cultivo_como_mucho():
+    generador = random.Random(5)
+    criterios = criterios_aleatorios(generador)
+    for max_cultivos in (0, 1):
+        propiedades = [rustica(generador, n, max_cultivos) for n in range(150)]
+        comprobar_modos(ValoradorInmuebles(criterios), propiedades)
+        comprobar_modos(ValoradorInmuebles(criterios), propiedades[:1])
+
+
+def test_datos_de_ejemplo_con_urbanas():
+    with open(DATOS_PRUEBA, encoding="utf-8") as f:
+        propiedades = json.load(f)
+    comprobar_modos(ValoradorInmuebles(CriteriosValoracion()), propiedades)
+    comprobar_modos(ValoradorInmuebles(CriteriosValoracion()), [])
+
+
+if __name__ == "__main__":
+    for prueba in (
+        test_propiedades_aleatorias_con_criterios_personalizados,
+        test_sin_cultivos_y_con_un_cultivo_como_mucho,
+        test_datos_de_ejemplo_con_urbanas,
+    ):
+        prueba()
+        print(f"✅ {prueba.__name__}")
@@ -9,15 +9,126 @@ Criterios basados en:
 - Coeficientes multiplicadores por CCAA
 """
 
+import copy
+import hashlib
 import json
+import sys
+from collections import ChainMap, OrderedDict, defaultdict
+from collections.abc import Mapping
 from datetime import datetime
-from typing import Dict, List, Optional
+from functools import partial
+from types import MappingProxyType
+from typing import Callable, Dict, List, Optional
+
+from ambitos_territoriales import IndiceAmbitos, indice_ambitos, variantes_nombre
+from cache_valoraciones import CacheValoraciones
+from formato_catastral import superficie_a_m2
+from tablas_valoracion import MAX_TABLAS_CARGADAS, TABLAS_VALORADOR, FuenteTablas, convertir_fecha, validar_tablas
+
+try:
+    import numpy as np
+except ImportError:  # Solo necesario para el modo de valoración vectorizado
+    np = None
+
+
+# Modos de valoración por lotes admitidos por valorar_multiples()
+MODOS_VALORACION = ("secuencial", "vectorizado")
+
+
+def _congelar(valor):
+    """Devuelve una vista de solo lectura (recursiva) de un diccionario"""
+    if isinstance(valor, Mapping):
+        return MappingProxyType({clave: _congelar(v) for clave, v in valor.items()})
+    return valor
+
+
+def _descongelar(valor):
+    """Copia en diccionarios normales de una vista congelada (para serializarla)"""
+    if isinstance(valor, Mapping):
+        return {clave: _descongelar(v) for clave, v in valor.items()}
+    return valor
+
+
+def _huella(*partes) -> str:
+    """Huella estable (hash SHA-1 abreviado) de estructuras JSON"""
+    contenido = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=dict)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+class TablaCriterios(Mapping):
+    """
+    Tabla de criterios por región con capas de valores personalizados
+
+    Cada región se resuelve como un ChainMap de solo lectura: primero las
+    capas personalizadas (la más reciente delante) y al final la tabla base.
+    Las regiones que solo existen en una capa se apoyan en la tabla "default".
+    Las vistas por región se construyen una vez y se reutilizan.
+    """
+
+    def __init__(self, base: Mapping, capas: tuple = ()):
+        """
+        Args:
+            base: Tabla base congelada {region: {clave: valor}}
+            capas: Capas congeladas {region: {clave: valor}}, de la más antigua a la más reciente
+        """
+        self._base = base
+        self._capas = capas
+        self._regiones = {}
+
+    def con_capa(self, capa: Mapping) -> "TablaCriterios":
+        """Devuelve una nueva tabla con una capa añadida encima"""
+        return TablaCriterios(self._base, self._capas + (capa,))
+
+    def __reduce__(self):
+        # Se serializan la base y las capas, no las vistas ya construidas
+        return (_restaurar_tabla, (_descongelar(self._base), [_descongelar(capa) for capa in self._capas]))
+
+    def __getitem__(self, region):
+        vista = self._regiones.get(region)
+        if vista is None:
+            mapas = [capa[region] for capa in reversed(self._capas) if region in capa]
+            if region in self._base:
+                mapas.append(self._base[region])
+            elif mapas:
+                mapas.append(self._base["default"])
+            else:
+                raise KeyError(region)
+            vista = mapas[0] if len(mapas) == 1 else MappingProxyType(ChainMap(*mapas))
+            self._regiones[region] = vista
+        return vista
+
+    def __contains__(self, region):
+        return region in self._base or any(region in capa for capa in self._capas)
+
+    def __iter__(self):
+        vistas = dict.fromkeys(self._base)
+        for capa in self._capas:
+            vistas.update(dict.fromkeys(capa))
+        return iter(vistas)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _restaurar_tabla(base: Dict, capas: List[Dict]) -> TablaCriterios:
+    return TablaCriterios(_congelar(base), tuple(_congelar(capa) for capa in capas))
 
 
 class CriteriosValoracion:
     """
     Criterios de valoración actualizables
     Basados en datos de mercado 2024/2025
+
+    Las instancias son inmutables y versionadas: las tablas se exponen como
+    vistas de solo lectura y los valores personalizados se aplican con
+    con_personalizados(), que devuelve una nueva instancia con una capa más.
+    Dos instancias con los mismos valores tienen la misma versión (y el mismo
+    hash), por lo que pueden usarse como parte de la clave de una caché.
+
+    Las tablas de la clase son las integradas. Las vigentes se leen en tiempo
+    de ejecución de la sección "tablas_valorador" de data/valores_gva_*.json
+    (ver criterios_vigentes() y tablas_valoracion.py); cada región definida
+    en los archivos sustituye a la integrada del mismo nombre.
     """
 
 
@@ -198,149 +309,324 @@ class CriteriosValoracion:
         }
     }
 
+    # Tablas que admiten valores personalizados (por región/ámbito) y que se
+    # pueden cargar de data/valores_gva_*.json
+    TABLAS_PERSONALIZABLES = TABLAS_VALORADOR
 
-class ValoradorInmuebles:
-    """
-    Valorador de inmuebles según datos del catastro
-    """
+    def __init__(self, tablas: Optional[Dict] = None):
+        """
+        Args:
+            tablas: Tablas cargadas en tiempo de ejecución
+                    {"PRECIOS_RUSTICO": {region: {...}}, "COEFICIENTES_URBANO": {...}};
+                    sus regiones sustituyen a las integradas en la clase
 
-    def __init__(self):
-        self.criterios = CriteriosValoracion()
+        Raises:
+            ValueError: Si algún valor de las tablas no es numérico
+        """
+        cls = type(self)
+        cargadas = validar_tablas(tablas or {})
+        tablas = {
+            nombre: _congelar({**getattr(cls, nombre), **cargadas.get(nombre, {})})
+            for nombre in cls.TABLAS_PERSONALIZABLES
+        }
 
-    def identificar_tipo_cultivo(self, texto_cultivo: str) -> str:
+        object.__setattr__(self, "version", _huella(tablas))
+        for nombre, tabla in tablas.items():
+            object.__setattr__(self, nombre, TablaCriterios(tabla))
+        object.__setattr__(self, "PRECIOS_RUSTICO_OLD", _congelar(cls.PRECIOS_RUSTICO_OLD))
+        object.__setattr__(self, "FACTORES_AJUSTE", _congelar(cls.FACTORES_AJUSTE))
+        object.__setattr__(self, "personalizados", ())
+
+    def __reduce__(self):
+        # Los procesos trabajadores reciben exactamente la misma versión
+        tablas = {nombre: getattr(self, nombre) for nombre in self.TABLAS_PERSONALIZABLES}
+        return (_restaurar_criterios, (self.version, tablas, self.personalizados))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("CriteriosValoracion es inmutable: usa con_personalizados()")
+
+    def __eq__(self, otro):
+        return isinstance(otro, CriteriosValoracion) and self.version == otro.version
+
+    def __hash__(self):
+        return hash(self.version)
+
+    def __repr__(self):
+        return f"CriteriosValoracion(version={self.version!r})"
+
+    def con_personalizados(self, personalizados: Optional[Dict]) -> "CriteriosValoracion":
         """
-        Identifica el tipo de cultivo a partir del código catastral oficial
-        Usa mapeo directo de códigos para máxima precisión
+        Devuelve unos criterios con los valores personalizados aplicados
+
+        No modifica ni copia las tablas existentes: los valores personalizados
+        se congelan en una capa que se antepone a las tablas actuales.
+        Se admiten valores para cualquier región o ámbito territorial.
 
         Args:
-            texto_cultivo: Texto del cultivo (ej: "O- Olivos secano", "MM Pinar maderable")
+            personalizados: Diccionario {"PRECIOS_RUSTICO": {"ambito_17_...": {...}},
+                            "COEFICIENTES_URBANO": {"valencia": {...}}}
 
         Returns:
-            Tipo de cultivo normalizado
+            Nuevos criterios (o los mismos si no hay nada que aplicar)
+
+        Raises:
+            ValueError: Si los valores personalizados no tienen la forma
+                {tabla: {region: {clave: número}}}
+        """
+        if personalizados is not None and not isinstance(personalizados, dict):
+            raise ValueError("criterios personalizados: se esperaba un diccionario de tablas")
+        # Se valida la entrada tal cual llega, antes de copiarla
+        validas = validar_tablas(personalizados or {}, "criterios personalizados")
+
+        capas = {}
+        for nombre, regiones in validas.items():
+            regiones = {region: dict(valores) for region, valores in regiones.items() if valores}
+            if regiones:
+                capas[nombre] = regiones
+
+        if not capas:
+            return self
+
+        nuevos = object.__new__(CriteriosValoracion)
+        object.__setattr__(nuevos, "version", _huella(self.version, capas))
+        for nombre in self.TABLAS_PERSONALIZABLES:
+            tabla = getattr(self, nombre)
+            if nombre in capas:
+                tabla = tabla.con_capa(_congelar(capas[nombre]))
+            object.__setattr__(nuevos, nombre, tabla)
+        object.__setattr__(nuevos, "PRECIOS_RUSTICO_OLD", self.PRECIOS_RUSTICO_OLD)
+        object.__setattr__(nuevos, "FACTORES_AJUSTE", self.FACTORES_AJUSTE)
+        object.__setattr__(nuevos, "personalizados", self.personalizados + (capas,))
+
+        return nuevos
+
+    def con_base(self, base: "CriteriosValoracion") -> "CriteriosValoracion":
+        """
+        Aplica los mismos valores personalizados sobre otras tablas base
+
+        Sirve para valorar con las tablas de otro año (ver
+        ValoradorInmuebles.para_fecha()) sin perder las capas personalizadas.
+
+        Args:
+            base: Criterios sin personalizar (p. ej. los de un periodo de vigencia)
+
+        Returns:
+            Criterios con las tablas de base y las capas de estos
         """
-        texto = texto_cultivo.strip()
-        texto_lower = texto.lower()
+        criterios = base
+        for capas in self.personalizados:
+            criterios = criterios.con_personalizados(capas)
+        return criterios
 
-        # Extraer código catastral (primeros 2-3 caracteres antes del espacio)
-        codigo = texto.split()[0].upper() if texto else ""
 
-        # ============================================================================
-        # MAPEO DIRECTO DE CÓDIGOS CATASTRALES OFICIALES
-        # Fuente: Tabla de códigos GVA 2025
-        # ============================================================================
+def _restaurar_criterios(version: str, tablas: Dict[str, TablaCriterios],
+                         personalizados: tuple = ()) -> CriteriosValoracion:
+    """Reconstruye unos criterios serializados (p. ej. en un proceso trabajador)"""
+    criterios = object.__new__(CriteriosValoracion)
+    object.__setattr__(criterios, "version", version)
+    for nombre, tabla in tablas.items():
+        object.__setattr__(criterios, nombre, tabla)
+    object.__setattr__(criterios, "PRECIOS_RUSTICO_OLD", _congelar(CriteriosValoracion.PRECIOS_RUSTICO_OLD))
+    object.__setattr__(criterios, "FACTORES_AJUSTE", _congelar(CriteriosValoracion.FACTORES_AJUSTE))
+    object.__setattr__(criterios, "personalizados", personalizados)
+    return criterios
 
-        # Mapeo exacto de códigos (con variantes regadío/secano donde aplique)
-        es_regadio = "regadio" in texto_lower or "regadío" in texto_lower
-        es_secano = "secano" in texto_lower
 
-        # Códigos exactos sin variantes
-        MAPEO_EXACTO = {
-            "MM": "pinar_maderable",  # MM Pinar maderable
-            "MT": "matorral",          # MT Matorral
-            "I-": "improductivo",      # I- Improductivo
-            "E-": "pastos",            # E- Pastos
-            "NR": "citricos_regadio",  # NR Agrios regadío (cítricos)
-        }
+# Criterios construidos con las tablas de data/valores_gva_*.json, por periodo
+# de vigencia. Se recargan cuando cambia algún archivo; los criterios ya
+# entregados no se modifican.
+FUENTE_CRITERIOS = FuenteTablas(CriteriosValoracion)
 
-        if codigo in MAPEO_EXACTO:
-            return MAPEO_EXACTO[codigo]
 
-        # Códigos con variantes regadío/secano
-        if codigo == "O-":  # Olivos
-            return "olivar_regadio" if es_regadio else "olivar_secano"
+def criterios_vigentes(fecha_devengo=None) -> CriteriosValoracion:
+    """
+    Criterios con las tablas de data/valores_gva_*.json aplicables en una fecha
 
-        if codigo == "F-":  # Frutales secos (almendros)
-            return "almendro_regadio" if es_regadio else "almendro_secano"
+    Args:
+        fecha_devengo: date o texto ISO (por defecto, hoy)
+    """
+    return FUENTE_CRITERIOS.para_fecha(fecha_devengo)
+
+
+# ============================================================================
+# CLASIFICADOR DE CULTIVOS
+# ============================================================================
+# Las tablas se construyen una sola vez al importar el módulo. Cada texto
+# distinto de "cultivo_aprovechamiento" se clasifica una vez
+# y el resultado se guarda en una caché; en una herencia con miles de
+# subparcelas solo hay unas pocas decenas de textos diferentes.
+
+# Códigos catastrales exactos sin variantes (Fuente: Tabla de códigos GVA 2025)
+CODIGOS_CULTIVO_EXACTOS = {
+    "MM": "pinar_maderable",  # MM Pinar maderable
+    "MT": "matorral",          # MT Matorral
+    "I-": "improductivo",      # I- Improductivo
+    "E-": "pastos",            # E- Pastos
+    "NR": "citricos_regadio",  # NR Agrios regadío (cítricos)
+}
+
+# Códigos con variantes regadío/secano: código -> (regadío, secano)
+CODIGOS_CULTIVO_VARIANTES = {
+    "O-": ("olivar_regadio", "olivar_secano"),        # Olivos
+    "F-": ("almendro_regadio", "almendro_secano"),    # Frutales secos (almendros)
+    "CR": ("labor_regadio", "labor_secano"),          # Labor/Labradío
+    "CL": ("labor_regadio", "labor_secano"),
+    "V-": ("vina_regadio", "vina_secano"),            # Viñedo
+    "FRT": ("frutal_regadio", "frutal_secano"),       # Frutales
+}
+
+# Palabras clave para textos sin código, en orden de prioridad: gana la
+# primera familia con alguna palabra contenida en el texto.
+# Cada entrada: (grupo, palabras, (regadío, secano))
+_PALABRAS_CLAVE_CULTIVO = (
+    ("olivar", ("olivo", "oliv"), ("olivar_regadio", "olivar_secano")),
+    ("almendro", ("almendro", "almendra", "fruto"), ("almendro_regadio", "almendro_secano")),
+    ("vina", ("vid", "viña"), ("vina_regadio", "vina_secano")),
+    ("labor", ("labor", "labradio", "labradío"), ("labor_regadio", "labor_secano")),
+    ("cereal", ("cereal", "trigo", "cebada"), ("cereal_regadio", "cereal_secano")),
+    ("pastos", ("past", "prado"), ("pastos", "pastos")),
+    ("citricos", ("citrico", "agrio", "naranj"), ("citricos_regadio", "citricos_regadio")),
+    ("horticola", ("hortícola", "horticola", "huert"), ("horticola_regadio", "horticola_regadio")),
+    ("forestal", ("forestal",), ("forestal", "forestal")),
+)
+
+_CACHE_TIPO_CULTIVO: Dict[str, str] = {}
+_MAX_CACHE_TIPO_CULTIVO = 4096
+
+
+def _clasificar_cultivo_sin_cache(texto_cultivo: str) -> str:
+    """Clasificación real; ver clasificar_cultivo()"""
+    texto = texto_cultivo.strip()
+    if not texto:
+        return "default"
 
-        if codigo == "CR" or codigo == "CL":  # Labor/Labradío
-            return "labor_regadio" if es_regadio else "labor_secano"
+    texto_lower = texto.lower()
+    codigo = texto.split(None, 1)[0].upper()
 
-        if codigo == "V-":  # Viñedo
-            return "vina_regadio" if es_regadio else "vina_secano"
+    tipo = CODIGOS_CULTIVO_EXACTOS.get(codigo)
+    if tipo is not None:
+        return tipo
 
-        if codigo == "FRT":  # Frutales
-            return "frutal_regadio" if es_regadio else "frutal_secano"
+    es_regadio = "regadio" in texto_lower or "regadío" in texto_lower
 
-        # ============================================================================
-        # FALLBACK: Búsqueda por palabras clave (para textos sin código)
-        # ============================================================================
+    variantes = CODIGOS_CULTIVO_VARIANTES.get(codigo)
+    if variantes is not None:
+        return variantes[0] if es_regadio else variantes[1]
 
-        if "olivo" in texto_lower or "oliv" in texto_lower:
-            return "olivar_regadio" if es_regadio else "olivar_secano"
+    # Fallback: búsqueda por palabras clave (para textos sin código). Cada
+    # palabra se busca con "in", de modo que las coincidencias pueden solaparse
+    for _, palabras, tipos in _PALABRAS_CLAVE_CULTIVO:
+        for palabra in palabras:
+            if palabra in texto_lower:
+                return tipos[0] if es_regadio else tipos[1]
 
-        if "almendro" in texto_lower or "almendra" in texto_lower or "fruto" in texto_lower:
-            return "almendro_regadio" if es_regadio else "almendro_secano"
+    return "default"
 
-        if "vid" in texto_lower or "viña" in texto_lower:
-            return "vina_regadio" if es_regadio else "vina_secano"
 
-        if "labor" in texto_lower or "labradio" in texto_lower or "labradío" in texto_lower:
-            return "labor_regadio" if es_regadio else "labor_secano"
+def clasificar_cultivo(texto_cultivo: str) -> str:
+    """
+    Clasifica un texto de cultivo del catastro usando la caché de resultados
 
-        if "cereal" in texto_lower or "trigo" in texto_lower or "cebada" in texto_lower:
-            return "cereal_regadio" if es_regadio else "cereal_secano"
+    Args:
+        texto_cultivo: Texto del cultivo (ej: "O- Olivos secano", "MM Pinar maderable")
 
-        if "past" in texto_lower or "prado" in texto_lower:
-            return "pastos"
+    Returns:
+        Tipo de cultivo normalizado
+    """
+    tipo = _CACHE_TIPO_CULTIVO.get(texto_cultivo)
+    if tipo is None:
+        tipo = sys.intern(_clasificar_cultivo_sin_cache(texto_cultivo))
+        if len(_CACHE_TIPO_CULTIVO) >= _MAX_CACHE_TIPO_CULTIVO:
+            _CACHE_TIPO_CULTIVO.clear()
+        _CACHE_TIPO_CULTIVO[sys.intern(texto_cultivo)] = tipo
+    return tipo
 
-        if "citrico" in texto_lower or "agrio" in texto_lower or "naranj" in texto_lower:
-            return "citricos_regadio"
 
-        if "hortícola" in texto_lower or "horticola" in texto_lower or "huert" in texto_lower:
-            return "horticola_regadio"
+# Provincias para la identificación por provincia (nombres normalizados)
+_PROVINCIAS_VALENCIA = frozenset({"alicante", "alacant", "valencia", "castellon", "castello"})
+_PROVINCIAS_EXTREMADURA = frozenset({"badajoz", "caceres"})
 
-        if "forestal" in texto_lower:
-            return "forestal"
 
-        return "default"
+class ValoradorInmuebles:
+    """
+    Valorador de inmuebles según datos del catastro
+    """
 
-    def identificar_region(self, provincia: str, municipio: str = "") -> str:
+    def __init__(self, criterios: Optional[CriteriosValoracion] = None,
+                 cache: Optional[CacheValoraciones] = None,
+                 ambitos: Optional[IndiceAmbitos] = None,
+                 registro: Optional[FuenteTablas] = None):
+        """
+        Inicializa el valorador
+
+        Args:
+            criterios: Criterios a aplicar (por defecto, los vigentes de
+                data/valores_gva_*.json, ver criterios_vigentes())
+            cache: Caché de valoraciones opcional (puede compartirse entre valoradores)
+            ambitos: Índice municipio -> ámbito territorial (por defecto, el de
+                data/valores_gva_2025_oficial.json)
+            registro: Tablas por periodo de vigencia para valorar con fecha de
+                devengo (por defecto, las de data/valores_gva_*.json)
+        """
+        self.criterios = criterios if criterios is not None else criterios_vigentes()
+        self.cache = cache
+        self.ambitos = ambitos if ambitos is not None else indice_ambitos()
+        self.registro = registro if registro is not None else FUENTE_CRITERIOS
+        self.periodo = None
+        self._matriz_precios_cache = None
+        self._por_periodo = OrderedDict()
+
+    def identificar_tipo_cultivo(self, texto_cultivo: str) -> str:
+        """
+        Identifica el tipo de cultivo a partir del código catastral oficial
+        Usa mapeo directo de códigos para máxima precisión
+
+        Args:
+            texto_cultivo: Texto del cultivo (ej: "O- Olivos secano", "MM Pinar maderable")
+
+        Returns:
+            Tipo de cultivo normalizado
+        """
+        return clasificar_cultivo(texto_cultivo)
+
+    def identificar_region(self, provincia: str, municipio: str = "", referencia: str = "") -> str:
         """
         Identifica el ámbito territorial para aplicar módulos de valor correctos
 
         Usa el sistema de ámbitos territoriales de la GVA que agrupa municipios
-        con características agronómicas similares.
+        con características agronómicas similares (ver ambitos_territoriales).
 
         Args:
             provincia: Nombre de la provincia
             municipio: Nombre del municipio (opcional, más preciso)
+            referencia: Referencia catastral (opcional; en las rústicas indica el municipio)
 
         Returns:
             Clave de ámbito territorial o región
         """
         # Primero intentar identificar por municipio (ámbitos territoriales GVA)
-        if municipio:
-            municipio_lower = municipio.lower().strip()
-
-            # Ámbito 13: Safor-Litoral (Oliva, Piles)
-            if municipio_lower in ['oliva', 'piles']:
-                return 'ambito_13_safor_litoral'
-
-            # Ámbito 17: Marina Alta-Interior (Vall de Gallinera, Planes)
-            if municipio_lower in ['vall de gallinera', 'vall_de_gallinera', 'planes']:
-                return 'ambito_17_marina_alta_interior'
+        ambito = self.ambitos.buscar(municipio, referencia)
+        if ambito:
+            return ambito
 
         # Fallback a identificación por provincia
-        provincia_lower = provincia.lower()
+        provincias = set(variantes_nombre(provincia))
 
-        if provincia_lower in ["alicante", "valencia", "castellon", "castellón"]:
+        if provincias & _PROVINCIAS_VALENCIA:
             return "valencia"
 
-        if provincia_lower in ["badajoz", "cáceres", "caceres"]:
+        if provincias & _PROVINCIAS_EXTREMADURA:
             return "extremadura"
 
         # Por defecto usar precios nacionales
         return "nacional"
 
-    def valorar_rustico(self, propiedad: Dict) -> Dict:
+    def _datos_rustico(self, propiedad: Dict):
         """
-        Valora un inmueble rústico
-
-        Args:
-            propiedad: Datos del inmueble del catastro
+        Extrae de una propiedad rústica los datos comunes a ambos modos de valoración
 
         Returns:
-            Diccionario con valoración
+            Tupla (provincia, region, superficie_m2, cultivos)
         """
         # Soportar ambos formatos de datos
         datos_desc = propiedad.get("datos_descriptivos", {})
@@ -351,19 +637,52 @@ class ValoradorInmuebles:
         loc = datos_desc.get("localizacion", {}) or propiedad.get("localizacion", {})
 
         # Obtener superficie
-        superficie_m2 = 0
-        if parcela.get("superficie_gráfica"):
-            import re
-            match = re.search(r'[\d.,]+', parcela["superficie_gráfica"])
-            if match:
-                superficie_m2 = float(match.group().replace('.', '').replace(',', '.'))
-
-        superficie_ha = superficie_m2 / 10000  # Convertir m² a ha
+        superficie_m2 = superficie_a_m2(parcela.get("superficie_gráfica")) or 0
 
         # Identificar región (ahora con soporte para municipio)
         provincia = loc.get("provincia", "")
         municipio = loc.get("municipio", "")
-        region = self.identificar_region(provincia, municipio)
+        region = self.identificar_region(provincia, municipio, propiedad.get("referencia_catastral", ""))
+
+        return provincia, region, superficie_m2, cultivos
+
+    def _resultado_rustico(self, provincia: str, region: str, superficie_m2: float,
+                           valor_total: float, detalles_cultivos: List[Dict]) -> Dict:
+        """Construye el diccionario de valoración rústica"""
+        superficie_ha = superficie_m2 / 10000
+
+        return {
+            "tipo_valoracion": "rustico",
+            "metodo": "precio_mercado_cultivo",
+            "superficie_total_m2": superficie_m2,
+            "superficie_total_ha": round(superficie_ha, 4),
+            "region": region,
+            "provincia": provincia,
+            "valor_estimado_euros": round(valor_total, 2),
+            "valor_por_ha": round(valor_total / superficie_ha if superficie_ha > 0 else 0, 2),
+            "valor_por_m2": round(valor_total / superficie_m2 if superficie_m2 > 0 else 0, 2),
+            "detalles_cultivos": detalles_cultivos,
+            "fuente_precios": f"Cocampo 2024/2025 - Región {region}",
+            "advertencias": [
+                "Valoración estimada basada en precios medios de mercado 2024/2025",
+                "No incluye valor catastral (no disponible en datos extraídos)",
+                "Precio real puede variar según ubicación exacta, accesos, agua, etc.",
+                "Recomendable tasación oficial para operaciones importantes"
+            ]
+        }
+
+    def valorar_rustico(self, propiedad: Dict) -> Dict:
+        """
+        Valora un inmueble rústico
+
+        Args:
+            propiedad: Datos del inmueble del catastro
+
+        Returns:
+            Diccionario con valoración
+        """
+        provincia, region, superficie_m2, cultivos = self._datos_rustico(propiedad)
+        superficie_ha = superficie_m2 / 10000  # Convertir m² a ha
 
         # Valorar por cultivos
         valor_total = 0
@@ -417,25 +736,160 @@ class ValoradorInmuebles:
                 "valor_estimado": round(valor_total, 2)
             })
 
-        return {
-            "tipo_valoracion": "rustico",
-            "metodo": "precio_mercado_cultivo",
-            "superficie_total_m2": superficie_m2,
-            "superficie_total_ha": round(superficie_ha, 4),
-            "region": region,
-            "provincia": provincia,
-            "valor_estimado_euros": round(valor_total, 2),
-            "valor_por_ha": round(valor_total / superficie_ha if superficie_ha > 0 else 0, 2),
-            "valor_por_m2": round(valor_total / superficie_m2 if superficie_m2 > 0 else 0, 2),
-            "detalles_cultivos": detalles_cultivos,
-            "fuente_precios": f"Cocampo 2024/2025 - Región {region}",
-            "advertencias": [
-                "Valoración estimada basada en precios medios de mercado 2024/2025",
-                "No incluye valor catastral (no disponible en datos extraídos)",
-                "Precio real puede variar según ubicación exacta, accesos, agua, etc.",
-                "Recomendable tasación oficial para operaciones importantes"
-            ]
-        }
+        return self._resultado_rustico(provincia, region, superficie_m2, valor_total, detalles_cultivos)
+
+    def _matriz_precios(self):
+        """
+        Construye la matriz región × tipo de cultivo a partir de PRECIOS_RUSTICO
+
+        Las regiones sin tabla propia usan la fila "default" y los cultivos
+        ausentes de una tabla usan el "default" de esa región, igual que
+        valorar_rustico().
+
+        La matriz se construye una vez por versión de los criterios y se
+        reutiliza en los lotes siguientes.
+
+        Returns:
+            Tupla (indice_regiones, indice_tipos, precios, matriz) donde
+            precios es la lista de listas con los valores originales (para la
+            salida) y matriz su versión NumPy en float64 (para el cálculo)
+        """
+        if self._matriz_precios_cache is not None and self._matriz_precios_cache[0] == self.criterios.version:
+            return self._matriz_precios_cache[1]
+
+        tablas = self.criterios.PRECIOS_RUSTICO
+
+        tipos = ["default"]
+        for tipos_codigo in CODIGOS_CULTIVO_VARIANTES.values():
+            tipos.extend(tipos_codigo)
+        tipos.extend(CODIGOS_CULTIVO_EXACTOS.values())
+        for _, _, tipos_clave in _PALABRAS_CLAVE_CULTIVO:
+            tipos.extend(tipos_clave)
+        for tabla in tablas.values():
+            tipos.extend(tabla)
+        indice_tipos = {tipo: i for i, tipo in enumerate(dict.fromkeys(tipos))}
+
+        indice_regiones = {region: i for i, region in enumerate(tablas)}
+
+        precios = []
+        for region in indice_regiones:
+            tabla = tablas[region]
+            por_defecto = tabla.get("default", 5000)
+            precios.append([tabla.get(tipo, por_defecto) for tipo in indice_tipos])
+
+        resultado = (indice_regiones, indice_tipos, precios, np.array(precios, dtype=np.float64))
+        self._matriz_precios_cache = (self.criterios.version, resultado)
+        return resultado
+
+    def _valorar_rusticos_vectorizado(self, propiedades: List[Dict]) -> List[Dict]:
+        """
+        Valora un lote de propiedades rústicas en modo columnar
+
+        Aplana los cultivos de todas las propiedades en arrays NumPy (superficie,
+        región, tipo de cultivo), obtiene el €/ha de la matriz de precios y
+        calcula todos los valores con una sola multiplicación. El resultado es
+        idéntico al de valorar_rustico() para cada propiedad.
+
+        Args:
+            propiedades: Lista de propiedades rústicas
+
+        Returns:
+            Lista de diccionarios de valoración rústica, en el mismo orden
+        """
+        if not propiedades:
+            return []
+
+        indice_regiones, indice_tipos, precios, matriz = self._matriz_precios()
+        fila_default = indice_regiones["default"]
+
+        cabeceras = []
+        textos = []
+        sup_m2 = []
+        filas_region = []
+        columnas_tipo = []
+        num_filas = []
+
+        for propiedad in propiedades:
+            provincia, region, superficie_m2, cultivos = self._datos_rustico(propiedad)
+            fila_region = indice_regiones.get(region, fila_default)
+            cabeceras.append((provincia, region, superficie_m2))
+
+            if cultivos:
+                for cultivo in cultivos:
+                    texto = cultivo.get("cultivo_aprovechamiento", "")
+                    textos.append(texto)
+                    sup_m2.append(float(cultivo.get("superficie_m2", "0").replace('.', '').replace(',', '.')))
+                    filas_region.append(fila_region)
+                    columnas_tipo.append(indice_tipos[self.identificar_tipo_cultivo(texto)])
+                num_filas.append(len(cultivos))
+            else:
+                # Si no hay cultivos, una fila con el precio por defecto de la región
+                textos.append(None)
+                sup_m2.append(superficie_m2)
+                filas_region.append(fila_region)
+                columnas_tipo.append(indice_tipos["default"])
+                num_filas.append(1)
+
+        sup_m2 = np.array(sup_m2, dtype=np.float64)
+        filas_region = np.array(filas_region, dtype=np.intp)
+        columnas_tipo = np.array(columnas_tipo, dtype=np.intp)
+        num_filas = np.array(num_filas, dtype=np.intp)
+
+        sup_ha = sup_m2 / 10000
+        valores = sup_ha * matriz[filas_region, columnas_tipo]
+
+        # Totales por propiedad. Se suman columna a columna sobre una matriz
+        # propiedad × cultivo rellena con ceros para conservar el orden de
+        # suma de valorar_rustico() (np.add.reduceat usa suma por bloques y
+        # puede diferir en el último bit, lo que cambiaría algún redondeo).
+        inicios = np.concatenate(([0], np.cumsum(num_filas)[:-1]))
+        indice_propiedad = np.repeat(np.arange(len(propiedades)), num_filas)
+        posicion = np.arange(len(valores)) - inicios[indice_propiedad]
+        por_propiedad = np.zeros((len(propiedades), int(num_filas.max())))
+        por_propiedad[indice_propiedad, posicion] = valores
+        totales = np.zeros(len(propiedades))
+        for columna in por_propiedad.T:
+            totales += columna
+
+        tipos = list(indice_tipos)
+        sup_m2 = sup_m2.tolist()
+        sup_ha = sup_ha.tolist()
+        valores = valores.tolist()
+        filas_region = filas_region.tolist()
+        columnas_tipo = columnas_tipo.tolist()
+        totales = totales.tolist()
+        finales = (inicios + num_filas).tolist()
+        inicios = inicios.tolist()
+
+        resultados = []
+        for i, (provincia, region, superficie_m2) in enumerate(cabeceras):
+            detalles_cultivos = []
+            for j in range(inicios[i], finales[i]):
+                precio_ha = precios[filas_region[j]][columnas_tipo[j]]
+                if textos[j] is None:
+                    detalles_cultivos.append({
+                        "cultivo": "Sin especificar",
+                        "tipo_identificado": "default",
+                        "superficie_m2": superficie_m2,
+                        "superficie_ha": round(sup_ha[j], 4),
+                        "precio_ha": precio_ha,
+                        "valor_estimado": round(valores[j], 2)
+                    })
+                else:
+                    detalles_cultivos.append({
+                        "cultivo": textos[j],
+                        "tipo_identificado": tipos[columnas_tipo[j]],
+                        "superficie_m2": sup_m2[j],
+                        "superficie_ha": round(sup_ha[j], 4),
+                        "precio_ha": precio_ha,
+                        "valor_estimado": round(valores[j], 2)
+                    })
+
+            resultados.append(self._resultado_rustico(
+                provincia, region, superficie_m2, totales[i], detalles_cultivos
+            ))
+
+        return resultados
 
     def valorar_urbano(self, propiedad: Dict) -> Dict:
         """
@@ -470,7 +924,7 @@ class ValoradorInmuebles:
         loc = datos_desc.get("localizacion", {}) or propiedad.get("localizacion", {})
         provincia = loc.get("provincia", "")
         municipio = loc.get("municipio", "")
-        region = self.identificar_region(provincia, municipio)
+        region = self.identificar_region(provincia, municipio, propiedad.get("referencia_catastral", ""))
 
         coefs = self.criterios.COEFICIENTES_URBANO.get(
             region,
@@ -497,15 +951,12 @@ class ValoradorInmuebles:
             ]
         }
 
-    def valorar_propiedad(self, propiedad: Dict) -> Dict:
+    def _cabecera_valoracion(self, propiedad: Dict):
         """
-        Valora una propiedad (rústica o urbana)
-
-        Args:
-            propiedad: Datos del inmueble del catastro
+        Construye los campos comunes de una valoración
 
         Returns:
-            Diccionario con valoración completa
+            Tupla (valoracion, es_rustico)
         """
         # Soportar ambos formatos: nuevo (datos_descriptivos) y viejo (datos_inmueble)
         datos_desc = propiedad.get("datos_descriptivos", {})
@@ -524,35 +975,204 @@ class ValoradorInmuebles:
             "uso_principal": uso_principal
         }
 
-        if "rústico" in clase_lower or "rustico" in clase_lower:
+        return valoracion, "rústico" in clase_lower or "rustico" in clase_lower
+
+    def _valorar_propiedad_sin_cache(self, propiedad: Dict) -> Dict:
+        """Valora una propiedad sin consultar la caché"""
+        valoracion, es_rustico = self._cabecera_valoracion(propiedad)
+
+        if es_rustico:
             valoracion.update(self.valorar_rustico(propiedad))
         else:
             valoracion.update(self.valorar_urbano(propiedad))
 
         return valoracion
 
-    def valorar_multiples(self, propiedades: List[Dict]) -> Dict:
+    def valorar_propiedad(self, propiedad: Dict, fecha_devengo=None) -> Dict:
         """
-        Valora múltiples propiedades y genera resumen
+        Valora una propiedad (rústica o urbana)
+
+        Si el valorador tiene caché y la propiedad ya se valoró con la misma
+        versión de criterios, se devuelve la valoración guardada.
+
+        Args:
+            propiedad: Datos del inmueble del catastro
+            fecha_devengo: Si se indica (date o texto ISO), se valora con las
+                tablas vigentes en esa fecha en lugar de con self.criterios
+
+        Returns:
+            Diccionario con valoración completa
+        """
+        if fecha_devengo is not None:
+            return self.valorar_por_fecha([propiedad], fecha_devengo)[0]
+        return self.valorar_lista([propiedad])[0]
+
+    def para_fecha(self, fecha_devengo) -> "ValoradorInmuebles":
+        """
+        Valorador con las tablas vigentes en una fecha de devengo
+
+        Los valores personalizados de self.criterios se aplican sobre las
+        tablas del periodo. El valorador de cada periodo (con su matriz de
+        precios) se reutiliza mientras siga entre los MAX_TABLAS_CARGADAS
+        periodos usados más recientemente.
+
+        Args:
+            fecha_devengo: date o texto ISO (None = hoy)
+        """
+        periodo = self.registro.periodo(fecha_devengo)
+        valorador = self._por_periodo.get(periodo)
+        if valorador is not None:
+            self._por_periodo.move_to_end(periodo)
+            return valorador
+
+        criterios = self.criterios.con_base(self.registro.cargar(periodo))
+        valorador = ValoradorInmuebles(criterios, cache=self.cache, ambitos=self.ambitos, registro=self.registro)
+        valorador.periodo = periodo
+        self._por_periodo[periodo] = valorador
+        while len(self._por_periodo) > MAX_TABLAS_CARGADAS:
+            self._por_periodo.popitem(last=False)
+        return valorador
+
+    def valorar_por_fecha(self, propiedades: List[Dict], fecha_devengo,
+                          modo: str = "secuencial") -> List[Dict]:
+        """
+        Valora propiedades con las tablas vigentes en su fecha de devengo
+
+        Las propiedades se agrupan por periodo de vigencia: las tablas de cada
+        periodo se cargan una sola vez y sus propiedades se valoran juntas,
+        aunque las fechas lleguen mezcladas.
 
         Args:
             propiedades: Lista de propiedades
+            fecha_devengo: Fecha común a todas las propiedades o lista con la
+                fecha de cada una (date o texto ISO)
+            modo: "secuencial" o "vectorizado"
 
         Returns:
-            Diccionario con valoraciones y resumen
+            Valoraciones en el mismo orden que las propiedades, con la fecha de
+            devengo y la vigencia de las tablas aplicadas
+
+        Raises:
+            ValueError: Si la lista de fechas no tiene una fecha por propiedad
         """
+        if isinstance(fecha_devengo, (list, tuple)):
+            if len(fecha_devengo) != len(propiedades):
+                raise ValueError("Se necesita una fecha de devengo por propiedad")
+            fechas = [convertir_fecha(fecha) for fecha in fecha_devengo]
+        else:
+            fechas = [convertir_fecha(fecha_devengo)] * len(propiedades)
+
+        valoradores = {}
+        grupos = defaultdict(list)
+        for i, fecha in enumerate(fechas):
+            valorador = valoradores.get(fecha)
+            if valorador is None:
+                valorador = valoradores[fecha] = self.para_fecha(fecha)
+            grupos[valorador].append(i)
+
+        valoraciones = [None] * len(propiedades)
+        for valorador, indices in grupos.items():
+            vigencia = valorador.periodo.vigencia() if valorador.periodo else None
+            lote = valorador.valorar_lista([propiedades[i] for i in indices], modo)
+            for i, valoracion in zip(indices, lote):
+                valoraciones[i] = {
+                    **valoracion,
+                    "fecha_devengo": fechas[i].isoformat() if fechas[i] else None,
+                    "vigencia_tablas": vigencia,
+                }
+        return valoraciones
+
+    def _valorar_lista_vectorizado(self, propiedades: List[Dict]) -> List[Dict]:
+        """Valora una lista de propiedades con el motor columnar para las rústicas"""
+        if np is None:
+            raise RuntimeError("El modo vectorizado requiere NumPy (pip install numpy)")
+
         valoraciones = []
-        valor_total = 0
+        rusticas = []
+        posiciones_rusticas = []
 
         for prop in propiedades:
-            val = self.valorar_propiedad(prop)
-            valoraciones.append(val)
+            valoracion, es_rustico = self._cabecera_valoracion(prop)
+            if es_rustico:
+                rusticas.append(prop)
+                posiciones_rusticas.append(len(valoraciones))
+            else:
+                valoracion.update(self.valorar_urbano(prop))
+            valoraciones.append(valoracion)
 
-            if "valor_estimado_euros" in val:
-                valor_total += val["valor_estimado_euros"]
+        for posicion, resultado in zip(posiciones_rusticas, self._valorar_rusticos_vectorizado(rusticas)):
+            valoraciones[posicion].update(resultado)
+
+        return valoraciones
+
+    def _valorar_sin_cache(self, propiedades: List[Dict], modo: str) -> List[Dict]:
+        """Valora una lista de propiedades sin consultar la caché"""
+        if modo == "vectorizado":
+            return self._valorar_lista_vectorizado(propiedades)
+
+        return [self._valorar_propiedad_sin_cache(prop) for prop in propiedades]
+
+    def valorar_lista(self, propiedades: List[Dict], modo: str = "secuencial",
+                      ejecutor: Optional[Callable[[List[Dict]], List[Dict]]] = None) -> List[Dict]:
+        """
+        Valora una lista de propiedades sin generar resumen
+
+        Con caché, solo se valoran las propiedades cuyos datos o criterios han
+        cambiado; el resto se toman de la caché.
+
+        Args:
+            propiedades: Lista de propiedades
+            modo: "secuencial" (propiedad a propiedad) o "vectorizado" (por lotes con NumPy)
+            ejecutor: Función opcional que valora las propiedades pendientes
+                      (por ejemplo, repartiéndolas en un pool de procesos)
+
+        Returns:
+            Lista de valoraciones en el mismo orden que las propiedades
+        """
+        if modo not in MODOS_VALORACION:
+            raise ValueError(f"Modo de valoración desconocido: {modo}")
+
+        if ejecutor is None:
+            ejecutor = partial(self._valorar_sin_cache, modo=modo)
+
+        if self.cache is None:
+            return ejecutor(propiedades)
+
+        # El ámbito de cada propiedad depende también del índice de municipios
+        version = _huella(self.criterios.version, self.ambitos.version)
+        claves = [self.cache.clave(prop, version) for prop in propiedades]
+        valoraciones = [self.cache.obtener(clave) for clave in claves]
+
+        # Las valoraciones de la caché se devuelven con la fecha de esta valoración
+        fecha = datetime.now().isoformat()
+        pendientes = []
+        for i, valoracion in enumerate(valoraciones):
+            if valoracion is None:
+                pendientes.append(i)
+            else:
+                valoraciones[i] = {**valoracion, "fecha_valoracion": fecha}
+
+        if pendientes:
+            nuevas = ejecutor([propiedades[i] for i in pendientes])
+            for i, valoracion in zip(pendientes, nuevas):
+                self.cache.guardar(claves[i], valoracion)
+                valoraciones[i] = valoracion
+
+        return valoraciones
+
+    def generar_resumen(self, total_propiedades: int, valor_total: float) -> Dict:
+        """
+        Genera el resumen de una valoración a partir de sus totales
 
-        resumen = {
-            "total_propiedades": len(propiedades),
+        Args:
+            total_propiedades: Número de propiedades valoradas
+            valor_total: Suma de los valores estimados
+
+        Returns:
+            Diccionario con el resumen
+        """
+        return {
+            "total_propiedades": total_propiedades,
             "valor_total_estimado": round(valor_total, 2),
             "fecha_valoracion": datetime.now().isoformat(),
             "criterios_utilizados": {
@@ -562,33 +1182,316 @@ class ValoradorInmuebles:
             }
         }
 
+    def generar_resultado(self, valoraciones: List[Dict]) -> Dict:
+        """
+        Genera el documento {"resumen", "valoraciones"} a partir de valoraciones ya calculadas
+
+        Args:
+            valoraciones: Lista de valoraciones
+
+        Returns:
+            Diccionario con valoraciones y resumen
+        """
+        valor_total = 0
+
+        for val in valoraciones:
+            if "valor_estimado_euros" in val:
+                valor_total += val["valor_estimado_euros"]
+
         return {
-            "resumen": resumen,
+            "resumen": self.generar_resumen(len(valoraciones), valor_total),
             "valoraciones": valoraciones
         }
 
+    def revalorar_incremental(self, resultado: Dict, cambios: Dict,
+                              propiedades: Optional[List[Dict]] = None) -> Dict:
+        """
+        Revalora una cartera ya valorada aplicando solo un diff de criterios
+
+        Se recalculan únicamente las filas de cultivo (y urbanos) cuyo precio
+        o coeficiente cambia. Para revaloraciones repetidas sobre la misma
+        cartera conviene conservar el PortafolioValorado y llamar a su método
+        aplicar_cambios().
+
+        Args:
+            resultado: Documento {"resumen", "valoraciones"} calculado con self.criterios
+            cambios: Diff de criterios ({"PRECIOS_RUSTICO": {region: {tipo: €/ha}}})
+            propiedades: Propiedades originales (solo para cambios de COEFICIENTES_URBANO)
+
+        Returns:
+            Valoraciones modificadas y resumen actualizado
+        """
+        return PortafolioValorado(resultado, self.criterios, propiedades).aplicar_cambios(cambios)
+
+    def valorar_multiples(self, propiedades: List[Dict], modo: str = "secuencial",
+                          fecha_devengo=None) -> Dict:
+        """
+        Valora múltiples propiedades y genera resumen
+
+        Args:
+            propiedades: Lista de propiedades
+            modo: "secuencial" (propiedad a propiedad) o "vectorizado" (por lotes con NumPy)
+            fecha_devengo: Fecha de devengo común o lista con la de cada propiedad;
+                si se indica, cada propiedad se valora con las tablas vigentes
+                en su fecha (ver valorar_por_fecha())
+
+        Returns:
+            Diccionario con valoraciones y resumen
+        """
+        if fecha_devengo is not None:
+            return self.generar_resultado(self.valorar_por_fecha(propiedades, fecha_devengo, modo))
+        return self.generar_resultado(self.valorar_lista(propiedades, modo))
+
+
+class PortafolioValorado:
+    """
+    Cartera ya valorada preparada para revaloraciones incrementales
+
+    Mantiene un índice inverso (tabla de precios, clave de precio) → filas de
+    cultivo, de modo que al cambiar un €/ha solo se recalculan las filas que
+    usan ese precio y las propiedades que las contienen. Las valoraciones
+    recibidas no se modifican: cada propiedad afectada se copia antes de
+    actualizarla (pueden estar compartidas con la caché de valoraciones).
+    """
+
+    def __init__(self, resultado: Dict, criterios: CriteriosValoracion,
+                 propiedades: Optional[List[Dict]] = None):
+        """
+        Args:
+            resultado: Documento {"resumen", "valoraciones"} de valorar_multiples()
+            criterios: Criterios con los que se calcularon las valoraciones
+            propiedades: Propiedades originales (solo necesarias para revalorar
+                         urbanos al cambiar COEFICIENTES_URBANO)
+        """
+        self.criterios = criterios
+        self.resumen = dict(resultado.get("resumen", {}))
+        self.valoraciones = list(resultado.get("valoraciones", []))
+        self.propiedades = propiedades
+        self._copiadas = set()
+
+        # (tabla, clave de precio) -> {(valoración, detalle)}
+        self._indice_rustico = defaultdict(set)
+        # región de la valoración -> {valoración}
+        self._por_region_rustico = defaultdict(set)
+        # tabla de coeficientes -> {valoración}
+        self._indice_urbano = defaultdict(set)
+        self._por_region_urbano = defaultdict(set)
+
+        self.valor_total = 0
+        for i, val in enumerate(self.valoraciones):
+            if "valor_estimado_euros" in val:
+                self.valor_total += val["valor_estimado_euros"]
+            self._indexar(i)
+
+    def _claves_rustico(self, i: int):
+        """Claves (tabla, clave de precio) de cada detalle de una valoración rústica"""
+        val = self.valoraciones[i]
+        tablas = self.criterios.PRECIOS_RUSTICO
+        tabla = val["region"] if val["region"] in tablas else "default"
+        precios = tablas[tabla]
+        for j, detalle in enumerate(val.get("detalles_cultivos", [])):
+            tipo = detalle["tipo_identificado"]
+            yield (tabla, tipo if tipo in precios else "default"), (i, j)
+
+    def _tabla_urbano(self, i: int) -> str:
+        region = self.valoraciones[i]["region"]
+        return region if region in self.criterios.COEFICIENTES_URBANO else "default"
+
+    def _indexar(self, i: int):
+        val = self.valoraciones[i]
+        if val.get("tipo_valoracion") == "rustico":
+            self._por_region_rustico[val["region"]].add(i)
+            for clave, fila in self._claves_rustico(i):
+                self._indice_rustico[clave].add(fila)
+        elif val.get("tipo_valoracion") == "urbano" and "region" in val:
+            self._por_region_urbano[val["region"]].add(i)
+            self._indice_urbano[self._tabla_urbano(i)].add(i)
+
+    def _desindexar(self, i: int):
+        val = self.valoraciones[i]
+        if val.get("tipo_valoracion") == "rustico":
+            for clave, fila in self._claves_rustico(i):
+                self._indice_rustico[clave].discard(fila)
+        elif val.get("tipo_valoracion") == "urbano" and "region" in val:
+            self._indice_urbano[self._tabla_urbano(i)].discard(i)
+
+    def _afectadas_rustico(self, cambios: Dict) -> set:
+        """Valoraciones rústicas cuyo precio puede cambiar con los cambios dados"""
+        tablas = self.criterios.PRECIOS_RUSTICO
+        afectadas = set()
+
+        for region, valores in cambios.items():
+            if region not in tablas:
+                # Las propiedades de esta región usaban la tabla "default"
+                afectadas |= self._por_region_rustico.get(region, set())
+                continue
+
+            precios = tablas[region]
+            for clave in valores:
+                if clave not in precios:
+                    # Nuevo tipo en la tabla: hasta ahora esas filas usaban el "default"
+                    clave = "default"
+                afectadas.update(i for i, _ in self._indice_rustico.get((region, clave), ()))
+
+            if region == "default":
+                # Regiones creadas solo en capas personalizadas se apoyan en "default"
+                for otra in tablas:
+                    if otra not in CriteriosValoracion.PRECIOS_RUSTICO:
+                        afectadas |= self._por_region_rustico.get(otra, set())
+
+        return afectadas
+
+    def _afectadas_urbano(self, cambios: Dict) -> set:
+        """Valoraciones urbanas cuyo coeficiente puede cambiar con los cambios dados"""
+        tablas = self.criterios.COEFICIENTES_URBANO
+        afectadas = set()
+
+        for region in cambios:
+            if region not in tablas:
+                afectadas |= self._por_region_urbano.get(region, set())
+            else:
+                afectadas |= self._indice_urbano.get(region, set())
+
+        return afectadas
+
+    def _copiar(self, i: int) -> Dict:
+        """Copia una valoración antes de modificarla (solo la primera vez)"""
+        if i not in self._copiadas:
+            self.valoraciones[i] = copy.deepcopy(self.valoraciones[i])
+            self._copiadas.add(i)
+        return self.valoraciones[i]
+
+    def _recalcular_rustico(self, i: int):
+        """Recalcula una valoración rústica con los criterios actuales"""
+        val = self._copiar(i)
+        tablas = self.criterios.PRECIOS_RUSTICO
+        precios_region = tablas.get(val["region"], tablas["default"])
+
+        valor_total = 0
+        for detalle in val["detalles_cultivos"]:
+            precio_ha = precios_region.get(detalle["tipo_identificado"], precios_region.get("default", 5000))
+            valor_cultivo = detalle["superficie_m2"] / 10000 * precio_ha
+            valor_total += valor_cultivo
+            detalle["precio_ha"] = precio_ha
+            detalle["valor_estimado"] = round(valor_cultivo, 2)
+
+        superficie_m2 = val["superficie_total_m2"]
+        superficie_ha = superficie_m2 / 10000
+        val["valor_estimado_euros"] = round(valor_total, 2)
+        val["valor_por_ha"] = round(valor_total / superficie_ha if superficie_ha > 0 else 0, 2)
+        val["valor_por_m2"] = round(valor_total / superficie_m2 if superficie_m2 > 0 else 0, 2)
+
+    def _recalcular_urbano(self, i: int, valorador: "ValoradorInmuebles"):
+        """Recalcula una valoración urbana con los criterios actuales"""
+        val = self._copiar(i)
+        val.update(valorador.valorar_urbano(self.propiedades[i]))
+
+    def aplicar_cambios(self, cambios: Dict) -> Dict:
+        """
+        Aplica un diff de criterios y revalora solo las filas afectadas
+
+        Args:
+            cambios: Diff con el formato de los criterios personalizados, p. ej.
+                     {"PRECIOS_RUSTICO": {"ambito_17_marina_alta_interior": {"olivar_secano": 14000}}}
+
+        Returns:
+            Diccionario con las valoraciones modificadas (y su posición) y el resumen actualizado
+
+        Raises:
+            ValueError: Si hay cambios de COEFICIENTES_URBANO sin propiedades originales
+        """
+        cambios_rustico = cambios.get("PRECIOS_RUSTICO", {})
+        cambios_urbano = cambios.get("COEFICIENTES_URBANO", {})
+
+        if cambios_urbano and self.propiedades is None:
+            raise ValueError("Para revalorar urbanos se necesitan las propiedades originales")
+
+        rusticas = self._afectadas_rustico(cambios_rustico)
+        urbanas = self._afectadas_urbano(cambios_urbano)
+        afectadas = sorted(rusticas | urbanas)
+        anteriores = {i: self.valoraciones[i].get("valor_estimado_euros", 0) for i in afectadas}
+
+        # Se validan los cambios antes de tocar el índice: un diff rechazado
+        # deja la cartera como estaba
+        nuevos = self.criterios.con_personalizados(cambios)
+        valorador = ValoradorInmuebles(nuevos)
+
+        # Las claves del índice se calculan con los criterios anteriores
+        for i in afectadas:
+            self._desindexar(i)
+        self.criterios = nuevos
+
+        for i in afectadas:
+            if i in rusticas:
+                self._recalcular_rustico(i)
+            else:
+                self._recalcular_urbano(i, valorador)
+            self._indexar(i)
+            self.valor_total += self.valoraciones[i].get("valor_estimado_euros", 0) - anteriores[i]
+
+        self.resumen["valor_total_estimado"] = round(self.valor_total, 2)
+        self.resumen["fecha_valoracion"] = datetime.now().isoformat()
+
+        return {
+            "resumen": self.resumen,
+            "valoraciones_modificadas": [
+                {"indice": i, "valoracion": self.valoraciones[i]} for i in afectadas
+            ],
+            "criterios_version": self.criterios.version
+        }
+
+    def resultado(self) -> Dict:
+        """Devuelve el documento {"resumen", "valoraciones"} actual"""
+        return {
+            "resumen": self.resumen,
+            "valoraciones": self.valoraciones
+        }
+
 
 def main():
     """
     Ejemplo de uso del valorador
+
+    Uso: python valorador_inmuebles.py [--vectorizado] [--fecha-devengo AAAA-MM-DD] [--almacen]
+
+    Con --almacen las propiedades se leen del almacén SQLite (solo las
+    columnas que usa la valoración) y las valoraciones se guardan en él en
+    lugar de en data/valoraciones.json.
     """
     import os
 
+    modo = "vectorizado" if "--vectorizado" in sys.argv[1:] else "secuencial"
+    fecha_devengo = None
+    if "--fecha-devengo" in sys.argv:
+        fecha_devengo = convertir_fecha(sys.argv[sys.argv.index("--fecha-devengo") + 1])
+
     print("=" * 60)
     print("SISTEMA DE VALORACIÓN DE INMUEBLES")
     print("=" * 60)
     print()
 
     # Cargar datos del catastro
-    archivo_datos = "data/datos_catastrales_consolidados.json"
+    usar_almacen = "--almacen" in sys.argv
+    if usar_almacen:
+        from almacen_catastral import RUTA_ALMACEN, AlmacenCatastral
+
+        if not os.path.exists(RUTA_ALMACEN):
+            print(f"❌ No se encontró el almacén: {RUTA_ALMACEN}")
+            print("\nEjecuta primero: python almacen_catastral.py migrar")
+            return
 
-    if not os.path.exists(archivo_datos):
-        print(f"❌ No se encontró el archivo: {archivo_datos}")
-        print("\nEjecuta primero: python extraer_datos_reales.py")
-        return
+        with AlmacenCatastral(RUTA_ALMACEN) as almacen:
+            propiedades = list(almacen.propiedades_para_valorar())
+    else:
+        archivo_datos = "data/datos_catastrales_consolidados.json"
 
-    with open(archivo_datos, 'r', encoding='utf-8') as f:
-        propiedades = json.load(f)
+        if not os.path.exists(archivo_datos):
+            print(f"❌ No se encontró el archivo: {archivo_datos}")
+            print("\nEjecuta primero: python extraer_datos_reales.py")
+            return
+
+        with open(archivo_datos, 'r', encoding='utf-8') as f:
+            propiedades = json.load(f)
 
     print(f"✓ Cargadas {len(propiedades)} propiedades\n")
 
@@ -596,12 +1499,23 @@ def main():
     valorador = ValoradorInmuebles()
 
     # Valorar todas las propiedades
-    resultado = valorador.valorar_multiples(propiedades)
+    print(f"Modo de valoración: {modo}")
+    if fecha_devengo:
+        vigencia = valorador.para_fecha(fecha_devengo).periodo
+        print(f"Fecha de devengo: {fecha_devengo.isoformat()}", end="")
+        print(f" (tablas {vigencia.desde} → {vigencia.hasta})" if vigencia else " (tablas integradas)")
+    print()
+    resultado = valorador.valorar_multiples(propiedades, modo=modo, fecha_devengo=fecha_devengo)
 
     # Guardar resultado
-    archivo_valoraciones = "data/valoraciones.json"
-    with open(archivo_valoraciones, 'w', encoding='utf-8') as f:
-        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    if usar_almacen:
+        with AlmacenCatastral(RUTA_ALMACEN) as almacen:
+            almacen.guardar_valoraciones(resultado["valoraciones"], sustituir=True)
+        archivo_valoraciones = f"{RUTA_ALMACEN} (tabla valoraciones)"
+    else:
+        archivo_valoraciones = "data/valoraciones.json"
+        with open(archivo_valoraciones, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
 
     print(f"✓ Valoraciones guardadas en: {archivo_valoraciones}\n")
 